@@ -0,0 +1 @@
+``dials.compute_delta_cchalf``: Computing the ΔCC½ for many groups is much faster. Add ``nproc`` to compute the values in parallel.
@@ -0,0 +1 @@
+``dials.export``: Several output formats can now be written in one run (e.g. ``format=mtz+mmcif``), reading the input once, and concurrently with ``nproc``. Reflections are converted and written to mtz, mmcif and xds_ascii files in chunks (``chunk_size``), reducing the peak memory use for large datasets.
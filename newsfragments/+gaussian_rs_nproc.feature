@@ -0,0 +1 @@
+``dials.integrate``, ``dials.create_profile_model``: Add ``profile.gaussian_rs.nproc`` to estimate the profile model of each frame of a scan-varying model in parallel.
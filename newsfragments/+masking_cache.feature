@@ -0,0 +1 @@
+``dials.generate_mask``: Generated masks can be stored in a directory set by ``cache.directory``, limited in size by ``cache.max_size``, so that they are reused by later runs and other processes with the same geometry and masking parameters.
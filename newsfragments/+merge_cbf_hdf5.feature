@@ -0,0 +1 @@
+``dials.merge_cbf``: Add ``nproc`` to sum the images in parallel, and ``output.format=hdf5`` to write all of the summed images to a single HDF5 file. This holds only the image data, without NeXus metadata, so cannot be imported by DIALS.
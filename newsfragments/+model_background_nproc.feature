@@ -0,0 +1 @@
+``dials.model_background``: The global background model is now computed over ``integration.mp.nproc`` processes, and the model is shared with the processes of ``dials.integrate`` by memory-mapping.
@@ -0,0 +1 @@
+``dials.report``: Add ``nproc`` to run the analyses of the reflections in parallel, and ``cache.directory`` to store their results so that the report can be regenerated from the same input without repeating them.
@@ -0,0 +1 @@
+``dials.scale``: Add the expert option ``Ih_table_memory_budget``, to keep the reflection data held during minimisation within a memory limit (in GB) by paging blocks of the data to disk.
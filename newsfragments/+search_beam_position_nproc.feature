@@ -0,0 +1 @@
+``dials.search_beam_position``: The wide grid search now uses ``nproc`` processes, and the new ``wide_search_coarse_factor`` option scores a coarser grid first, refining only around the best point.
@@ -0,0 +1 @@
+``dials.split_experiments``: Add ``nproc`` to write the output files in parallel. The reflections are now split in a single pass, rather than once per experiment.
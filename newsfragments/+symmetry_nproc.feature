@@ -0,0 +1 @@
+``dials.symmetry``: Add ``nproc`` to score the symmetry elements of the lattice group in parallel.
@@ -16,9 +16,41 @@ namespace dials { namespace algorithms { namespace background { namespace boost_
 
   using namespace boost::python;
 
+  struct BackgroundStatisticsPickleSuite : boost::python::pickle_suite {
+    static boost::python::tuple getinitargs(const BackgroundStatistics &obj) {
+      return boost::python::make_tuple(
+        obj.sum(), obj.sum_sq(), obj.num(), obj.min(), obj.max());
+    }
+  };
+
+  struct MultiPanelBackgroundStatisticsPickleSuite : boost::python::pickle_suite {
+    static boost::python::tuple getstate(const MultiPanelBackgroundStatistics &obj) {
+      boost::python::list result;
+      for (std::size_t i = 0; i < obj.size(); ++i) {
+        result.append(obj.get(i));
+      }
+      return boost::python::tuple(result);
+    }
+
+    static void setstate(MultiPanelBackgroundStatistics &obj,
+                         boost::python::tuple state) {
+      DIALS_ASSERT(obj.size() == 0);
+      std::size_t n = boost::python::len(state);
+      for (std::size_t i = 0; i < n; ++i) {
+        obj.append(boost::python::extract<const BackgroundStatistics &>(state[i]));
+      }
+    }
+  };
+
   BOOST_PYTHON_MODULE(dials_algorithms_background_modeller_ext) {
     class_<BackgroundStatistics>("BackgroundStatistics", no_init)
       .def(init<const ImageVolume<>&>())
+      .def(init<const af::versa<double, af::c_grid<2> >&,
+                const af::versa<double, af::c_grid<2> >&,
+                const af::versa<int, af::c_grid<2> >&,
+                const af::versa<double, af::c_grid<2> >&,
+                const af::versa<double, af::c_grid<2> >&>(
+        (arg("sum"), arg("sum_sq"), arg("num"), arg("min"), arg("max"))))
       .def("sum", &BackgroundStatistics::sum)
       .def("sum_sq", &BackgroundStatistics::sum_sq)
       .def("num", &BackgroundStatistics::num)
@@ -28,13 +60,17 @@ namespace dials { namespace algorithms { namespace background { namespace boost_
       .def("mean", &BackgroundStatistics::mean)
       .def("variance", &BackgroundStatistics::variance)
       .def("dispersion", &BackgroundStatistics::dispersion)
-      .def("mask", &BackgroundStatistics::mask);
+      .def("mask", &BackgroundStatistics::mask)
+      .def_pickle(BackgroundStatisticsPickleSuite());
 
     class_<MultiPanelBackgroundStatistics>("MultiPanelBackgroundStatistics", no_init)
+      .def(init<>())
       .def(init<const MultiPanelImageVolume<>&>())
+      .def("append", &MultiPanelBackgroundStatistics::append)
       .def("get", &MultiPanelBackgroundStatistics::get)
       .def("__len__", &MultiPanelBackgroundStatistics::size)
-      .def("__iadd__", &MultiPanelBackgroundStatistics::operator+=);
+      .def("__iadd__", &MultiPanelBackgroundStatistics::operator+=)
+      .def_pickle(MultiPanelBackgroundStatisticsPickleSuite());
   }
 
 }}}}  // namespace dials::algorithms::background::boost_python
@@ -7,6 +7,7 @@
     "BackgroundAlgorithm",
     "BackgroundModel",
     "Creator",
+    "ExternalBackgroundModel",
     "PolarTransform",
     "PolarTransformResult",
     "StaticBackgroundModel",
@@ -1,11 +1,153 @@
+"""
+The global background model (GModel) algorithm.
+
+The model is written by dials.model_background as a pickled
+StaticBackgroundModel, which holds a full copy of the model of every panel of
+the detector. Since every integration process needs the whole model, the model
+is also stored alongside the pickle file as a numpy .npy file for each panel,
+described by a json file, which each process maps read-only into an
+ExternalBackgroundModel, so that the model is held in memory once (in the page
+cache shared by the processes) rather than once per process.
+"""
+
 from __future__ import annotations
 
+import json
+import os
 import pickle
+import tempfile
+
+import numpy as np
+
+from dxtbx import flumpy
+
+
+def mapped_model_filename(filename):
+    """The json file describing the memory-mappable copy of a model."""
+    return f"{filename}.json"
+
+
+def _source(filename):
+    """A signature of a model file, to check a mapped copy is up to date."""
+    stat = os.stat(filename)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _write_atomically(filename, write, suffix):
+    """Write a file with write(fileobj) to a temporary file, then rename it."""
+    fd, temp = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(filename)), suffix=suffix
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(temp, filename)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+
+def save_mapped_model(model, filename, source=(0, 0)):
+    """Write a background model to files that can be mapped by load_mapped_model.
+
+    The data of each panel is written to a .npy file alongside filename, which
+    is a json file recording the source signature and the file and size
+    (slow, fast) of each panel. The files are written to temporary files and
+    renamed, with the json file last, so that processes converting the same
+    model at once do not see partly written files.
+
+    Args:
+        model: A StaticBackgroundModel.
+        filename (str): The json file to write.
+        source (tuple): A signature (size, mtime) of the model file the data was
+            read from, checked by load_mapped_model.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    panels = []
+    for i in range(len(model)):
+        data = flumpy.to_numpy(model.data(i))
+        panel_file = f"{stem}.{i}.npy"
+        _write_atomically(
+            os.path.join(os.path.dirname(filename), panel_file),
+            lambda f, data=data: np.save(f, data),
+            ".npy",
+        )
+        panels.append({"file": panel_file, "shape": list(data.shape)})
+    header = json.dumps({"source": list(source), "panels": panels}, indent=2)
+    _write_atomically(filename, lambda f: f.write(header.encode()), ".json")
+
+
+def load_mapped_model(filename, source=None):
+    """Map a background model written by save_mapped_model read-only.
+
+    Returns:
+        An ExternalBackgroundModel referring to the mapped data.
+
+    Raises:
+        ValueError: If a source signature is given, and the model was converted
+            from a different model file, or if the panel data do not match
+            their description.
+    """
+    from dials.algorithms.background.gmodel import ExternalBackgroundModel
+
+    with open(filename) as f:
+        header = json.load(f)
+    try:
+        panels = [(panel["file"], panel["shape"]) for panel in header["panels"]]
+        converted_from = tuple(header["source"])
+    except (KeyError, TypeError):
+        raise ValueError(f"{filename} is not a background model")
+    if source is not None and converted_from != tuple(source):
+        raise ValueError(f"{filename} was not converted from the same model")
+
+    model = ExternalBackgroundModel()
+    for panel_file, shape in panels:
+        panel_file = os.path.join(os.path.dirname(filename), panel_file)
+        data = np.load(panel_file, mmap_mode="r", allow_pickle=False)
+        if data.dtype != np.float64 or list(data.shape) != shape:
+            raise ValueError(f"{panel_file} does not match {filename}")
+        model.add(data)
+    return model
+
+
+def save_model(model, filename):
+    """Save a background model, with a memory-mappable copy alongside.
+
+    Args:
+        model: A StaticBackgroundModel.
+        filename (str): The file to pickle the model to.
+    """
+    with open(filename, "wb") as outfile:
+        pickle.dump(model, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+    save_mapped_model(model, mapped_model_filename(filename), _source(filename))
+
+
+def load_model(filename):
+    """Load a background model, mapping its data read-only where possible.
+
+    The memory-mappable copy of the model is used if it is up to date with the
+    model file, and otherwise is created from the pickled model. If it cannot
+    be created (for instance if the directory is not writable) the pickled
+    model is returned instead.
+    """
+    source = _source(filename)
+    mapped_file = mapped_model_filename(filename)
+    try:
+        return load_mapped_model(mapped_file, source)
+    except (OSError, ValueError):
+        pass
+    with open(filename, "rb") as infile:
+        model = pickle.load(infile)
+    try:
+        save_mapped_model(model, mapped_file, source)
+        return load_mapped_model(mapped_file, source)
+    except (OSError, ValueError):
+        return model
 
 
 class ModelCache:
     """
-    A class to cache the model
+    A class to cache the model, and the background creators using it
     """
 
     def __init__(self):
@@ -13,6 +155,7 @@ def __init__(self):
         Create a model dictionary
         """
         self.model = {}
+        self.creators = {}
 
     def get(self, name):
         """
@@ -23,11 +166,23 @@ def get(self, name):
         try:
             model = self.model[name]
         except KeyError:
-            with open(name, "rb") as infile:
-                model = pickle.load(infile)
-                self.model[name] = model
+            model = load_model(name)
+            self.model[name] = model
         return model
 
+    def get_creator(self, cls, name, robust, min_pixels):
+        """
+        Get a background creator of the given class for the model, which is
+        constructed once per process and shared by all the experiments
+        """
+        key = (cls, name, robust, min_pixels)
+        try:
+            creator = self.creators[key]
+        except KeyError:
+            creator = cls(model=self.get(name), robust=robust, min_pixels=min_pixels)
+            self.creators[key] = creator
+        return creator
+
 
 # Instance of the model cache
 global_model_cache = ModelCache()
@@ -54,11 +209,10 @@ def __init__(
         """
         from dials.algorithms.background.gmodel import Creator
 
-        # Get the model
-        model = global_model_cache.get(model)
-
-        # Create the background creator
-        self._create = Creator(model=model, robust=robust, min_pixels=min_pixels)
+        # Get the background creator
+        self._create = global_model_cache.get_creator(
+            Creator, model, robust, min_pixels
+        )
 
     def compute_background(self, reflections, image_volume=None):
         """
@@ -95,10 +249,7 @@ def create(experiments, model=None, robust=False, min_pixels=10):
             GModelBackgroundCalculator,
         )
 
-        # Get the model
-        model = global_model_cache.get(model)
-
-        # Create the background creator
-        return GModelBackgroundCalculator(
-            model=model, robust=robust, min_pixels=min_pixels
+        # Get the background calculator
+        return global_model_cache.get_creator(
+            GModelBackgroundCalculator, model, robust, min_pixels
         )
@@ -8,7 +8,9 @@
  *  This code is distributed under the BSD license, a copy of which is
  *  included in the root directory of this package.
  */
+#include <algorithm>
 #include <memory>
+#include <string>
 #include <boost/python.hpp>
 #include <boost/python/def.hpp>
 #include <dials/algorithms/background/gmodel/creator.h>
@@ -39,6 +41,68 @@ namespace dials { namespace algorithms { namespace background { namespace boost_
     }
   };
 
+  /**
+   * Pickle an external background model by value. The unpickled model owns
+   * copies of the data rather than referring to memory held elsewhere.
+   */
+  struct ExternalBackgroundModelPickleSuite : boost::python::pickle_suite {
+    static boost::python::tuple getstate(const ExternalBackgroundModel &obj) {
+      boost::python::list data;
+      for (std::size_t i = 0; i < obj.size(); ++i) {
+        data.append(obj.data(i));
+      }
+      return boost::python::make_tuple(data);
+    }
+
+    static void setstate(ExternalBackgroundModel &obj, boost::python::tuple state) {
+      DIALS_ASSERT(boost::python::len(state) == 1);
+      boost::python::list data = boost::python::extract<boost::python::list>(state[0]);
+      for (std::size_t i = 0; i < boost::python::len(data); ++i) {
+        af::const_ref<double, af::c_grid<2> > arr =
+          boost::python::extract<af::const_ref<double, af::c_grid<2> > >(data[i]);
+        std::shared_ptr<af::versa<double, af::c_grid<2> > > copy(
+          new af::versa<double, af::c_grid<2> >(arr.accessor()));
+        std::copy(arr.begin(), arr.end(), copy->begin());
+        obj.add(copy->const_ref(), copy);
+      }
+    }
+  };
+
+  /**
+   * Release a buffer exported by a python object, holding the GIL.
+   */
+  struct ReleaseBuffer {
+    void operator()(Py_buffer *view) const {
+      PyGILState_STATE state = PyGILState_Ensure();
+      PyBuffer_Release(view);
+      PyGILState_Release(state);
+      delete view;
+    }
+  };
+
+  /**
+   * Add the data of a panel to an external background model from any python
+   * object exporting a C-contiguous 2D buffer of doubles (e.g. a numpy memory
+   * map), without copying. The model keeps the buffer (and the object) alive.
+   */
+  void external_background_model_add(ExternalBackgroundModel &self,
+                                     boost::python::object data) {
+    Py_buffer *view = new Py_buffer();
+    if (PyObject_GetBuffer(data.ptr(), view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT)
+        != 0) {
+      delete view;
+      boost::python::throw_error_already_set();
+    }
+    std::shared_ptr<Py_buffer> owner(view, ReleaseBuffer());
+    DIALS_ASSERT(view->ndim == 2);
+    DIALS_ASSERT(view->itemsize == sizeof(double));
+    DIALS_ASSERT(view->format != NULL && std::string(view->format) == "d");
+    af::c_grid<2> grid(view->shape[0], view->shape[1]);
+    self.add(af::const_ref<double, af::c_grid<2> >(
+               static_cast<const double *>(view->buf), grid),
+             owner);
+  }
+
   BOOST_PYTHON_MODULE(dials_algorithms_background_gmodel_ext) {
     class_<PolarTransformResult>("PolarTransformResult", no_init)
       .def("data", &PolarTransformResult::data)
@@ -62,6 +126,12 @@ namespace dials { namespace algorithms { namespace background { namespace boost_
       .def("data", &StaticBackgroundModel::data)
       .def_pickle(StaticBackgroundModelPickleSuite());
 
+    class_<ExternalBackgroundModel, bases<BackgroundModel> >("ExternalBackgroundModel")
+      .def("add", &external_background_model_add)
+      .def("__len__", &ExternalBackgroundModel::size)
+      .def("data", &ExternalBackgroundModel::data)
+      .def_pickle(ExternalBackgroundModelPickleSuite());
+
     class_<GModelBackgroundCreator> creator("Creator", no_init);
     creator
       .def(init<std::shared_ptr<BackgroundModel>, bool, std::size_t>(
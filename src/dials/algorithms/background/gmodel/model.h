@@ -12,6 +12,8 @@
 #ifndef DIALS_ALGORITHMS_BACKGROUND_GLM_MODEL_H
 #define DIALS_ALGORITHMS_BACKGROUND_GLM_MODEL_H
 
+#include <memory>
+#include <vector>
 #include <dials/array_family/scitbx_shared_and_versa.h>
 #include <dials/error.h>
 
@@ -28,6 +30,35 @@ namespace dials { namespace algorithms {
                                                       int6 bbox) const = 0;
   };
 
+  /**
+   * Extract a shoebox from the background model of a panel
+   * @param data The model data of the panel
+   * @param bbox The bounding box
+   * @returns The model data
+   */
+  inline af::versa<double, af::c_grid<3> > extract_background_model(
+    const af::const_ref<double, af::c_grid<2> > &data,
+    int6 bbox) {
+    DIALS_ASSERT(bbox[1] > bbox[0]);
+    DIALS_ASSERT(bbox[3] > bbox[2]);
+    DIALS_ASSERT(bbox[5] > bbox[4]);
+    af::c_grid<3> grid(bbox[5] - bbox[4], bbox[3] - bbox[2], bbox[1] - bbox[0]);
+    af::versa<double, af::c_grid<3> > result(grid, 0);
+    for (std::size_t j = 0; j < result.accessor()[1]; ++j) {
+      for (std::size_t i = 0; i < result.accessor()[2]; ++i) {
+        int ii = bbox[0] + i;
+        int jj = bbox[2] + j;
+        if (ii >= 0 && jj >= 0 && ii < data.accessor()[1] && jj < data.accessor()[0]) {
+          double value = data(jj, ii);
+          for (std::size_t k = 0; k < result.accessor()[0]; ++k) {
+            result(k, j, i) = value;
+          }
+        }
+      }
+    }
+    return result;
+  }
+
   /**
    * A simple static background model
    */
@@ -43,26 +74,7 @@ namespace dials { namespace algorithms {
     virtual af::versa<double, af::c_grid<3> > extract(std::size_t panel,
                                                       int6 bbox) const {
       DIALS_ASSERT(panel < data_.size());
-      DIALS_ASSERT(bbox[1] > bbox[0]);
-      DIALS_ASSERT(bbox[3] > bbox[2]);
-      DIALS_ASSERT(bbox[5] > bbox[4]);
-      af::c_grid<3> grid(bbox[5] - bbox[4], bbox[3] - bbox[2], bbox[1] - bbox[0]);
-      af::versa<double, af::c_grid<3> > result(grid, 0);
-      af::const_ref<double, af::c_grid<2> > data = data_[panel].const_ref();
-      for (std::size_t j = 0; j < result.accessor()[1]; ++j) {
-        for (std::size_t i = 0; i < result.accessor()[2]; ++i) {
-          int ii = bbox[0] + i;
-          int jj = bbox[2] + j;
-          if (ii >= 0 && jj >= 0 && ii < data.accessor()[1]
-              && jj < data.accessor()[0]) {
-            double value = data(jj, ii);
-            for (std::size_t k = 0; k < result.accessor()[0]; ++k) {
-              result(k, j, i) = value;
-            }
-          }
-        }
-      }
-      return result;
+      return extract_background_model(data_[panel].const_ref(), bbox);
     }
 
     /**
@@ -95,6 +107,60 @@ namespace dials { namespace algorithms {
     af::shared<af::versa<double, af::c_grid<2> > > data_;
   };
 
+  /**
+   * A static background model whose data is held in memory owned elsewhere,
+   * for example in a read-only memory map of a file that is shared between
+   * processes, rather than being copied into the model.
+   */
+  class ExternalBackgroundModel : public BackgroundModel {
+  public:
+    ExternalBackgroundModel() {}
+
+    /**
+     * Extract a shoebox
+     * @param bbox The bounding box
+     * @returns The model data
+     */
+    virtual af::versa<double, af::c_grid<3> > extract(std::size_t panel,
+                                                      int6 bbox) const {
+      DIALS_ASSERT(panel < data_.size());
+      return extract_background_model(data_[panel], bbox);
+    }
+
+    /**
+     * Add the background model of a panel, without copying the data
+     * @param data The model data
+     * @param owner An object keeping the data alive while the model exists
+     */
+    void add(const af::const_ref<double, af::c_grid<2> > &data,
+             std::shared_ptr<void> owner) {
+      data_.push_back(data);
+      owners_.push_back(owner);
+    }
+
+    /**
+     * The number of panels
+     */
+    std::size_t size() const {
+      return data_.size();
+    }
+
+    /**
+     * Get a copy of the data array
+     * @returns The data array
+     */
+    af::versa<double, af::c_grid<2> > data(std::size_t panel) const {
+      DIALS_ASSERT(panel < size());
+      af::versa<double, af::c_grid<2> > result(data_[panel].accessor());
+      std::copy(data_[panel].begin(), data_[panel].end(), result.begin());
+      return result;
+    }
+
+  protected:
+    std::vector<af::const_ref<double, af::c_grid<2> > > data_;
+    std::vector<std::shared_ptr<void> > owners_;
+  };
+
 }}  // namespace dials::algorithms
 
 #endif  // DIALS_ALGORITHMS_BACKGROUND_GLM_MODEL_H
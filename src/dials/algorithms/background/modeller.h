@@ -57,6 +57,31 @@ namespace dials { namespace algorithms {
       }
     }
 
+    /**
+     * Initialize from previously computed statistics
+     * @param sum The image sum at each pixel
+     * @param sum_sq The image sum_sq at each pixel
+     * @param num The number of images contributing for each pixel
+     * @param min The minimum image
+     * @param max The maximum image
+     */
+    BackgroundStatistics(const af::versa<double, af::c_grid<2> > &sum,
+                         const af::versa<double, af::c_grid<2> > &sum_sq,
+                         const af::versa<int, af::c_grid<2> > &num,
+                         const af::versa<double, af::c_grid<2> > &min,
+                         const af::versa<double, af::c_grid<2> > &max)
+        : accessor_(sum.accessor()),
+          sum_(sum),
+          sum_sq_(sum_sq),
+          num_(num),
+          min_(min),
+          max_(max) {
+      DIALS_ASSERT(sum_sq.accessor().all_eq(accessor_));
+      DIALS_ASSERT(num.accessor().all_eq(accessor_));
+      DIALS_ASSERT(min.accessor().all_eq(accessor_));
+      DIALS_ASSERT(max.accessor().all_eq(accessor_));
+    }
+
     /**
      * Add results from another object
      * @param other The other object
@@ -193,6 +218,11 @@ namespace dials { namespace algorithms {
    */
   class MultiPanelBackgroundStatistics {
   public:
+    /**
+     * Initialize with no panels
+     */
+    MultiPanelBackgroundStatistics() {}
+
     /**
      * Initialize with multipanel image volume
      * @param volume The multi panel image volume
@@ -203,6 +233,14 @@ namespace dials { namespace algorithms {
       }
     }
 
+    /**
+     * Add the statistics for the next panel
+     * @param statistics The panel statistics
+     */
+    void append(const BackgroundStatistics &statistics) {
+      statistics_.push_back(statistics);
+    }
+
     /**
      * @returns the statistics for the given panel
      */
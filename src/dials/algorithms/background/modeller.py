@@ -1,7 +1,13 @@
 from __future__ import annotations
 
+import concurrent.futures
+import contextlib
 import logging
 
+import numpy as np
+
+from dxtbx import flumpy
+
 from dials_algorithms_background_modeller_ext import (
     BackgroundStatistics,
     MultiPanelBackgroundStatistics,
@@ -19,6 +25,30 @@
 logger = logging.getLogger(__name__)
 
 
+def _median_filter_columns(data, mask, kernel_size, periodic=True):
+    """
+    Apply a median filter along the first axis of a block of columns.
+
+    With a kernel of (kernel_size, 0) each column is filtered independently of
+    the others, so that an image can be filtered in blocks of columns.
+
+    :param data: The data array, as a numpy array
+    :param mask: The mask array, as a numpy array
+    :param kernel_size: The half size of the kernel along the first axis
+    :param periodic: Wrap the filter
+    :returns: The filtered block, as a numpy array
+    """
+    from dials.algorithms.image.filter import median_filter
+
+    result = median_filter(
+        flumpy.from_numpy(np.ascontiguousarray(data)),
+        flumpy.from_numpy(np.ascontiguousarray(mask)),
+        (kernel_size, 0),
+        periodic=periodic,
+    )
+    return flumpy.to_numpy(result)
+
+
 class FinalizeModel:
     """
     A class to finalize the background model
@@ -42,27 +72,84 @@ def __init__(self, experiments, filter_type="median", kernel_size=10, niter=100)
         # Check the input
         assert len(experiments) == 1
         experiment = experiments[0]
-        assert len(experiment.detector) == 1
 
         # Save the experiment
         self.experiment = experiment
 
-        # Create the transform object
-        self.transform = PolarTransform(
-            experiment.beam, experiment.detector[0], experiment.goniometer
-        )
+        # Create the transform object for each panel
+        self.transforms = [
+            PolarTransform(experiment.beam, panel, experiment.goniometer)
+            for panel in experiment.detector
+        ]
+        self.transform = self.transforms[0]
+
+    def median_filter(self, data, mask, pool=None, n_blocks=1):
+        """
+        Apply the median filter to the polar image
 
-    def finalize(self, data, mask):
+        The kernel only extends along the first axis of the image, so the
+        columns are filtered independently, and may be filtered in blocks by
+        the workers of a pool.
+
+        :param data: The polar data array
+        :param mask: The polar mask array
+        :param pool: An optional concurrent.futures executor
+        :param n_blocks: The number of blocks of columns for the pool
+        :returns: The filtered image
+        """
+        from dials.algorithms.image.filter import median_filter
+
+        n_blocks = min(n_blocks, data.all()[1])
+        if pool is None or n_blocks <= 1:
+            return median_filter(data, mask, (self.kernel_size, 0), periodic=True)
+        data_blocks = np.array_split(flumpy.to_numpy(data), n_blocks, axis=1)
+        mask_blocks = np.array_split(flumpy.to_numpy(mask), n_blocks, axis=1)
+        futures = [
+            pool.submit(_median_filter_columns, d, m, self.kernel_size)
+            for d, m in zip(data_blocks, mask_blocks)
+        ]
+        return flumpy.from_numpy(np.concatenate([f.result() for f in futures], axis=1))
+
+    def finalize(self, data, mask, panel=0, pool=None, n_blocks=1):
         """
         Finalize the model
 
         :param data: The data array
         :param mask: The mask array
+        :param panel: The panel of the data
+        :param pool: An optional concurrent.futures executor to filter the
+                     polar image in blocks
+        :param n_blocks: The number of blocks to filter in the pool
+        """
+        data = self.smooth(data, mask, panel=panel, pool=pool, n_blocks=n_blocks)
+
+        # Get and apply the mask
+        mask = self.experiment.imageset.get_mask(0)[panel]
+        mask = mask.as_1d().as_int().as_double()
+        mask.reshape(data.accessor())
+        data *= mask
+
+        # Return the result
+        return data
+
+    def smooth(self, data, mask, panel=0, pool=None, n_blocks=1):
+        """
+        Filter the image in polar coordinates and fill the masked regions,
+        before the detector mask is applied
+
+        :param data: The data array
+        :param mask: The mask array
+        :param panel: The panel of the data
+        :param pool: An optional concurrent.futures executor to filter the
+                     polar image in blocks
+        :param n_blocks: The number of blocks to filter in the pool
         """
         from dials.algorithms.image.fill_holes import diffusion_fill, simple_fill
-        from dials.algorithms.image.filter import mean_filter, median_filter
+        from dials.algorithms.image.filter import mean_filter
         from dials.array_family import flex
 
+        transform = self.transforms[panel]
+
         # Print some image properties
         sub_data = data.as_1d().select(mask.as_1d())
         logger.info("Raw image statistics:")
@@ -73,7 +160,7 @@ def finalize(self, data, mask):
 
         # Transform to polar
         logger.info("Transforming image data to polar grid")
-        result = self.transform.to_polar(data, mask)
+        result = transform.to_polar(data, mask)
         data = result.data()
         mask = result.mask()
         sub_data = data.as_1d().select(mask.as_1d())
@@ -87,7 +174,7 @@ def finalize(self, data, mask):
         if self.kernel_size > 0:
             if self.filter_type == "median":
                 logger.info("Applying median filter")
-                data = median_filter(data, mask, (self.kernel_size, 0), periodic=True)
+                data = self.median_filter(data, mask, pool=pool, n_blocks=n_blocks)
                 sub_data = data.as_1d().select(mask.as_1d())
                 logger.info("Median polar image statistics:")
                 logger.info("  min:  %d", int(flex.min(sub_data)))
@@ -122,7 +209,7 @@ def finalize(self, data, mask):
 
         # Transform back
         logger.info("Transforming image data from polar grid")
-        result = self.transform.from_polar(data, mask)
+        result = transform.from_polar(data, mask)
         data = result.data()
         mask = result.mask()
         sub_data = data.as_1d().select(mask.as_1d())
@@ -133,17 +220,8 @@ def finalize(self, data, mask):
         logger.info("")
 
         # Fill in any discontinuities
-        mask = ~self.transform.discontinuity()[:-1, :-1]
-        data = diffusion_fill(data, mask, self.niter)
-
-        # Get and apply the mask
-        mask = self.experiment.imageset.get_mask(0)[0]
-        mask = mask.as_1d().as_int().as_double()
-        mask.reshape(data.accessor())
-        data *= mask
-
-        # Return the result
-        return data
+        mask = ~transform.discontinuity()[:-1, :-1]
+        return diffusion_fill(data, mask, self.niter)
 
 
 class BackgroundModellerResult:
@@ -182,13 +260,14 @@ def __init__(self, experiments, params):
         if self.min_images > len(experiments[0].imageset):
             self.min_images = len(experiments[0].imageset)
         self.image_type = params.modeller.image_type
+        self.nproc = params.integration.mp.nproc
 
-        self.finalizer = FinalizeModel(
-            experiments=experiments,
-            filter_type=params.modeller.filter_type,
-            kernel_size=params.modeller.kernel_size,
-            niter=params.modeller.niter,
-        )
+        # The finalizer is created when the model is finalized, so that the
+        # executor can be sent to the processing jobs
+        self.experiments = experiments
+        self.filter_type = params.modeller.filter_type
+        self.kernel_size = params.modeller.kernel_size
+        self.niter = params.modeller.niter
         self.result = None
 
     def process(self, image_volume, experiments, reflections):
@@ -221,37 +300,55 @@ def finalize_model(self):
         logger.info("Finalizing model")
         logger.info("")
 
-        result = []
-        for i in range(len(self.result)):
-            # Get the statistics
-            stats = self.result.get(i)
-            mean = stats.mean(self.min_images)
-            variance = stats.variance(self.min_images)
-            dispersion = stats.dispersion(self.min_images)
-            mask = stats.mask(self.min_images)
-            min_image = stats.min()
-            max_image = stats.max()
-
-            # Create the model
-            if self.image_type == "min":
-                model = self.finalizer.finalize(min_image, mask)
-            elif self.image_type == "mean":
-                model = self.finalizer.finalize(mean, mask)
-            else:
-                raise RuntimeError(f"Unknown image_type: {self.image_type}")
-
-            # Add to the list
-            result.append(
-                BackgroundModellerResult(
-                    mean=mean,
-                    variance=variance,
-                    dispersion=dispersion,
-                    mask=mask,
-                    min_image=min_image,
-                    max_image=max_image,
-                    model=model,
+        finalizer = FinalizeModel(
+            experiments=self.experiments,
+            filter_type=self.filter_type,
+            kernel_size=self.kernel_size,
+            niter=self.niter,
+        )
+
+        with contextlib.ExitStack() as stack:
+            # Filter each polar image in blocks of columns over the workers
+            pool = None
+            if self.nproc > 1:
+                pool = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(max_workers=self.nproc)
+                )
+
+            result = []
+            for i in range(len(self.result)):
+                # Get the statistics
+                stats = self.result.get(i)
+                mean = stats.mean(self.min_images)
+                variance = stats.variance(self.min_images)
+                dispersion = stats.dispersion(self.min_images)
+                mask = stats.mask(self.min_images)
+                min_image = stats.min()
+                max_image = stats.max()
+
+                # Create the model
+                if self.image_type == "min":
+                    image = min_image
+                elif self.image_type == "mean":
+                    image = mean
+                else:
+                    raise RuntimeError(f"Unknown image_type: {self.image_type}")
+                model = finalizer.finalize(
+                    image, mask, panel=i, pool=pool, n_blocks=self.nproc
+                )
+
+                # Add to the list
+                result.append(
+                    BackgroundModellerResult(
+                        mean=mean,
+                        variance=variance,
+                        dispersion=dispersion,
+                        mask=mask,
+                        min_image=min_image,
+                        max_image=max_image,
+                        model=model,
+                    )
                 )
-            )
 
         return result
 
@@ -3,8 +3,6 @@
 import logging
 import math
 
-import pkg_resources
-
 import iotbx.phil
 import libtbx
 from cctbx import sgtbx
@@ -23,6 +21,7 @@
 from dials.algorithms.indexing.symmetry import SymmetryHandler
 from dials.algorithms.refinement import DialsRefineConfigError, DialsRefineRuntimeError
 from dials.array_family import flex
+from dials.util.entry_points import entry_points
 from dials.util.multi_dataset_handling import generate_experiment_identifiers
 
 logger = logging.getLogger(__name__)
@@ -438,9 +437,7 @@ def from_parameters(
                     experiment.goniometer = None
 
             IndexerType = None
-            for entry_point in pkg_resources.iter_entry_points(
-                "dials.index.basis_vector_search"
-            ):
+            for entry_point in entry_points("dials.index.basis_vector_search"):
                 if params.indexing.method == entry_point.name:
                     if use_stills_indexer:
                         # do something
@@ -453,9 +450,7 @@ def from_parameters(
                         )
 
             if IndexerType is None:
-                for entry_point in pkg_resources.iter_entry_points(
-                    "dials.index.lattice_search"
-                ):
+                for entry_point in entry_points("dials.index.lattice_search"):
                     if params.indexing.method == entry_point.name:
                         if use_stills_indexer:
                             from dials.algorithms.indexing.stills_indexer import (
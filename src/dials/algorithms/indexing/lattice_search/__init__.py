@@ -5,8 +5,6 @@
 import math
 from io import StringIO
 
-import pkg_resources
-
 import libtbx.phil
 import scitbx.matrix
 from dxtbx.model.experiment_list import Experiment, ExperimentList
@@ -14,6 +12,7 @@
 
 from dials.algorithms.indexing import indexer
 from dials.algorithms.indexing.basis_vector_search import combinations, optimise
+from dials.util.entry_points import entry_points
 
 from .ffb_indexer import FfbIndexer
 from .low_res_spot_match import LowResSpotMatch
@@ -82,8 +81,8 @@
 
 methods = []
 for entry_point in itertools.chain(
-    pkg_resources.iter_entry_points("dials.index.basis_vector_search"),
-    pkg_resources.iter_entry_points("dials.index.lattice_search"),
+    entry_points("dials.index.basis_vector_search"),
+    entry_points("dials.index.lattice_search"),
 ):
     ext_master_scope = libtbx.phil.parse(
         f"""
@@ -113,9 +112,7 @@ def __init__(self, reflections, experiments, params):
         super().__init__(reflections, experiments, params)
 
         self._lattice_search_strategy = None
-        for entry_point in pkg_resources.iter_entry_points(
-            "dials.index.lattice_search"
-        ):
+        for entry_point in entry_points("dials.index.lattice_search"):
             if entry_point.name == self.params.method:
                 strategy_class = entry_point.load()
                 self._lattice_search_strategy = strategy_class(
@@ -296,9 +293,7 @@ def __init__(self, reflections, experiments, params):
         super().__init__(reflections, experiments, params)
 
         strategy_class = None
-        for entry_point in pkg_resources.iter_entry_points(
-            "dials.index.basis_vector_search"
-        ):
+        for entry_point in entry_points("dials.index.basis_vector_search"):
             if entry_point.name == params.indexing.method:
                 strategy_class = entry_point.load()
                 break
@@ -266,8 +266,14 @@ def generate_phil_scope():
     return phil_scope
 
 
-# The integration phil scope
-phil_scope = generate_phil_scope()
+def __getattr__(name):
+    # The integration phil scope is only generated on first use, as it requires
+    # loading the phil parameters of all background and centroid extensions.
+    if name == "phil_scope":
+        global phil_scope
+        phil_scope = generate_phil_scope()
+        return phil_scope
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def hist(data, width=80, symbol="#", prefix=""):
@@ -8,20 +8,251 @@
 
 from __future__ import annotations
 
-import collections
+import concurrent.futures
 import copy
+import itertools
 import logging
 import math
+import time
 
 import numpy as np
+import scipy.optimize
+import scipy.special
 
-import scitbx.math
 from dxtbx import flumpy
 
 from dials.array_family import flex
+from dials.util.histogram import rows_per_bin
 
 logger = logging.getLogger(__name__)
 
+# The fewest frames for which starting another process to estimate the
+# scan-varying profile model is worthwhile
+_min_frames_per_process = 20
+
+
+def _minimize_log_sigma(target, start):
+    """Minimize a target function of the logarithm of a sigma.
+
+    Params:
+        target A function of an array [log(sigma)], returning the value and
+            gradient of the target
+        start The starting value of log(sigma)
+
+    Returns:
+        The value of log(sigma) at the minimum
+    """
+    result = scipy.optimize.minimize(
+        target,
+        [start],
+        jac=True,
+        method="L-BFGS-B",
+        bounds=[(math.log(1e-6), math.log(math.pi))],
+    )
+    if not np.isfinite(result.fun):
+        raise RuntimeError(f"Failed to estimate sigma: {result.message}")
+    return result.x[0]
+
+
+def _fraction_and_derivative(e1, e2, sigma_m):
+    """Calculate the fraction of observed intensity for each observation.
+
+    Params:
+        e1 zeta * (tau + dphi / 2) / sqrt(2) for each observation
+        e2 zeta * (tau - dphi / 2) / sqrt(2) for each observation
+        sigma_m The mosaicity
+
+    Returns:
+        The fractions, and their derivatives with respect to log(sigma_m)
+    """
+    # Tiny value
+    TINY = 1e-10
+    assert sigma_m > TINY
+
+    # Calculate the fraction of observed reflection intensity
+    u1 = e1 / sigma_m
+    u2 = e2 / sigma_m
+    R = (scipy.special.erf(u1) - scipy.special.erf(u2)) / 2.0
+    dR = (u2 * np.exp(-np.square(u2)) - u1 * np.exp(-np.square(u1))) / math.sqrt(
+        math.pi
+    )
+
+    # Set any points <= 0 to 1e-10 (otherwise will get a floating
+    # point error in log calculation below).
+    assert np.all(R >= 0)
+    mask = R < TINY
+    assert np.count_nonzero(mask) < mask.size
+    R[mask] = TINY
+    dR[mask] = 0
+    return R, dR
+
+
+def _frame_observations(scan, reflections):
+    """Split the shoeboxes of the reflections into observations on each image.
+
+    Params:
+        scan The scan model
+        reflections The reflections
+
+    Returns:
+        (the reflection of each observation, the list of tau, the number of
+        valid foreground pixels and the total counts in the valid foreground
+        pixels of each observation), where tau is the angle between the centre
+        of the image and the predicted angle of the reflection.
+    """
+    from dials.algorithms.shoebox import MaskCode
+
+    mask_code = MaskCode.Valid | MaskCode.Foreground
+
+    # The observations, ordered by reflection and then image
+    shoebox = reflections["shoebox"]
+    x0, x1, y0, y1, z0, z1 = (
+        flumpy.to_numpy(p).astype(np.int64) for p in shoebox.bounding_boxes().parts()
+    )
+    n_images = z1 - z0
+    row = np.repeat(np.arange(len(reflections)), n_images)
+    first = np.repeat(np.cumsum(n_images) - n_images, n_images)
+    frame = z0[row] + np.arange(row.size) - first
+
+    # Sum the pixels of each observation
+    data, _, mask = shoebox.get_shoebox_data_arrays()
+    pixels = np.repeat(np.arange(row.size), ((x1 - x0) * (y1 - y0))[row])
+    foreground = flumpy.to_numpy(mask) == mask_code
+    n_pixels = np.bincount(pixels[foreground], minlength=row.size)
+    counts = np.bincount(
+        pixels[foreground],
+        weights=flumpy.to_numpy(data)[foreground].astype(np.float64),
+        minlength=row.size,
+    )
+
+    # Calculate the list of tau values from the angles of the image edges
+    edges = np.union1d(frame, frame + 1)
+    angles = np.array(
+        [scan.get_angle_from_array_index(int(f), deg=False) for f in edges]
+    )
+    phi0 = angles[np.searchsorted(edges, frame)]
+    phi1 = angles[np.searchsorted(edges, frame + 1)]
+    phi = flumpy.to_numpy(reflections["xyzcal.mm"].parts()[2])
+    tau = (phi1 + phi0) / 2.0 - phi[row]
+    return row, tau, n_pixels, counts
+
+
+def _tau_and_zeta(scan, reflections):
+    """Calculate the list of tau and zeta of the observations of the reflections
+    on each image with valid foreground pixels.
+
+    Params:
+        scan The scan model
+        reflections The list of reflections
+
+    Returns:
+        (list of tau, list of zeta)
+    """
+    row, tau, n_pixels, _ = _frame_observations(scan, reflections)
+    selection = n_pixels > 0
+    zeta = flumpy.to_numpy(reflections["zeta"])
+    return tau[selection], zeta[row[selection]]
+
+
+def _beam_direction_variances(detector, reflections, centroid_definition="s1"):
+    """Calculate the variance in beam direction for each spot.
+
+    Params:
+        detector The detector model
+        reflections The list of reflections
+        centroid_definition ENUM com or s1
+
+    Returns:
+        The variance of each reflection, and whether it could be calculated
+    """
+    # Get the reflection columns
+    shoebox = reflections["shoebox"]
+    xyz = reflections["xyzobs.px.value"]
+
+    if centroid_definition == "com":
+        # Calculate the beam vector at the centroid
+        panel = shoebox.panels()
+        s1_centroid = [
+            detector[panel[r]].get_pixel_lab_coord(xyz[r][0:2])
+            for r in range(len(reflections))
+        ]
+    else:
+        s1_centroid = reflections["s1"]
+
+    # Loop through all the reflections
+    variance = np.zeros(len(reflections))
+    valid = np.zeros(len(reflections), dtype=bool)
+    for r in range(len(reflections)):
+        # Get the coordinates and values of valid shoebox pixels
+        # FIXME maybe I note in Kabsch (2010) s3.1 step (v) is
+        # background subtraction, appears to be missing here.
+        mask = shoebox[r].mask != 0
+        values = flumpy.to_numpy(shoebox[r].values(mask))
+        s1 = shoebox[r].beam_vectors(detector, mask)
+
+        angles = flumpy.to_numpy(s1.angle(s1_centroid[r], deg=False))
+
+        total = np.sum(values)
+        if total > 1:
+            variance[r] = np.dot(values, np.square(angles)) / (total - 1)
+            valid[r] = True
+
+    return variance, valid
+
+
+def _estimate_sigma_m(tau, zeta, dphi2):
+    """Estimate the E.s.d reflecting range by maximum likelihood estimation.
+
+    Params:
+        tau The list of tau
+        zeta The list of zeta
+        dphi2 Half the oscillation width
+
+    Returns:
+        The E.s.d reflecting range
+    """
+    # Calculate zeta * (tau +- dphi / 2) / math.sqrt(2)
+    e1 = (tau + dphi2) * np.abs(zeta) / math.sqrt(2.0)
+    e2 = (tau - dphi2) * np.abs(zeta) / math.sqrt(2.0)
+
+    def target(log_sigma):
+        R, dR = _fraction_and_derivative(e1, e2, math.exp(log_sigma[0]))
+        return -np.sum(np.log(R)), np.array([-np.sum(dR / R)])
+
+    # Start from 2 degrees, as 1 - 3 degrees seems sensible for crystal
+    # mosaic spread
+    return math.exp(_minimize_log_sigma(target, math.log(2 * math.pi / 180)))
+
+
+def _estimate_sigma_m_crude(tau, zeta):
+    """Make a crude estimate of the E.s.d reflecting range."""
+    return math.sqrt(np.var(tau * zeta, ddof=1))
+
+
+def _estimate_frame_sigmas(variance, tau, zeta, dphi2):
+    """Estimate the E.s.d beam divergence and reflecting range on an image.
+
+    Params:
+        variance The beam direction variances of the reflections
+        tau The list of tau
+        zeta The list of zeta
+        dphi2 Half the oscillation width
+
+    Returns:
+        (E.s.d beam divergence, E.s.d reflecting range, whether the crude
+        estimate of the reflecting range was used)
+    """
+    sigma_b = math.sqrt(np.sum(variance) / variance.size)
+    try:
+        return sigma_b, _estimate_sigma_m(tau, zeta, dphi2), False
+    except Exception:
+        return sigma_b, _estimate_sigma_m_crude(tau, zeta), True
+
+
+def _estimate_frames_sigmas(frames):
+    """Estimate the sigmas of a list of frames, see _estimate_frame_sigmas."""
+    return [_estimate_frame_sigmas(*frame) for frame in frames]
+
 
 class ComputeEsdBeamDivergence:
     """Calculate the E.s.d of the beam divergence."""
@@ -59,38 +290,10 @@ def _beam_direction_variance_list(
         Returns:
             The list of variances
         """
-        # Get the reflection columns
-        shoebox = reflections["shoebox"]
-        xyz = reflections["xyzobs.px.value"]
-
-        # Loop through all the reflections
-        variance = np.array([], dtype=np.float64)
-
-        if centroid_definition == "com":
-            # Calculate the beam vector at the centroid
-            s1_centroid = []
-            for r in range(len(reflections)):
-                panel = shoebox[r].panel
-                s1_centroid.append(detector[panel].get_pixel_lab_coord(xyz[r][0:2]))
-        else:
-            s1_centroid = reflections["s1"]
-
-        for r in range(len(reflections)):
-            # Get the coordinates and values of valid shoebox pixels
-            # FIXME maybe I note in Kabsch (2010) s3.1 step (v) is
-            # background subtraction, appears to be missing here.
-            mask = shoebox[r].mask != 0
-            values = flumpy.to_numpy(shoebox[r].values(mask))
-            s1 = shoebox[r].beam_vectors(detector, mask)
-
-            angles = flumpy.to_numpy(s1.angle(s1_centroid[r], deg=False))
-
-            if np.sum(values) > 1:
-                var = np.sum(values * np.square(angles)) / (np.sum(values) - 1)
-                variance = np.append(variance, var)
-
-        # Return a list of variances
-        return variance
+        variance, valid = _beam_direction_variances(
+            detector, reflections, centroid_definition
+        )
+        return variance[valid]
 
 
 class FractionOfObservedIntensity:
@@ -107,52 +310,11 @@ def __init__(self, crystal, beam, detector, goniometer, scan, reflections):
         dphi2 = scan.get_oscillation(deg=False)[1] / 2.0
 
         # Calculate a list of angles and zeta's
-        tau, zeta = self._calculate_tau_and_zeta(
-            crystal, beam, detector, goniometer, scan, reflections
-        )
+        tau, zeta = _tau_and_zeta(scan, reflections)
 
         # Calculate zeta * (tau +- dphi / 2) / math.sqrt(2)
-        self.e1 = (tau + dphi2) * flex.abs(zeta) / math.sqrt(2.0)
-        self.e2 = (tau - dphi2) * flex.abs(zeta) / math.sqrt(2.0)
-
-    def _calculate_tau_and_zeta(
-        self, crystal, beam, detector, goniometer, scan, reflections
-    ):
-        """Calculate the list of tau and zeta needed for the calculation.
-
-        Params:
-            reflections The list of reflections
-            experiment The experiment object.
-
-        Returns:
-            (list of tau, list of zeta)
-        """
-        from dials.algorithms.shoebox import MaskCode
-
-        mask_code = MaskCode.Valid | MaskCode.Foreground
-
-        # Calculate the list of frames and z coords
-        sbox = reflections["shoebox"]
-        bbox = reflections["bbox"]
-        phi = reflections["xyzcal.mm"].parts()[2]
-
-        # Calculate the zeta list
-        zeta = reflections["zeta"]
-
-        # Calculate the list of tau values
-        tau = []
-        zeta2 = []
-        for s, b, p, z in zip(sbox, bbox, phi, zeta):
-            for z0, f in enumerate(range(b[4], b[5])):
-                phi0 = scan.get_angle_from_array_index(int(f), deg=False)
-                phi1 = scan.get_angle_from_array_index(int(f) + 1, deg=False)
-                m = s.mask[z0 : z0 + 1, :, :]
-                if m.count(mask_code) > 0:
-                    tau.append((phi1 + phi0) / 2.0 - p)
-                    zeta2.append(z)
-
-        # Return the list of tau and zeta
-        return flex.double(tau), flex.double(zeta2)
+        self.e1 = (tau + dphi2) * np.abs(zeta) / math.sqrt(2.0)
+        self.e2 = (tau - dphi2) * np.abs(zeta) / math.sqrt(2.0)
 
     def __call__(self, sigma_m):
         """Calculate the fraction of observed intensity for each observation.
@@ -163,26 +325,8 @@ def __call__(self, sigma_m):
         Returns:
             A list of log intensity fractions
         """
-        # Tiny value
-        TINY = 1e-10
-        assert sigma_m > TINY
-
-        # Calculate the two components to the fraction
-        a = scitbx.math.erf(self.e1 / sigma_m)
-        b = scitbx.math.erf(self.e2 / sigma_m)
-
-        # Calculate the fraction of observed reflection intensity
-        R = (a - b) / 2.0
-
-        # Set any points <= 0 to 1e-10 (otherwise will get a floating
-        # point error in log calculation below).
-        assert R.all_ge(0)
-        mask = R < TINY
-        assert mask.count(True) < len(mask)
-        R.set_selected(mask, TINY)
-
-        # Return the logarithm of r
-        return flex.log(R)
+        R, _ = _fraction_and_derivative(self.e1, self.e2, sigma_m)
+        return np.log(R)
 
 
 class ComputeEsdReflectingRange:
@@ -193,8 +337,6 @@ class Estimator:
 
         def __init__(self, crystal, beam, detector, goniometer, scan, reflections):
             """Initialise the optimization."""
-            from scitbx import simplex
-
             # FIXME in here this code is very unstable or actually broken if
             # we pass in a few lone images i.e. screening shots - propose need
             # for alternative algorithm, in meantime can avoid code death if
@@ -207,81 +349,18 @@ def __init__(self, crystal, beam, detector, goniometer, scan, reflections):
             # is used... @JMP please could we discuss? assert best method to get
             # sigma_m in that case is actually to look at present / absent
             # reflections as per how Mosflm does it...
-            # Initialise the function used in likelihood estimation.
-            self._R = FractionOfObservedIntensity(
-                crystal, beam, detector, goniometer, scan, reflections
-            )
-
-            # Set the starting values to try 1, 3 degrees seems sensible for
-            # crystal mosaic spread
-            start = 1 * math.pi / 180
-            stop = 3 * math.pi / 180
-            starting_simplex = [flex.double([start]), flex.double([stop])]
-
-            # Initialise the optimizer
-            optimizer = simplex.simplex_opt(
-                1, matrix=starting_simplex, evaluator=self, tolerance=1e-7
+            tau, zeta = _tau_and_zeta(scan, reflections)
+            self.sigma = _estimate_sigma_m(
+                tau, zeta, scan.get_oscillation(deg=False)[1] / 2.0
             )
 
-            # Get the solution
-            self.sigma = math.exp(optimizer.get_solution()[0])
-
-        def target(self, log_sigma):
-            """The target for minimization."""
-            return -flex.sum(self._R(math.exp(log_sigma[0])))
-
     class CrudeEstimator:
         """If the main estimator failed make a crude estimate"""
 
         def __init__(self, crystal, beam, detector, goniometer, scan, reflections):
             # Calculate a list of angles and zeta's
-            tau, zeta = self._calculate_tau_and_zeta(
-                crystal, beam, detector, goniometer, scan, reflections
-            )
-
-            # Calculate zeta * (tau +- dphi / 2) / math.sqrt(2)
-            X = tau * zeta
-            mv = flex.mean_and_variance(X)
-            self.sigma = math.sqrt(mv.unweighted_sample_variance())
-
-        def _calculate_tau_and_zeta(
-            self, crystal, beam, detector, goniometer, scan, reflections
-        ):
-            """Calculate the list of tau and zeta needed for the calculation.
-
-            Params:
-                reflections The list of reflections
-                experiment The experiment object.
-
-            Returns:
-                (list of tau, list of zeta)
-            """
-            from dials.algorithms.shoebox import MaskCode
-
-            mask_code = MaskCode.Valid | MaskCode.Foreground
-
-            # Calculate the list of frames and z coords
-            sbox = reflections["shoebox"]
-            bbox = reflections["bbox"]
-            phi = reflections["xyzcal.mm"].parts()[2]
-
-            # Calculate the zeta list
-            zeta = reflections["zeta"]
-
-            # Calculate the list of tau values
-            tau = []
-            zeta2 = []
-            for s, b, p, z in zip(sbox, bbox, phi, zeta):
-                for z0, f in enumerate(range(b[4], b[5])):
-                    phi0 = scan.get_angle_from_array_index(int(f), deg=False)
-                    phi1 = scan.get_angle_from_array_index(int(f) + 1, deg=False)
-                    m = s.mask[z0 : z0 + 1, :, :]
-                    if m.count(mask_code) > 0:
-                        tau.append((phi1 + phi0) / 2.0 - p)
-                        zeta2.append(z)
-
-            # Return the list of tau and zeta
-            return flex.double(tau), flex.double(zeta2)
+            tau, zeta = _tau_and_zeta(scan, reflections)
+            self.sigma = _estimate_sigma_m_crude(tau, zeta)
 
     class ExtendedEstimator:
         """Try to estimate using knowledge of intensities"""
@@ -296,71 +375,47 @@ def __init__(
             reflections,
             n_macro_cycles=10,
         ):
-            from scitbx import simplex
-
             # Get the oscillation width
             dphi2 = scan.get_oscillation(deg=False)[1] / 2.0
 
-            # Calculate a list of angles and zeta's
-            tau, zeta, n, indices = self._calculate_tau_and_zeta(
-                crystal, beam, detector, goniometer, scan, reflections
-            )
-
-            # Calculate zeta * (tau +- dphi / 2) / math.sqrt(2)
-            self.e1 = (tau + dphi2) * flex.abs(zeta) / math.sqrt(2.0)
-            self.e2 = (tau - dphi2) * flex.abs(zeta) / math.sqrt(2.0)
-            self.indices = indices
-            if len(self.e1) == 0:
+            # Calculate a list of angles and zeta's, and the counts of each
+            # observation with any counts
+            row, tau, _, counts = _frame_observations(scan, reflections)
+            selection = counts > 0
+            row = row[selection]
+            tau = tau[selection]
+            zeta = flumpy.to_numpy(reflections["zeta"])[row]
+            self.n = counts[selection]
+            if len(tau) == 0:
                 raise RuntimeError(
                     "Something went wrong. Zero pixels selected for estimation of profile parameters."
                 )
 
-            # Compute intensity
-            self.K = flex.double()
-            self.nj = []
-            for i0, i1 in zip(self.indices[:-1], self.indices[1:]):
-                nj = n[i0:i1]
-                self.K.append(flex.sum(nj))
-                self.nj.append(nj)
-
-            # Set the starting values to try 1, 3 degrees seems sensible for
-            # crystal mosaic spread
-            start = math.log(0.1 * math.pi / 180)
-            stop = math.log(1 * math.pi / 180)
-            starting_simplex = [flex.double([start]), flex.double([stop])]
+            # Calculate zeta * (tau +- dphi / 2) / math.sqrt(2)
+            self.e1 = (tau + dphi2) * np.abs(zeta) / math.sqrt(2.0)
+            self.e2 = (tau - dphi2) * np.abs(zeta) / math.sqrt(2.0)
 
-            # Initialise the optimizer
-            optimizer = simplex.simplex_opt(
-                1, matrix=starting_simplex, evaluator=self, tolerance=1e-3
-            )
+            # The first observation of each reflection, and the total
+            # intensity of each reflection
+            self.indices = np.flatnonzero(np.diff(row, prepend=-1))
+            self.K = np.add.reduceat(self.n, self.indices)
 
-            # Get the solution
-            sigma = math.exp(optimizer.get_solution()[0])
+            # Start between 0.1 and 1 degrees, which seems sensible for
+            # crystal mosaic spread
+            start = math.log(math.sqrt(0.1) * math.pi / 180)
 
             # Save the result
-            self.sigma = sigma
+            self.sigma = math.exp(_minimize_log_sigma(self.target, start))
 
         def target(self, log_sigma):
-            """The target for minimization."""
+            """The target for minimization, and its gradient."""
             sigma_m = math.exp(log_sigma[0])
 
-            # Tiny value
-            TINY = 1e-10
-            assert sigma_m > TINY
-
-            # Calculate the two components to the fraction
-            a = scitbx.math.erf(self.e1 / sigma_m)
-            b = scitbx.math.erf(self.e2 / sigma_m)
-
-            # Calculate the fraction of observed reflection intensity
-            zi = (a - b) / 2.0
-
-            # Set any points <= 0 to 1e-10 (otherwise will get a floating
-            # point error in log calculation below).
-            assert zi.all_ge(0)
-            mask = zi < TINY
-            assert mask.count(True) < len(mask)
-            zi.set_selected(mask, TINY)
+            # Calculate the fraction of observed reflection intensity on each
+            # image, and the total for each reflection
+            zi, dzi = _fraction_and_derivative(self.e1, self.e2, sigma_m)
+            Z = np.add.reduceat(zi, self.indices)
+            dZ = np.add.reduceat(dzi, self.indices)
 
             # Compute the likelihood
             #
@@ -379,68 +434,12 @@ def target(self, log_sigma):
             # as a prior for sigma, which accounts for which reflections were actually
             # recorded.
             #
-            L = 0
-            for kj, nj, i0, i1 in zip(
-                self.K, self.nj, self.indices[:-1], self.indices[1:]
-            ):
-                zj = zi[i0:i1]
-                logZ = math.log(flex.sum(zj))
-                L += flex.sum(nj * flex.log(zj)) - kj * logZ + logZ
+            L = np.sum(self.n * np.log(zi)) + np.sum((1 - self.K) * np.log(Z))
+            dL = np.sum(self.n * dzi / zi) + np.sum((1 - self.K) * dZ / Z)
             logger.debug("Sigma M: %f, log(L): %f", sigma_m * 180 / math.pi, L)
 
-            # Return the logarithm of r
-            return -L
-
-        def _calculate_tau_and_zeta(
-            self, crystal, beam, detector, goniometer, scan, reflections
-        ):
-            """Calculate the list of tau and zeta needed for the calculation.
-
-            Params:
-                reflections The list of reflections
-                experiment The experiment object.
-
-            Returns:
-                (list of tau, list of zeta)
-            """
-            from dials.algorithms.shoebox import MaskCode
-
-            mask_code = MaskCode.Valid | MaskCode.Foreground
-
-            # Calculate the list of frames and z coords
-            sbox = reflections["shoebox"]
-            phi = reflections["xyzcal.mm"].parts()[2]
-
-            # Calculate the zeta list
-            zeta = reflections["zeta"]
-
-            # Calculate the list of tau values
-            tau = []
-            zeta2 = []
-            num = []
-            indices = [0]
-            for s, p, z in zip(sbox, phi, zeta):
-                b = s.bbox
-                for z0, f in enumerate(range(b[4], b[5])):
-                    phi0 = scan.get_angle_from_array_index(int(f), deg=False)
-                    phi1 = scan.get_angle_from_array_index(int(f) + 1, deg=False)
-                    d = s.data[z0 : z0 + 1, :, :]
-                    m = s.mask[z0 : z0 + 1, :, :]
-                    d = flex.sum(d.as_1d().select(m.as_1d() == mask_code))
-                    if d > 0:
-                        tau.append((phi1 + phi0) / 2.0 - p)
-                        zeta2.append(z)
-                        num.append(d)
-                if len(zeta2) > indices[-1]:
-                    indices.append(len(zeta2))
-
-            # Return the list of tau and zeta
-            return (
-                flex.double(tau),
-                flex.double(zeta2),
-                flex.double(num),
-                flex.size_t(indices),
-            )
+            # Return the negative log likelihood and its gradient
+            return -L, np.array([-dL])
 
     def __init__(
         self, crystal, beam, detector, goniometer, scan, reflections, algorithm="basic"
@@ -505,6 +504,7 @@ def __init__(
         assert centroid_definition in ("s1", "com")
 
         n_all = reflections.size()
+        start_time = time.perf_counter()
 
         # stills images behave differently in here
         if goniometer is None or scan is None or scan.is_still():
@@ -555,6 +555,9 @@ def __init__(
 
             self._sigma_m = reflecting_range.sigma()
 
+        logger.info(
+            "Computed profile model in %.2f seconds", time.perf_counter() - start_time
+        )
         logger.info(" sigma b: %f degrees", self._sigma_b * 180 / math.pi)
         logger.info(" sigma m: %f degrees", self._sigma_m * 180 / math.pi)
 
@@ -581,8 +584,9 @@ def __init__(
         min_zeta=0.05,
         algorithm="basic",
         centroid_definition="s1",
+        nproc=1,
     ):
-        """Calculate the profile model."""
+        """Calculate the profile model, estimating the frames with nproc processes."""
         from dxtbx.model.experiment_list import Experiment
 
         # Check input has what we want
@@ -614,52 +618,72 @@ def __init__(
 
         # Get a list of reflections for each frame
         bbox = reflections["bbox"]
-        index_list = collections.defaultdict(list)
-        for i, (x0, x1, y0, y1, z0, z1) in enumerate(bbox):
-            assert z1 == z0 + 1
-            index_list[z0].append(i)
-        reflection_list = {
-            key: reflections.select(flex.size_t(value))
-            for key, value in index_list.items()
-        }
+        _, _, _, _, bbox_z0, bbox_z1 = (flumpy.to_numpy(p) for p in bbox.parts())
+        assert np.all(bbox_z1 == bbox_z0 + 1)
 
         # The range of frames
         z0, z1 = scan.get_array_range()
-        min_z = min(index_list)
-        max_z = max(index_list)
-        assert z0 == min_z
-        assert z1 == max_z + 1
+        assert z0 == bbox_z0.min()
+        assert z1 == bbox_z0.max() + 1
+        order, boundaries = rows_per_bin(bbox_z0 - z0, z1 - z0)
+        self._num = np.diff(boundaries).tolist()
+        assert all(self._num)
+
+        # Calculate the beam direction variances and the observations for all
+        # the frames at once, then estimate the sigmas for each frame
+        start_time = time.perf_counter()
+        variance, valid = _beam_direction_variances(detector, reflections)
+        row, tau, n_pixels, _ = _frame_observations(scan, reflections)
+        assert np.array_equal(row, np.arange(len(reflections)))
+        zeta = flumpy.to_numpy(reflections["zeta"])
+        dphi2 = scan.get_oscillation(deg=False)[1] / 2.0
+        tasks = []
+        for i in range(z1 - z0):
+            selection = order[boundaries[i] : boundaries[i + 1]]
+            observed = selection[n_pixels[selection] > 0]
+            tasks.append(
+                (
+                    variance[selection[valid[selection]]],
+                    tau[observed],
+                    zeta[observed],
+                    dphi2,
+                )
+            )
+        # Send the frames to each process in one contiguous chunk, and only use
+        # processes when there are enough frames to be worth starting them
+        n_processes = max(min(nproc, len(tasks) // _min_frames_per_process), 1)
+        if n_processes > 1:
+            chunks = np.array_split(np.arange(len(tasks)), n_processes)
+            with concurrent.futures.ProcessPoolExecutor(n_processes) as pool:
+                results = pool.map(
+                    _estimate_frames_sigmas,
+                    [[tasks[i] for i in chunk] for chunk in chunks],
+                )
+                sigmas = list(itertools.chain.from_iterable(results))
+        else:
+            sigmas = _estimate_frames_sigmas(tasks)
+        logger.info(
+            "Computed profile model for %d frames in %.2f seconds using %d processes",
+            len(sigmas),
+            time.perf_counter() - start_time,
+            n_processes,
+        )
 
-        # Compute for all frames
-        self._num = []
         sigma_b = flex.double()
         sigma_m = flex.double()
-        for i in range(z0, z1):
-            # Get reflections at the index
-            reflections = reflection_list[i]
-
-            self._num.append(len(reflections))
-
-            # Calculate the E.S.D of the beam divergence
-            beam_divergence = ComputeEsdBeamDivergence(detector, reflections)
-
-            # Set the sigma b
-            sigma_b.append(beam_divergence.sigma())
-
-            # Calculate the E.S.D of the reflecting range
-            reflecting_range = ComputeEsdReflectingRange(
-                crystal, beam, detector, goniometer, scan, reflections
-            )
-
+        for i, (frame_sigma_b, frame_sigma_m, crude) in zip(range(z0, z1), sigmas):
+            if crude:
+                logger.info("Using Crude Mosaicity estimator")
             logger.info(
                 "Computing profile model for frame %d: sigma_b = %.4f degrees, sigma_m = %.4f degrees",
                 i,
-                beam_divergence.sigma() * 180 / math.pi,
-                reflecting_range.sigma() * 180 / math.pi,
+                frame_sigma_b * 180 / math.pi,
+                frame_sigma_m * 180 / math.pi,
             )
 
             # Set the sigmas
-            sigma_m.append(reflecting_range.sigma())
+            sigma_b.append(frame_sigma_b)
+            sigma_m.append(frame_sigma_m)
 
         def convolve(data, kernel):
             assert len(kernel) & 1
@@ -7,6 +7,14 @@
 
 from __future__ import annotations
 
+import contextlib
+import itertools
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
 from orderedset import OrderedSet
@@ -43,6 +51,153 @@ def get_sorted_asu_indices(asu_indices, space_group, anomalous=False):
     return sorted_asu_miller_index, permuted
 
 
+def _group_asu_indices(asu_indices):
+    """
+    Sort asu indices into groups of equivalent reflections.
+
+    The groups are in the same order as get_sorted_asu_indices, without
+    building a list of the sorted indices.
+
+    Returns:
+        The unique asu indices, as an (n_groups, 3) array, and the position of
+        the first reflection of each group in the sorted order, followed by
+        the total number of reflections.
+    """
+    asu_indices = flumpy.to_numpy(asu_indices).reshape(-1, 3)
+    ordered = asu_indices[
+        np.lexsort((asu_indices[:, 2], asu_indices[:, 1], asu_indices[:, 0]))
+    ]
+    starts = np.flatnonzero(np.any(ordered[1:] != ordered[:-1], axis=1)) + 1
+    if ordered.shape[0]:
+        starts = np.concatenate(([0], starts))
+    return ordered[starts], np.append(starts, ordered.shape[0])
+
+
+class IhTableBlockPager:
+    """
+    Keep the data of IhTableBlocks within a memory budget.
+
+    The reflection data of registered blocks (the Ih_table and the asu miller
+    indices) is kept in memory for the most recently used blocks only. When the
+    total size of the resident blocks exceeds the budget, the least recently
+    used blocks are written to files in a temporary directory and released.
+    They are paged back in the next time the block data is accessed, with the
+    Ih_table columns memory mapped copy-on-write, so that only modified pages
+    are copied into memory. The sparse matrices and derivatives are always
+    kept in memory.
+    """
+
+    def __init__(self, memory_budget: int, directory: str | None = None):
+        """Set the memory budget (in bytes) and the directory for the block files."""
+        if memory_budget <= 0:
+            raise ValueError("The Ih table memory budget must be greater than zero")
+        self.memory_budget = memory_budget
+        self._directory = tempfile.mkdtemp(prefix="dials_Ih_table_", dir=directory)
+        self._finalizer = weakref.finalize(
+            self, shutil.rmtree, self._directory, ignore_errors=True
+        )
+        self._keys = itertools.count()
+        self._resident = OrderedDict()  # page key : block
+        self._nbytes = {}  # page key : size of a resident block when last used
+        self._resident_bytes = 0
+        self._paged_out = {}  # page key : paths of the paged-out data, by name
+        self._files = {}  # page key : paths of the files last written
+        self.n_page_ins = 0
+        self.n_page_outs = 0
+
+    @property
+    def resident_bytes(self) -> int:
+        """
+        The memory used by the data of the blocks currently in memory.
+
+        The size of each block is measured when it is used, so that changes to
+        the data of a block are included the next time it is used.
+        """
+        return self._resident_bytes
+
+    def register(self, block: IhTableBlock) -> None:
+        """Place a block under the control of the pager."""
+        block._pager = self
+        block._page_key = next(self._keys)
+        self.touch(block)
+
+    def unregister(self, block: IhTableBlock) -> None:
+        """Release a block from the pager, paging it back in if necessary."""
+        key = block._page_key
+        if key in self._resident:
+            del self._resident[key]
+            self._resident_bytes -= self._nbytes.pop(key)
+        elif key in self._paged_out:
+            self._page_in(block)
+        self._remove_files(key)
+        block._pager = None
+        block._page_key = None
+
+    def touch(self, block: IhTableBlock) -> None:
+        """Mark a block as most recently used, paging it in if necessary."""
+        key = block._page_key
+        if key in self._resident:
+            self._resident.move_to_end(key)
+        else:
+            if key in self._paged_out:
+                self._page_in(block)
+            self._resident[key] = block
+        nbytes = _block_nbytes(block)
+        self._resident_bytes += nbytes - self._nbytes.get(key, 0)
+        self._nbytes[key] = nbytes
+        self._evict()
+
+    def cleanup(self) -> None:
+        """Remove the block files from disk."""
+        self._finalizer()
+
+    def _evict(self) -> None:
+        """Page out least recently used blocks, always keeping the latest one."""
+        while len(self._resident) > 1 and self._resident_bytes > self.memory_budget:
+            key, block = self._resident.popitem(last=False)
+            self._resident_bytes -= self._nbytes.pop(key)
+            self._page_out(block)
+
+    def _remove_files(self, key: int) -> None:
+        for path in self._files.pop(key, []):
+            # A file that is still memory mapped cannot be removed on some
+            # platforms, in which case it is removed with the directory.
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
+    def _page_out(self, block: IhTableBlock) -> None:
+        key = block._page_key
+        # Write new files each time, as the files from the last page in may still
+        # be mapped by the data being written.
+        prefix = os.path.join(self._directory, f"{key}_{self.n_page_outs}_")
+        columns = list(block._Ih_table.columns)
+        paths = {name: f"{prefix}{name}.npy" for name in columns + ["hkl"]}
+        for column in columns:
+            np.save(paths[column], block._Ih_table[column].to_numpy())
+        np.save(paths["hkl"], flumpy.to_numpy(block._hkl))
+        block._Ih_table = None
+        block._hkl = None
+        self._remove_files(key)
+        self._files[key] = list(paths.values())
+        self._paged_out[key] = paths
+        self.n_page_outs += 1
+
+    def _page_in(self, block: IhTableBlock) -> None:
+        paths = dict(self._paged_out.pop(block._page_key))
+        hkl = np.load(paths.pop("hkl"))
+        block._Ih_table = pd.DataFrame(
+            {name: np.load(path, mmap_mode="c") for name, path in paths.items()},
+            copy=False,
+        )
+        block._hkl = flumpy.miller_index_from_numpy(hkl)
+        self.n_page_ins += 1
+
+
+def _block_nbytes(block: IhTableBlock) -> int:
+    """Estimate the memory used by the reflection data of a block."""
+    return int(block._Ih_table.memory_usage(index=False).sum()) + 12 * len(block._hkl)
+
+
 class IhTable:
     """
     A class to manage access to Ih_table blocks.
@@ -69,6 +224,7 @@ class IhTable:
         asu_index_dict (dict): A dictionary, key: asu_miller_index, value tuple
             containing group_id and block_id (where group id is the group index
             within its block).
+        pager: An IhTableBlockPager if a memory budget was set, else None.
     """
 
     id_ = "IhTable"
@@ -83,6 +239,7 @@ def __init__(
         free_set_offset: int = 0,
         additional_cols: list[str] | None = None,
         anomalous: bool = False,
+        memory_budget: int | None = None,
     ):
         """
         Distribute the input data into the required structure.
@@ -98,6 +255,10 @@ def __init__(
             indices_list = selection.iselection() = flex.size_t([0, 2])
             then the block selection will contain 0 and 2 to refer back
             to the location of the data in r_master.
+
+        If a memory_budget (in bytes) is given, each block is placed under the
+        control of a pager as soon as its setup is complete, so that only the
+        most recently used blocks are held in memory at any time.
         """
         if indices_lists:
             assert len(indices_lists) == len(reflection_tables)
@@ -115,6 +276,9 @@ def __init__(
             "miller_index_boundaries": [],
         }
         self.free_set_percentage = free_set_percentage
+        self.pager = None
+        if memory_budget is not None:
+            self.pager = IhTableBlockPager(memory_budget)
         self._determine_required_block_structures(
             reflection_tables, free_set_percentage, free_set_offset
         )
@@ -227,13 +391,11 @@ def _determine_required_block_structures(
                     table["miller_index"], self.space_group, self.anomalous
                 )
             joint_asu_indices.extend(table["asu_miller_index"])
-        sorted_joint_asu_indices, _ = get_sorted_asu_indices(
-            joint_asu_indices, self.space_group, self.anomalous
-        )
-        if not sorted_joint_asu_indices:
+        unique_asu_indices, n_before_group = _group_asu_indices(joint_asu_indices)
+        if not n_before_group[-1]:
             raise ValueError("No data found in input file(s)")
 
-        asu_index_set = OrderedSet(sorted_joint_asu_indices)
+        asu_index_set = [tuple(index) for index in unique_asu_indices.tolist()]
         n_unique_groups = len(asu_index_set)
         n_free_groups = None
         interval_between_free_groups = None
@@ -294,23 +456,13 @@ def _determine_required_block_structures(
         self.properties_dict["n_unique_in_each_block"].append(group_id_in_block_i)
         self.properties_dict["miller_index_boundaries"].append((10000, 10000, 10000))
         # ^ to avoid bounds checking when in last group
-        # need to know how many reflections will be in each block also
-
-        block_id = 0
-        idx_prev = 0
-        boundary = self.properties_dict["miller_index_boundaries"][0]
-        for i, index in enumerate(sorted_joint_asu_indices):
-            if index == boundary:
-                n_in_prev_group = i - idx_prev
-                self.properties_dict["n_reflections_in_each_block"][block_id] = (
-                    n_in_prev_group
-                )
-                block_id += 1
-                boundary = self.properties_dict["miller_index_boundaries"][block_id]
-                idx_prev = i
-        self.properties_dict["n_reflections_in_each_block"][block_id] = (
-            len(sorted_joint_asu_indices) - idx_prev
-        )
+        # need to know how many reflections will be in each block also, which
+        # is the number in the groups between the block boundaries
+        for block_id in range(self.n_work_blocks):
+            self.properties_dict["n_reflections_in_each_block"][block_id] = int(
+                n_before_group[group_boundaries[block_id + 1]]
+                - n_before_group[group_boundaries[block_id]]
+            )
 
     def _create_empty_Ih_table_blocks(self) -> None:
         for n in range(self.n_work_blocks):
@@ -379,6 +531,7 @@ def _add_dataset_to_blocks(
         # so now have group ids as well for individual dataset
         if self.n_work_blocks == 1:
             self.Ih_table_blocks[0].add_data(dataset_id, group_ids, df, hkl)
+            self._register_if_complete(self.Ih_table_blocks[0])
         else:
             for i, val in enumerate(boundaries_for_this_datset[:-1]):
                 start = val
@@ -386,6 +539,12 @@ def _add_dataset_to_blocks(
                 self.Ih_table_blocks[i].add_data(
                     dataset_id, group_ids[start:end], df[start:end], hkl[start:end]
                 )
+                self._register_if_complete(self.Ih_table_blocks[i])
+
+    def _register_if_complete(self, block: IhTableBlock) -> None:
+        """Page the data of a block once it is complete, if using a pager."""
+        if self.pager and block._setup_info["setup_complete"]:
+            self.pager.register(block)
 
     def extract_free_set(self) -> None:
         """Extract a free set from all blocks."""
@@ -412,6 +571,9 @@ def extract_free_set(self) -> None:
             for sel in free_block.block_selections:
                 free_indices = np.concatenate([free_indices, sel])
             self.Ih_table_blocks[j] = block.select_on_groups(~groups_for_free_set)
+            if self.pager:
+                self.pager.unregister(block)
+                self.pager.register(self.Ih_table_blocks[j])
             # Now need to update dataset_info dict.
             removed_from_each_dataset = [
                 np.count_nonzero(free_block.Ih_table["dataset_id"].to_numpy() == i)
@@ -450,6 +612,7 @@ def extract_free_set(self) -> None:
 
         self.Ih_table_blocks.append(free_block)
         self.blocked_selection_list.append(free_block.block_selections)
+        self._register_if_complete(free_block)
 
     def as_miller_array(
         self, unit_cell: uctbx.unit_cell, return_free_set_data: bool = False
@@ -514,7 +677,9 @@ class IhTableBlock:
 
     def __init__(self, n_groups: int, n_refl: int, n_datasets: int = 1):
         """Create empty datastructures to which data can later be added."""
-        self.Ih_table = pd.DataFrame()
+        self._pager = None
+        self._page_key = None
+        self._Ih_table = pd.DataFrame()
         self.block_selections = [None] * n_datasets
         self.h_index_matrix = sparse.matrix(n_refl, n_groups)
         self._setup_info = {"next_row": 0, "next_dataset": 0, "setup_complete": False}
@@ -525,6 +690,9 @@ def __init__(self, n_groups: int, n_refl: int, n_datasets: int = 1):
         self.binner = None
         self._csc_rows = np.array([], dtype=np.uint64).reshape((0,))
         self._csc_cols = np.array([], dtype=np.uint64).reshape((0,))
+        # Data are collected per dataset and joined once setup is complete,
+        # to avoid repeated copying when adding many datasets.
+        self._pending_data = {"rows": [], "cols": [], "reflections": []}
         self._csc_h_index_matrix = None
         self._csc_h_expand_matrix = None
         self._hkl = flex.miller_index([])
@@ -563,15 +731,15 @@ def add_data(
             dtype=np.uint64,
         )
 
-        self._csc_cols = np.concatenate([self._csc_cols, cols])
-        self._csc_rows = np.concatenate([self._csc_rows, rows])
+        self._pending_data["cols"].append(cols)
+        self._pending_data["rows"].append(rows)
+        self._pending_data["reflections"].append(reflections)
         self._hkl.extend(hkl)
 
         self.dataset_info[dataset_id] = {"start_index": self._setup_info["next_row"]}
         self._setup_info["next_row"] += len(group_ids)
         self._setup_info["next_dataset"] += 1
         self.dataset_info[dataset_id]["end_index"] = self._setup_info["next_row"]
-        self.Ih_table = pd.concat([self.Ih_table, reflections], ignore_index=True)
         if "loc_indices" in reflections:
             self.block_selections[dataset_id] = reflections["loc_indices"].to_numpy()
         else:
@@ -583,6 +751,12 @@ def add_data(
 
     def _complete_setup(self) -> None:
         """Finish the setup of the Ih_table once all data has been added."""
+        self._csc_cols = np.concatenate([self._csc_cols] + self._pending_data["cols"])
+        self._csc_rows = np.concatenate([self._csc_rows] + self._pending_data["rows"])
+        self.Ih_table = pd.concat(
+            [self.Ih_table] + self._pending_data["reflections"], ignore_index=True
+        )
+        self._pending_data = {"rows": [], "cols": [], "reflections": []}
         self.h_index_matrix.compact()
         assert self._setup_info["next_row"] == self.h_index_matrix.n_rows, """
 Not all rows of h_index_matrix appear to be filled in IhTableBlock setup."""
@@ -614,7 +788,7 @@ def select(self, sel: np.array) -> IhTableBlock:
         csc_h_expand_matrix = csc_h_index_matrix.transpose()
         newtable = IhTableBlock(n_groups=0, n_refl=0, n_datasets=self.n_datasets)
         newtable.Ih_table = Ih_table
-        newtable._hkl = self._hkl.select(flumpy.from_numpy(sel))
+        newtable._hkl = self.asu_miller_index.select(flumpy.from_numpy(sel))
         newtable.h_expand_matrix = h_expand
         newtable.h_index_matrix = h_index_matrix
         newtable._csc_h_index_matrix = csc_h_index_matrix
@@ -714,6 +888,23 @@ def match_Ih_values_to_target(self, target_Ih_table: IhTable) -> None:
         self._csc_h_expand_matrix = new_table._csc_h_expand_matrix
         self._csc_h_index_matrix = new_table._csc_h_index_matrix
 
+    @property
+    def Ih_table(self) -> pd.DataFrame:
+        """The reflection data, paged in from disk if necessary."""
+        if self._pager:
+            self._pager.touch(self)
+        return self._Ih_table
+
+    @Ih_table.setter
+    def Ih_table(self, table: pd.DataFrame) -> None:
+        if self._pager:
+            # Page in first, so that the asu indices are restored with the table.
+            self._pager.touch(self)
+            self._Ih_table = table
+            self._pager.touch(self)
+        else:
+            self._Ih_table = table
+
     @property
     def inverse_scale_factors(self) -> np.array:
         """The inverse scale factors of the reflections."""
@@ -777,6 +968,8 @@ def n_groups(self) -> int:
     @property
     def asu_miller_index(self) -> flex.miller_index:
         """Return the miller indices in the asymmetric unit."""
+        if self._pager:
+            self._pager.touch(self)
         return self._hkl
 
     def setup_binner(
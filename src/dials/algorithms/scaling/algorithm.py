@@ -103,6 +103,12 @@ def prepare_input(params, experiments, reflections):
             "Mismatched number of experiments and reflection tables found."
         )
 
+    if (
+        params.scaling_options.Ih_table_memory_budget is not None
+        and params.scaling_options.Ih_table_memory_budget <= 0
+    ):
+        raise ValueError("Ih_table_memory_budget must be greater than zero")
+
     #### Sort out deprecated options
     if params.scaling_options.target_model or params.scaling_options.target_mtz:
         if params.scaling_options.reference:
@@ -419,6 +425,7 @@ def run(self):
                     self.params.filtering.deltacchalf.group_size
                 )
                 delta_cc_params.stdcutoff = self.params.filtering.deltacchalf.stdcutoff
+                delta_cc_params.nproc = self.params.scaling_options.nproc
                 logger.info("\nPerforming a round of filtering.\n")
 
                 # need to reduce to single table.
@@ -8,12 +8,12 @@
 import itertools
 from copy import deepcopy
 
-import pkg_resources
-
 from libtbx import phil
 from libtbx.table_utils import simple_table
 from scitbx.array_family import flex
 
+from dials.util.entry_points import entry_points
+
 
 class CrossValidator:
     """Abstract class defining common methods for cross validation and methods
@@ -171,10 +171,7 @@ def set_parameter(self, params, name, val):
             params.model = val
             return params
         available_models = [
-            entry_point.name
-            for entry_point in pkg_resources.iter_entry_points(
-                "dxtbx.scaling_model_ext"
-            )
+            entry_point.name for entry_point in entry_points("dxtbx.scaling_model_ext")
         ]
         phil_branches = [
             params.weighting.error_model,
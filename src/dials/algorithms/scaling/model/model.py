@@ -10,8 +10,6 @@
 import logging
 import math
 
-import pkg_resources
-
 from libtbx import Auto, phil
 
 from dials.algorithms.scaling.error_model.error_model import BasicErrorModel
@@ -43,6 +41,7 @@
 )
 from dials.algorithms.scaling.scaling_utilities import sph_harm_table
 from dials.array_family import flex
+from dials.util.entry_points import entry_points
 from dials_scaling_ext import (
     calc_lookup_index,
     calc_theta_phi,
@@ -1509,29 +1508,42 @@ def calc_n_param_from_bins(value_min, value_max, n_bins):
     return n_param, bin_width
 
 
-model_phil_scope = phil.parse("")
-_dxtbx_scaling_models = {
-    ep.name: ep for ep in pkg_resources.iter_entry_points("dxtbx.scaling_model_ext")
-}
-assert (
-    _dxtbx_scaling_models
-), "No models registered with dxtbx.scaling_model_ext entry point"
-model_phil_scope.adopt_scope(
-    phil.parse(
-        "model ="
-        + " ".join(_dxtbx_scaling_models)
-        + "\n    .type = choice"
-        + "\n    .help = Set scaling model to be applied to input datasets"
-        + "\n    .expert_level = 0"
+def _generate_model_phil_scope():
+    """Generate the phil scope for the choice of scaling model and its options."""
+    dxtbx_scaling_models = {
+        ep.name: ep for ep in entry_points("dxtbx.scaling_model_ext")
+    }
+    assert (
+        dxtbx_scaling_models
+    ), "No models registered with dxtbx.scaling_model_ext entry point"
+    model_phil_scope = phil.parse("")
+    model_phil_scope.adopt_scope(
+        phil.parse(
+            "model ="
+            + " ".join(dxtbx_scaling_models)
+            + "\n    .type = choice"
+            + "\n    .help = Set scaling model to be applied to input datasets"
+            + "\n    .expert_level = 0"
+        )
     )
-)
-for entry_point_name, entry_point in _dxtbx_scaling_models.items():
-    ext_master_scope = phil.parse("%s .expert_level=1 {}" % entry_point_name)
-    ext_phil_scope = ext_master_scope.get_without_substitution(entry_point_name)
-    assert len(ext_phil_scope) == 1
-    ext_phil_scope = ext_phil_scope[0]
-    ext_phil_scope.adopt_scope(entry_point.load().phil_scope)
-    model_phil_scope.adopt_scope(ext_master_scope)
+    for entry_point_name, entry_point in dxtbx_scaling_models.items():
+        ext_master_scope = phil.parse("%s .expert_level=1 {}" % entry_point_name)
+        ext_phil_scope = ext_master_scope.get_without_substitution(entry_point_name)
+        assert len(ext_phil_scope) == 1
+        ext_phil_scope = ext_phil_scope[0]
+        ext_phil_scope.adopt_scope(entry_point.load().phil_scope)
+        model_phil_scope.adopt_scope(ext_master_scope)
+    return model_phil_scope
+
+
+def __getattr__(name):
+    # The model phil scope is only built on first use, as this requires loading
+    # all of the registered scaling model extensions.
+    if name == "model_phil_scope":
+        global model_phil_scope
+        model_phil_scope = _generate_model_phil_scope()
+        return model_phil_scope
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def plot_scaling_models(model, reflection_table=None):
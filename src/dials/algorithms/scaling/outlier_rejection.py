@@ -12,15 +12,17 @@
 
 import copy
 import logging
+from math import ceil
 
 import numpy as np
+import pandas as pd
 
 from dxtbx import flumpy
 from scitbx.array_family import flex
 
 from dials.algorithms.scaling.Ih_table import IhTable
 from dials.util.normalisation import quasi_normalisation
-from dials_scaling_ext import determine_outlier_indices, limit_outlier_weights
+from dials_scaling_ext import limit_outlier_weights
 
 logger = logging.getLogger("dials")
 
@@ -111,7 +113,9 @@ def determine_Esq_outlier_index_arrays(Ih_table, experiment, emax=10.0):
     return final_outlier_arrays
 
 
-def determine_outlier_index_arrays(Ih_table, method="standard", zmax=6.0, target=None):
+def determine_outlier_index_arrays(
+    Ih_table, method="standard", zmax=6.0, target=None, memory_budget=None
+):
     """
     Run an outlier algorithm and return the outlier indices.
 
@@ -123,6 +127,9 @@ def determine_outlier_index_arrays(Ih_table, method="standard", zmax=6.0, target
         zmax (float): Normalised deviation threshold for classifying an outlier.
         target (Optional[IhTable]): An IhTable to use to obtain target Ih for
             outlier rejectiob, if method=target.
+        memory_budget (Optional[int]): If set, split the Ih table blocks into
+            chunks of groups small enough that the chunk being processed fits
+            within this number of bytes.
 
     Returns:
         outlier_index_arrays (list): A list of flex.size_t arrays, with one
@@ -136,12 +143,12 @@ def determine_outlier_index_arrays(Ih_table, method="standard", zmax=6.0, target
     """
     outlier_rej = None
     if method == "standard":
-        outlier_rej = NormDevOutlierRejection(Ih_table, zmax)
+        outlier_rej = NormDevOutlierRejection(Ih_table, zmax, memory_budget)
     elif method == "simple":
-        outlier_rej = SimpleNormDevOutlierRejection(Ih_table, zmax)
+        outlier_rej = SimpleNormDevOutlierRejection(Ih_table, zmax, memory_budget)
     elif method == "target":
         assert target is not None
-        outlier_rej = TargetedOutlierRejection(Ih_table, zmax, target)
+        outlier_rej = TargetedOutlierRejection(Ih_table, zmax, target, memory_budget)
     elif method is not None:
         raise ValueError(f"Invalid choice of outlier rejection method: {method}")
     if not outlier_rej:
@@ -160,14 +167,73 @@ def determine_outlier_index_arrays(Ih_table, method="standard", zmax=6.0, target
     return outlier_index_arrays
 
 
+def _split_block_on_groups(block, n_chunks):
+    """
+    Split an IhTableBlock into (at most) n_chunks blocks of whole groups.
+
+    The chunks are generated one at a time, so that only the chunks currently
+    in use are held in memory.
+    """
+    n_groups = block.n_groups
+    n_chunks = min(n_chunks, n_groups)
+    if n_chunks < 2:
+        yield block
+        return
+    boundaries = np.linspace(0, n_groups, n_chunks + 1).astype(int)
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        sel = np.full(n_groups, False)
+        sel[start:end] = True
+        yield block.select_on_groups(sel)
+
+
+def _outlier_data(block, sel):
+    """Get the loc_indices and dataset ids of the selected reflections of a block."""
+    return (
+        block.Ih_table["loc_indices"].to_numpy()[sel],
+        block.Ih_table["dataset_id"].to_numpy()[sel],
+    )
+
+
+def _group_outlier_indices(block, z_scores, zmax):
+    """
+    Find the reflection with the largest z-score above zmax in each group.
+
+    Only groups with more than two reflections are considered. This is a
+    vectorised equivalent of dials_scaling_ext.determine_outlier_indices.
+
+    Returns:
+        A tuple of the indices of the outliers and the indices of the other
+        reflections in the groups that contain an outlier.
+    """
+    h_index_matrix = block._csc_h_index_matrix
+    rows = h_index_matrix.indices
+    groups = np.repeat(
+        np.arange(h_index_matrix.shape[1]), np.diff(h_index_matrix.indptr)
+    )
+    # Sort by group, then descending z-score, taking the first index for ties.
+    order = np.lexsort((rows, -z_scores[rows], groups))
+    rows = rows[order]
+    groups = groups[order]
+    first = np.flatnonzero(np.diff(groups, prepend=-1))
+    n_in_group = np.diff(first, append=groups.size)
+    candidates = rows[first]
+    is_outlier = (n_in_group > 2) & (z_scores[candidates] > zmax)
+    in_outlier_group = np.repeat(is_outlier, n_in_group)
+    in_outlier_group[first] = False
+    return candidates[is_outlier], rows[in_outlier_group]
+
+
 class OutlierRejectionBase:
     """
     Base class for outlier rejection algorithms using an IhTable datastructure.
 
-    Subclasses must implement the _do_outlier_rejection method, which must
-    add the indices of outliers to the _outlier_indices attribute. The algorithms
-    are run upon initialisation and result in the population of the
-    :obj:`final_outlier_arrays`.
+    Symmetry groups never span Ih table blocks, so the algorithm is run on each
+    work block independently, with blocks split further into chunks of groups to
+    keep the chunk being processed within the memory budget, if one is given.
+    Subclasses must implement the
+    _do_outlier_rejection method, which must return the loc_indices and dataset
+    ids of the outliers in a block. Running the algorithm results in the
+    population of the :obj:`final_outlier_arrays`.
 
     Attributes:
         final_outlier_arrays (:obj:`list`): A list of flex.size_t arrays of outlier
@@ -175,33 +241,40 @@ class OutlierRejectionBase:
             create the Ih_table.
     """
 
-    def __init__(self, Ih_table, zmax):
-        """Set up and run the outlier rejection algorithm."""
-        assert Ih_table.n_work_blocks == 1, """
-Outlier rejection algorithms require an Ih_table with nblocks = 1"""
-        # Note: could be possible to code for nblocks > 1
-        self._Ih_table_block = Ih_table.blocked_data_list[0]
+    def __init__(self, Ih_table, zmax, memory_budget=None):
+        """Set up the outlier rejection algorithm."""
+        if Ih_table.free_Ih_table:
+            self._Ih_table_blocks = Ih_table.blocked_data_list[:-1]
+        else:
+            self._Ih_table_blocks = Ih_table.blocked_data_list
         self._n_datasets = Ih_table.n_datasets
-        self._block_selections = Ih_table.blocked_selection_list[0]
-        self._datasets = np.array([], dtype=np.uint64).reshape((0,))  # flex.int([])
         self._zmax = zmax
-        self._outlier_indices = np.array([], dtype=np.uint64).reshape(
-            (0,)
-        )  # flex.size_t([])
+        self._memory_budget = memory_budget
         self.final_outlier_arrays = None
 
+    def _n_chunks(self, block):
+        """The number of chunks of groups to split a block into."""
+        if not self._memory_budget:
+            return 1
+        nbytes = int(block.Ih_table.memory_usage(index=False).sum())
+        return ceil(nbytes / self._memory_budget)
+
     def run(self):
         """Run the outlier rejection algorithm, implemented by a subclass."""
-        self._do_outlier_rejection()
-        self.final_outlier_arrays = self._determine_outlier_indices()
+        results = [
+            self._do_outlier_rejection(chunk)
+            for block in self._Ih_table_blocks
+            for chunk in _split_block_on_groups(block, self._n_chunks(block))
+        ]
+        outlier_indices = np.concatenate([r[0] for r in results])
+        datasets = np.concatenate([r[1] for r in results])
+        self.final_outlier_arrays = self._determine_outlier_indices(
+            outlier_indices, datasets
+        )
 
-    def _determine_outlier_indices(self):
+    def _determine_outlier_indices(self, outlier_indices, datasets):
         """
-        Determine outlier indices with respect to the input reflection tables.
-
-        Transform the outlier indices w.r.t the Ih_table, determined during the
-        algorithm, to outlier indices w.r.t the initial reflection tables used
-        to create the Ih_table, separated by reflection table.
+        Separate the outlier indices by the dataset of the input reflection tables.
 
         Returns:
             final_outlier_arrays (:obj:`list`): A list of flex.size_t arrays of
@@ -209,14 +282,13 @@ def _determine_outlier_indices(self):
                 reflection tables used to create the Ih_table.
         """
         if self._n_datasets == 1:
-            return [self._outlier_indices]
-        final_outlier_arrays = []
-        for i in range(self._n_datasets):
-            final_outlier_arrays.append(self._outlier_indices[self._datasets == i])
-        return final_outlier_arrays
-
-    def _do_outlier_rejection(self):
-        """Add indices (w.r.t. the Ih_table data) to self._outlier_indices."""
+            return [outlier_indices]
+        order = np.argsort(datasets, kind="stable")
+        boundaries = np.searchsorted(datasets[order], np.arange(1, self._n_datasets))
+        return np.split(outlier_indices[order], boundaries)
+
+    def _do_outlier_rejection(self, block):
+        """Return the loc_indices and dataset ids of the outliers in a block."""
         raise NotImplementedError()
 
 
@@ -228,62 +300,42 @@ class TargetedOutlierRejection(OutlierRejectionBase):
     calculated from the intensity values in the target table.
     """
 
-    def __init__(self, Ih_table, zmax, target):
-        """Set a target Ih_table and run the outlier rejection."""
+    def __init__(self, Ih_table, zmax, target, memory_budget=None):
+        """Set a target Ih_table and set up the outlier rejection."""
         assert target.n_work_blocks == 1, """
 Targeted outlier rejection requires a target Ih_table with nblocks = 1"""
-        self._target_Ih_table_block = target.blocked_data_list[0]
-        self._target_Ih_table_block.calc_Ih()
-        super().__init__(Ih_table, zmax)
-
-    def _do_outlier_rejection(self):
-        """Add indices (w.r.t. the Ih_table data) to self._outlier_indices."""
-        Ih_table = self._Ih_table_block
-        target = self._target_Ih_table_block
-        target_asu_Ih_dict = dict(
-            zip(target.asu_miller_index, zip(target.Ih_values, target.variances))
+        target_block = target.blocked_data_list[0]
+        target_block.calc_Ih()
+        target_hkl = pd.MultiIndex.from_arrays(
+            flumpy.to_numpy(target_block.asu_miller_index).T
+        )
+        unique = ~target_hkl.duplicated(keep="last")
+        self._target_asu_index = target_hkl[unique]
+        self._target_Ih_values = target_block.Ih_values[unique]
+        self._target_variances = target_block.variances[unique]
+        super().__init__(Ih_table, zmax, memory_budget)
+
+    def _do_outlier_rejection(self, block):
+        """Return the loc_indices and dataset ids of the outliers in a block."""
+        positions = self._target_asu_index.get_indexer(
+            pd.MultiIndex.from_arrays(flumpy.to_numpy(block.asu_miller_index).T)
         )
-        target_Ih_value = np.zeros(Ih_table.size)
-        target_Ih_sigmasq = np.zeros(Ih_table.size)
-        for j, miller_idx in enumerate(Ih_table.asu_miller_index):
-            try:
-                vals = target_asu_Ih_dict[miller_idx]
-            except KeyError:
-                pass
-            else:
-                target_Ih_value[j] = vals[0]
-                target_Ih_sigmasq[j] = vals[1]
+        found = positions >= 0
+        target_Ih_value = np.zeros(block.size)
+        target_Ih_sigmasq = np.zeros(block.size)
+        target_Ih_value[found] = self._target_Ih_values[positions[found]]
+        target_Ih_sigmasq[found] = self._target_variances[positions[found]]
 
         nz_sel = target_Ih_value != 0.0
         target_Ih_value = target_Ih_value[nz_sel]
         target_Ih_sigmasq = target_Ih_sigmasq[nz_sel]
-        Ih_table = Ih_table.select(nz_sel)
-        norm_dev = (
-            Ih_table.intensities - (Ih_table.inverse_scale_factors * target_Ih_value)
-        ) / (
-            np.sqrt(
-                Ih_table.variances
-                + (np.square(Ih_table.inverse_scale_factors) * target_Ih_sigmasq)
-            )
-        )
-        outliers_sel = np.abs(norm_dev) > self._zmax
-        outliers_isel = np.nonzero(nz_sel)[0][outliers_sel]
-
-        outliers = np.full(self._Ih_table_block.size, False)
-        outliers[outliers_isel] = True
-
-        self._outlier_indices = np.concatenate(
-            [
-                self._outlier_indices,
-                self._Ih_table_block.Ih_table["loc_indices"].iloc[outliers],
-            ]
-        )
-        self._datasets = np.concatenate(
-            [
-                self._datasets,
-                self._Ih_table_block.Ih_table["dataset_id"].iloc[outliers],
-            ]
+        g = block.inverse_scale_factors[nz_sel]
+        norm_dev = (block.intensities[nz_sel] - (g * target_Ih_value)) / (
+            np.sqrt(block.variances[nz_sel] + (np.square(g) * target_Ih_sigmasq))
         )
+        outliers = np.full(block.size, False)
+        outliers[np.nonzero(nz_sel)[0][np.abs(norm_dev) > self._zmax]] = True
+        return _outlier_data(block, outliers)
 
 
 class SimpleNormDevOutlierRejection(OutlierRejectionBase):
@@ -293,23 +345,15 @@ class SimpleNormDevOutlierRejection(OutlierRejectionBase):
     the symmetry group excluding the test reflection.
     """
 
-    def __init__(self, Ih_table, zmax):
-        super().__init__(Ih_table, zmax)
-        self.weights = flumpy.to_numpy(
-            limit_outlier_weights(
-                copy.deepcopy(self._Ih_table_block.weights),
-                self._Ih_table_block.h_index_matrix,
-            )
+    def _do_outlier_rejection(self, block):
+        """Return the loc_indices and dataset ids of the outliers in a block."""
+        intensity = block.intensities
+        g = block.inverse_scale_factors
+        w = flumpy.to_numpy(
+            limit_outlier_weights(copy.deepcopy(block.weights), block.h_index_matrix)
         )
-
-    def _do_outlier_rejection(self):
-        """Add indices (w.r.t. the Ih_table data) to self._outlier_indices."""
-        Ih_table = self._Ih_table_block
-        intensity = Ih_table.intensities
-        g = Ih_table.inverse_scale_factors
-        w = self.weights
-        wgIsum = Ih_table.sum_in_groups(w * g * intensity, output="per_refl")
-        wg2sum = Ih_table.sum_in_groups(w * g * g, output="per_refl")
+        wgIsum = block.sum_in_groups(w * g * intensity, output="per_refl")
+        wg2sum = block.sum_in_groups(w * g * g, output="per_refl")
 
         # guard against zero division errors - can happen due to rounding errors
         # or bad data giving g values are very small
@@ -323,20 +367,7 @@ def _do_outlier_rejection(self):
             np.sqrt((1.0 / w) + np.square(g / wg2sum))
         )
         norm_dev[zero_sel] = 1000  # to trigger rejection
-        outliers = np.abs(norm_dev) > self._zmax
-
-        self._outlier_indices = np.concatenate(
-            [
-                self._outlier_indices,
-                self._Ih_table_block.Ih_table["loc_indices"].iloc[outliers].to_numpy(),
-            ]
-        )
-        self._datasets = np.concatenate(
-            [
-                self._datasets,
-                self._Ih_table_block.Ih_table["dataset_id"].iloc[outliers].to_numpy(),
-            ]
-        )
+        return _outlier_data(block, np.abs(norm_dev) > self._zmax)
 
 
 class NormDevOutlierRejection(OutlierRejectionBase):
@@ -346,39 +377,50 @@ class NormDevOutlierRejection(OutlierRejectionBase):
     the symmetry group excluding the test reflection.
     """
 
-    def __init__(self, Ih_table, zmax):
-        super().__init__(Ih_table, zmax)
-        self.weights = flumpy.to_numpy(
-            limit_outlier_weights(
-                copy.deepcopy(self._Ih_table_block.weights),
-                self._Ih_table_block.h_index_matrix,
-            )
-        )
+    def _do_outlier_rejection(self, block):
+        """
+        Return the loc_indices and dataset ids of the outliers in a block.
 
-    def _do_outlier_rejection(self):
-        """Add indices (w.r.t. the Ih_table data) to self._outlier_indices."""
-        self._round_of_outlier_rejection()
-        n_outliers = self._outlier_indices.size
-        n_new_outliers = n_outliers
-        while n_new_outliers:
-            self._round_of_outlier_rejection()
-            n_new_outliers = self._outlier_indices.size - n_outliers
-            n_outliers = self._outlier_indices.size
-
-    def _round_of_outlier_rejection(self):
+        Rounds of outlier rejection are repeated on the groups which contained
+        an outlier in the previous round, until no new outliers are found.
+        """
+        weights = flumpy.to_numpy(
+            limit_outlier_weights(copy.deepcopy(block.weights), block.h_index_matrix)
+        )
+        outlier_indices = []
+        datasets = []
+        while block.size:
+            outliers, others = self._round_of_outlier_rejection(block, weights)
+            if not outliers.size:
+                break
+            loc_indices, dataset_ids = _outlier_data(block, outliers)
+            outlier_indices.append(loc_indices)
+            datasets.append(dataset_ids)
+            sel = np.full(block.size, False, dtype=bool)
+            sel[others] = True
+            block = block.select(sel)
+            weights = weights[sel]
+        if not outlier_indices:
+            return _outlier_data(block, np.full(block.size, False))
+        return np.concatenate(outlier_indices), np.concatenate(datasets)
+
+    def _round_of_outlier_rejection(self, block, weights):
         """
-        Calculate normal deviations from the data in the Ih_table.
+        Calculate normal deviations from the data in an Ih table block.
+
+        Returns:
+            A tuple of the indices of the outliers in the block and of the other
+            reflections in the groups containing an outlier.
         """
-        Ih_table = self._Ih_table_block
-        intensity = Ih_table.intensities
-        g = Ih_table.inverse_scale_factors
-        w = self.weights
-        wgIsum = Ih_table.sum_in_groups(w * g * intensity, output="per_refl")
-        wg2sum = Ih_table.sum_in_groups(w * g * g, output="per_refl")
+        intensity = block.intensities
+        g = block.inverse_scale_factors
+        w = weights
+        wgIsum = block.sum_in_groups(w * g * intensity, output="per_refl")
+        wg2sum = block.sum_in_groups(w * g * g, output="per_refl")
         wgIsum_others = wgIsum - (w * g * intensity)
         wg2sum_others = wg2sum - (w * g * g)
         # Now do the rejection analysis if n_in_group > 2
-        nh = Ih_table.calc_nh()
+        nh = block.calc_nh()
         sel = nh > 2
         wg2sum_others_sel = wg2sum_others[sel]
         wgIsum_others_sel = wgIsum_others[sel]
@@ -400,31 +442,6 @@ def _round_of_outlier_rejection(self):
         norm_dev[zero_sel] = 1000  # to trigger rejection
         z_score = np.abs(norm_dev)
         # Want an array same size as Ih table.
-        all_z_scores = np.zeros(Ih_table.size)
-        # all_z_scores.set_selected(sel.iselection(), z_score)
+        all_z_scores = np.zeros(block.size)
         all_z_scores[sel] = z_score
-        outlier_indices, other_potential_outliers = determine_outlier_indices(
-            Ih_table.h_index_matrix, flumpy.from_numpy(all_z_scores), self._zmax
-        )
-        sel = np.full(Ih_table.size, False, dtype=bool)
-        outlier_indices = flumpy.to_numpy(outlier_indices)
-        sel[outlier_indices] = True
-        lsel = self._Ih_table_block.Ih_table["loc_indices"].iloc[sel].to_numpy()
-        dsel = self._Ih_table_block.Ih_table["dataset_id"].iloc[sel].to_numpy()
-        self._outlier_indices = np.concatenate(
-            [
-                self._outlier_indices,
-                lsel,
-            ]
-        )
-        self._datasets = np.concatenate(
-            [
-                self._datasets,
-                dsel,
-            ]
-        )
-
-        sel = np.full(Ih_table.size, False, dtype=bool)
-        sel[flumpy.to_numpy(other_potential_outliers)] = True
-        self._Ih_table_block = self._Ih_table_block.select(sel)
-        self.weights = self.weights[sel]
+        return _group_outlier_indices(block, all_z_scores, self._zmax)
@@ -53,6 +53,7 @@
     BadDatasetForScalingException,
     DialsMergingStatisticsError,
     log_memory_usage,
+    log_stage_timing,
 )
 from dials.algorithms.scaling.target_function import ScalingTarget, ScalingTargetFixedIH
 from dials.array_family import flex
@@ -66,6 +67,63 @@
 flex.set_random_seed(42)
 
 
+def _split_by_dataset(values, dataset_ids, n_datasets):
+    """
+    Split an array of values into a list of arrays, one per dataset.
+
+    This uses a single stable sort on the dataset ids, rather than a full-length
+    selection for each dataset.
+    """
+    order = np.argsort(dataset_ids, kind="stable")
+    boundaries = np.searchsorted(
+        dataset_ids[order], np.arange(1, n_datasets, dtype=dataset_ids.dtype)
+    )
+    return np.split(values[order], boundaries)
+
+
+def _loc_indices_by_dataset(block, n_datasets):
+    """Get the loc_indices of the reflections in an Ih table block per dataset."""
+    return _split_by_dataset(
+        block.Ih_table["loc_indices"].to_numpy(),
+        block.Ih_table["dataset_id"].to_numpy(),
+        n_datasets,
+    )
+
+
+# Approximate memory per reflection in an Ih table block (data columns and asu index)
+IH_TABLE_BYTES_PER_REFLECTION = 80
+
+
+def _memory_budget(params):
+    """The Ih table memory budget in bytes, or None if no budget is set."""
+    budget = params.scaling_options.Ih_table_memory_budget
+    if budget is None:
+        return None
+    return int(budget * 1024**3)
+
+
+def _Ih_table_block_options(params, n_reflections):
+    """
+    Determine the number of blocks and memory budget for the minimisation Ih table.
+
+    If a memory budget is set, use enough blocks that at least two blocks fit
+    within the budget, so that blocks can be paged in and out during minimisation.
+    """
+    nblocks = params.scaling_options.nproc
+    memory_budget = _memory_budget(params)
+    if memory_budget is None:
+        return {"nblocks": nblocks}
+    budget = params.scaling_options.Ih_table_memory_budget
+    required = 2 * n_reflections * IH_TABLE_BYTES_PER_REFLECTION
+    nblocks = max(nblocks, ceil(required / memory_budget))
+    logger.info(
+        "Using %s Ih table blocks to keep within a memory budget of %.2f GB",
+        nblocks,
+        budget,
+    )
+    return {"nblocks": nblocks, "memory_budget": memory_budget}
+
+
 class ScalerBase(Subject):
     """
     Abstract base class for all scalers (single and multiple).
@@ -748,8 +806,8 @@ def _create_Ih_table(self):
             [self.get_reflections_for_model_minimisation()],
             self.experiment.crystal.get_space_group(),
             indices_lists=[self.scaling_selection.iselection()],
-            nblocks=self.params.scaling_options.nproc,
             anomalous=self.params.anomalous,
+            **_Ih_table_block_options(self.params, self.scaling_selection.count(True)),
         )
         if self._experiment.scaling_model.error_model:
             # update with the error model to add the correct weights
@@ -825,6 +883,7 @@ def round_of_outlier_rejection(self):
                 self.global_Ih_table,
                 self.params.scaling_options.outlier_rejection,
                 self.params.scaling_options.outlier_zmax,
+                memory_budget=_memory_budget(self.params),
             )[0]
             outlier_indices = flumpy.from_numpy(outlier_indices)
             self.outliers = flex.bool(self.n_suitable_refl, False)
@@ -841,6 +900,7 @@ def round_of_outlier_rejection(self):
                     self._free_Ih_table,
                     self.params.scaling_options.outlier_rejection,
                     self.params.scaling_options.outlier_zmax,
+                    memory_budget=_memory_budget(self.params),
                 )[0]
                 self.outliers.set_selected(
                     flumpy.from_numpy(free_outlier_indices), True
@@ -947,8 +1007,10 @@ def expand_scales_to_all_reflections(self, caller=None, calc_cov=False):
         """
         if calc_cov:
             logger.info("Calculating error estimates of inverse scale factors. \n")
+        with log_stage_timing("expansion of scale factors to all reflections"):
+            for scaler in self.active_scalers:
+                scaler.expand_scales_to_all_reflections(caller=self, calc_cov=calc_cov)
         for i, scaler in enumerate(self.active_scalers):
-            scaler.expand_scales_to_all_reflections(caller=self, calc_cov=calc_cov)
             # now update global Ih table
             self.global_Ih_table.update_data_in_blocks(
                 scaler.reflection_table["inverse_scale_factor"].select(
@@ -1045,15 +1107,10 @@ def _create_global_Ih_table(self, anomalous=False, remove_outliers=False):
             free_tables = []
             indices_list = []
             free_indices_list = []
-            for i, scaler in enumerate(self.active_scalers):
-                sel = (
-                    global_Ih_table.Ih_table_blocks[-1]
-                    .Ih_table["dataset_id"]
-                    .to_numpy()
-                    == i
-                )
-                indiv_Ih_block = global_Ih_table.Ih_table_blocks[-1].select(sel)
-                loc_indices = indiv_Ih_block.Ih_table["loc_indices"].to_numpy()
+            free_loc_indices = _loc_indices_by_dataset(
+                global_Ih_table.Ih_table_blocks[-1], len(self.active_scalers)
+            )
+            for scaler, loc_indices in zip(self.active_scalers, free_loc_indices):
                 scaler.free_set_selection = flex.bool(scaler.n_suitable_refl, False)
                 scaler.free_set_selection.set_selected(
                     flumpy.from_numpy(loc_indices), True
@@ -1088,8 +1145,8 @@ def _create_Ih_table(self):
             tables,
             self.active_scalers[0].experiment.crystal.get_space_group(),
             indices_lists=indices_lists,
-            nblocks=self.params.scaling_options.nproc,
             anomalous=self.params.anomalous,
+            **_Ih_table_block_options(self.params, sum(len(i) for i in indices_lists)),
         )
         for i, scaler in enumerate(self.active_scalers):
             error_model = scaler._experiment.scaling_model.error_model
@@ -1146,6 +1203,7 @@ def _round_of_outlier_rejection(self, target=None):
                 method,
                 self.params.scaling_options.outlier_zmax,
                 target=target,
+                memory_budget=_memory_budget(self.params),
             )
             for outlier_indices, scaler in zip(
                 outlier_index_arrays, self.active_scalers
@@ -1168,6 +1226,7 @@ def _round_of_outlier_rejection(self, target=None):
                     method,
                     self.params.scaling_options.outlier_zmax,
                     target=target,
+                    memory_budget=_memory_budget(self.params),
                 )
                 for outlier_indices, scaler in zip(
                     free_outlier_index_arrays,
@@ -1226,12 +1285,17 @@ def _select_reflections_for_scaling(self):
 
             n_connected_by_dataset = []
             total_qr_sel = indices.size()
-            for i, scaler in enumerate(self.active_scalers):
+            indices_by_dataset = _split_by_dataset(
+                flumpy.to_numpy(indices), flumpy.to_numpy(dataset_ids), n_datasets
+            )
+            for scaler, indices_for_dataset in zip(
+                self.active_scalers, indices_by_dataset
+            ):
                 scaler.scaling_selection = flex.bool(scaler.n_suitable_refl, False)
-                sel = dataset_ids == i
-                indices_for_dataset = indices.select(sel)
-                scaler.scaling_selection.set_selected(indices_for_dataset, True)
-                n_connected_by_dataset.append(indices_for_dataset.size())
+                scaler.scaling_selection.set_selected(
+                    flumpy.from_numpy(indices_for_dataset), True
+                )
+                n_connected_by_dataset.append(indices_for_dataset.size)
 
             min_cross_dataset = (total_target - total_qr_sel) / (2.0 * n_datasets)
 
@@ -1332,10 +1396,9 @@ def _select_reflections_for_scaling(self):
             rows = []
             total_overall = 0
 
+            loc_indices_by_dataset = _loc_indices_by_dataset(sel_block, n_datasets)
             for i, scaler in enumerate(self.active_scalers):
-                sel = sel_block.Ih_table["dataset_id"].to_numpy() == i
-                indiv_block = sel_block.select(sel)
-                loc_indices = indiv_block.Ih_table["loc_indices"].to_numpy()
+                loc_indices = loc_indices_by_dataset[i]
                 scaler.scaling_selection.set_selected(
                     flumpy.from_numpy(loc_indices), True
                 )
@@ -1440,10 +1503,11 @@ def _select_reflections_for_scaling(self):
                 n_groups_in_table,
                 sel_block.size,
             )
+            loc_indices_by_dataset = _loc_indices_by_dataset(
+                sel_block, len(self.active_scalers)
+            )
             for i, scaler in enumerate(self.active_scalers):
-                sel = sel_block.Ih_table["dataset_id"].to_numpy() == i
-                indiv_block = sel_block.select(sel)
-                loc_indices = indiv_block.Ih_table["loc_indices"].to_numpy()
+                loc_indices = loc_indices_by_dataset[i]
                 scaler.scaling_selection = flex.bool(scaler.n_suitable_refl, False)
                 scaler.scaling_selection.set_selected(
                     flumpy.from_numpy(loc_indices), True
@@ -1548,12 +1612,15 @@ def __init__(self, single_scalers):
         logger.info("Determining symmetry equivalent reflections across datasets.\n")
         self._active_scalers = self.single_scalers
         self.n_initial_active_scalers = len(self._active_scalers)
-        self._global_Ih_table, self._free_Ih_table = self._create_global_Ih_table(
-            self.params.anomalous
-        )
+        with log_stage_timing("creation of the global Ih table"):
+            self._global_Ih_table, self._free_Ih_table = self._create_global_Ih_table(
+                self.params.anomalous
+            )
         # now select reflections from across the datasets
-        self._select_reflections_for_scaling()
-        self._create_Ih_table()
+        with log_stage_timing("selection of reflections for minimisation"):
+            self._select_reflections_for_scaling()
+        with log_stage_timing("creation of the Ih table for minimisation"):
+            self._create_Ih_table()
         # now add data to scale components from datasets
         self._update_model_data()
         logger.info("Completed configuration of MultiScaler. \n\n" + "=" * 80 + "\n")
@@ -20,6 +20,7 @@
     Reasons,
     align_axis_along_z,
     calc_crystal_frame_vectors,
+    log_stage_timing,
     quasi_normalisation,
 )
 from dials.array_family import flex
@@ -56,6 +57,27 @@ def create_scaler(params, experiments, reflections):
     return scaler
 
 
+def _create_single_scalers(params, experiments, reflections):
+    """
+    Create a SingleScaler for each dataset, for use in a multi-dataset scaler.
+
+    A scaler of None is returned for each dataset that is unsuitable for
+    scaling. The datasets are prepared serially: the work is dominated by
+    flex operations that hold the GIL, and each dataset logs its own summary.
+    """
+    scalers = []
+    with log_stage_timing("preparation of individual datasets"):
+        for expt, refl in zip(experiments, reflections):
+            try:
+                scalers.append(
+                    SingleScalerFactory.create(params, expt, refl, for_multi=True)
+                )
+            except BadDatasetForScalingException as e:
+                logger.info(e)
+                scalers.append(None)
+    return scalers
+
+
 class ScalerFactory:
     """Base class for Scaler Factories"""
 
@@ -243,12 +265,10 @@ def create(params, experiments, reflections):
         """create a list of single scalers to pass to a MultiScaler."""
         single_scalers = []
         idx_to_remove = []
-        for i, (expt, refl) in enumerate(zip(experiments, reflections)):
+        scalers = _create_single_scalers(params, experiments, reflections)
+        for i, scaler in enumerate(scalers):
             # Remove bad datasets that literally have no integrated reflections
-            try:
-                scaler = SingleScalerFactory.create(params, expt, refl, for_multi=True)
-            except BadDatasetForScalingException as e:
-                logger.info(e)
+            if scaler is None:
                 idx_to_remove.append(i)
             else:
                 single_scalers.append(scaler)
@@ -283,12 +303,10 @@ def create_for_target_against_reference(params, experiments, reflections):
         unscaled_scalers = []
         idx_to_remove = []
 
-        for i, (expt, refl) in enumerate(zip(experiments[:-1], reflections[:-1])):
+        scalers = _create_single_scalers(params, experiments[:-1], reflections[:-1])
+        for i, scaler in enumerate(scalers):
             # Remove bad datasets that literally have no integrated reflections
-            try:
-                scaler = SingleScalerFactory.create(params, expt, refl, for_multi=True)
-            except BadDatasetForScalingException as e:
-                logger.info(e)
+            if scaler is None:
                 idx_to_remove.append(i)
             else:
                 unscaled_scalers.append(scaler)
@@ -312,12 +330,10 @@ def create(params, experiments, reflections):
         unscaled_scalers = []
         idx_to_remove = []
 
-        for i, (expt, refl) in enumerate(zip(experiments, reflections)):
+        scalers = _create_single_scalers(params, experiments, reflections)
+        for i, (expt, scaler) in enumerate(zip(experiments, scalers)):
             # Remove bad datasets that literally have no integrated reflections
-            try:
-                scaler = SingleScalerFactory.create(params, expt, refl, for_multi=True)
-            except BadDatasetForScalingException as e:
-                logger.info(e)
+            if scaler is None:
                 idx_to_remove.append(i)
             else:
                 if expt.scaling_model.is_scaled:
@@ -18,7 +18,6 @@
 from unittest.mock import Mock
 
 import numpy as np
-import pkg_resources
 
 import iotbx.merging_statistics
 from cctbx import crystal, miller, uctbx
@@ -34,6 +33,7 @@
 )
 from dials.array_family import flex
 from dials.util import Sorry
+from dials.util.entry_points import entry_points
 from dials.util.options import ArgumentParser
 from dials.util.reference import intensities_from_reference_file
 from dials_scaling_ext import split_unmerged
@@ -215,7 +215,7 @@ def create_scaling_model(params, experiments, reflections):
     # Determine non-auto model to use outside the loop over datasets.
     if not use_auto_model:
         model_class = None
-        for entry_point in pkg_resources.iter_entry_points("dxtbx.scaling_model_ext"):
+        for entry_point in entry_points("dxtbx.scaling_model_ext"):
             if entry_point.name == params.model:
                 model_class = entry_point.load()
                 break
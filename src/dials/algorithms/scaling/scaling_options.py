@@ -180,6 +180,15 @@
               This also sets the number of processes to use if the option is
               available."
       .expert_level = 2
+    Ih_table_memory_budget = None
+      .type = float(value_min=0)
+      .help = "Maximum memory (in GB), greater than zero, to use for the
+              reflection data held in the Ih table during minimisation. If set,
+              the data are divided into enough blocks that at least two fit
+              within the budget, and blocks are paged to and from disk as
+              needed. Outlier rejection also works through the data in chunks
+              of symmetry groups that fit within the budget."
+      .expert_level = 3
     use_free_set = False
       .type = bool
       .help = "Option to use a free set during scaling to check for overbiasing.
@@ -4,7 +4,9 @@
 
 from __future__ import annotations
 
+import contextlib
 import logging
+import time
 from math import acos
 
 import numpy as np
@@ -43,6 +45,14 @@ def log_memory_usage():
         pass
 
 
+@contextlib.contextmanager
+def log_stage_timing(stage):
+    """Log the time taken for a stage of the scaling algorithm."""
+    st = time.time()
+    yield
+    logger.info("Time taken for %s: %.2fs", stage, time.time() - st)
+
+
 class DialsMergingStatisticsError(Exception):
     """Raised when iotbx merging statistics fails."""
 
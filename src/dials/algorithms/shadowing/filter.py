@@ -2,42 +2,85 @@
 
 
 def filter_shadowed_reflections(experiments, reflections, experiment_goniometer=False):
+    """
+    Determine which reflections lie in the shadow of the goniometer.
+
+    The reflections of each experiment are assigned to images with a single
+    sort on (image, panel), and the shadow is projected once for each image
+    that contains reflections (caching the result for repeated angles within
+    each experiment), before testing all reflections on each panel of the
+    image against the shadow polygon in one call.
+
+    Args:
+        experiments: The experiment list
+        reflections: A reflection table with xyzcal.px, panel and id columns
+        experiment_goniometer: Unused, retained for compatibility
+
+    Returns:
+        A flex.bool array, True for reflections in a shadowed region
+    """
+    import numpy as np
+
+    from dxtbx import flumpy
     from dxtbx.masking import is_inside_polygon
     from scitbx.array_family import flex
 
-    shadowed = flex.bool(reflections.size(), False)
-
-    for expt_id in range(len(experiments)):
-        expt = experiments[expt_id]
-        imageset = expt.imageset
-        masker = imageset.masker()
+    shadowed = np.full(reflections.size(), False)
+    if not reflections.size():
+        return flumpy.from_numpy(shadowed)
+    ids = flumpy.to_numpy(reflections["id"])
+    panels = flumpy.to_numpy(reflections["panel"]).astype(np.int64)
+    xyz = flumpy.to_numpy(reflections["xyzcal.px"])
 
+    for expt_id, expt in enumerate(experiments):
+        masker = expt.imageset.masker()
         if masker is None:
             continue
 
         detector = expt.detector
-        sel = reflections["id"] == expt_id
-        isel = sel.iselection()
-        x, y, z = reflections["xyzcal.px"].select(isel).parts()
         start, end = expt.scan.get_array_range()
-        for i in range(start, end):
-            shadow = masker.project_extrema(
-                detector, expt.scan.get_angle_from_array_index(i)
-            )
-            img_sel = (z >= i) & (z < (i + 1))
-            img_isel = img_sel.iselection()
-            for p_id in range(len(detector)):
-                panel = reflections["panel"].select(img_isel)
-                if shadow[p_id].size() < 4:
+        isel = np.flatnonzero(ids == expt_id)
+        images = np.floor(xyz[isel, 2]).astype(np.int64)
+        in_scan = (images >= start) & (images < end)
+        isel = isel[in_scan]
+        images = images[in_scan]
+        if not isel.size:
+            continue
+        # The shadows of this experiment, by scan angle
+        shadow_cache = {}
+
+        # Sort once by image then panel, and find the runs of each (image, panel)
+        order = np.lexsort((panels[isel], images))
+        isel = isel[order]
+        images = images[order]
+        isel_panels = panels[isel]
+        run_starts = np.flatnonzero(
+            (np.diff(images, prepend=-1) != 0) | (np.diff(isel_panels, prepend=-1) != 0)
+        )
+        run_ends = np.append(run_starts[1:], isel.size)
+        image_starts = np.flatnonzero(np.diff(images[run_starts], prepend=-1))
+        image_ends = np.append(image_starts[1:], run_starts.size)
+
+        for first_run, last_run in zip(image_starts, image_ends):
+            image = int(images[run_starts[first_run]])
+            angle = expt.scan.get_angle_from_array_index(image)
+            if angle not in shadow_cache:
+                shadow_cache[angle] = masker.project_extrema(detector, angle)
+            shadow = shadow_cache[angle]
+            for run_start, run_end in zip(
+                run_starts[first_run:last_run], run_ends[first_run:last_run]
+            ):
+                polygon = shadow[int(isel_panels[run_start])]
+                if polygon.size() < 4:
                     continue
-                panel_isel = img_isel.select(panel == p_id)
+                indices = isel[run_start:run_end]
                 inside = is_inside_polygon(
-                    shadow[p_id],
+                    polygon,
                     flex.vec2_double(
-                        x.select(isel.select(panel_isel)),
-                        y.select(isel.select(panel_isel)),
+                        flumpy.from_numpy(xyz[indices, 0]),
+                        flumpy.from_numpy(xyz[indices, 1]),
                     ),
                 )
-                shadowed.set_selected(panel_isel, inside)
+                shadowed[indices] = flumpy.to_numpy(inside)
 
-    return shadowed
+    return flumpy.from_numpy(shadowed)
@@ -3,6 +3,8 @@
 import collections
 import math
 
+import numpy as np
+
 from cctbx import sgtbx, uctbx
 from libtbx.math_utils import nearest_integer as nint
 from scitbx import matrix
@@ -10,6 +12,7 @@
 from dials.algorithms.integration import filtering
 from dials.array_family import flex
 from dials.util import tabulate
+from dials.util.histogram import bin_indices, rows_per_bin
 
 Slot = collections.namedtuple("Slot", "d_min d_max")
 _stats_field_names = [
@@ -634,16 +637,19 @@ def stats_per_image(experiment, reflections, resolution_analysis=True):
     noisiness_method_1 = []
     noisiness_method_2 = []
 
-    image_number = reflections["xyzobs.px.value"].parts()[2]
-    image_number = flex.floor(image_number)
-
     try:
         start, end = experiment.scan.get_array_range()
     except AttributeError:
         start, end = 0, 1
-    for i in range(start, end):
+
+    # Group the reflections by image with a single sort
+    z = reflections["xyzobs.px.value"].parts()[2].as_numpy_array()
+    images = bin_indices(z, np.arange(start, end + 1))
+    order, boundaries = rows_per_bin(images, end - start)
+    for i in range(end - start):
+        rows = order[boundaries[i] : boundaries[i + 1]]
         stats = stats_for_reflection_table(
-            reflections.select(image_number == i),
+            reflections.select(flex.size_t(rows.astype(np.uint64))),
             resolution_analysis=resolution_analysis,
         )
         n_spots_total.append(stats.n_spots_total)
@@ -500,6 +500,7 @@ def run(self):
             self.params.dmin,
             self.params.dmax,
             self.params.nbins,
+            nproc=self.params.nproc,
         )
 
         statistics.run()
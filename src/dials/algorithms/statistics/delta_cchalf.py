@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import concurrent.futures
 import logging
-from collections import defaultdict
+import time
 from math import floor, sqrt
 
+import numpy as np
+
 from cctbx import crystal, miller
 
 from dials.array_family import flex
@@ -69,6 +72,17 @@ def index(self, h):
             bin_index = 0
         return bin_index
 
+    def indices(self, miller_indices):
+        """
+        Get the bin indices for an array of miller indices
+
+        :param miller_indices: The miller indices
+        :returns: A numpy array of bin indices
+        """
+        d2 = self._unit_cell.d_star_sq(miller_indices).as_numpy_array()
+        bin_index = np.floor((d2 - self._xmin) / self._bin_size).astype(np.int64)
+        return np.clip(bin_index, 0, self._nbins - 1)
+
 
 class ReflectionSum:
     """
@@ -154,6 +168,51 @@ def compute_cchalf_from_reflection_sums(reflection_sums, binner):
     return compute_mean_cchalf_in_bins(bin_data)
 
 
+def _cchalf_bin_sums(n, sum_x, sum_x2):
+    """
+    Compute the per-reflection terms summed over a resolution bin for CC 1/2
+
+    Reflections with fewer than two observations do not contribute.
+
+    :param n: Array of the number of observations of each unique reflection
+    :param sum_x: Array of the sum of intensities of each unique reflection
+    :param sum_x2: Array of the sum of squared intensities of each reflection
+    :returns: An (n, 4) array of count, mean, mean**2 and variance of the mean
+    """
+    valid = n > 1
+    n_safe = np.where(valid, n, 2)
+    mean = sum_x / n_safe
+    var = (sum_x2 - sum_x**2 / n_safe) / ((n_safe - 1) * n_safe)
+    terms = np.column_stack((np.ones(n.size), mean, mean**2, var))
+    terms[~valid] = 0.0
+    return terms
+
+
+def _mean_cchalf_from_bin_sums(bin_sums):
+    """
+    Compute the mean CC 1/2 across resolution bins from the summed terms
+
+    Vectorised equivalent of compute_mean_cchalf_in_bins, for an array of
+    bin sums with shape (..., nbins, 4) as given by _cchalf_bin_sums.
+
+    :param bin_sums: The summed count, mean, mean**2 and variance in each bin
+    :returns: The mean CC 1/2, with shape bin_sums.shape[:-2]
+    """
+    count, sum_mean, sum_mean2, sum_var = np.moveaxis(bin_sums, -1, 0)
+    valid = count > 1.5
+    count_safe = np.where(valid, count, 2)
+    sigma_y = (sum_mean2 - sum_mean**2 / count_safe) / (count_safe - 1)
+    sigma_e = sum_var / count_safe
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cchalf = (sigma_y - sigma_e) / (sigma_y + sigma_e)
+    weights = np.where(valid, count, 0)
+    cchalf = np.where(valid, cchalf, 0.0)
+    total = weights.sum(axis=-1)
+    return np.where(
+        total > 0, (weights * cchalf).sum(axis=-1) / np.where(total > 0, total, 1), 0
+    )
+
+
 class PerGroupCChalfStatistics:
     def __init__(
         self,
@@ -163,6 +222,7 @@ def __init__(
         d_min=None,
         d_max=None,
         n_bins=10,
+        nproc=1,
     ):
         # here dataset is the sweep number, group is the group number for doing
         # the cc half analysis. May be the same as dataset if doing per dataset
@@ -173,6 +233,7 @@ def __init__(
         self.d_min = d_min
         self.d_max = d_max
         self._num_bins = n_bins
+        self._nproc = nproc
         self.reflection_table = reflection_table
         self._cchalf_mean = None
         self._cchalf = None
@@ -193,30 +254,59 @@ def __init__(
             self.d_max = flex.max(self.reflection_table["d"])
         self.binner = ResolutionBinner(mean_unit_cell, self.d_min, self.d_max, n_bins)
 
-        self.reflection_sums = defaultdict(ReflectionSum)
         self.compute_overall_stats()
 
     def compute_overall_stats(self):
-        # Create lookups for elements by miller index
-        index_lookup = defaultdict(list)
-        for i, h in enumerate(self.reflection_table["miller_index"]):
-            index_lookup[h].append(i)
+        """
+        Compute the sufficient statistics for each unique reflection and for
+        each (group, unique reflection) pair, in a single pass over the data.
+        """
+        hkl = self.reflection_table["miller_index"].as_vec3_double().as_numpy_array()
+        unique_hkl, first, unique_index = np.unique(
+            hkl, axis=0, return_index=True, return_inverse=True
+        )
+        unique_index = unique_index.reshape(-1)
+        groups, group_index = np.unique(
+            self.reflection_table["group"].as_numpy_array(), return_inverse=True
+        )
+        group_index = group_index.reshape(-1)
+        intensity = self.reflection_table["intensity"].as_numpy_array()
+
+        n_unique = unique_hkl.shape[0]
+        bin_index = self.binner.indices(self.reflection_table["miller_index"])
+        self._unique_bin = bin_index[first]
 
         # Compute the Overall Sum(X) and Sum(X^2) for each unique reflection
+        self._unique_n = np.bincount(unique_index, minlength=n_unique).astype(float)
+        self._unique_sum_x = np.bincount(
+            unique_index, weights=intensity, minlength=n_unique
+        )
+        self._unique_sum_x2 = np.bincount(
+            unique_index, weights=intensity**2, minlength=n_unique
+        )
 
-        for h in index_lookup:
-            sel = flex.size_t(index_lookup[h])
-            intensities = self.reflection_table["intensity"].select(sel)
-            n = intensities.size()
-            sum_x = flex.sum(intensities)
-            sum_x2 = flex.sum(flex.pow2(intensities))
-            self.reflection_sums[h] = ReflectionSum(sum_x, sum_x2, n)
+        # And the same sums per (group, unique reflection) pair, sorted by group
+        pair_keys, pair_index = np.unique(
+            group_index.astype(np.int64) * n_unique + unique_index,
+            return_inverse=True,
+        )
+        pair_index = pair_index.reshape(-1)
+        self._groups = groups
+        self._pair_group = pair_keys // n_unique
+        self._pair_unique = pair_keys % n_unique
+        self._pair_n = np.bincount(pair_index, minlength=pair_keys.size).astype(float)
+        self._pair_sum_x = np.bincount(
+            pair_index, weights=intensity, minlength=pair_keys.size
+        )
+        self._pair_sum_x2 = np.bincount(
+            pair_index, weights=intensity**2, minlength=pair_keys.size
+        )
 
         # Compute some numbers
         self._num_datasets = len(set(self.reflection_table["dataset"]))
-        self._num_groups = len(set(self.reflection_table["group"]))
+        self._num_groups = groups.size
         self._num_reflections = self.reflection_table.size()
-        self._num_unique = len(self.reflection_sums)
+        self._num_unique = n_unique
 
         logger.info(
             """
@@ -252,58 +342,92 @@ def d_filter(self):
             sel = self.reflection_table["d"] < self.d_max
         self.reflection_table.select(sel)
 
+    def _overall_bin_sums(self):
+        """Sum the CC 1/2 terms in each resolution bin for all of the data"""
+        terms = _cchalf_bin_sums(
+            self._unique_n, self._unique_sum_x, self._unique_sum_x2
+        )
+        bin_sums = np.zeros((self.binner.nbins(), 4))
+        np.add.at(bin_sums, self._unique_bin, terms)
+        return bin_sums
+
     def run(self):
         """Compute the ΔCC½ for all the data"""
-        self._cchalf_mean = compute_cchalf_from_reflection_sums(
-            self.reflection_sums, self.binner
-        )
+        self._overall_sums = self._overall_bin_sums()
+        self._cchalf_mean = float(_mean_cchalf_from_bin_sums(self._overall_sums))
         logger.info("CC 1/2 mean: %.3f", (100 * self._cchalf_mean))
+        st = time.perf_counter()
         self._cchalf = self._compute_cchalf_excluding_each_group()
+        logger.info(
+            "Computed CC 1/2 excluding each of %d groups in %.2f seconds",
+            self._num_groups,
+            time.perf_counter() - st,
+        )
 
-    def _compute_cchalf_excluding_each_group(self):
-        #   self, reflection_sums, binner, miller_index, dataset, intensity
-        # ):
+    def _bin_sums_excluding_groups(self, pairs):
         """
-        Compute the CC 1/2 with an image excluded.
+        Compute the binned CC 1/2 terms with each group excluded in turn, for
+        the (group, unique reflection) pairs in the slice pairs.
 
-        For each image, update the sums by removing the contribution from the image
-        and then compute the CC 1/2 of the remaining data
+        Only the unique reflections observed in a group change when that group
+        is excluded, so the overall bin sums are updated by the difference in
+        the terms for those reflections alone.
         """
+        group = self._pair_group[pairs]
+        unique = self._pair_unique[pairs]
+        n = self._unique_n[unique]
+        sum_x = self._unique_sum_x[unique]
+        sum_x2 = self._unique_sum_x2[unique]
+        delta = _cchalf_bin_sums(
+            n - self._pair_n[pairs],
+            sum_x - self._pair_sum_x[pairs],
+            sum_x2 - self._pair_sum_x2[pairs],
+        ) - _cchalf_bin_sums(n, sum_x, sum_x2)
+
+        first_group = group[0]
+        n_groups = group[-1] - first_group + 1
+        bin_sums = np.zeros((n_groups, self.binner.nbins(), 4))
+        np.add.at(bin_sums, (group - first_group, self._unique_bin[unique]), delta)
+        bin_sums += self._overall_sums
+        return first_group, _mean_cchalf_from_bin_sums(bin_sums)
 
-        # Create a lookup table for each reflection by dataset i.e. group of images
-        dataset_lookup = defaultdict(list)
-        for i, b in enumerate(self.reflection_table["group"]):
-            dataset_lookup[b].append(i)
+    def _compute_cchalf_excluding_each_group(self):
+        """
+        Compute the CC 1/2 with each group excluded.
 
-        # Compute CC1/2 minus each dataset
-        cchalf_i = {}
-        for dataset in dataset_lookup:
-            # Find all observations from this dataset and create a lookup based on
-            # miller index
-            index_lookup = defaultdict(list)
-            for i in dataset_lookup[dataset]:
-                index_lookup[self.reflection_table["miller_index"][i]].append(i)
-
-            # Loop through all the reflections and remove the contribution of
-            # reflections from the current dataset
-            dataset_reflection_sums = defaultdict(ReflectionSum)
-            for h in self.reflection_sums:
-                sum_x = self.reflection_sums[h].sum_x
-                sum_x2 = self.reflection_sums[h].sum_x2
-                n = self.reflection_sums[h].n
-                for i in index_lookup[h]:
-                    sum_x -= self.reflection_table["intensity"][i]
-                    sum_x2 -= self.reflection_table["intensity"][i] ** 2
-                    n -= 1
-                dataset_reflection_sums[h] = ReflectionSum(sum_x, sum_x2, n)
-
-            # Compute the CC 1/2 without the reflections from the current dataset
-            cchalf = compute_cchalf_from_reflection_sums(
-                dataset_reflection_sums, self.binner
+        For each group, the sums of the unique reflections are updated by
+        removing the contribution from the group, and the CC 1/2 of the remaining
+        data is computed. This is done for all groups at once from the per-group
+        sums, split into contiguous ranges of groups for parallel processing.
+        """
+        cchalf = np.zeros(self._num_groups)
+        n_pairs = self._pair_group.size
+        n_chunks = max(1, min(self._nproc * 4, self._num_groups))
+        # Split the pairs (which are sorted by group) on group boundaries
+        boundaries = np.searchsorted(
+            self._pair_group,
+            np.linspace(0, self._num_groups, n_chunks + 1)[1:-1].astype(np.int64),
+        )
+        chunks = [
+            slice(start, end)
+            for start, end in zip(
+                np.concatenate(([0], boundaries)),
+                np.concatenate((boundaries, [n_pairs])),
             )
-            cchalf_i[dataset] = cchalf
-            logger.info("CC 1/2 excluding group %d: %.3f", dataset, 100 * cchalf)
+            if end > start
+        ]
+        if self._nproc > 1:
+            with concurrent.futures.ThreadPoolExecutor(self._nproc) as pool:
+                results = list(pool.map(self._bin_sums_excluding_groups, chunks))
+        else:
+            results = [self._bin_sums_excluding_groups(chunk) for chunk in chunks]
+        for first_group, values in results:
+            cchalf[first_group : first_group + values.size] = values
 
+        cchalf_i = {}
+        for group, value in zip(self._groups.tolist(), cchalf.tolist()):
+            cchalf_i[group] = value
+            logger.info("CC 1/2 excluding group %d: %.3f", group, 100 * value)
         return cchalf_i
 
     def num_datasets(self):
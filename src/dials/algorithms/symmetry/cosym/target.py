@@ -4,11 +4,9 @@
 
 import concurrent.futures
 import copy
-import itertools
 import logging
 
 import numpy as np
-import pandas as pd
 from orderedset import OrderedSet
 from scipy import sparse
 
@@ -149,6 +147,72 @@ def _compute_rij_matrix_one_row_block(
     return rij, wij
 
 
+# The maximum number of elements in each of the dense arrays used for one tile of
+# rows when calculating pairwise correlations.
+_MAX_TILE_ELEMENTS = 2**22
+
+
+def _pairwise_correlations(rows, columns, values, n_rows, min_pairs=None):
+    """Calculate the correlation coefficients between all pairs of rows.
+
+    Each pair of rows of a sparse matrix of values is correlated over the
+    columns present in both rows (i.e. with pairwise deletion of missing values,
+    as pandas.DataFrame.corr). The sums needed for all pairs are calculated with
+    sparse matrix products, for one tile of rows at a time to bound the memory
+    used.
+
+    Args:
+      rows (np.ndarray): The row of each value.
+      columns (np.ndarray): The column of each value.
+      values (np.ndarray): The values. If a (row, column) pair is repeated, the
+        last value is used.
+      n_rows (int): The number of rows.
+      min_pairs (int): The minimum number of pairs needed for a correlation
+        coefficient.
+
+    Returns:
+      tuple: An (n_rows, n_rows) array of the correlation coefficients (NaN
+      where there are fewer than min_pairs pairs, or a correlation coefficient
+      is undefined), and an array of the number of pairs.
+    """
+    # Keep only the last value for each (row, column)
+    order = np.lexsort((np.arange(rows.size), columns, rows))[::-1]
+    _, last = np.unique(
+        np.column_stack((rows[order], columns[order])), axis=0, return_index=True
+    )
+    keep = order[last]
+    rows, columns, values = rows[keep], columns[keep], values[keep]
+
+    n_columns = columns.max() + 1 if columns.size else 0
+    shape = (n_rows, n_columns)
+    x = sparse.csr_matrix((values, (rows, columns)), shape=shape)
+    x2 = sparse.csr_matrix((values**2, (rows, columns)), shape=shape)
+    present = sparse.csr_matrix((np.ones(values.size), (rows, columns)), shape=shape)
+    x_t = x.T.tocsr()
+    x2_t = x2.T.tocsr()
+    present_t = present.T.tocsr()
+
+    rij = np.empty((n_rows, n_rows))
+    n_pairs = np.empty((n_rows, n_rows))
+    tile_size = max(1, _MAX_TILE_ELEMENTS // max(n_rows, 1))
+    for start in range(0, n_rows, tile_size):
+        tile = slice(start, min(start + tile_size, n_rows))
+        n = (present[tile] @ present_t).toarray()
+        sum_x = (x[tile] @ present_t).toarray()
+        sum_y = (present[tile] @ x_t).toarray()
+        sum_xx = (x2[tile] @ present_t).toarray()
+        sum_yy = (present[tile] @ x2_t).toarray()
+        sum_xy = (x[tile] @ x_t).toarray()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cc = (n * sum_xy - sum_x * sum_y) / np.sqrt(
+                (n * sum_xx - sum_x**2) * (n * sum_yy - sum_y**2)
+            )
+        cc[n < max(min_pairs or 1, 1)] = np.nan
+        rij[tile] = np.clip(cc, -1, 1)
+        n_pairs[tile] = n
+    return rij, n_pairs
+
+
 class Target:
     """Target function for cosym analysis.
 
@@ -408,31 +472,31 @@ def _compute_rij_wij(self, use_cache=True):
         for cb_op, hkl in indices.items():
             indices[cb_op] = np.ravel_multi_index((hkl + offset).T, dims)
 
-        # Create an empty 2D array of shape (m * n, L), where m is the number of sym
-        # ops, n is the number of lattices, and L is the number of unique miller indices
-        all_intensities = np.empty((n_sym_ops * n_lattices, np.prod(dims)))
-
-        # Populate all_intensities with intensity values, filling absent intensities
-        # with np.nan
-        all_intensities.fill(np.nan)
+        # Gather the intensities of each (sym op, lattice) pair as a row of a
+        # sparse matrix, with a column for each of the miller indices observed
         slices = np.append(self._lattices, intensities.size)
         slices = list(map(slice, slices[:-1], slices[1:]))
+        rows = []
+        columns = []
+        values = []
         for i, (mil_ind, eps) in enumerate(zip(indices.values(), epsilons.values())):
             for j, selection in enumerate(slices):
-                # map (i, j) to a column in all_intensities
-                column = np.ravel_multi_index((i, j), (n_sym_ops, n_lattices))
+                # map (i, j) to a row
+                row = np.ravel_multi_index((i, j), (n_sym_ops, n_lattices))
                 epsilon_equals_one = eps[selection] == 1
-                valid_mil_ind = mil_ind[selection][epsilon_equals_one]
-                valid_intensities = intensities[selection][epsilon_equals_one]
-                all_intensities[column, valid_mil_ind] = valid_intensities
-
-        # Ideally we would use `np.ma.corrcoef` here, but it is broken, so use
-        # pd.DataFrame.corr() instead (see numpy/numpy#15601)
-        rij = (
-            pd.DataFrame(all_intensities)
-            .T.dropna(how="all")
-            .corr(min_periods=self._min_pairs)
-            .values
+                columns.append(mil_ind[selection][epsilon_equals_one])
+                values.append(intensities[selection][epsilon_equals_one])
+                rows.append(np.full(columns[-1].size, row))
+        rows = np.concatenate(rows)
+        columns = np.concatenate(columns)
+        values = np.concatenate(values)
+        _, columns = np.unique(columns, return_inverse=True)
+        rij, n_pairs = _pairwise_correlations(
+            rows,
+            columns.reshape(-1),
+            values,
+            n_sym_ops * n_lattices,
+            min_pairs=self._min_pairs,
         )
         # Set any NaN correlation coefficients to zero
         np.nan_to_num(rij, copy=False)
@@ -442,21 +506,8 @@ def _compute_rij_wij(self, use_cache=True):
         ## First, populate a weights matrix of the number of pairs i.e. counts
         ## if we are not going to use weights, this helps us select where we
         ## calculated values, so that we can set them to constant weights
-        wij = np.zeros_like(rij)
-        right_up = np.triu_indices_from(wij, k=1)
-
-        # For each correlation coefficient, set the weight equal to the size of
-        # the sample used to calculate that coefficient
-        pairwise_combos = itertools.combinations(np.isfinite(all_intensities), 2)
-
-        def sample_size(x, y):
-            pairs = np.count_nonzero(x & y)
-            if pairs < self._min_pairs:
-                return 0
-            else:
-                return pairs
-
-        wij[right_up] = list(itertools.starmap(sample_size, pairwise_combos))
+        right_up = np.triu_indices_from(n_pairs, k=1)
+        wij = np.triu(np.where(n_pairs >= (self._min_pairs or 0), n_pairs, 0), k=1)
 
         if self._weights:
             ## the weights are currently the pairwise sample sizes
@@ -2,9 +2,11 @@
 
 from __future__ import annotations
 
+import concurrent.futures
 import json
 import logging
 import math
+import time
 
 import scipy.stats
 
@@ -41,6 +43,7 @@ def __init__(
         absolute_angle_tolerance=None,
         best_monoclinic_beta=True,
         apply_sigma_correction=True,
+        nproc=1,
     ):
         """Initialise a LaueGroupAnalysis object.
 
@@ -67,7 +70,10 @@ def __init__(
           best_monoclinic_beta (bool): If True, then for monoclinic centered cells, I2
             will be preferred over C2 if it gives a less oblique cell (i.e. smaller
             beta angle).
+          apply_sigma_correction (bool): If True, correct SDs by "typical" SD factors.
+          nproc (int): The number of processes used to score the symmetry elements.
         """
+        self._nproc = nproc
         super().__init__(
             intensities,
             normalisation=normalisation,
@@ -181,12 +187,11 @@ def _estimate_cc_true(self):
 
         # (ii)
 
-        reindexed_intensities = self.intensities.change_basis(
-            sgtbx.change_of_basis_op("-x,-y,-z")
-        ).map_to_asu()
-        x, y = self.intensities.common_sets(
-            reindexed_intensities, assert_is_similar_symmetry=False
+        # The pairs related by inversion, also used to score the identity
+        self._inversion_pairs = related_pairs(
+            self.intensities, sgtbx.change_of_basis_op("-x,-y,-z")
         )
+        x, y = self._inversion_pairs
         self.cc_identity = CorrelationCoefficientAccumulator(x.data(), y.data())
 
         min_sd = 0.05
@@ -213,15 +218,41 @@ def _estimate_cc_true(self):
         logger.debug("cc_true: %g", self.cc_true)
 
     def _score_symmetry_elements(self):
-        self.sym_op_scores = []
-        for smx in self.lattice_group.smx():
-            if smx.r().info().sense() < 0:
-                continue
-            self.sym_op_scores.append(
-                ScoreSymmetryElement(
-                    self.intensities, smx, self.cc_true, self.cc_sig_fac
+        sym_ops = [
+            smx for smx in self.lattice_group.smx() if smx.r().info().sense() >= 0
+        ]
+        st = time.perf_counter()
+        if self._nproc > 1 and len(sym_ops) > 1:
+            # Send the (normalised) intensities to each worker once, rather than
+            # with each symmetry element
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(self._nproc, len(sym_ops)),
+                initializer=_init_symmetry_element_worker,
+                initargs=(self.intensities, self._inversion_pairs),
+            ) as pool:
+                ccs = list(
+                    pool.map(
+                        _symmetry_element_cc_worker,
+                        [smx.as_xyz() for smx in sym_ops],
+                    )
                 )
+        else:
+            ccs = [
+                symmetry_element_cc(self.intensities, smx, self._inversion_pairs)
+                for smx in sym_ops
+            ]
+        logger.debug(
+            "Scored %d symmetry elements with nproc=%d in %.2f seconds",
+            len(sym_ops),
+            self._nproc,
+            time.perf_counter() - st,
+        )
+        self.sym_op_scores = [
+            ScoreSymmetryElement(
+                self.intensities, smx, self.cc_true, self.cc_sig_fac, cc=cc
             )
+            for smx, cc in zip(sym_ops, ccs)
+        ]
 
     def _score_laue_groups(self):
         subgroup_scores = [
@@ -490,7 +521,7 @@ class ScoreSymmetryElement:
     <https://doi.org/10.1107/S090744491003982X>`_
     """
 
-    def __init__(self, intensities, sym_op, cc_true, cc_sig_fac):
+    def __init__(self, intensities, sym_op, cc_true, cc_sig_fac, cc=None):
         """Initialise a ScoreSymmetryElement object.
 
         Args:
@@ -500,42 +531,15 @@ def __init__(self, intensities, sym_op, cc_true, cc_sig_fac):
           cc_true (float): the expected value of CC if the symmetry element is present,
             E(CC; S)
           cc_sig_fac (float): Estimation of sigma(CC) as a function of sample size.
+          cc (CorrelationCoefficientAccumulator): Optionally, the correlation
+            coefficient for the symmetry element, if already calculated by
+            :func:`symmetry_element_cc`.
         """
         self.sym_op = sym_op
         assert self.sym_op.r().info().sense() >= 0
-        self.cc = CorrelationCoefficientAccumulator()
-        cb_op = sgtbx.change_of_basis_op(self.sym_op)
-        cb_ops = [cb_op]
-        if self.sym_op.r().order() > 2:
-            # include inverse symmetry operation
-            cb_ops.append(cb_op.inverse())
-        for cb_op in cb_ops:
-            if cb_op.is_identity_op():
-                cb_op = sgtbx.change_of_basis_op("-x,-y,-z")
-            reindexed_intensities = intensities.change_basis(cb_op).map_to_asu()
-            x, y = intensities.common_sets(
-                reindexed_intensities, assert_is_similar_symmetry=False
-            )
-            sel = sgtbx.space_group().expand_smx(self.sym_op).epsilon(x.indices()) == 1
-            x = x.select(sel)
-            y = y.select(sel)
-
-            outliers = flex.bool(len(x.data()), False)
-            iqr_multiplier = 20  # very generous tolerance
-            for col in (x.data(), y.data()):
-                if col.size():
-                    min_x, q1_x, med_x, q3_x, max_x = five_number_summary(col)
-                    iqr_x = q3_x - q1_x
-                    cut_x = iqr_multiplier * iqr_x
-                    outliers.set_selected(col > q3_x + cut_x, True)
-                    outliers.set_selected(col < q1_x - cut_x, True)
-            if outliers.count(True):
-                n, s = libtbx.utils.plural_s(outliers.count(True))
-                logger.debug(f"Rejecting {n} outlier value{s}")
-                x = x.select(~outliers)
-                y = y.select(~outliers)
-
-            self.cc += CorrelationCoefficientAccumulator(x.data(), y.data())
+        if cc is None:
+            cc = symmetry_element_cc(intensities, sym_op)
+        self.cc = cc
 
         self.n_refs = self.cc.n()
         if self.n_refs <= 0:
@@ -589,6 +593,95 @@ def as_dict(self):
         }
 
 
+def related_pairs(intensities, cb_op):
+    """Get the pairs of intensities related by a change of basis operator.
+
+    Args:
+      intensities (cctbx.miller.array): The intensities.
+      cb_op (cctbx.sgtbx.change_of_basis_op): The change of basis operator.
+
+    Returns:
+      tuple: The common sets of the intensities and the reindexed intensities.
+    """
+    reindexed_intensities = intensities.change_basis(cb_op).map_to_asu()
+    return intensities.common_sets(
+        reindexed_intensities, assert_is_similar_symmetry=False
+    )
+
+
+def symmetry_element_cc(intensities, sym_op, inversion_pairs=None):
+    """Calculate the correlation coefficient for a symmetry element.
+
+    The intensities are correlated with those related by the symmetry operation
+    (and its inverse, for operations of order greater than two), excluding
+    outliers.
+
+    Args:
+      intensities (cctbx.miller.array): The intensities on which to perform
+        symmetry analysis.
+      sym_op (cctbx.sgtbx.rt_mx): The symmetry operation for analysis.
+      inversion_pairs (tuple): Optionally, the pairs of intensities related by
+        inversion, as given by :func:`related_pairs`, which are used for the
+        identity operation.
+
+    Returns:
+      CorrelationCoefficientAccumulator: The correlation coefficient.
+    """
+    cc = CorrelationCoefficientAccumulator()
+    cb_op = sgtbx.change_of_basis_op(sym_op)
+    cb_ops = [cb_op]
+    if sym_op.r().order() > 2:
+        # include inverse symmetry operation
+        cb_ops.append(cb_op.inverse())
+    for cb_op in cb_ops:
+        if cb_op.is_identity_op():
+            if inversion_pairs is not None:
+                x, y = inversion_pairs
+            else:
+                x, y = related_pairs(intensities, sgtbx.change_of_basis_op("-x,-y,-z"))
+        else:
+            x, y = related_pairs(intensities, cb_op)
+        sel = sgtbx.space_group().expand_smx(sym_op).epsilon(x.indices()) == 1
+        x = x.select(sel)
+        y = y.select(sel)
+
+        outliers = flex.bool(len(x.data()), False)
+        iqr_multiplier = 20  # very generous tolerance
+        for col in (x.data(), y.data()):
+            if col.size():
+                min_x, q1_x, med_x, q3_x, max_x = five_number_summary(col)
+                iqr_x = q3_x - q1_x
+                cut_x = iqr_multiplier * iqr_x
+                outliers.set_selected(col > q3_x + cut_x, True)
+                outliers.set_selected(col < q1_x - cut_x, True)
+        if outliers.count(True):
+            n, s = libtbx.utils.plural_s(outliers.count(True))
+            logger.debug(f"Rejecting {n} outlier value{s}")
+            x = x.select(~outliers)
+            y = y.select(~outliers)
+
+        cc += CorrelationCoefficientAccumulator(x.data(), y.data())
+    return cc
+
+
+# The intensities (and inversion pairs) used by each symmetry element scoring
+# process, set once when the process starts.
+_worker_data = {}
+
+
+def _init_symmetry_element_worker(intensities, inversion_pairs):
+    _worker_data["intensities"] = intensities
+    _worker_data["inversion_pairs"] = inversion_pairs
+
+
+def _symmetry_element_cc_worker(sym_op_xyz):
+    return symmetry_element_cc(
+        _worker_data["intensities"],
+        sgtbx.rt_mx(sym_op_xyz),
+        _worker_data["inversion_pairs"],
+    )
+
+
 class ScoreSubGroup:
     """Score the probability of a given subgroup being the true subgroup.
 
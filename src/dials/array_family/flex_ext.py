@@ -22,6 +22,7 @@
 import cctbx.array_family.flex
 import cctbx.miller
 import libtbx.smart_open
+from dxtbx import flumpy
 from dxtbx.model import ExperimentType
 from scitbx import matrix
 
@@ -46,6 +47,50 @@
     raise TypeError('unknown "real" type')
 
 
+class ExperimentIdIndex:
+    """
+    The rows of a reflection table belonging to each experiment id.
+
+    The index is built with one stable sort of the id column, after which the
+    rows of any number of experiments can be selected, removed or split out in a
+    single pass over the table. The rows of each experiment are kept in their
+    order in the table.
+    """
+
+    def __init__(self, ids):
+        """
+        :param ids: The id column, as a numpy array
+        """
+        self.ids = np.asarray(ids)
+        self.order = np.argsort(self.ids, kind="stable")
+        sorted_ids = self.ids[self.order]
+        starts = np.flatnonzero(sorted_ids[1:] != sorted_ids[:-1]) + 1
+        if sorted_ids.size:
+            starts = np.concatenate(([0], starts))
+        self.id_values = sorted_ids[starts]
+        self.starts = starts
+        self.ends = np.append(starts[1:], sorted_ids.size).astype(starts.dtype)
+
+    def rows(self, id_value):
+        """Get the rows of a single experiment id."""
+        i = np.searchsorted(self.id_values, id_value)
+        if i == self.id_values.size or self.id_values[i] != id_value:
+            return self.order[:0]
+        return self.order[self.starts[i] : self.ends[i]]
+
+    def selection(self, id_values):
+        """Get a boolean mask selecting the rows of several experiment ids."""
+        chosen = np.isin(self.id_values, np.asarray(list(id_values), dtype=int))
+        mask = np.zeros(self.ids.size, dtype=bool)
+        mask[self.order] = np.repeat(chosen, self.ends - self.starts)
+        return mask
+
+    def groups(self):
+        """Iterate through the (id, rows) of each experiment id in the table."""
+        for id_value, start, end in zip(self.id_values, self.starts, self.ends):
+            yield int(id_value), self.order[start:end]
+
+
 @boost_adaptbx.boost.python.inject_into(dials_array_family_flex_ext.reflection_table)
 class _:
     """
@@ -1168,6 +1213,17 @@ def compute_miller_indices_in_asu(self, experiments):
 
         return self["miller_index_asu"]
 
+    def experiment_id_index(self):
+        """
+        Get the index of the rows of each experiment id in the table.
+
+        The index is built from the current id column, and is not updated if the
+        table is changed afterwards.
+
+        :return: An ExperimentIdIndex for the id column
+        """
+        return ExperimentIdIndex(flumpy.to_numpy(self["id"]))
+
     def select_on_experiment_identifiers(self, list_of_identifiers):
         """
         Given a list of experiment identifiers (strings), perform a selection
@@ -1175,11 +1231,12 @@ def select_on_experiment_identifiers(self, list_of_identifiers):
         map.
         """
         # First get the reverse of the map i.e. ids for a given exp_identifier
+        identifiers = set(list_of_identifiers)
         id_values = []
         for k, v in zip(
             self.experiment_identifiers().keys(), self.experiment_identifiers().values()
         ):
-            if v in list_of_identifiers:
+            if v in identifiers:
                 id_values.append(k)
         if len(id_values) != len(list_of_identifiers):
             logger.warning(
@@ -1189,14 +1246,15 @@ def select_on_experiment_identifiers(self, list_of_identifiers):
 Found {id_values}"""
             )
         # Build up a selection and use this
-        sel = cctbx.array_family.flex.bool(self.size(), False)
-        for id_val in id_values:
-            id_sel = self["id"] == id_val
-            sel.set_selected(id_sel, True)
-        self = self.select(sel)
+        if id_values and len(self):
+            sel = self.experiment_id_index().selection(id_values)
+            self = self.select(flumpy.from_numpy(sel))
+        else:
+            self = self.select(cctbx.array_family.flex.bool(self.size(), False))
         # Remove entries from the experiment_identifiers map
+        selected_ids = set(id_values)
         for k in self.experiment_identifiers().keys():
-            if k not in id_values:
+            if k not in selected_ids:
                 del self.experiment_identifiers()[k]
         return self
 
@@ -1208,11 +1266,12 @@ def remove_on_experiment_identifiers(self, list_of_identifiers):
         # First get the reverse of the map i.e. ids for a given exp_identifier
         if len(self):
             assert "id" in self
+        identifiers = set(list_of_identifiers)
         id_values = []
         for k, v in zip(
             self.experiment_identifiers().keys(), self.experiment_identifiers().values()
         ):
-            if v in list_of_identifiers:
+            if v in identifiers:
                 id_values.append(k)
         if len(id_values) != len(list_of_identifiers):
             logger.warning(
@@ -1221,10 +1280,11 @@ def remove_on_experiment_identifiers(self, list_of_identifiers):
 Requested {list_of_identifiers}:
 Found {id_values}"""
             )
-        # Now delete the selections, also removing the entry from the map
+        # Now delete the selection, also removing the entries from the map
+        if id_values and len(self):
+            sel = self.experiment_id_index().selection(id_values)
+            self.del_selected(flumpy.from_numpy(sel))
         for id_val in id_values:
-            sel = self["id"] == id_val
-            self.del_selected(sel)
             del self.experiment_identifiers()[id_val]
         return self
 
@@ -1250,11 +1310,12 @@ def reset_ids(self):
             del self.experiment_identifiers()[k]
         if not len(self):
             return
-        orig_id = self["id"].deep_copy()
+        index = self.experiment_id_index()
+        new_id = index.ids.copy()
         for i_exp, exp_id in enumerate(reverse_map.keys()):
-            sel_exp = orig_id == reverse_map[exp_id]
-            self["id"].set_selected(sel_exp, i_exp)
+            new_id[index.rows(reverse_map[exp_id])] = i_exp
             self.experiment_identifiers()[i_exp] = exp_id
+        self["id"] = flumpy.from_numpy(new_id)
 
     def centroid_px_to_mm(self, experiments):
         """
@@ -0,0 +1,150 @@
+# LIBTBX_SET_DISPATCHER_NAME dev.dials.benchmark_background_model
+
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+
+import numpy as np
+
+from dxtbx import flumpy
+from dxtbx.model import (
+    BeamFactory,
+    DetectorFactory,
+    Experiment,
+    ExperimentList,
+    GoniometerFactory,
+)
+
+import dials.util
+from dials.algorithms.background.modeller import FinalizeModel
+from dials.util.benchmark import Column, best_time, make_phil_scope, report
+
+help_message = """
+
+Measure the time taken to finalize the global background model of
+dials.model_background (the polar transform, median filter and filling of
+the masked regions) for a simulated detector, by default the size of an
+Eiger 16M, with increasing numbers of processes. The models computed with
+each number of processes are checked to be identical.
+
+Examples::
+
+  dev.dials.benchmark_background_model
+
+  dev.dials.benchmark_background_model nproc=1,8 kernel_size=10 niter=10
+"""
+
+phil_scope = make_phil_scope(
+    """
+  nproc = 1 2 4
+    .type = ints(value_min=1)
+    .help = "The numbers of processes to benchmark"
+  image_size = 4150 4371
+    .type = ints(size=2, value_min=1)
+    .help = "The size (fast, slow) of the simulated detector"
+  kernel_size = 50
+    .type = int(value_min=0)
+    .help = "The kernel size for the median filter"
+  niter = 100
+    .type = int(value_min=1)
+    .help = "The number of iterations for filling holes"
+""",
+    repeats=1,
+    seed=True,
+)
+
+
+def simulated_experiments(image_size):
+    """Create an experiment with a single panel detector of the given size."""
+    beam = BeamFactory.make_beam(wavelength=0.97625, sample_to_source=(0, 0, 1))
+    detector = DetectorFactory.simple(
+        sensor="PAD",
+        distance=200.0,
+        beam_centre=(image_size[0] * 0.075 / 2, image_size[1] * 0.075 / 2),
+        fast_direction="+x",
+        slow_direction="-y",
+        pixel_size=(0.075, 0.075),
+        image_size=image_size,
+        trusted_range=(0, 1e8),
+    )
+    goniometer = GoniometerFactory.single_axis()
+    experiments = ExperimentList()
+    experiments.append(Experiment(beam=beam, detector=detector, goniometer=goniometer))
+    return experiments
+
+
+def simulated_background(image_size, seed=0):
+    """
+    Simulate a mean background image with an ice ring, masking the gaps
+    between the modules of an Eiger detector.
+
+    Returns:
+        A tuple of the image and mask, as flex arrays.
+    """
+    rng = np.random.default_rng(seed)
+    fast, slow = image_size
+    y, x = np.mgrid[0:slow, 0:fast]
+    r = np.hypot(x - fast / 2, y - slow / 2)
+    image = 5.0 + 50.0 * np.exp(-r / 500) + 20.0 * np.exp(-(((r - 1200) / 20) ** 2))
+    image = rng.poisson(image).astype(np.float64)
+    # Modules of 1030 x 514 pixels, separated by 10 and 37 pixel gaps
+    mask = (x % 1040 < 1030) & (y % 551 < 514)
+    return flumpy.from_numpy(image), flumpy.from_numpy(mask)
+
+
+@dials.util.show_mail_handle_errors()
+def run(args=None):
+    from dials.util.options import ArgumentParser
+
+    usage = "dev.dials.benchmark_background_model [options]"
+
+    parser = ArgumentParser(usage=usage, phil=phil_scope, epilog=help_message)
+    params, options = parser.parse_args(args, show_diff_phil=True)
+
+    image_size = tuple(params.image_size)
+    finalizer = FinalizeModel(
+        simulated_experiments(image_size),
+        kernel_size=params.kernel_size,
+        niter=params.niter,
+    )
+    image, mask = simulated_background(image_size, params.seed)
+
+    results = []
+    reference = None
+    for nproc in params.nproc:
+        with contextlib.ExitStack() as stack:
+            pool = None
+            if nproc > 1:
+                pool = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(max_workers=nproc)
+                )
+            elapsed, model = best_time(
+                finalizer.smooth, params.repeats, image, mask, pool=pool, n_blocks=nproc
+            )
+        model = flumpy.to_numpy(model)
+        if reference is None:
+            reference = model
+        results.append(
+            {
+                "nproc": nproc,
+                "time": elapsed,
+                "identical": bool(np.array_equal(model, reference)),
+            }
+        )
+
+    print(f"Finalized background model for a {image_size[0]}x{image_size[1]} image")
+    report(
+        results,
+        [
+            Column("nproc", "nproc"),
+            Column("time (s)", "time", ".2f"),
+            Column("identical", "identical"),
+        ],
+        params.output.json,
+        image_size=image_size,
+    )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,112 @@
+# LIBTBX_SET_DISPATCHER_NAME dev.dials.benchmark_batch_statistics
+
+from __future__ import annotations
+
+import numpy as np
+
+from cctbx import crystal, miller
+from dxtbx import flumpy
+
+import dials.util
+from dials.report.analysis import batch_dependent_properties
+from dials.util.benchmark import Column, best_time, make_phil_scope, report
+
+help_message = """
+
+Measure the time taken to calculate the batch-dependent statistics (Rmerge,
+I/sigma and scale vs batch) reported by dials.scale, dials.merge and
+dials.report, for synthetic data with increasing numbers of batches.
+
+Examples::
+
+  dev.dials.benchmark_batch_statistics
+
+  dev.dials.benchmark_batch_statistics n_batches=1000,10000 reflections_per_batch=50
+"""
+
+phil_scope = make_phil_scope(
+    """
+  n_batches = 1000 10000 100000
+    .type = ints(value_min=1)
+    .help = "The numbers of batches to benchmark"
+  reflections_per_batch = 20
+    .type = int(value_min=1)
+    .help = "The number of reflections in each batch"
+""",
+    seed=True,
+)
+
+
+def generate_batch_data(n_batches, reflections_per_batch, seed=0):
+    """
+    Generate synthetic intensities, batches and scales for the benchmark.
+
+    Returns:
+        A tuple of the batches, intensities (with sigmas) and scales, as miller
+        arrays.
+    """
+    rng = np.random.default_rng(seed)
+    n_refl = n_batches * reflections_per_batch
+    symmetry = crystal.symmetry(
+        unit_cell=(50, 60, 70, 90, 90, 90), space_group_symbol="P 21 21 21"
+    )
+    indices = rng.integers(-20, 21, size=(n_refl, 3), dtype=np.int32)
+    ms = miller.set(
+        symmetry, flumpy.miller_index_from_numpy(indices), anomalous_flag=False
+    )
+    intensities = rng.exponential(100.0, size=n_refl)
+    sigmas = np.sqrt(intensities + 1.0)
+    intensities = miller.array(
+        ms,
+        data=flumpy.from_numpy(rng.normal(intensities, sigmas)),
+        sigmas=flumpy.from_numpy(sigmas),
+    )
+    batches = miller.array(
+        ms,
+        data=flumpy.from_numpy(
+            rng.permutation(np.arange(n_refl, dtype=np.int32) % n_batches + 1)
+        ),
+    )
+    scales = miller.array(ms, data=flumpy.from_numpy(rng.uniform(0.5, 2.0, n_refl)))
+    return batches, intensities, scales
+
+
+@dials.util.show_mail_handle_errors()
+def run(args=None):
+    from dials.util.options import ArgumentParser
+
+    usage = "dev.dials.benchmark_batch_statistics [options]"
+
+    parser = ArgumentParser(usage=usage, phil=phil_scope, epilog=help_message)
+    params, options = parser.parse_args(args, show_diff_phil=True)
+
+    results = []
+    for n_batches in params.n_batches:
+        batches, intensities, scales = generate_batch_data(
+            n_batches, params.reflections_per_batch, params.seed
+        )
+        elapsed, (bins, _, _, _) = best_time(
+            batch_dependent_properties, params.repeats, batches, intensities, scales
+        )
+        assert len(bins) == n_batches
+        results.append(
+            {
+                "n_batches": n_batches,
+                "n_reflections": batches.size(),
+                "time": elapsed,
+            }
+        )
+
+    report(
+        results,
+        [
+            Column("batches", "n_batches"),
+            Column("reflections", "n_reflections"),
+            Column("time (s)", "time", ".3f"),
+        ],
+        params.output.json,
+    )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,192 @@
+# LIBTBX_SET_DISPATCHER_NAME dev.dials.benchmark_delta_cchalf
+
+from __future__ import annotations
+
+from collections import defaultdict
+
+import numpy as np
+
+from cctbx import crystal, miller, sgtbx, uctbx
+from dxtbx import flumpy
+
+import dials.util
+from dials.algorithms.statistics.delta_cchalf import (
+    PerGroupCChalfStatistics,
+    ReflectionSum,
+    compute_cchalf_from_reflection_sums,
+)
+from dials.array_family import flex
+from dials.util.benchmark import Column, best_time, make_phil_scope, report
+
+help_message = """
+
+Measure the time taken to calculate the CC½ with each group of reflections
+excluded in turn, as used by dials.compute_delta_cchalf and the ΔCC½ filtering
+in dials.scale, for synthetic data with increasing numbers of groups. The
+calculation is optionally compared against a direct calculation that updates
+the sums of every unique reflection for each group separately, checking that
+the two agree.
+
+Examples::
+
+  dev.dials.benchmark_delta_cchalf
+
+  dev.dials.benchmark_delta_cchalf n_groups=1000,10000 per_group=False
+"""
+
+phil_scope = make_phil_scope(
+    """
+  n_groups = 100 1000
+    .type = ints(value_min=2)
+    .help = "The numbers of groups to benchmark"
+  reflections_per_group = 500
+    .type = int(value_min=1)
+    .help = "The number of reflections in each group"
+  d_min = 3.0
+    .type = float(value_min=0)
+    .help = "The resolution limit of the generated reflections"
+  n_bins = 10
+    .type = int(value_min=1)
+    .help = "The number of resolution bins"
+  per_group = True
+    .type = bool
+    .help = "Also time the direct per-group calculation and compare the results"
+""",
+    seed=True,
+)
+
+unit_cell = uctbx.unit_cell((40, 50, 60, 90, 90, 90))
+space_group = sgtbx.space_group_info("P 2 2 2").group()
+
+
+def generate_group_data(n_groups, reflections_per_group, d_min=3.0, seed=0):
+    """
+    Generate a reflection table of noisy observations split into groups.
+
+    Returns:
+        A reflection table with miller_index, intensity, variance, group and
+        dataset columns, with each group a separate dataset.
+    """
+    rng = np.random.default_rng(seed)
+    indices = flumpy.to_numpy(
+        miller.build_set(
+            crystal.symmetry(unit_cell, space_group=space_group),
+            anomalous_flag=False,
+            d_min=d_min,
+        )
+        .expand_to_p1()
+        .indices()
+        .as_vec3_double()
+    ).astype(np.int32)
+    true_intensities = rng.exponential(100.0, size=len(indices))
+    n_refl = n_groups * reflections_per_group
+    selection = rng.integers(0, len(indices), size=n_refl)
+    group = np.repeat(np.arange(n_groups, dtype=np.int32), reflections_per_group)
+
+    table = flex.reflection_table()
+    table["miller_index"] = flumpy.miller_index_from_numpy(indices[selection])
+    table["intensity"] = flumpy.from_numpy(
+        rng.normal(true_intensities[selection], 10.0)
+    )
+    table["variance"] = flex.double(n_refl, 100.0)
+    table["group"] = flumpy.from_numpy(group)
+    table["dataset"] = flumpy.from_numpy(group.copy())
+    return table
+
+
+def cchalf_excluding_each_group_per_group(statistics):
+    """
+    Compute the CC½ with each group excluded, one group at a time.
+
+    For each group, the sums of every unique reflection are copied, the
+    contribution of the group removed, and the CC½ of the remaining data
+    computed from the resulting sums.
+
+    Returns:
+        A dictionary of the CC½ excluding each group.
+    """
+    table = statistics.reflection_table
+    reflection_sums = defaultdict(ReflectionSum)
+    group_lookup = defaultdict(list)
+    for h, x, g in zip(table["miller_index"], table["intensity"], table["group"]):
+        s = reflection_sums[h]
+        s.sum_x += x
+        s.sum_x2 += x**2
+        s.n += 1
+        group_lookup[g].append((h, x))
+
+    cchalf_i = {}
+    for group, observations in group_lookup.items():
+        index_lookup = defaultdict(list)
+        for h, x in observations:
+            index_lookup[h].append(x)
+        group_reflection_sums = {}
+        for h, s in reflection_sums.items():
+            sum_x, sum_x2, n = s.sum_x, s.sum_x2, s.n
+            for x in index_lookup.get(h, ()):
+                sum_x -= x
+                sum_x2 -= x**2
+                n -= 1
+            group_reflection_sums[h] = ReflectionSum(sum_x, sum_x2, n)
+        cchalf_i[group] = compute_cchalf_from_reflection_sums(
+            group_reflection_sums, statistics.binner
+        )
+    return cchalf_i
+
+
+def _vectorised(statistics):
+    statistics.run()
+    return statistics.cchalf_i()
+
+
+@dials.util.show_mail_handle_errors()
+def run(args=None):
+    from dials.util.options import ArgumentParser
+
+    usage = "dev.dials.benchmark_delta_cchalf [options]"
+
+    parser = ArgumentParser(usage=usage, phil=phil_scope, epilog=help_message)
+    params, options = parser.parse_args(args, show_diff_phil=True)
+
+    results = []
+    for n_groups in params.n_groups:
+        table = generate_group_data(
+            n_groups, params.reflections_per_group, params.d_min, params.seed
+        )
+        statistics = PerGroupCChalfStatistics(
+            table, unit_cell, space_group, n_bins=params.n_bins
+        )
+        elapsed, cchalf_i = best_time(_vectorised, params.repeats, statistics)
+        assert len(cchalf_i) == n_groups
+        result = {
+            "n_groups": n_groups,
+            "n_reflections": statistics.num_reflections(),
+            "time": elapsed,
+        }
+        if params.per_group:
+            per_group_elapsed, per_group_cchalf_i = best_time(
+                cchalf_excluding_each_group_per_group, params.repeats, statistics
+            )
+            result["per_group_time"] = per_group_elapsed
+            result["speedup"] = per_group_elapsed / elapsed
+            result["max_difference"] = max(
+                abs(cchalf_i[g] - per_group_cchalf_i[g]) for g in cchalf_i
+            )
+        results.append(result)
+
+    columns = [
+        Column("groups", "n_groups"),
+        Column("reflections", "n_reflections"),
+        Column("time (s)", "time", ".3f"),
+    ]
+    if params.per_group:
+        columns += [
+            Column("per-group time (s)", "per_group_time", ".3f"),
+            Column("speedup", "speedup", ".1f"),
+            Column("max difference", "max_difference", ".1e"),
+        ]
+    report(results, columns, params.output.json)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,125 @@
+# LIBTBX_SET_DISPATCHER_NAME dev.dials.benchmark_detect_blanks
+
+from __future__ import annotations
+
+import numpy as np
+
+from dxtbx import flumpy
+from dxtbx.model import Scan
+
+import dials.util
+from dials.array_family import flex
+from dials.command_line.report import StrongSpotsAnalyser
+from dials.util import detect_blanks
+from dials.util.ascii_art import spot_counts_per_image_plot
+from dials.util.benchmark import Column, best_time, make_phil_scope, report
+
+help_message = """
+
+Measure the time taken by the per-image analyses of dials.detect_blanks
+(counts and integrated I/sigma per image), the spot count per image plots of
+dials.report and the spot count histogram of dials.find_spots, for synthetic
+sweeps with increasing numbers of images.
+
+Examples::
+
+  dev.dials.benchmark_detect_blanks
+
+  dev.dials.benchmark_detect_blanks n_images=1000,10000 spots_per_image=50
+"""
+
+phil_scope = make_phil_scope(
+    """
+  n_images = 100 1000 10000
+    .type = ints(value_min=2)
+    .help = "The numbers of images to benchmark"
+  spots_per_image = 100
+    .type = int(value_min=1)
+    .help = "The average number of reflections on each image"
+""",
+    seed=True,
+)
+
+
+def generate_sweep(n_images, spots_per_image, seed=0):
+    """
+    Generate a synthetic sweep of integrated reflections for the benchmark.
+
+    Returns:
+        A tuple of the reflection table and scan.
+    """
+    rng = np.random.default_rng(seed)
+    n_refl = n_images * spots_per_image
+    scan = Scan(image_range=(1, n_images), oscillation=(0.0, 0.1))
+    xyz = np.column_stack(
+        (
+            rng.uniform(0, 2000, n_refl),
+            rng.uniform(0, 2000, n_refl),
+            rng.uniform(0, n_images, n_refl),
+        )
+    )
+    intensities = rng.exponential(100.0, n_refl)
+    reflections = flex.reflection_table()
+    reflections["xyzobs.px.value"] = flumpy.vec_from_numpy(xyz)
+    reflections["panel"] = flex.size_t(n_refl, 0)
+    reflections["id"] = flex.int(n_refl, 0)
+    reflections["intensity.sum.value"] = flumpy.from_numpy(intensities)
+    reflections["intensity.sum.variance"] = flumpy.from_numpy(intensities + 1.0)
+    reflections.set_flags(
+        flex.bool(n_refl, True),
+        reflections.flags.strong | reflections.flags.integrated_sum,
+    )
+    reflections.set_flags(
+        flumpy.from_numpy(rng.random(n_refl) < 0.8), reflections.flags.indexed
+    )
+    return reflections, scan
+
+
+@dials.util.show_mail_handle_errors()
+def run(args=None):
+    from dials.util.options import ArgumentParser
+
+    usage = "dev.dials.benchmark_detect_blanks [options]"
+
+    parser = ArgumentParser(usage=usage, phil=phil_scope, epilog=help_message)
+    params, options = parser.parse_args(args, show_diff_phil=True)
+
+    analyses = {
+        "blank_counts_analysis": lambda reflections, scan: (
+            detect_blanks.blank_counts_analysis(
+                reflections, scan, phi_step=2, fractional_loss=0.1
+            )
+        ),
+        "blank_integrated_analysis": lambda reflections, scan: (
+            detect_blanks.blank_integrated_analysis(
+                reflections, scan, phi_step=2, fractional_loss=0.1
+            )
+        ),
+        "spot_count_per_image": lambda reflections, scan: (
+            StrongSpotsAnalyser().spot_count_per_image(reflections)
+        ),
+        "spot_counts_per_image_plot": lambda reflections, scan: (
+            spot_counts_per_image_plot(reflections)
+        ),
+    }
+
+    results = []
+    for n_images in params.n_images:
+        reflections, scan = generate_sweep(
+            n_images, params.spots_per_image, params.seed
+        )
+        result = {"n_images": n_images, "n_reflections": reflections.size()}
+        for name, analysis in analyses.items():
+            result[name], _ = best_time(analysis, params.repeats, reflections, scan)
+        results.append(result)
+
+    report(
+        results,
+        [Column("images", "n_images"), Column("reflections", "n_reflections")]
+        + [Column(f"{name} (s)", name, ".3f") for name in analyses],
+        params.output.json,
+    )
+
+
+if __name__ == "__main__":
+    run()
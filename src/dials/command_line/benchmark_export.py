@@ -0,0 +1,190 @@
+# LIBTBX_SET_DISPATCHER_NAME dev.dials.benchmark_export
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import tempfile
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where peak memory use is not measured
+    resource = None
+
+import dials.util
+from dials.util.benchmark import Column, best_time, make_phil_scope, report
+
+help_message = """
+
+Measure the throughput and peak memory use of dials.export for the formats
+that are written incrementally (mtz, mmcif and xds_ascii), optionally for a
+range of chunk sizes. Each export is run in a new process, so that the peak
+memory use of each is measured separately; the times include reading the
+input files. The peak memory use is not measured on Windows.
+
+Examples::
+
+  dev.dials.benchmark_export scaled.expt scaled.refl
+
+  dev.dials.benchmark_export integrated.expt integrated.refl formats=mtz \\
+    chunk_size=10000,100000,1000000 intensity=sum
+"""
+
+phil_scope = make_phil_scope(
+    """
+  formats = *mtz *mmcif *xds_ascii
+    .type = choice(multi=True)
+    .help = "The export formats to benchmark"
+  chunk_size = None
+    .type = ints(value_min=1)
+    .help = "The chunk sizes to benchmark, by default the dials.export default"
+  intensity = *auto profile sum scale
+    .type = choice(multi=True)
+    .help = "The intensities to export, as for dials.export"
+""",
+    repeats=1,
+)
+
+# The parameter setting the output file of each format, and the file name
+output_files = {
+    "mtz": ("mtz.hklout", "benchmark.mtz"),
+    "mmcif": ("mmcif.hklout", "benchmark.cif"),
+    "xds_ascii": ("xds_ascii.hklout", "BENCHMARK.HKL"),
+}
+
+# Run a command, printing its peak memory use (ru_maxrss). This is run in a
+# new interpreter for each export, as RUSAGE_CHILDREN gives the largest peak
+# of any child process waited for so far.
+peak_memory_script = """
+import resource, subprocess, sys
+returncode = subprocess.call(
+    sys.argv[1:], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+)
+print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+sys.exit(returncode)
+"""
+
+
+def run_export(experiments, reflections, export_format, directory, options=None):
+    """
+    Run dials.export in a new process.
+
+    Args:
+        experiments: The path to the experiments file
+        reflections: The path to the reflections file
+        export_format: The format to export to
+        directory: The directory to write the output (and log) to
+        options: A list of additional dials.export parameters
+
+    Returns:
+        The peak memory use (in MB, or None if it can't be measured) and the
+        size of the output file (in MB).
+    """
+    parameter, filename = output_files[export_format]
+    output = os.path.join(directory, filename)
+    command = [
+        sys.executable,
+        "-m",
+        "dials.command_line.export",
+        experiments,
+        reflections,
+        f"format={export_format}",
+        f"{parameter}={output}",
+        f"output.log={os.path.join(directory, 'dials.export.log')}",
+    ] + (options or [])
+    process = subprocess.Popen(
+        [sys.executable, "-c", peak_memory_script] + command if resource else command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    stdout, _ = process.communicate()
+    if process.wait():
+        raise dials.util.Sorry(f"dials.export failed: {' '.join(command)}")
+    peak_memory = None
+    if resource:
+        # ru_maxrss is in kB on Linux, but bytes on macOS
+        peak_memory = int(stdout.splitlines()[-1]) / (
+            1024**2 if sys.platform == "darwin" else 1024
+        )
+    return peak_memory, os.path.getsize(output) / 1024**2
+
+
+@dials.util.show_mail_handle_errors()
+def run(args=None):
+    from dials.util.options import ArgumentParser
+
+    usage = "dev.dials.benchmark_export models.expt reflections.refl [options]"
+
+    parser = ArgumentParser(
+        usage=usage,
+        phil=phil_scope,
+        read_experiments=True,
+        read_reflections=True,
+        check_format=False,
+        epilog=help_message,
+    )
+    params, options = parser.parse_args(args, show_diff_phil=True)
+
+    if len(params.input.experiments) != 1 or len(params.input.reflections) != 1:
+        parser.print_help()
+        sys.exit("Exactly one experiment list and one reflection file required")
+    experiments = params.input.experiments[0].filename
+    reflections = params.input.reflections[0].filename
+    n_reflections = params.input.reflections[0].data.size()
+
+    export_options = []
+    if params.intensity and params.intensity != ["auto"]:
+        export_options.append("intensity=" + "+".join(params.intensity))
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for export_format in params.formats:
+            for chunk_size in params.chunk_size or [None]:
+                run_options = list(export_options)
+                if chunk_size:
+                    run_options.append(f"chunk_size={chunk_size}")
+                elapsed, (peak_memory, output_size) = best_time(
+                    run_export,
+                    params.repeats,
+                    experiments,
+                    reflections,
+                    export_format,
+                    directory,
+                    run_options,
+                )
+                results.append(
+                    {
+                        "format": export_format,
+                        "chunk_size": chunk_size,
+                        "time": elapsed,
+                        "reflections_per_second": n_reflections / elapsed,
+                        "peak_memory": peak_memory,
+                        "output_size": output_size,
+                    }
+                )
+
+    columns = [
+        Column("format", "format"),
+        Column("chunk size", "chunk_size", lambda size: str(size or "default")),
+        Column("time (s)", "time", ".2f"),
+        Column("reflections/s", "reflections_per_second", ".0f"),
+        Column("peak memory (MB)", "peak_memory", ".1f"),
+        Column("output (MB)", "output_size", ".1f"),
+    ]
+    if resource is None:
+        columns = [column for column in columns if column.key != "peak_memory"]
+
+    print(f"Benchmarked export of {n_reflections} reflections")
+    report(
+        results,
+        columns,
+        params.output.json,
+        n_reflections=n_reflections,
+    )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,96 @@
+# LIBTBX_SET_DISPATCHER_NAME dev.dials.benchmark_import_time
+
+from __future__ import annotations
+
+import pkgutil
+import subprocess
+import sys
+
+import dials.command_line
+import dials.util
+from dials.util.benchmark import Column, best_time, make_phil_scope, report
+
+help_message = """
+
+Measure the time taken to import the module behind each dials command, which
+is the fixed start-up cost paid on every invocation. Each module is imported
+in a fresh Python interpreter, and the best of several repeats is reported,
+along with the start-up time of the interpreter itself.
+
+Examples::
+
+  dev.dials.benchmark_import_time
+
+  dev.dials.benchmark_import_time commands=show,split_experiments repeats=5
+"""
+
+phil_scope = make_phil_scope(
+    """
+  commands = None
+    .type = strings
+    .help = "The commands to benchmark (e.g. show), by default all commands"
+"""
+)
+
+
+def import_time(module, repeats):
+    """Return the best time (in seconds) to import a module in a new interpreter."""
+    command = [sys.executable, "-c", f"import {module}" if module else "pass"]
+    elapsed, _ = best_time(
+        subprocess.run, repeats, command, check=True, capture_output=True
+    )
+    return elapsed
+
+
+def command_modules(commands=None):
+    """Get the names of the command line modules, by command name."""
+    modules = {
+        module.name: f"dials.command_line.{module.name}"
+        for module in pkgutil.iter_modules(dials.command_line.__path__)
+    }
+    if commands:
+        unknown = set(commands) - set(modules)
+        if unknown:
+            raise dials.util.Sorry(f"Unknown commands: {', '.join(sorted(unknown))}")
+        modules = {command: modules[command] for command in commands}
+    return modules
+
+
+@dials.util.show_mail_handle_errors()
+def run(args=None):
+    from dials.util.options import ArgumentParser
+
+    usage = "dev.dials.benchmark_import_time [options]"
+
+    parser = ArgumentParser(usage=usage, phil=phil_scope, epilog=help_message)
+    params, options = parser.parse_args(args, show_diff_phil=True)
+
+    modules = command_modules(params.commands)
+    baseline = import_time(None, params.repeats)
+    results = []
+    for command, module in modules.items():
+        try:
+            elapsed = import_time(module, params.repeats)
+        except subprocess.CalledProcessError:
+            print(f"Unable to import {module}")
+            continue
+        results.append(
+            {"command": command, "total": elapsed, "import": elapsed - baseline}
+        )
+    results.sort(key=lambda r: r["total"], reverse=True)
+
+    print(f"Python interpreter start-up time: {baseline:.3f}s")
+    report(
+        results,
+        [
+            Column("command", "command"),
+            Column("total (s)", "total", ".3f"),
+            Column("import (s)", "import", ".3f"),
+        ],
+        params.output.json,
+        baseline=baseline,
+    )
+
+
+if __name__ == "__main__":
+    run()
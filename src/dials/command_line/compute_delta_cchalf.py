@@ -77,6 +77,10 @@
     .type = float
     .help = "Datasets with a ΔCC½ below (mean - stdcutoff*std) are removed"
 
+  nproc = 1
+    .type = int(value_min=1)
+    .help = "The number of threads to use for computing the ΔCC½ values"
+
   output {
     log = 'dials.compute_delta_cchalf.log'
       .type = str
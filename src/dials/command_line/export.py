@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import concurrent.futures
+import copy
 import logging
 import sys
 
@@ -65,6 +67,9 @@
   dials.export models.expt integrated.refl format=nxs
   dials.export models.expt integrated.refl format=nxs nxs.hklout=integrated.nxs
 
+  # Export to mtz and mmcif, reading the input once
+  dials.export models.expt integrated.refl format=mtz+mmcif
+
   # Export to mmcif
   dials.export models.expt integrated.refl format=mmcif
   dials.export models.expt integrated.refl format=mmcif mmcif.hklout=integrated.mmcif
@@ -88,8 +93,10 @@
     """
 
   format = *mtz sadabs nxs mmcif mosflm xds xds_ascii json shelx pets
-    .type = choice
-    .help = "The output file format"
+    .type = choice(multi=True)
+    .help = "The output file format. Several formats may be given (e.g."
+            "format=mtz+mmcif), in which case the input is read once and each"
+            "of the output files written in turn, or concurrently if nproc > 1."
 
   intensity = *auto profile sum scale
     .type = choice(multi=True)
@@ -102,6 +109,19 @@
     .type = bool
     .help = "Output additional debugging information"
 
+  nproc = 1
+    .type = int(value_min=1)
+    .help = "The number of output formats to write concurrently, when exporting"
+            "to several formats."
+    .expert_level = 1
+
+  chunk_size = 100000
+    .type = int(value_min=1)
+    .help = "The number of reflections to convert and write at a time, for the"
+            "formats written incrementally (mtz, mmcif and xds_ascii). This"
+            "bounds the temporary memory used when exporting large datasets."
+    .expert_level = 2
+
   mtz {
 
     combine_partials = True
@@ -398,6 +418,7 @@ def export_mtz(params, experiments, reflections):
         crystal_name=params.mtz.crystal_name,
         project_name=params.mtz.project_name,
         wavelength_tolerance=params.mtz.wavelength_tolerance,
+        chunk_size=params.chunk_size,
     )
 
 
@@ -590,6 +611,79 @@ def export_pets(params, experiments, reflections):
     return
 
 
+exporters = {
+    "mtz": export_mtz,
+    "sadabs": export_sadabs,
+    "xds_ascii": export_xdsascii,
+    "nxs": export_nexus,
+    "mmcif": export_mmcif,
+    "mosflm": export_mosflm,
+    "xds": export_xds,
+    "json": export_json,
+    "shelx": export_shelx,
+    "pets": export_pets,
+}
+
+
+def _shallow_copy(reflections):
+    """
+    Make a new reflection table sharing the column data of a table, so that
+    columns can be added to or replaced in either without affecting the other.
+    """
+    from dials.array_family import flex
+
+    copied = flex.reflection_table()
+    for key in reflections.keys():
+        copied[key] = reflections[key]
+    identifiers = reflections.experiment_identifiers()
+    for id_ in identifiers.keys():
+        copied.experiment_identifiers()[id_] = identifiers[id_]
+    return copied
+
+
+def export_formats(params, experiments, reflections, formats, nproc=1):
+    """
+    Export the data to several formats, from a single read of the input.
+
+    Some exporters modify the experiment models, intensity choice or
+    reflection tables that they are given, so each is given its own copy of
+    these (copying only the structure of the reflection tables, not the column
+    data). The exports are then independent, and are run concurrently if
+    nproc > 1.
+
+    :param params: The phil parameters
+    :param experiments: The experiment list
+    :param reflections: The reflection tables
+    :param formats: The formats to export to
+    :param nproc: The number of exports to run concurrently
+    :returns: A dictionary of the exception raised by each failed export
+    """
+
+    def export(export_format):
+        exporter_params = copy.copy(params)
+        exporter_params.intensity = list(params.intensity)
+        exporter_reflections = [_shallow_copy(r) for r in reflections]
+        if export_format == "mosflm":
+            exporter_reflections = []
+        try:
+            exporters[export_format](
+                exporter_params, copy.deepcopy(experiments), exporter_reflections
+            )
+        except Exception as e:
+            return e
+
+    if nproc > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=nproc) as pool:
+            results = list(pool.map(export, formats))
+    else:
+        results = [export(export_format) for export_format in formats]
+    return {
+        export_format: error
+        for export_format, error in zip(formats, results)
+        if error is not None
+    }
+
+
 @show_mail_handle_errors()
 def run(args=None):
     from dials.util.options import (
@@ -669,27 +763,27 @@ def run(args=None):
                 + "+".join(params.intensity)
             )
 
-    # Choose the exporter
-    exporter = {
-        "mtz": export_mtz,
-        "sadabs": export_sadabs,
-        "xds_ascii": export_xdsascii,
-        "nxs": export_nexus,
-        "mmcif": export_mmcif,
-        "mosflm": export_mosflm,
-        "xds": export_xds,
-        "json": export_json,
-        "shelx": export_shelx,
-        "pets": export_pets,
-    }.get(params.format)
-    if not exporter:
+    # Choose the exporters
+    formats = list(dict.fromkeys(params.format))
+    if not formats or any(f not in exporters for f in formats):
         sys.exit(f"Unknown format: {params.format}")
 
-    # Export the data
-    try:
-        exporter(params, experiments, reflections)
-    except Exception as e:
-        logger.error(f"Error: {e}")
+    if len(formats) == 1:
+        # Export the data
+        try:
+            exporters[formats[0]](params, experiments, reflections)
+        except Exception as e:
+            logger.error(f"Error: {e}")
+            sys.exit(1)
+        return
+
+    # Export to each format from the data already read
+    errors = export_formats(
+        params, experiments, reflections, formats, nproc=params.nproc
+    )
+    for export_format, e in errors.items():
+        logger.error(f"Error exporting {export_format}: {e}")
+    if errors:
         sys.exit(1)
 
 
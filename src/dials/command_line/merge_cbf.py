@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 import binascii
+import collections
+import concurrent.futures
+import contextlib
 import sys
 
 import iotbx.phil
@@ -14,13 +17,19 @@
 a smaller number of images For example, running dials.merge_cbf on a experiments
 with 100 images, using the default value of merge_n_images=2, will output 50
 summed images, with every consecutive pair of images being summed into a single
-output image. Currently only cbf format images are supported as input.
+output image. Images of other formats (e.g. HDF5/NeXus) are read through the
+imageset, and written as cbf images with a miniCBF header. Alternatively, the
+summed images can be written to a single HDF5 file, as a bare "data" array
+without NeXus metadata, which cannot be imported by DIALS. The output images
+can be summed in parallel with nproc.
 
 Examples::
 
   dials.merge_cbf image_*.cbf
 
-  dials.merge_cbf image_*.cbf merge_n_images=10
+  dials.merge_cbf image_*.cbf merge_n_images=10 nproc=4
+
+  dials.merge_cbf image_master.h5 merge_n_images=10 output.format=hdf5
 """
 
 phil_scope = iotbx.phil.parse(
@@ -38,23 +47,39 @@
           "the CBF file"
   .expert_level = 2
 
+nproc = 1
+  .type = int(value_min=1)
+  .help = "The number of processes used to sum the images"
+
 output {
+  format = *cbf hdf5
+    .type = choice
+    .help = "Write each summed image to a cbf file, or all the summed images"
+            "to a single HDF5 file. The HDF5 file holds only a bare 'data'"
+            "array of the summed images, without the NeXus metadata (detector,"
+            "beam, scan etc.), so cannot be imported by DIALS."
   image_prefix = sum_
     .type = path
+  hdf5_file = sum.h5
+    .type = path
+    .help = "The output file, for output.format=hdf5"
 }
 """,
     process_includes=True,
 )
 
 
-def get_raw_data_from_file(imageset, i):
-    """Read cbf directly to access the raw data array rather than
-    through the imageset, in order to work for multi-panel detectors and other
-    situations where the format class modifies the raw array"""
-    file_name = imageset.get_image_identifier(i)
-    with open(file_name, "rb") as cbf:
-        data = cbf.read()
-    start_tag = binascii.unhexlify("0c1a04d5")
+# The tag marking the start of the binary section of a CBF file
+start_tag = binascii.unhexlify("0c1a04d5")
+
+
+def read_file(file_name):
+    with open(file_name, "rb") as f:
+        return f.read()
+
+
+def raw_data_from_cbf(data):
+    """Decompress the raw data array from the contents of a cbf file"""
     data_offset = data.find(start_tag) + 4
     cbf_header = data[: data_offset - 4].decode("latin-1")
     fast = slow = length = 0
@@ -71,144 +96,283 @@ def get_raw_data_from_file(imageset, i):
     return (values,)
 
 
-def merge_cbf(imageset, n_images, out_prefix="sum_", get_raw_data_from_imageset=True):
-    from dxtbx.format.FormatCBF import FormatCBF
+def get_raw_data_from_file(imageset, i):
+    """Read cbf directly to access the raw data array rather than
+    through the imageset, in order to work for multi-panel detectors and other
+    situations where the format class modifies the raw array"""
+    return raw_data_from_cbf(read_file(imageset.get_image_identifier(i)))
+
+
+def read_ahead(read, items, depth=2):
+    """Yield read(item) for each item, reading up to depth items ahead in a
+    background thread"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.submit(read, item))
+            if len(pending) > depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def sum_images(imageset, first, n_images, get_raw_data_from_imageset=True):
+    """Sum n_images consecutive images of a single panel imageset, starting
+    from the image first.
+
+    Returns:
+        A tuple of the summed data array and the contents of the first image
+        file, if it was read (only when get_raw_data_from_imageset is False)
+    """
+    indices = range(first, first + n_images)
+    first_file = None
+    if get_raw_data_from_imageset:
+        images = read_ahead(imageset.get_raw_data, indices)
+    else:
+        images = read_ahead(
+            read_file, (imageset.get_image_identifier(i) for i in indices)
+        )
 
-    assert issubclass(
-        imageset.get_format_class(), FormatCBF
-    ), "Only CBF format images supported"
+    data_out = None
+    for image in images:
+        if get_raw_data_from_imageset:
+            data_in = image
+        else:
+            if first_file is None:
+                first_file = image
+            data_in = raw_data_from_cbf(image)
+
+        assert len(data_in) == 1
+        data_in = data_in[0]
+        if data_out is None:
+            data_out = data_in
+        else:
+            # FIXME only add pixels to this which are > 0; image pixels < 0
+            # are meaningful and should be preserved;
+            # Achieved by setting -ve values here to 0 before +=
+            # This assumes that -ve values are constant over all images
+            data_special = data_in < 0
+            data_in.set_selected(data_special, 0)
+            data_out += data_in
+    return data_out, first_file
+
+
+def write_cbf_image(data, data_out, n_images, out_image):
+    """Write a summed image, with the header of the first cbf image of the sum
+    (given as the contents of its file) updated for the number of images"""
+    data_offset = data.find(start_tag)
+    cbf_header = data[:data_offset].decode("latin-1")
+
+    new_header = []
+    compressed = compress(data_out)
+
+    old_size = 0
+
+    for record in cbf_header.split("\n")[:-1]:
+        rsplit = record.split(" ")
+        if "X-Binary-Size:" in record:
+            old_size = int(record.split()[-1])
+            new_header.append(f"X-Binary-Size: {len(compressed)}\r\n")
+        elif "Content-MD5" in record:
+            pass
+        elif len(rsplit) > 3 and rsplit[1] in {
+            "Exposure_time",
+            "Angle_increment",
+            "Exposure_period",
+            "Count_cutoff",
+            "Phi_increment",
+            "Omega_increment",
+            "Chi_increment",
+        }:
+            if rsplit[1] == "Count_cutoff":  # needs to be an integer
+                new_header.append(
+                    "%s\n"
+                    % " ".join(
+                        rsplit[:2] + ["%d" % (n_images * int(rsplit[2]))] + rsplit[3:]
+                    )
+                )
+            else:
+                new_header.append(
+                    "%s\n"
+                    % " ".join(
+                        rsplit[:2] + ["%f" % (n_images * float(rsplit[2]))] + rsplit[3:]
+                    )
+                )
+
+        else:
+            new_header.append(f"{record}\n")
+
+    loop_lines = [
+        n for n, record in enumerate(new_header) if record.startswith("loop_")
+    ]
+    multiply_fields = {
+        "_diffrn_scan_axis.angle_range",
+        "_diffrn_scan_axis.angle_increment",
+        "_diffrn_scan_axis.displacement_range",
+        "_diffrn_scan_axis.displacement_increment",
+        "_diffrn_scan_frame.integration_time",
+        "_diffrn_scan_frame.exposure_time",
+        "_array_intensities.overload",
+    }
+    for loop_start in loop_lines:
+        n = loop_start
+        modifiers = []
+        while True:
+            n = n + 1
+            line = new_header[n].strip()
+            if line in {"", ";"}:  # end of loop
+                break
+            elif line.startswith("_"):  # loop header
+                if line in multiply_fields:
+                    modifiers.append(n_images)
+                else:
+                    modifiers.append(None)
+            elif any(modifiers):  # loop body
+                # NOTE: This can break when fields are modified in loops with
+                #   'Strings with spaces, as they are seen as multiple columns, or with'
+                #   _multiple _columns _defined _on _same _line _they _are _seen _as _one _column
+                new_line = [
+                    (element if modifier is None else f"{float(element) * modifier:f}")
+                    for modifier, element in zip(modifiers, line.split())
+                ]
+                new_header[n] = f"{' '.join(new_line)}\r\n"
+
+    tailer = data[data_offset + 4 + old_size :]
+
+    with open(out_image, "wb") as f:
+        f.write("".join(new_header).encode("latin-1"))
+        f.write(start_tag)
+        f.write(compressed)
+        f.write(tailer)
+
+
+def write_mini_cbf_image(imageset, first, n_images, data_out, out_image):
+    """Write a summed image of a non-cbf imageset, with a miniCBF header"""
+    from dxtbx.format.FormatCBFMini import FormatCBFMini
+
+    scan = imageset.get_scan()
+    if scan is not None:
+        scan = scan[first : first + 1]
+        start, width = scan.get_oscillation()
+        scan.set_oscillation((start, width * n_images))
+        scan.set_exposure_times(scan.get_exposure_times() * n_images)
+    FormatCBFMini.as_file(
+        imageset.get_detector(),
+        imageset.get_beam(),
+        imageset.get_goniometer(),
+        scan,
+        data_out,
+        out_image,
+    )
 
-    assert len(imageset) >= n_images
 
-    n_output_images = len(imageset) // n_images
+# The state of each worker process, set by _init_worker
+_worker = {}
 
-    n_digits = len(str(n_output_images))
 
-    for i_out in range(n_output_images):
-        data_out = None
+def _init_worker(imageset, n_images, get_raw_data_from_imageset, is_cbf):
+    _worker.update(
+        imageset=imageset,
+        n_images=n_images,
+        get_raw_data_from_imageset=get_raw_data_from_imageset,
+        is_cbf=is_cbf,
+    )
 
-        for j in range(n_images):
-            i_in = (i_out * n_images) + j
 
-            if get_raw_data_from_imageset:
-                data_in = imageset.get_raw_data(i_in)
-            else:
-                data_in = get_raw_data_from_file(imageset, i_in)
+def _merge_output_image(i_out, out_image=None):
+    """Sum the images of an output image, and write it to out_image if given,
+    otherwise return the summed data as a numpy array"""
+    imageset = _worker["imageset"]
+    n_images = _worker["n_images"]
+    first = i_out * n_images
+    data_out, first_file = sum_images(
+        imageset, first, n_images, _worker["get_raw_data_from_imageset"]
+    )
+    if out_image is None:
+        return data_out.as_numpy_array()
+    if _worker["is_cbf"]:
+        if first_file is None:
+            first_file = read_file(imageset.get_path(first))
+        write_cbf_image(first_file, data_out, n_images, out_image)
+    else:
+        write_mini_cbf_image(imageset, first, n_images, data_out, out_image)
+    return out_image
+
+
+def merge_cbf(
+    imageset,
+    n_images,
+    out_prefix="sum_",
+    get_raw_data_from_imageset=True,
+    nproc=1,
+    output_format="cbf",
+    hdf5_file="sum.h5",
+):
+    """Sum every n_images consecutive images of an imageset.
+
+    Each output image is summed (reading its input images ahead in a
+    background thread) and, for cbf output, written by a worker process.
+    Images of formats other than cbf are read through the imageset, and
+    written as cbf with a miniCBF header. Alternatively all the summed images
+    may be written to a single chunked HDF5 file.
+    """
+    from dxtbx.format.FormatCBF import FormatCBF
 
-            assert len(data_in) == 1
-            data_in = data_in[0]
-            if data_out is None:
-                data_out = data_in
-            else:
-                # FIXME only add pixels to this which are > 0; image pixels < 0
-                # are meaningful and should be preserved;
-                # Achieved by setting -ve values here to 0 before +=
-                # This assumes that -ve values are constant over all images
-                data_special = data_in < 0
-                data_in.set_selected(data_special, 0)
-                data_out += data_in
-
-        out_image = "{prefix}{number:0{digits}d}.cbf".format(
-            prefix=out_prefix, number=i_out + 1, digits=n_digits
-        )
+    is_cbf = issubclass(imageset.get_format_class(), FormatCBF)
+    assert (
+        is_cbf or get_raw_data_from_imageset
+    ), "Only cbf images can be read directly from the file"
 
-        start_tag = binascii.unhexlify("0c1a04d5")
-
-        with open(imageset.get_path(i_out * n_images), "rb") as fh:
-            data = fh.read()
-        data_offset = data.find(start_tag)
-        cbf_header = data[:data_offset].decode("latin-1")
-
-        new_header = []
-        compressed = compress(data_out)
-
-        old_size = 0
-
-        for record in cbf_header.split("\n")[:-1]:
-            rsplit = record.split(" ")
-            if "X-Binary-Size:" in record:
-                old_size = int(record.split()[-1])
-                new_header.append(f"X-Binary-Size: {len(compressed)}\r\n")
-            elif "Content-MD5" in record:
-                pass
-            elif len(rsplit) > 3 and rsplit[1] in {
-                "Exposure_time",
-                "Angle_increment",
-                "Exposure_period",
-                "Count_cutoff",
-                "Phi_increment",
-                "Omega_increment",
-                "Chi_increment",
-            }:
-                if rsplit[1] == "Count_cutoff":  # needs to be an integer
-                    new_header.append(
-                        "%s\n"
-                        % " ".join(
-                            rsplit[:2]
-                            + ["%d" % (n_images * int(rsplit[2]))]
-                            + rsplit[3:]
-                        )
-                    )
-                else:
-                    new_header.append(
-                        "%s\n"
-                        % " ".join(
-                            rsplit[:2]
-                            + ["%f" % (n_images * float(rsplit[2]))]
-                            + rsplit[3:]
-                        )
-                    )
+    assert len(imageset) >= n_images
 
-            else:
-                new_header.append(f"{record}\n")
+    n_output_images = len(imageset) // n_images
 
-        loop_lines = [
-            n for n, record in enumerate(new_header) if record.startswith("loop_")
+    n_digits = len(str(n_output_images))
+
+    if output_format == "hdf5":
+        out_images = [None] * n_output_images
+    else:
+        out_images = [
+            "{prefix}{number:0{digits}d}.cbf".format(
+                prefix=out_prefix, number=i_out + 1, digits=n_digits
+            )
+            for i_out in range(n_output_images)
         ]
-        multiply_fields = {
-            "_diffrn_scan_axis.angle_range",
-            "_diffrn_scan_axis.angle_increment",
-            "_diffrn_scan_axis.displacement_range",
-            "_diffrn_scan_axis.displacement_increment",
-            "_diffrn_scan_frame.integration_time",
-            "_diffrn_scan_frame.exposure_time",
-            "_array_intensities.overload",
-        }
-        for loop_start in loop_lines:
-            n = loop_start
-            modifiers = []
-            while True:
-                n = n + 1
-                line = new_header[n].strip()
-                if line in {"", ";"}:  # end of loop
-                    break
-                elif line.startswith("_"):  # loop header
-                    if line in multiply_fields:
-                        modifiers.append(n_images)
-                    else:
-                        modifiers.append(None)
-                elif any(modifiers):  # loop body
-                    # NOTE: This can break when fields are modified in loops with
-                    #   'Strings with spaces, as they are seen as multiple columns, or with'
-                    #   _multiple _columns _defined _on _same _line _they _are _seen _as _one _column
-                    new_line = [
-                        (
-                            element
-                            if modifier is None
-                            else f"{float(element) * modifier:f}"
-                        )
-                        for modifier, element in zip(modifiers, line.split())
-                    ]
-                    new_header[n] = f"{' '.join(new_line)}\r\n"
-
-        tailer = data[data_offset + 4 + old_size :]
-
-        with open(out_image, "wb") as f:
-            f.write("".join(new_header).encode("latin-1"))
-            f.write(start_tag)
-            f.write(compressed)
-            f.write(tailer)
-        print(f"{out_image} written")
+
+    initargs = (imageset, n_images, get_raw_data_from_imageset, is_cbf)
+    with contextlib.ExitStack() as stack:
+        if nproc > 1:
+            pool = stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(
+                    max_workers=nproc, initializer=_init_worker, initargs=initargs
+                )
+            )
+            results = pool.map(_merge_output_image, range(n_output_images), out_images)
+        else:
+            _init_worker(*initargs)
+            results = map(_merge_output_image, range(n_output_images), out_images)
+
+        if output_format == "hdf5":
+            import h5py
+            import hdf5plugin
+
+            dataset = None
+            h5 = stack.enter_context(h5py.File(hdf5_file, "w"))
+            for i_out, data_out in enumerate(results):
+                if dataset is None:
+                    dataset = h5.create_dataset(
+                        "data",
+                        shape=(n_output_images,) + data_out.shape,
+                        dtype=data_out.dtype,
+                        chunks=(1,) + data_out.shape,
+                        compression=hdf5plugin.LZ4(),
+                    )
+                    dataset.attrs["merge_n_images"] = n_images
+                dataset[i_out] = data_out
+            print(f"{n_output_images} summed images written to {hdf5_file}")
+        else:
+            for out_image in results:
+                print(f"{out_image} written")
 
 
 @dials.util.show_mail_handle_errors()
@@ -249,6 +413,9 @@ def run(args=None):
         n_images,
         out_prefix=out_prefix,
         get_raw_data_from_imageset=params.get_raw_data_from_imageset,
+        nproc=params.nproc,
+        output_format=params.output.format,
+        hdf5_file=params.output.hdf5_file,
     )
 
 
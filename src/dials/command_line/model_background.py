@@ -3,15 +3,18 @@
 cases, such as in the presence of ice rings. The method is described in the
 publication https://doi.org/10.1107/S2052252517010259.
 
+The images are accumulated over integration.mp.nproc processes, which are
+also used to filter the model in blocks of columns.
+
 Usage:
     dials.model_background integrated.expt
+    dials.model_background integrated.expt integration.mp.nproc=8
     dials.integrate integrated.expt refined.refl background.algorithm=gmodel gmodel.robust.algorithm=True gmodel.model=background.pickle
 """
 
 from __future__ import annotations
 
 import logging
-import pickle
 import sys
 
 from libtbx.phil import parse
@@ -28,7 +31,10 @@
   output {
     model = 'background.pickle'
       .type = str
-      .help = "The output filename"
+      .help = "The output filename. A memory-mappable copy of the model, which is"
+              "shared by the processes of dials.integrate, is written alongside"
+              "as a .npy file for each panel, described by a file with the"
+              "extension .json added."
 
     log = 'dials.model_background.log'
       .type = str
@@ -222,14 +228,6 @@ def run(self, args=None):
         # Configure the logging
         dials.util.log.config(verbosity=options.verbose, logfile=params.output.log)
 
-        if params.integration.mp.nproc != 1 or params.integration.mp.njobs != 1:
-            # https://github.com/dials/dials/issues/1083
-            logger.warning(
-                "Multiprocessing is currently disabled. " "Setting nproc = njobs = 1"
-            )
-            params.integration.mp.nproc = 1
-            params.integration.mp.njobs = 1
-
         from dials.util.version import dials_version
 
         logger.info(dials_version())
@@ -277,12 +275,12 @@ def run(self, args=None):
         # Save the background model
         logger.info("Saving background model to %s", params.output.model)
         from dials.algorithms.background.gmodel import StaticBackgroundModel
+        from dials.algorithms.background.gmodel.algorithm import save_model
 
         static_model = StaticBackgroundModel()
         for m in model:
             static_model.add(m.model)
-        with open(params.output.model, "wb") as outfile:
-            pickle.dump(static_model, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        save_model(static_model, params.output.model)
 
         # Output some diagnostic images
         image_generator = ImageGenerator(model)
@@ -2,9 +2,8 @@
 
 import sys
 
-import pkg_resources
-
 import dials.util
+from dials.util.entry_points import entry_points
 
 BOLD = "\033[1m"
 RED = "\033[1;31m"
@@ -18,7 +17,7 @@ def read_entry_point(entry_point):
 
     :return: A dictionary of entry point plugins
     """
-    return {e.name: e for e in pkg_resources.iter_entry_points(entry_point)}
+    return {e.name: e for e in entry_points(entry_point)}
 
 
 def installation_is_valid():
@@ -66,7 +65,7 @@ def run(_=None):
         plugins = read_entry_point(ep)
         for p in sorted(plugins):
             print(
-                f" {GREEN}{p} {NC}({plugins[p].module_name} via {BOLD}{plugins[p].dist.project_name}{NC} {plugins[p].dist.version})"
+                f" {GREEN}{p} {NC}({plugins[p].module} via {BOLD}{plugins[p].dist.name}{NC} {plugins[p].dist.version})"
             )
         required_plugins = set(ep_dict.get("required", []))
         missing_plugins = required_plugins - set(plugins)
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import concurrent.futures
+import contextlib
 import copy
+import hashlib
 import itertools
 import json
 import math
+import os
+import tempfile
 
 import numpy as np
 
@@ -23,6 +28,8 @@
 from dials.report.plots import i_over_sig_i_vs_i_plot
 from dials.util import show_mail_handle_errors
 from dials.util.command_line import Command
+from dials.util.histogram import counts_per_image
+from dials.util.version import dials_version
 
 RAD2DEG = 180 / math.pi
 
@@ -44,6 +51,8 @@
   dials.report refined.expt
 
   dials.report integrated.refl integrated.expt
+
+  dials.report integrated.refl integrated.expt nproc=4 cache.directory=report_cache
 """
 
 # Create the phil parameters
@@ -68,6 +77,21 @@
   pixels_per_bin = 40
     .type = int(value_min=1)
 
+  nproc = 1
+    .type = int(value_min=1)
+    .help = "The number of processes used to analyse the reflections, running"
+            "the independent analyses concurrently."
+
+  cache {
+    directory = None
+      .type = path
+      .help = "If set, store the results of analysing the reflections in this"
+              "directory, keyed on a hash of the input files and the analysis"
+              "parameters, so that regenerating the report from the same input"
+              "(e.g. with different output options) reuses the results."
+      .expert_level = 1
+  }
+
   centroid_diff_max = None
     .help = "Magnitude in pixels of shifts mapped to the extreme colours"
             "in the heatmap plots centroid_diff_x and centroid_diff_y"
@@ -441,8 +465,14 @@ class StrongSpotsAnalyser:
     def __init__(self, pixels_per_bin=10):
         self.pixels_per_bin = pixels_per_bin
 
-        # Set the required fields
+        # Set the required fields, and all of the fields used
         self.required = ["xyzobs.px.value", "panel"]
+        self.columns = self.required + [
+            "intensity.sum.variance",
+            "flags",
+            "id",
+            "imageset_id",
+        ]
 
     def __call__(self, rlist):
         """Analyse the strong spots."""
@@ -455,7 +485,7 @@ def __call__(self, rlist):
         if "intensity.sum.variance" in rlist:
             selection = rlist["intensity.sum.variance"] <= 0
             if selection.count(True) > 0:
-                rlist.del_selected(selection)
+                rlist = rlist.select(~selection)
                 print(
                     " Removing %d reflections with variance <= 0"
                     % selection.count(True)
@@ -498,21 +528,17 @@ def spot_count_per_image(self, rlist):
             ids = rlist["imageset_id"]
         else:
             ids = rlist["id"]
-        spot_count_per_image = []
-        indexed_per_image = []
-        for j in range(flex.max(ids) + 1):
-            spot_count_per_image.append([])
-            ids_sel = ids == j
-            zsel = z.select(ids_sel)
-            for i in range(max_z):
-                sel = (zsel >= i) & (zsel < (i + 1))
-                spot_count_per_image[j].append(sel.count(True))
-            if n_indexed > 0:
-                indexed_per_image.append([])
-                zsel = z.select(ids_sel & indexed_sel)
-                for i in range(max_z):
-                    sel = (zsel >= i) & (zsel < (i + 1))
-                    indexed_per_image[j].append(sel.count(True))
+        z_values = z.as_numpy_array()
+        id_values = ids.as_numpy_array()
+        indexed_values = indexed_sel.as_numpy_array()
+        n_ids = flex.max(ids) + 1
+        spot_count_per_image = counts_per_image(
+            z_values, max_z, id_values, n_ids
+        ).tolist()
+        if n_indexed > 0:
+            indexed_per_image = counts_per_image(
+                z_values[indexed_values], max_z, id_values[indexed_values], n_ids
+            ).tolist()
 
         d = {
             "spot_count_per_image": {
@@ -560,13 +586,12 @@ def spot_count_per_image(self, rlist):
         if indexed_sel.count(True) > 0 and flex.max(rlist["id"]) > 0:
             # multiple lattices
             ids = rlist["id"]
-            indexed_per_lattice_per_image = []
-            for j in range(flex.max(ids) + 1):
-                indexed_per_lattice_per_image.append([])
-                zsel = z.select((ids == j) & indexed_sel)
-                for i in range(max_z):
-                    sel = (zsel >= i) & (zsel < (i + 1))
-                    indexed_per_lattice_per_image[j].append(sel.count(True))
+            indexed_per_lattice_per_image = counts_per_image(
+                z_values[indexed_values],
+                max_z,
+                ids.as_numpy_array()[indexed_values],
+                flex.max(ids) + 1,
+            ).tolist()
 
             d["indexed_per_lattice_per_image"] = {
                 "data": [],
@@ -686,6 +711,7 @@ def __init__(self, grid_size=None, pixels_per_bin=10, centroid_diff_max=1.5):
             "xyzcal.mm",
             "xyzobs.mm.value",
         ]
+        self.columns = self.required + ["partiality", "flags"]
 
     def __call__(self, rlist):
         """Analyse the reflection centroids."""
@@ -697,14 +723,14 @@ def __call__(self, rlist):
         # Remove I_sigma <= 0
         selection = rlist["intensity.sum.variance"] <= 0
         if selection.count(True) > 0:
-            rlist.del_selected(selection)
+            rlist = rlist.select(~selection)
             print(" Removing %d reflections with variance <= 0" % selection.count(True))
 
         # Remove partial reflections as their observed centroids won't be accurate
         if "partiality" in rlist:
             selection = rlist["partiality"] < 0.99
             if selection.count(True) > 0 and selection.count(True) < selection.size():
-                rlist.del_selected(selection)
+                rlist = rlist.select(~selection)
                 print(" Removing %d partial reflections" % selection.count(True))
 
         # Select only integrated reflections
@@ -1214,6 +1240,13 @@ def __init__(self, grid_size=None, pixels_per_bin=10):
 
         # Set the required fields
         self.required = ["intensity.sum.value", "intensity.sum.variance", "xyzcal.px"]
+        self.columns = self.required + [
+            "intensity.prf.value",
+            "intensity.prf.variance",
+            "partiality",
+            "qe",
+            "flags",
+        ]
 
     def __call__(self, rlist):
         """Analyse the reflection centroids."""
@@ -1226,12 +1259,12 @@ def __call__(self, rlist):
 
         selection = rlist["intensity.sum.variance"] <= 0
         if selection.count(True) > 0:
-            rlist.del_selected(selection)
+            rlist = rlist.select(~selection)
             print(" Removing %d reflections with variance <= 0" % selection.count(True))
 
         selection = rlist["intensity.sum.value"] <= 0
         if selection.count(True) > 0:
-            rlist.del_selected(selection)
+            rlist = rlist.select(~selection)
             print(
                 " Removing %d reflections with intensity <= 0" % selection.count(True)
             )
@@ -1505,12 +1538,12 @@ def __call__(self, rlist, experiments):
 
         selection = rlist["intensity.sum.variance"] <= 0
         if selection.count(True) > 0:
-            rlist.del_selected(selection)
+            rlist = rlist.select(~selection)
             print(" Removing %d reflections with variance <= 0" % selection.count(True))
 
         selection = rlist["intensity.sum.value"] <= 0
         if selection.count(True) > 0:
-            rlist.del_selected(selection)
+            rlist = rlist.select(~selection)
             print(
                 " Removing %d reflections with intensity <= 0" % selection.count(True)
             )
@@ -1741,6 +1774,7 @@ def __init__(self, grid_size=None, pixels_per_bin=10):
             "xyzcal.px",
             "profile.correlation",
         ]
+        self.columns = self.required + ["d", "flags"]
 
     def __call__(self, rlist):
         """Analyse the reference profiles."""
@@ -2077,6 +2111,69 @@ def reflection_corr_vs_ios(self, rlist, filename):
         }
 
 
+def file_digest(filenames):
+    """Calculate a sha256 hash of the content of a list of files."""
+    digest = hashlib.sha256()
+    for filename in filenames:
+        with open(filename, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """A directory of analysis results, stored as json, keyed on a hash."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def key(*args):
+        """Make a cache key from the input hash and analysis parameters."""
+        return hashlib.sha256(
+            repr((dials_version(),) + args).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key):
+        """Get the cached result for a key, or None if there is none."""
+        try:
+            with open(
+                os.path.join(self.directory, key + ".json"), encoding="utf-8"
+            ) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        """Store a result, if it can be serialised as json."""
+        try:
+            text = json.dumps(result)
+        except (TypeError, ValueError):
+            return
+        ensure_directory(self.directory)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, os.path.join(self.directory, key + ".json"))
+
+
+def select_columns(rlist, columns):
+    """
+    Make a reflection table of those of the columns present in rlist, sharing
+    the column data, so that an analysis need only be given the data it uses.
+    """
+    selected = flex.reflection_table()
+    for key in columns:
+        if key in rlist:
+            selected[key] = rlist[key]
+    return selected
+
+
+def run_analyser(analyser, rlist):
+    """Run an analyser on a reflection table (in a separate process)."""
+    return analyser(rlist)
+
+
 def merging_stats_data(reflections, experiments):
     reflections["intensity"] = reflections["intensity.scale.value"]
     reflections["variance"] = reflections["intensity.scale.variance"]
@@ -2114,9 +2211,19 @@ def merging_stats_data(reflections, experiments):
 class Analyser:
     """Helper class to do all the analysis."""
 
-    def __init__(self, params, grid_size=None, centroid_diff_max=1.5):
-        """Setup the analysers."""
+    def __init__(self, params, grid_size=None, centroid_diff_max=1.5, input_hash=None):
+        """
+        Setup the analysers.
+
+        If an input_hash (identifying the input files) is given, and a cache
+        directory is set in the parameters, the results of the analyses are
+        stored in and reused from the cache.
+        """
         self.params = params
+        self.cache = None
+        if input_hash and params.cache.directory:
+            self.cache = ResultCache(params.cache.directory)
+        self.input_hash = input_hash
         self.analysers = [
             StrongSpotsAnalyser(pixels_per_bin=self.params.pixels_per_bin),
             CentroidAnalyser(
@@ -2134,17 +2241,73 @@ def __init__(self, params, grid_size=None, centroid_diff_max=1.5):
 
     def __call__(self, rlist=None, experiments=None):
         """Do all the analysis."""
-        json_data = {}
-
-        if rlist is not None:
-            for analyse in self.analysers:
-                result = analyse(copy.deepcopy(rlist))
+        json_data = {"strong": {}, "centroid": {}, "intensity": {}, "reference": {}}
+        with contextlib.ExitStack() as stack:
+            pool = None
+            if rlist is not None and self.params.nproc > 1:
+                pool = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.params.nproc
+                    )
+                )
+            analyses = []
+            if rlist is not None:
+                analyses = [self.start_analysis(a, rlist, pool) for a in self.analysers]
+            crystal_table, expt_geom_table = self.analyse_experiments(
+                json_data, rlist, experiments
+            )
+            for key, result in analyses:
+                if isinstance(result, concurrent.futures.Future):
+                    result = result.result()
+                    if self.cache:
+                        self.cache.put(key, result)
                 if result is not None:
                     json_data.update(result)
-        else:
-            json_data.update(
-                {"strong": {}, "centroid": {}, "intensity": {}, "reference": {}}
+        self.write_output(json_data, crystal_table, expt_geom_table)
+
+    def start_analysis(self, analyser, rlist, pool=None):
+        """
+        Start an analysis of the reflections, on only the columns it uses.
+
+        Returns the cache key and either the (cached) result, or if a process
+        pool is given, a future for the result.
+        """
+        key = None
+        if self.cache:
+            key = self.cache.key(
+                self.input_hash, type(analyser).__name__, sorted(vars(analyser).items())
             )
+            result = self.cache.get(key)
+            if result is not None:
+                print(f"Using cached {type(analyser).__name__} results")
+                return key, result
+        rlist = select_columns(rlist, analyser.columns)
+        if pool:
+            return key, pool.submit(run_analyser, analyser, rlist)
+        result = analyser(rlist)
+        if self.cache:
+            self.cache.put(key, result)
+        return key, result
+
+    def merging_stats_data(self, rlist, experiments):
+        """Calculate the merging statistics plots, using the cache if possible."""
+        key = None
+        if self.cache:
+            key = self.cache.key(self.input_hash, "merging_stats_data")
+            result = self.cache.get(key)
+            if result is not None:
+                print("Using cached merging statistics")
+                return tuple(result)
+        result = merging_stats_data(rlist, experiments)
+        if self.cache:
+            self.cache.put(key, result)
+        return result
+
+    def analyse_experiments(self, json_data, rlist, experiments):
+        """
+        Do the analysis of the models, and the merging statistics, adding the
+        results to json_data. Returns the crystal and geometry tables.
+        """
 
         crystal_table = None
         expt_geom_table = None
@@ -2187,7 +2350,7 @@ def __call__(self, rlist=None, experiments=None):
                             batch_plots,
                             image_range_tables,
                             scaling_tables,
-                        ) = merging_stats_data(rlist, experiments)
+                        ) = self.merging_stats_data(rlist, experiments)
                     except DialsMergingStatisticsError as e:
                         print(f"Error merging stats data: {e}")
                     else:
@@ -2199,6 +2362,10 @@ def __call__(self, rlist=None, experiments=None):
                         json_data["scaling_tables"] = scaling_tables
                         json_data["image_range_tables"] = image_range_tables
 
+        return crystal_table, expt_geom_table
+
+    def write_output(self, json_data, crystal_table=None, expt_geom_table=None):
+        """Write the html report and json data."""
         if self.params.output.html is not None:
             from jinja2 import ChoiceLoader, Environment, PackageLoader
 
@@ -2460,11 +2627,20 @@ def run(self, args=None):
             params.input.reflections, params.input.experiments
         )
 
+        # Identify the input by its content, to look up cached results
+        input_hash = None
+        if params.cache.directory:
+            input_hash = file_digest(
+                [r.filename for r in params.input.reflections]
+                + [e.filename for e in params.input.experiments]
+            )
+
         # Analyse the reflections
         analyse = Analyser(
             params,
             grid_size=params.grid_size,
             centroid_diff_max=params.centroid_diff_max,
+            input_hash=input_hash,
         )
         if len(reflections):
             reflections = reflections[0]
@@ -2,6 +2,7 @@
 
 import cmath
 import concurrent.futures
+import contextlib
 import copy
 import itertools
 import json
@@ -89,6 +90,12 @@
       .help = "Modify the coarseness of the wide grid search for "
               "the beam centre."
       .type = float(value_min=0)
+    wide_search_coarse_factor = 1
+      .help = "If greater than 1, first score every n-th point of the wide"
+              "search grid, and then score the full grid only within n points"
+              "of the best of these."
+      .type = int(value_min=1)
+      .expert_level = 2
     n_macro_cycles = 1
       .type = int
       .help = "Number of macro cycles for an iterative beam centre search."
@@ -278,9 +285,16 @@ def optimize_origin_offset_local_scope(
     mm_search_scope=4,
     wide_search_binning=1,
     plot_search_scope=False,
+    nproc=1,
+    wide_search_coarse_factor=1,
 ):
     """Local scope: find the optimal origin-offset closest to the current
-    overall detector position (local minimum, simple minimization)"""
+    overall detector position (local minimum, simple minimization)
+
+    The points of the wide search grid are scored in tiles, in parallel over
+    the tiles and experiments if nproc > 1. If wide_search_coarse_factor is
+    greater than 1, only every n-th point of the grid is scored at first,
+    followed by the full grid around the best of these points."""
 
     beam = experiments[0].beam
     s0 = matrix.col(beam.get_s0())
@@ -302,42 +316,63 @@ def optimize_origin_offset_local_scope(
         grid = max(1, int(mm_search_scope / plot_px_sz))
         widegrid = 2 * grid + 1
 
-        def get_experiment_score_for_coord(x, y):
-            new_origin_offset = x * plot_px_sz * beamr1 + y * plot_px_sz * beamr2
-            return sum(
-                _get_origin_offset_score(
-                    new_origin_offset,
-                    solution_lists[i],
-                    amax_lists[i],
-                    reflection_lists[i],
-                    experiment,
-                )
-                for i, experiment in enumerate(experiments)
+        scorers = [
+            _OriginOffsetScorer(
+                experiment, reflection_lists[i], solution_lists[i], amax_lists[i]
             )
-
-        scores = flex.double(
-            get_experiment_score_for_coord(x, y)
-            for y in range(-grid, grid + 1)
-            for x in range(-grid, grid + 1)
-        )
-
-        def igrid(x):
-            return x - (widegrid // 2)
-
-        idxs = [igrid(i) * plot_px_sz for i in range(widegrid)]
+            for i, experiment in enumerate(experiments)
+        ]
+        basis = np.array([beamr1.elems, beamr2.elems]) * plot_px_sz
+        idxs = np.arange(-grid, grid + 1)
+
+        # The scores of the grid points, indexed by [y, x], NaN if not scored
+        scores = np.full((widegrid, widegrid), np.nan)
+
+        def score_points(iy, ix, pool):
+            offsets = np.column_stack((idxs[ix], idxs[iy])) @ basis
+            scores[iy, ix] = _score_origin_offsets(offsets, scorers, pool)
+
+        with contextlib.ExitStack() as stack:
+            pool = None
+            if nproc > 1:
+                pool = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(
+                        max_workers=nproc,
+                        initializer=_init_origin_offset_worker,
+                        initargs=(scorers,),
+                    )
+                )
+            factor = wide_search_coarse_factor
+            if factor > 1 and widegrid > factor:
+                coarse = np.unique(np.append(np.arange(0, widegrid, factor), grid))
+                iy, ix = np.meshgrid(coarse, coarse, indexing="ij")
+                score_points(iy.ravel(), ix.ravel(), pool)
+                # Score the full grid around the best of the coarse points
+                best = np.argwhere(scores > 0.9 * np.nanmax(scores))
+                todo = np.zeros((widegrid, widegrid), dtype=bool)
+                for y, x in best:
+                    todo[
+                        max(0, y - factor) : y + factor + 1,
+                        max(0, x - factor) : x + factor + 1,
+                    ] = True
+                iy, ix = np.nonzero(todo & np.isnan(scores))
+            else:
+                iy, ix = np.indices((widegrid, widegrid)).reshape(2, -1)
+            score_points(iy, ix, pool)
 
         # if there are several similarly high scores, then choose the closest
         # one to the current beam centre
-        potential_offsets = flex.vec3_double()
-        if scores.all_eq(0):
+        scores = scores.ravel()
+        if not np.any(np.nan_to_num(scores)):
             raise Sorry("No valid scores")
-        sel = scores > (0.9 * flex.max(scores))
-        for i in sel.iselection():
-            offset = (idxs[i % widegrid]) * beamr1 + (idxs[i // widegrid]) * beamr2
-            potential_offsets.append(offset.elems)
-            # print offset.length(), scores[i]
+        sel = np.flatnonzero(scores > (0.9 * np.nanmax(scores)))
+        potential_offsets = (
+            np.column_stack((idxs[sel % widegrid], idxs[sel // widegrid])) @ basis
+        )
         wide_search_offset = matrix.col(
-            potential_offsets[flex.min_index(potential_offsets.norms())]
+            potential_offsets[
+                np.argmin(np.linalg.norm(potential_offsets, axis=1))
+            ].tolist()
         )
 
     else:
@@ -441,6 +476,122 @@ def igrid(x):
     return new_experiments
 
 
+class _OriginOffsetScorer:
+    """
+    Score trial detector origin offsets for one experiment.
+
+    The score is that of _get_origin_offset_score, with the laboratory
+    coordinates of the spots computed once, and the mapping of the spots to
+    reciprocal space vectorised over the trial offsets.
+    """
+
+    def __init__(self, experiment, spots_mm, solutions, amax):
+        xyz = flumpy.to_numpy(spots_mm["xyzobs.mm.value"])
+        panels = flumpy.to_numpy(spots_mm["panel"])
+        self.lab = np.zeros((xyz.shape[0], 3))
+        for i_panel, panel in enumerate(experiment.detector):
+            sel = np.flatnonzero(panels == i_panel)
+            if sel.size:
+                xy = flex.vec2_double(
+                    flumpy.from_numpy(np.ascontiguousarray(xyz[sel, 0])),
+                    flumpy.from_numpy(np.ascontiguousarray(xyz[sel, 1])),
+                )
+                self.lab[sel] = flumpy.to_numpy(panel.get_lab_coord(xy))
+        self.wavelength = experiment.beam.get_wavelength()
+        self.s0 = np.array(experiment.beam.get_s0())
+
+        # As for _get_origin_offset_score, the fixed rotation is the identity
+        self.setting_rotation_inverse = None
+        self.phi = None
+        goniometer = experiment.goniometer
+        if goniometer is not None:
+            self.setting_rotation_inverse = np.linalg.inv(
+                np.array(goniometer.get_setting_rotation()).reshape(3, 3)
+            )
+            axis = np.array(goniometer.get_rotation_axis_datum())
+            self.axis = axis / np.linalg.norm(axis)
+            scan = experiment.scan
+            if scan is not None and scan.has_property("oscillation"):
+                self.phi = xyz[:, 2].copy()
+        self.solutions = solutions
+        self.amax = amax
+
+    def reciprocal_space_vectors(self, offsets):
+        """The (n_offsets, n_spots, 3) reciprocal space vectors of the spots."""
+        s1 = self.lab[np.newaxis] + offsets[:, np.newaxis]
+        s1 /= np.linalg.norm(s1, axis=2, keepdims=True) * self.wavelength
+        rlp = s1 - self.s0
+        if self.setting_rotation_inverse is not None:
+            rlp = rlp @ self.setting_rotation_inverse.T
+            if self.phi is not None:
+                # Rotate each spot by -phi around the rotation axis
+                cos = np.cos(-self.phi)[:, np.newaxis]
+                sin = np.sin(-self.phi)[:, np.newaxis]
+                rlp = (
+                    rlp * cos
+                    + np.cross(self.axis, rlp) * sin
+                    + (rlp @ self.axis)[..., np.newaxis] * self.axis * (1 - cos)
+                )
+        return rlp
+
+    def scores(self, offsets):
+        """Score an (n, 3) array of origin offsets."""
+        return np.array(
+            [
+                _sum_score_detail(
+                    flumpy.vec_from_numpy(np.ascontiguousarray(rlp)),
+                    self.solutions,
+                    amax=self.amax,
+                )
+                for rlp in self.reciprocal_space_vectors(offsets)
+            ]
+        )
+
+
+# The number of origin offsets scored in each task of the wide grid search
+_ORIGIN_OFFSET_TILE_SIZE = 32
+
+# The scorers of each experiment, set in each worker process of the search
+_origin_offset_scorers = None
+
+
+def _init_origin_offset_worker(scorers):
+    global _origin_offset_scorers
+    _origin_offset_scorers = scorers
+
+
+def _origin_offset_worker(i_expt, offsets):
+    return _origin_offset_scorers[i_expt].scores(offsets)
+
+
+def _score_origin_offsets(offsets, scorers, pool=None):
+    """
+    Sum the scores of all experiments for each of an (n, 3) array of offsets.
+
+    The offsets are scored in tiles, and if a process pool (initialised with
+    _init_origin_offset_worker) is given, each tile of each experiment is
+    scored in a separate task.
+    """
+    tasks = [
+        (i_expt, start)
+        for i_expt in range(len(scorers))
+        for start in range(0, len(offsets), _ORIGIN_OFFSET_TILE_SIZE)
+    ]
+    tiles = [offsets[start : start + _ORIGIN_OFFSET_TILE_SIZE] for _, start in tasks]
+    if pool is not None:
+        results = pool.map(
+            _origin_offset_worker, [i_expt for i_expt, _ in tasks], tiles
+        )
+    else:
+        results = (
+            scorers[i_expt].scores(tile) for (i_expt, _), tile in zip(tasks, tiles)
+        )
+    total = np.zeros(len(offsets))
+    for (_, start), result in zip(tasks, results):
+        total[start : start + len(result)] += result
+    return total
+
+
 def _get_origin_offset_score(
     trial_origin_offset, solutions, amax, spots_mm, experiment
 ):
@@ -557,6 +708,7 @@ def discover_better_experimental_model(
     mm_search_scope=4.0,
     wide_search_binning=1,
     plot_search_scope=False,
+    wide_search_coarse_factor=1,
 ):
     assert len(experiments) == len(reflections)
     assert len(experiments) > 0
@@ -629,6 +781,8 @@ def discover_better_experimental_model(
         mm_search_scope=mm_search_scope,
         wide_search_binning=wide_search_binning,
         plot_search_scope=plot_search_scope,
+        nproc=nproc,
+        wide_search_coarse_factor=wide_search_coarse_factor,
     )
     new_detector = new_experiments[0].detector
     old_panel, old_beam_centre = detector.get_ray_intersection(beam.get_s0())
@@ -747,6 +901,7 @@ def run(args=None):
                 mm_search_scope=params.default.mm_search_scope,
                 wide_search_binning=params.default.wide_search_binning,
                 plot_search_scope=params.default.plot_search_scope,
+                wide_search_coarse_factor=params.default.wide_search_coarse_factor,
             )
             logger.info("")
 
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import concurrent.futures
 import functools
 
+import numpy as np
 from orderedset import OrderedSet
 
+from dxtbx import flumpy
 from dxtbx.model.experiment_list import ExperimentList
 from libtbx.phil import parse
 
@@ -25,9 +28,48 @@
 Example::
 
   dials.split_experiments combined.expt combined.refl
+
+  dials.split_experiments combined.expt combined.refl chunk_size=100 nproc=4
 """
 
 
+def select_experiments(reflections, index, ids, imageset_ids, identifiers=None):
+    """
+    Select the reflections of several experiments, numbering them 0 .. n-1.
+
+    The reflections of all the experiments are taken with one select, grouped
+    by experiment in the order given.
+
+    Args:
+        reflections: The reflection table to select from
+        index: The ExperimentIdIndex of the reflection table, or None if the
+            table is empty
+        ids: The id of each experiment to select
+        imageset_ids: The imageset_id to set for each experiment
+        identifiers: The experiment identifier of each experiment, if set
+
+    Returns:
+        The reflection table of the selected experiments
+    """
+    empty = np.zeros(0, dtype=np.intp)
+    rows = [index.rows(id_) if index else empty for id_ in ids]
+    sizes = [r.size for r in rows]
+    rows = np.concatenate(rows) if rows else empty
+    selected = reflections.select(flex.size_t(rows.astype(np.uint64)))
+    selected["id"] = flumpy.from_numpy(
+        np.repeat(np.arange(len(ids), dtype=np.int32), sizes)
+    )
+    selected["imageset_id"] = flumpy.from_numpy(
+        np.repeat(np.array(imageset_ids, dtype=np.int32), sizes)
+    )
+    for k in selected.experiment_identifiers().keys():
+        del selected.experiment_identifiers()[k]
+    if identifiers:
+        for new_id, identifier in enumerate(identifiers):
+            selected.experiment_identifiers()[new_id] = identifier
+    return selected
+
+
 class Script:
     def __init__(self):
         """Initialise the script."""
@@ -46,6 +88,9 @@ def __init__(self):
         .type = bool
         .help = "If True, group experiments by wavelength, from low to high"
                 "(using a relative tolerance of 1e-4 to match wavelengths)."
+      nproc = 1
+        .type = int(value_min=1)
+        .help = "The number of threads used to write the output files"
       output {
         experiments_prefix = split
           .type = str
@@ -146,6 +191,54 @@ def run(self, args=None):
                     f"Sum of chunk sizes list ({sum(params.output.chunk_sizes)}) not equal to number of experiments ({len(experiments)})"
                 )
 
+        if reflections is not None:
+            # Index the rows of each experiment once, rather than searching the
+            # whole table for the reflections of each output
+            index = reflections.experiment_id_index() if len(reflections) else None
+            id_for_identifier = {
+                identifier: k for k, identifier in reflections.experiment_identifiers()
+            }
+
+        def find_id(experiment, i):
+            """Find the id of an experiment in the reflection table."""
+            if not id_for_identifier:
+                return i
+            try:
+                return id_for_identifier[experiment.identifier]
+            except KeyError:
+                raise Sorry(
+                    "Unable to find id matching experiment identifier in reflection table."
+                )
+
+        def experiment_identifiers(expts):
+            """The identifiers to set in the reflection table for experiments."""
+            if id_for_identifier:
+                return list(expts.identifiers())
+            return None
+
+        def save(
+            filename_index, expts, refl_ids=None, imageset_ids=None, identifiers=None
+        ):
+            """Save a set of experiments and their reflections."""
+            expts.as_json(experiments_template(index=filename_index))
+            if refl_ids is not None:
+                select_experiments(
+                    reflections, index, refl_ids, imageset_ids, identifiers
+                ).as_file(reflections_template(index=filename_index))
+
+        def save_all(outputs):
+            """Save the outputs, with a thread pool if nproc > 1."""
+            if params.nproc > 1:
+                with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=params.nproc
+                ) as pool:
+                    futures = [pool.submit(save, *output) for output in outputs]
+                    for future in futures:
+                        future.result()
+            else:
+                for output in outputs:
+                    save(*output)
+
         if params.by_wavelength:
             if reflections:
                 if not reflections.experiment_identifiers():
@@ -178,14 +271,16 @@ def run(self, args=None):
                 new_exps.as_json(experiment_filename)
                 if reflections:
                     refls = reflections.select_on_experiment_identifiers(expids)
-                    refls["imageset_id"] = flex.int(refls.size(), 0)
-                    # now set the imageset ids
-                    for k, iset_id in enumerate(imageset_ids):
-                        # select the experiment based on id (unique per sweep),
-                        # and set the imageset_id (not necessarily unique per sweep
-                        # if imageset is shared)
-                        sel = refls["id"] == k
-                        refls["imageset_id"].set_selected(sel, iset_id)
+                    # now set the imageset ids: select the experiment based on id
+                    # (unique per sweep), and set the imageset_id (not necessarily
+                    # unique per sweep if imageset is shared)
+                    ids = flumpy.to_numpy(refls["id"])
+                    known = (ids >= 0) & (ids < len(imageset_ids))
+                    refl_imageset_ids = np.zeros(ids.size, dtype=np.int32)
+                    refl_imageset_ids[known] = np.array(imageset_ids, dtype=np.int32)[
+                        ids[known]
+                    ]
+                    refls["imageset_id"] = flumpy.from_numpy(refl_imageset_ids)
                     reflections_filename = reflections_template(index=i)
                     print(
                         f"Saving reflections with wavelength {wl} to {reflections_filename}"
@@ -196,169 +291,132 @@ def run(self, args=None):
             assert (
                 not params.output.chunk_size
             ), "chunk_size + by_detector is not implemented"
-            if reflections is None:
-                split_data = {
-                    detector: {"experiments": ExperimentList()}
-                    for detector in experiments.detectors()
-                }
-            else:
-                split_data = {
-                    detector: {
-                        "experiments": ExperimentList(),
-                        "reflections": flex.reflection_table(),
-                        "imagesets_found": OrderedSet(),
-                    }
-                    for detector in experiments.detectors()
+            detectors = experiments.detectors()
+            split_data = {
+                detector: {
+                    "experiments": ExperimentList(),
+                    "ids": [],
+                    "imageset_ids": [],
+                    "imagesets_found": OrderedSet(),
                 }
+                for detector in detectors
+            }
             for i, experiment in enumerate(experiments):
-                split_expt_id = experiments.detectors().index(experiment.detector)
+                split_expt_id = detectors.index(experiment.detector)
                 experiment_filename = experiments_template(index=split_expt_id)
                 print("Adding experiment %d to %s" % (i, experiment_filename))
-                split_data[experiment.detector]["experiments"].append(experiment)
+                data = split_data[experiment.detector]
+                data["experiments"].append(experiment)
                 if reflections is not None:
                     reflections_filename = reflections_template(index=split_expt_id)
-                    split_data[experiment.detector]["imagesets_found"].add(
-                        experiment.imageset
-                    )
+                    data["imagesets_found"].add(experiment.imageset)
                     print(
                         "Adding reflections for experiment %d to %s"
                         % (i, reflections_filename)
                     )
-                    if reflections.experiment_identifiers().keys():
-                        # first find which id value corresponds to experiment in question
-                        identifier = experiment.identifier
-                        id_ = None
-                        for k in reflections.experiment_identifiers().keys():
-                            if reflections.experiment_identifiers()[k] == identifier:
-                                id_ = k
-                                break
-                        if id_ is None:
-                            raise Sorry(
-                                "Unable to find id matching experiment identifier in reflection table."
-                            )
-                        ref_sel = reflections.select(reflections["id"] == id_)
-                        # now reset ids and reset/update identifiers map
-                        for k in ref_sel.experiment_identifiers().keys():
-                            del ref_sel.experiment_identifiers()[k]
-                        new_id = len(split_data[experiment.detector]["experiments"]) - 1
-                        ref_sel["id"] = flex.int(len(ref_sel), new_id)
-                        ref_sel.experiment_identifiers()[new_id] = identifier
-                    else:
-                        ref_sel = reflections.select(reflections["id"] == i)
-                        ref_sel["id"] = flex.int(
-                            len(ref_sel),
-                            len(split_data[experiment.detector]["experiments"]) - 1,
-                        )
-                    iset_id = split_data[experiment.detector]["imagesets_found"].index(
-                        experiment.imageset
+                    data["ids"].append(find_id(experiment, i))
+                    data["imageset_ids"].append(
+                        data["imagesets_found"].index(experiment.imageset)
                     )
-                    ref_sel["imageset_id"] = flex.int(ref_sel.size(), iset_id)
-                    split_data[experiment.detector]["reflections"].extend(ref_sel)
 
-            for i, detector in enumerate(experiments.detectors()):
+            outputs = []
+            for i, detector in enumerate(detectors):
                 experiment_filename = experiments_template(index=i)
                 print("Saving experiment %d to %s" % (i, experiment_filename))
-                split_data[detector]["experiments"].as_json(experiment_filename)
-
+                data = split_data[detector]
                 if reflections is not None:
                     reflections_filename = reflections_template(index=i)
                     print(
                         "Saving reflections for experiment %d to %s"
                         % (i, reflections_filename)
                     )
-                    split_data[detector]["reflections"].as_file(reflections_filename)
+                    outputs.append(
+                        (
+                            i,
+                            data["experiments"],
+                            data["ids"],
+                            data["imageset_ids"],
+                            experiment_identifiers(data["experiments"]),
+                        )
+                    )
+                else:
+                    outputs.append((i, data["experiments"]))
+            save_all(outputs)
         elif params.output.chunk_size or params.output.chunk_sizes:
+            outputs = []
 
-            def save_chunk(chunk_id, expts, refls):
+            def add_chunk(chunk_id, expts, ids, imageset_ids):
                 experiment_filename = experiments_template(index=chunk_id)
                 print("Saving chunk %d to %s" % (chunk_id, experiment_filename))
-                expts.as_json(experiment_filename)
-                if refls is not None:
+                if reflections:
                     reflections_filename = reflections_template(index=chunk_id)
                     print(
                         "Saving reflections for chunk %d to %s"
                         % (chunk_id, reflections_filename)
                     )
-                    refls.as_file(reflections_filename)
+                    outputs.append(
+                        (
+                            chunk_id,
+                            expts,
+                            ids,
+                            imageset_ids,
+                            experiment_identifiers(expts),
+                        )
+                    )
+                else:
+                    outputs.append((chunk_id, expts))
 
             chunk_counter = 0
             chunk_expts = ExperimentList()
-            if reflections:
-                chunk_refls = flex.reflection_table()
-            else:
-                chunk_refls = None
+            chunk_ids = []
+            chunk_imageset_ids = []
             next_iset_id = 0
             imagesets_found = OrderedSet()
             for i, experiment in enumerate(experiments):
                 chunk_expts.append(experiment)
                 if reflections:
-                    if reflections.experiment_identifiers().keys():
-                        # first find which id value corresponds to experiment in question
-                        identifier = experiment.identifier
-                        id_ = None
-                        for k in reflections.experiment_identifiers().keys():
-                            if reflections.experiment_identifiers()[k] == identifier:
-                                id_ = k
-                                break
-                        if id_ is None:
-                            raise Sorry(
-                                "Unable to find id matching experiment identifier in reflection table."
-                            )
-                        ref_sel = reflections.select(reflections["id"] == id_)
-                        # now reset ids and reset/update identifiers map
-                        for k in ref_sel.experiment_identifiers().keys():
-                            del ref_sel.experiment_identifiers()[k]
-                        new_id = len(chunk_expts) - 1
-                        ref_sel["id"] = flex.int(len(ref_sel), new_id)
-                        ref_sel.experiment_identifiers()[new_id] = identifier
-                    else:
-                        ref_sel = reflections.select(reflections["id"] == i)
-                        ref_sel["id"] = flex.int(len(ref_sel), len(chunk_expts) - 1)
+                    chunk_ids.append(find_id(experiment, i))
                     if experiment.imageset not in imagesets_found:
                         imagesets_found.add(experiment.imageset)
-                        ref_sel["imageset_id"] = flex.int(ref_sel.size(), next_iset_id)
+                        chunk_imageset_ids.append(next_iset_id)
                         next_iset_id += 1
                     else:
-                        iset_id = imagesets_found.index(experiment.imageset)
-                        ref_sel["imageset_id"] = flex.int(ref_sel.size(), iset_id)
-                    chunk_refls.extend(ref_sel)
+                        chunk_imageset_ids.append(
+                            imagesets_found.index(experiment.imageset)
+                        )
                 if params.output.chunk_sizes:
                     chunk_limit = params.output.chunk_sizes[chunk_counter]
                 else:
                     chunk_limit = params.output.chunk_size
                 if len(chunk_expts) == chunk_limit:
-                    save_chunk(chunk_counter, chunk_expts, chunk_refls)
+                    add_chunk(chunk_counter, chunk_expts, chunk_ids, chunk_imageset_ids)
                     chunk_counter += 1
                     chunk_expts = ExperimentList()
-                    if reflections:
-                        chunk_refls = flex.reflection_table()
-                    else:
-                        chunk_refls = None
+                    chunk_ids = []
+                    chunk_imageset_ids = []
             if len(chunk_expts) > 0:
-                save_chunk(chunk_counter, chunk_expts, chunk_refls)
+                add_chunk(chunk_counter, chunk_expts, chunk_ids, chunk_imageset_ids)
+            save_all(outputs)
         else:
+            outputs = []
             for i, experiment in enumerate(experiments):
                 experiment_filename = experiments_template(index=i)
                 print("Saving experiment %d to %s" % (i, experiment_filename))
-                ExperimentList([experiment]).as_json(experiment_filename)
-
                 if reflections is not None:
                     reflections_filename = reflections_template(index=i)
                     print(
                         "Saving reflections for experiment %d to %s"
                         % (i, reflections_filename)
                     )
-                    ref_sel = reflections.select(reflections["id"] == i)
-                    if ref_sel.experiment_identifiers().keys():
-                        identifier = ref_sel.experiment_identifiers()[i]
-                        for k in ref_sel.experiment_identifiers().keys():
-                            del ref_sel.experiment_identifiers()[k]
-                        ref_sel["id"] = flex.int(ref_sel.size(), 0)
-                        ref_sel.experiment_identifiers()[0] = identifier
-                    else:
-                        ref_sel["id"] = flex.int(len(ref_sel), 0)
-                    ref_sel["imageset_id"] = flex.int(len(ref_sel), 0)
-                    ref_sel.as_file(reflections_filename)
+                    identifiers = None
+                    if id_for_identifier:
+                        identifiers = [reflections.experiment_identifiers()[i]]
+                    outputs.append(
+                        (i, ExperimentList([experiment]), [i], [0], identifiers)
+                    )
+                else:
+                    outputs.append((i, ExperimentList([experiment])))
+            save_all(outputs)
 
         return
 
@@ -3,10 +3,13 @@
 import json
 import sys
 
+import numpy as np
+
 import iotbx.phil
 
 import dials.util
 from dials.algorithms.spot_finding import per_image_analysis
+from dials.array_family import flex
 from dials.util import tabulate
 from dials.util.options import ArgumentParser, reflections_and_experiments_from_files
 
@@ -81,9 +84,10 @@ def run(args=None):
     if params.id is not None:
         reflections = reflections.select(reflections["id"] == params.id)
 
+    index = reflections.experiment_id_index()
     all_stats = []
     for i, expt in enumerate(experiments):
-        refl = reflections.select(reflections["id"] == i)
+        refl = reflections.select(flex.size_t(index.rows(i).astype(np.uint64)))
         stats = per_image_analysis.stats_per_image(
             expt, refl, resolution_analysis=params.resolution_analysis
         )
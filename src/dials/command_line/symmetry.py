@@ -94,6 +94,11 @@
   .help = "If True, then for monoclinic centered cells, I2 will be preferred over C2 if"
           "it gives a less oblique cell (i.e. smaller beta angle)."
 
+nproc = 1
+  .type = int(value_min=1)
+  .help = "The number of processes used to score the symmetry elements of the"
+          "lattice group."
+
 systematic_absences {
 
   check = True
@@ -422,6 +427,7 @@ def symmetry(experiments, reflection_tables, params=None):
             absolute_angle_tolerance=params.absolute_angle_tolerance,
             best_monoclinic_beta=params.best_monoclinic_beta,
             apply_sigma_correction=apply_sigma_correction,
+            nproc=params.nproc,
         )
         logger.info("")
         logger.info(result)
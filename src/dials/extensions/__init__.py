@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import pkg_resources
+from dials.util.entry_points import entry_points
 
 
 class _Extension:
@@ -13,10 +13,7 @@ class _Extension:
     @classmethod
     def extensions(cls):
         """Return a list of all registered extension classes."""
-        return [
-            entry_point.load()
-            for entry_point in pkg_resources.iter_entry_points(cls.entry_point)
-        ]
+        return [entry_point.load() for entry_point in entry_points(cls.entry_point)]
 
     @classmethod
     def load(cls, name):
@@ -25,7 +22,7 @@ def load(cls, name):
         :param name: The name of the extension
         :returns: The extension class
         """
-        for entry_point in pkg_resources.iter_entry_points(cls.entry_point, name):
+        for entry_point in entry_points(cls.entry_point, name):
             # if there are multiple entry points with the same name then just return the first
             return entry_point.load()
 
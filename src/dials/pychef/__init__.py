@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import numpy as np
+
 from cctbx.array_family import flex
+from dxtbx import flumpy
 from iotbx.data_plots import table_data
 from libtbx import phil
 
@@ -161,7 +164,7 @@ def __init__(
         # self.dose /= range_width
         self.dose -= int(self.range_min)
 
-        self.dose = flex.size_t(list(self.dose))
+        self.dose = flex.size_t(flumpy.to_numpy(self.dose).astype(np.uint64))
 
         binner_non_anom = intensities.as_non_anomalous_array().use_binning(self.binner)
         n_complete = flex.size_t(binner_non_anom.counts_complete()[1:-1])
@@ -458,14 +461,14 @@ def to_dict(self):
 
 def batches_to_dose(batches, params):
     if len(params.batch):
-        dose = flex.double(batches.size(), -1)
+        batch_values = flumpy.to_numpy(batches)
+        dose = np.full(batch_values.size, -1.0)
         for batch in params.batch:
-            start = batch.dose_start
-            step = batch.dose_step
-            for i in range(batch.range[0], batch.range[1] + 1):
-                # inclusive range
-                dose.set_selected(batches == i, start + step * (i - batch.range[0]))
-        dose = dose.iround()
+            # inclusive range
+            first, last = batch.range
+            sel = (batch_values >= first) & (batch_values <= last)
+            dose[sel] = batch.dose_start + batch.dose_step * (batch_values[sel] - first)
+        dose = flumpy.from_numpy(dose).iround()
     elif params.remove_gaps:
         dose = remove_batch_gaps(batches)
     else:
@@ -474,17 +477,9 @@ def batches_to_dose(batches, params):
 
 
 def remove_batch_gaps(batches):
-    perm = flex.sort_permutation(batches)
-    new_batches = flex.int(batches.size(), -1)
-    sorted_batches = batches.select(perm)
-    curr_batch = -1
-    new_batch = -1
-    for i, b in enumerate(sorted_batches):
-        if b != curr_batch:
-            curr_batch = b
-            new_batch += 1
-        new_batches[perm[i]] = new_batch
-    return new_batches
+    """Renumber the batches consecutively from zero, in the same order."""
+    _, new_batches = np.unique(flumpy.to_numpy(batches), return_inverse=True)
+    return flumpy.from_numpy(new_batches.reshape(-1).astype(np.int32))
 
 
 def resolution_limit(i_obs, min_completeness, n_bins):
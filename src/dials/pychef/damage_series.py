@@ -4,8 +4,11 @@
 from copy import copy
 from math import ceil, floor
 
+import numpy as np
+
 import iotbx
 from cctbx import crystal, miller, uctbx
+from dxtbx import flumpy
 from dxtbx.model import ExperimentList
 from scitbx.array_family import flex
 
@@ -226,6 +229,45 @@ def _write_mtz(sel_intensities, sel_doses, fname):
     logger.info(f"Saved {nref} reflections to {fname}")
 
 
+class DoseRanges:
+    """The observations in each of a series of consecutive dose ranges.
+
+    The observations are sorted into the ranges once, after which the
+    observations in a range, or in all ranges up to a given range, are found
+    without testing every observation again.
+    """
+
+    def __init__(self, doses, dose_boundaries):
+        """
+        Args:
+            doses: The dose of each observation.
+            dose_boundaries: The n + 1 boundaries of n ranges, where range i is
+                dose_boundaries[i] <= dose < dose_boundaries[i + 1].
+        """
+        if not isinstance(doses, np.ndarray):
+            doses = flumpy.to_numpy(doses)
+        boundaries = np.asarray(dose_boundaries)
+        ranges = np.searchsorted(boundaries, doses, side="right") - 1
+        # A stable sort keeps the original order within each range
+        self.order = np.argsort(ranges, kind="stable")
+        self.starts = np.searchsorted(ranges[self.order], np.arange(boundaries.size))
+
+    def __len__(self):
+        return self.starts.size - 1
+
+    def selection(self, n):
+        """The observations in range n, in their original order."""
+        return flex.size_t(
+            self.order[self.starts[n] : self.starts[n + 1]].astype(np.uint64)
+        )
+
+    def accumulated_selection(self, n):
+        """The observations in ranges 0 to n, in their original order."""
+        return flex.size_t(
+            np.sort(self.order[self.starts[0] : self.starts[n + 1]]).astype(np.uint64)
+        )
+
+
 def generate_damage_series_mtz(params, doses, intensities):
     plots = DamageSeriesPlots(d_max=params.d_max, d_min=params.d_min)
     group_size = params.damage_series.dose_group_size
@@ -237,13 +279,14 @@ def generate_damage_series_mtz(params, doses, intensities):
     n_output = ceil(dose_range / group_size)
 
     dose_boundaries = [ceil(n * group_size) for n in range(n_output + 1)]
+    dose_ranges = DoseRanges(doses, dose_boundaries)
 
     for n in range(n_output):
         lower_dose_boundary = dose_boundaries[n]
         upper_dose_boundary = dose_boundaries[n + 1]
         fname = f"damage_series_{lower_dose_boundary}_{upper_dose_boundary}.mtz"
 
-        sel = (doses >= lower_dose_boundary) & (doses < upper_dose_boundary)
+        sel = dose_ranges.selection(n)
         sel_intensities = intensities.select(sel)
         sel_intensities.set_info(intensities.info())
         plots.add_to_damage_series(
@@ -256,7 +299,7 @@ def generate_damage_series_mtz(params, doses, intensities):
     for n in range(n_output):
         upper_dose_boundary = dose_boundaries[n + 1]
         fname = f"damage_series_{lower_dose_boundary}_{upper_dose_boundary}.mtz"
-        sel = (doses >= lower_dose_boundary) & (doses < upper_dose_boundary)
+        sel = dose_ranges.accumulated_selection(n)
         sel_intensities = intensities.select(sel)
         sel_intensities.set_info(intensities.info())
         plots.add_to_accumulation_series(
@@ -278,7 +321,6 @@ def generate_damage_series(params, experiments, reflection_table):
 
     reflection_table = reflection_table.select(experiments)
 
-    doses = flex.double()
     start_doses, doses_per_image = interpret_images_to_doses_options(
         experiments,
         params.dose.experiments.dose_per_image,
@@ -286,13 +328,22 @@ def generate_damage_series(params, experiments, reflection_table):
         params.dose.experiments.shared_crystal,
     )
 
-    for expt, starting_dose, dose_per_img in zip(
-        experiments, start_doses, doses_per_image
+    # Look up the starting dose and dose per image of each reflection from
+    # its experiment
+    id_to_expt = {expt.identifier: i for i, expt in enumerate(experiments)}
+    ids = flumpy.to_numpy(reflection_table["id"])
+    expt_starting_doses = np.zeros(ids.max(initial=0) + 1)
+    expt_doses_per_image = np.zeros(ids.max(initial=0) + 1)
+    for id_value, identifier in zip(
+        reflection_table.experiment_identifiers().keys(),
+        reflection_table.experiment_identifiers().values(),
     ):
-        refls = reflection_table.select(expt)
-        imgno = flex.floor(refls["xyzobs.px.value"].parts()[2])
-        dose = (imgno * dose_per_img) + starting_dose
-        doses.extend(dose)
+        expt_starting_doses[id_value] = start_doses[id_to_expt[identifier]]
+        expt_doses_per_image[id_value] = doses_per_image[id_to_expt[identifier]]
+    imgno = np.floor(flumpy.to_numpy(reflection_table["xyzobs.px.value"])[:, 2])
+    doses = flumpy.from_numpy(
+        imgno * expt_doses_per_image[ids] + expt_starting_doses[ids]
+    )
 
     # e.g. start dose of 0, images have doses of 0 -> 499 for the purposes
     # of this calculation
@@ -304,16 +355,8 @@ def generate_damage_series(params, experiments, reflection_table):
     dose_range = max_dose - min_dose + 1
     n_output = ceil(dose_range / group_size)
 
-    def select_data_in_dose_range(lower_dose_boundary, upper_dose_boundary):
-        sel = (doses >= lower_dose_boundary) & (doses < upper_dose_boundary)
-        refl = reflection_table.select(sel)
-
-        sel = (doses >= lower_dose_boundary) & (doses < upper_dose_boundary)
-        refl = reflection_table.select(sel)
-
-        # now need to get the subsets of the experiments corresponding to that
-        # dose range
-
+    def select_experiments_in_dose_range(lower_dose_boundary, upper_dose_boundary):
+        # get the subsets of the experiments corresponding to the dose range
         new_expts = ExperimentList()
         for expt, start_dose, dose_per_image in zip(
             experiments, start_doses, doses_per_image
@@ -351,9 +394,10 @@ def select_data_in_dose_range(lower_dose_boundary, upper_dose_boundary):
                     )
                 new_expts.append(new_expt)
 
-        return new_expts, refl
+        return new_expts
 
     dose_boundaries = [ceil(n * group_size) for n in range(n_output + 1)]
+    dose_ranges = DoseRanges(doses, dose_boundaries)
 
     for n in range(n_output):
         lower_dose_boundary = dose_boundaries[n]
@@ -363,10 +407,10 @@ def select_data_in_dose_range(lower_dose_boundary, upper_dose_boundary):
         reflections_filename = name + ".refl"
         experiments_filename = name + ".expt"
 
-        new_expts, refl = select_data_in_dose_range(
-            lower_dose_boundary,
-            upper_dose_boundary,
+        new_expts = select_experiments_in_dose_range(
+            lower_dose_boundary, upper_dose_boundary
         )
+        refl = reflection_table.select(dose_ranges.selection(n))
 
         assert len(new_expts) == len(
             refl.experiment_identifiers().keys()
@@ -395,10 +439,10 @@ def select_data_in_dose_range(lower_dose_boundary, upper_dose_boundary):
         reflections_filename = name + ".refl"
         experiments_filename = name + ".expt"
 
-        new_expts, refl = select_data_in_dose_range(
-            lower_dose_boundary,
-            upper_dose_boundary,
+        new_expts = select_experiments_in_dose_range(
+            lower_dose_boundary, upper_dose_boundary
         )
+        refl = reflection_table.select(dose_ranges.accumulated_selection(n))
 
         assert len(new_expts) == len(
             refl.experiment_identifiers().keys()
@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
+import numpy as np
+
 from cctbx import miller
+from dxtbx import flumpy
 from scitbx.array_family import flex
 
 from dials.algorithms.scaling.scaling_library import scaled_data_as_miller_array
@@ -106,30 +109,32 @@ def rmerge_vs_batch(intensities, batches):
     merging = intensities.merge_equivalents()
     merged_intensities = merging.array()
 
-    perm = flex.sort_permutation(batches.data())
-    batches = batches.data().select(perm)
-    intensities = intensities.select(perm)
-
-    pairs = miller.match_multi_indices(
-        merged_intensities.indices(), intensities.indices()
-    ).pairs()
-
-    def r_merge_per_batch(pairs):
-        """Calculate R_merge for the list of (merged-I, I) pairs."""
-
-        merged_indices, unmerged_indices = zip(*pairs)
-
-        unmerged_Ij = intensities.data().select(flex.size_t(unmerged_indices))
-        merged_Ij = merged_intensities.data().select(flex.size_t(merged_indices))
-
-        numerator = flex.sum(flex.abs(unmerged_Ij - merged_Ij))
-        denominator = flex.sum(unmerged_Ij)
-
-        if denominator > 0:
-            return numerator / denominator
-        return 0
-
-    return _batch_bins_and_data(batches, pairs, function_to_apply=r_merge_per_batch)
+    # Look up the merged intensity of each reflection, by numbering the unique
+    # indices of the merged and unmerged intensities together
+    n_merged = merged_intensities.size()
+    _, inverse = np.unique(
+        np.concatenate(
+            (
+                flumpy.to_numpy(merged_intensities.indices()),
+                flumpy.to_numpy(intensities.indices()),
+            )
+        ),
+        axis=0,
+        return_inverse=True,
+    )
+    inverse = inverse.ravel()
+    merged_by_index = np.zeros(inverse.max() + 1 if inverse.size else 0)
+    merged_by_index[inverse[:n_merged]] = flumpy.to_numpy(merged_intensities.data())
+    unmerged_Ij = flumpy.to_numpy(intensities.data())
+    merged_Ij = merged_by_index[inverse[n_merged:]]
+
+    batch_bins, _, (numerator, denominator) = _batch_bins_and_sums(
+        batches.data(), np.abs(unmerged_Ij - merged_Ij), unmerged_Ij
+    )
+    rmerge = [
+        n / d if d > 0 else 0 for n, d in zip(numerator.tolist(), denominator.tolist())
+    ]
+    return batch_bins, rmerge
 
 
 def i_sig_i_vs_batch(intensities, batches):
@@ -141,45 +146,43 @@ def i_sig_i_vs_batch(intensities, batches):
     i_sig_i = intensities.data().select(sel) / intensities.sigmas().select(sel)
     batches = batches.select(sel)
 
-    perm = flex.sort_permutation(batches.data())
-    batches = batches.data().select(perm)
-    i_sig_i = i_sig_i.select(perm)
-
-    return _batch_bins_and_data(batches, i_sig_i, function_to_apply=flex.mean)
+    batch_bins, counts, (sums,) = _batch_bins_and_sums(
+        batches.data(), flumpy.to_numpy(i_sig_i)
+    )
+    return batch_bins, (sums / counts).tolist()
 
 
 def scales_vs_batch(scales, batches):
     """Determine batches and scale values per batch."""
     assert scales.size() == batches.size()
 
-    perm = flex.sort_permutation(batches.data())
-    batches = batches.data().select(perm)
-    scales = scales.data().select(perm)
+    batch_bins, counts, (sums,) = _batch_bins_and_sums(
+        batches.data(), flumpy.to_numpy(scales.data())
+    )
+    return batch_bins, (sums / counts).tolist()
 
-    return _batch_bins_and_data(batches, scales, function_to_apply=flex.mean)
 
+def _batch_bins_and_sums(batches, *values):
+    """Sum each of the value arrays over the data from each batch.
 
-def _batch_bins_and_data(batches, values, function_to_apply):
-    """Apply function to the data from each batch.
+    The data are sorted by batch once, and summed over the contiguous runs of
+    each batch.
 
-    Return the list of the batch bins and the value for each bin.
+    Return the list of the batch bins (in increasing order), the number of
+    reflections in each bin, and an array of the sums for each bin for each of
+    the value arrays.
     """
-    batch_bins = []
-    data = []
-
-    i_batch_start = 0
-    current_batch = flex.min(batches)
-    n_ref = batches.size()
-    for i_ref in range(n_ref + 1):
-        if i_ref == n_ref or batches[i_ref] != current_batch:
-            assert batches[i_batch_start:i_ref].all_eq(current_batch)
-            values_for_batch = values[i_batch_start:i_ref]
-            data.append(function_to_apply(values_for_batch))
-            batch_bins.append(current_batch)
-            i_batch_start = i_ref
-            if i_ref < n_ref:
-                current_batch = batches[i_batch_start]
-    return batch_bins, data
+    batches = flumpy.to_numpy(batches)
+    if not batches.size:
+        return [], np.zeros(0, dtype=int), tuple(np.zeros(0) for _ in values)
+    order = np.argsort(batches, kind="stable")
+    batches = batches[order]
+    starts = np.concatenate(([0], np.flatnonzero(batches[1:] != batches[:-1]) + 1))
+    counts = np.diff(np.append(starts, batches.size))
+    sums = tuple(
+        np.add.reduceat(np.asarray(v, dtype=np.float64)[order], starts) for v in values
+    )
+    return batches[starts].tolist(), counts, sums
 
 
 formats = {
@@ -2,7 +2,10 @@
 
 import math
 
+import numpy as np
+
 from dials.array_family import flex
+from dials.util.histogram import bin_counts, bin_indices
 
 
 def spot_counts_per_image_plot(reflections, **kwargs):
@@ -41,15 +44,13 @@ def flex_histogram(z, char="*", width=60, height=10):
     z_step = (max_z - min_z) / width
 
     # bin all spots
-    counts = flex.double()
-    seen_spots = 0
-    for i in range(1, width):
-        z_bound = min_z + (i * z_step)
-        spots = (z < z_bound).count(True)
-        counts.append(spots - seen_spots)
-        seen_spots = spots
-    spots = (z >= z_bound).count(True)
-    counts.append(spots)
+    z_bounds = min_z + (np.arange(1, width) * z_step)
+    edges = np.concatenate(([-np.inf], z_bounds, [np.inf]))
+    counts = flex.double(
+        bin_counts(bin_indices(z.as_numpy_array(), edges), width)
+        .astype(np.float64)
+        .tolist()
+    )
 
     max_count = flex.max(counts)
     total_counts = flex.sum(counts)
@@ -0,0 +1,107 @@
+"""Common parameters, timing and reporting for the dev.dials.benchmark commands."""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Callable, NamedTuple
+
+import libtbx.phil
+
+import dials.util
+
+benchmark_phil_str = """
+  repeats = %(repeats)d
+    .type = int(value_min=1)
+    .help = "The number of times to repeat each measurement, reporting the fastest"
+  output {
+    json = None
+      .type = path
+      .help = "Write the benchmark results to a json file"
+  }
+"""
+
+seed_phil_str = """
+  seed = 0
+    .type = int
+    .help = "The seed for the random number generator used to generate the data"
+"""
+
+
+def make_phil_scope(
+    phil_str: str = "", repeats: int = 3, seed: bool = False
+) -> libtbx.phil.scope:
+    """
+    Make the phil scope of a benchmark command.
+
+    Args:
+        phil_str: The parameters specific to the benchmark
+        repeats: The default number of times to repeat each measurement
+        seed: Whether to include a seed for generating random data
+
+    Returns:
+        The parameters of the benchmark, followed by the repeats, seed (if
+        requested) and output parameters common to all benchmarks.
+    """
+    return libtbx.phil.parse(
+        phil_str
+        + (seed_phil_str if seed else "")
+        + benchmark_phil_str % {"repeats": repeats}
+    )
+
+
+def best_time(function: Callable, repeats: int, *args, **kwargs) -> tuple[float, Any]:
+    """
+    Time several calls to a function.
+
+    Returns:
+        The fastest time (in seconds) and the value returned by that call.
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, result)
+    return best
+
+
+class Column(NamedTuple):
+    """A column of the table of benchmark results."""
+
+    header: str
+    key: str
+    format: str | Callable[[Any], str] = ""
+
+
+def report(
+    results: list[dict],
+    columns: list[Column],
+    json_file: str | None = None,
+    **metadata,
+) -> None:
+    """
+    Print a table of benchmark results, and optionally write them to a json file.
+
+    Args:
+        results: The results, one dictionary for each row of the table
+        columns: The columns of the table
+        json_file: The json file to write, containing any metadata along with
+            the list of results
+        **metadata: Additional information to include in the json file
+    """
+    rows = [
+        [
+            column.format(result[column.key])
+            if callable(column.format)
+            else format(result[column.key], column.format)
+            for column in columns
+        ]
+        for result in results
+    ]
+    print(dials.util.tabulate(rows, [column.header for column in columns]))
+
+    if json_file:
+        with open(json_file, "w") as f:
+            json.dump({**metadata, "results": results}, f, indent=2)
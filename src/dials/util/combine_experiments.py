@@ -1,12 +1,16 @@
 from __future__ import annotations
 
 import logging
+import os
 import random
 import sys
 from dataclasses import dataclass
 
+import numpy as np
+
 import dxtbx.model
 import dxtbx.model.compare as compare
+from dxtbx import flumpy
 from dxtbx.model.experiment_list import (
     BeamComparison,
     DetectorComparison,
@@ -452,8 +456,44 @@ def combine_experiments_no_reflections(params, experiment_lists):
     return experiments
 
 
+class _ImagesetIndex:
+    """
+    The positions of the unique imagesets of a sequence of experiments, in the
+    order they first appear (as for ExperimentList.imagesets()).
+
+    Imagesets are found with a dictionary lookup on their length, first path
+    and the range of images they use from their data, rather than by
+    comparison with each imageset seen so far. The images used are included so
+    that single-image imagesets from the same (e.g. HDF5) file are told apart
+    by the lookup.
+    """
+
+    def __init__(self):
+        self._imagesets = {}
+        self._count = 0
+
+    def index(self, imageset):
+        """Get the position of an imageset, adding it if it is not yet known."""
+        key = None
+        if len(imageset):
+            indices = imageset.indices()
+            key = (len(imageset), imageset.get_path(0), indices[0], indices[-1])
+        candidates = self._imagesets.setdefault(key, [])
+        for position, other in candidates:
+            if other == imageset:
+                return position
+        candidates.append((self._count, imageset))
+        self._count += 1
+        return self._count - 1
+
+
 def combine_experiments(params, experiment_lists, reflection_tables):
-    """Run combine_experiments"""
+    """Run combine_experiments
+
+    The reflection tables may be given as filenames, in which case each is read
+    only when it is reached, and released once its reflections have been
+    selected, so that the inputs are not all held in memory at once.
+    """
 
     flat_exps = ExperimentList()
     try:
@@ -480,8 +520,9 @@ def combine_experiments(params, experiment_lists, reflection_tables):
     )
 
     # set up global experiments and reflections lists
-    reflections = flex.reflection_table()
     experiments = ExperimentList()
+    combined_imagesets = _ImagesetIndex()
+    tables = []
     global_id = 0
     skipped_expts_min_refl = 0
     skipped_expts_max_refl = 0
@@ -489,17 +530,32 @@ def combine_experiments(params, experiment_lists, reflection_tables):
     # loop through the input, building up the global lists
     nrefs_per_exp = []
     for refs, exps in zip(reflection_tables, experiment_lists):
+        if isinstance(refs, (str, os.PathLike)):
+            refs = flex.reflection_table.from_file(refs)
+            if params.output.delete_shoeboxes and "shoebox" in refs:
+                del refs["shoebox"]
         # Record initial mapping of ids for updating later.
         ids_map = dict(refs.experiment_identifiers())
         # Keep track of mapping of imageset_ids old->new within this experimentlist
         imageset_result_map = {}
+        input_imagesets = _ImagesetIndex()
+
+        # Find the rows of each experiment with one pass over the table, and
+        # collect the selected rows with their new id and imageset_id values
+        index = refs.experiment_id_index() if len(refs) else None
+        old_imageset_ids = None
+        if "imageset_id" in refs:
+            old_imageset_ids = flumpy.to_numpy(refs["imageset_id"])
+        rows = []
+        new_ids = []
+        new_imageset_ids = []
+        identifiers = {}
 
-        for k in refs.experiment_identifiers().keys():
-            del refs.experiment_identifiers()[k]
         for i, exp in enumerate(exps):
-            sel = refs["id"] == i
-            sub_ref = refs.select(sel)
-            n_sub_ref = len(sub_ref)
+            if exp.imageset:
+                old_imageset_id = input_imagesets.index(exp.imageset)
+            sub_rows = index.rows(i) if index else np.zeros(0, dtype=np.intp)
+            n_sub_ref = sub_rows.size
             if (
                 params.output.min_reflections_per_experiment is not None
                 and n_sub_ref < params.output.min_reflections_per_experiment
@@ -514,13 +570,13 @@ def combine_experiments(params, experiment_lists, reflection_tables):
                 continue
 
             nrefs_per_exp.append(n_sub_ref)
-            sub_ref["id"] = flex.int(len(sub_ref), global_id)
+            rows.append(sub_rows)
+            new_ids.append(np.full(n_sub_ref, global_id, dtype=np.int32))
 
             # now update identifiers if set.
             if i in ids_map:
-                sub_ref.experiment_identifiers()[global_id] = ids_map[i]
-            if params.output.delete_shoeboxes and "shoebox" in sub_ref:
-                del sub_ref["shoebox"]
+                identifiers[global_id] = ids_map[i]
+            global_id += 1
 
             try:
                 experiments.append(combine(exp))
@@ -531,36 +587,65 @@ def combine_experiments(params, experiment_lists, reflection_tables):
                     f"Model didn't match reference within required tolerance for experiment {index} in input file {i}:"
                     f"\n{str(e)}\nAdjust tolerances or set compare_models=False to ignore differences."
                 )
+            if experiments[-1].imageset:
+                new_imageset_id = combined_imagesets.index(experiments[-1].imageset)
 
+            if old_imageset_ids is None:
+                continue
+            sub_imageset_ids = old_imageset_ids[sub_rows]
             # Rewrite imageset_id, if the experiment has an imageset
-            if exp.imageset and "imageset_id" in sub_ref:
-                # Get the index of the imageset for this experiment and record how it changed
-                new_imageset_id = experiments.imagesets().index(
-                    experiments[-1].imageset
-                )
-                old_imageset_id = exps.imagesets().index(exp.imageset)
+            if exp.imageset:
+                # Record how the index of the imageset for this experiment changed
                 imageset_result_map[old_imageset_id] = new_imageset_id
 
                 # Check for invalid(?) imageset_id indices... and leave if they are wrong
-                if len(set(sub_ref["imageset_id"])) != 1:
+                if n_sub_ref and sub_imageset_ids.min() != sub_imageset_ids.max():
                     logger.warning(
                         "Warning: Experiment %d reflections appear to have come from multiple imagesets - output may be incorrect",
                         i,
                     )
                 else:
-                    sub_ref["imageset_id"] = flex.int(len(sub_ref), new_imageset_id)
-
-            reflections.extend(sub_ref)
-
-            global_id += 1
+                    sub_imageset_ids = np.full(n_sub_ref, new_imageset_id, np.int32)
+            new_imageset_ids.append(sub_imageset_ids)
 
         # Include unindexed reflections, if we can safely remap their imagesets
-        if "imageset_id" in reflections:
-            unindexed_refs = refs.select(refs["id"] == -1)
-            for old_id in set(unindexed_refs["imageset_id"]):
-                subs = unindexed_refs.select(unindexed_refs["imageset_id"] == old_id)
-                subs["imageset_id"] = flex.int(len(subs), imageset_result_map[old_id])
-                reflections.extend(subs)
+        if old_imageset_ids is not None and global_id and index:
+            unindexed = index.rows(-1)
+            old_ids, inverse = np.unique(
+                old_imageset_ids[unindexed], return_inverse=True
+            )
+            new_ids_lookup = np.array(
+                [imageset_result_map[old_id] for old_id in old_ids.tolist()],
+                dtype=np.int32,
+            )
+            # Keep the unindexed reflections grouped by imageset
+            order = np.argsort(inverse, kind="stable")
+            rows.append(unindexed[order])
+            new_ids.append(np.full(unindexed.size, -1, dtype=np.int32))
+            new_imageset_ids.append(new_ids_lookup[inverse[order]])
+
+        if not rows:
+            continue
+        rows = np.concatenate(rows)
+        table = refs.select(flex.size_t(rows.astype(np.uint64)))
+        table["id"] = flumpy.from_numpy(np.concatenate(new_ids))
+        if new_imageset_ids:
+            table["imageset_id"] = flumpy.from_numpy(
+                np.concatenate(new_imageset_ids).astype(np.int32)
+            )
+        for k in table.experiment_identifiers().keys():
+            del table.experiment_identifiers()[k]
+        for k, v in identifiers.items():
+            table.experiment_identifiers()[k] = v
+        if params.output.delete_shoeboxes and "shoebox" in table:
+            del table["shoebox"]
+        tables.append(table)
+
+    # Join the reflections selected from each input
+    reflections = flex.reflection_table()
+    for table in tables:
+        reflections.extend(table)
+    del tables
 
     # Finished building global lists
 
@@ -6,6 +6,7 @@
 from libtbx.math_utils import iceil
 
 from dials.array_family import flex
+from dials.util.histogram import bin_indices, bin_means
 
 logger = logging.getLogger(__name__)
 
@@ -103,16 +104,6 @@ def blank_integrated_analysis(reflections, scan, phi_step, fractional_loss):
     logger.debug("Histogram:")
     logger.debug(hist.as_str())
 
-    mean_i_sigi = flex.double()
-    for i, slot_info in enumerate(hist.slot_infos()):
-        sel = (z_px >= slot_info.low_cutoff) & (z_px < slot_info.high_cutoff)
-        if sel.count(True) == 0:
-            mean_i_sigi.append(0)
-        else:
-            mean_i_sigi.append(flex.mean(i_sigi.select(sel)))
-
-    potential_blank_sel = mean_i_sigi <= (fractional_loss * flex.max(mean_i_sigi))
-
     xmin, xmax = zip(
         *[
             (slot_info.low_cutoff, slot_info.high_cutoff)
@@ -120,6 +111,13 @@ def blank_integrated_analysis(reflections, scan, phi_step, fractional_loss):
         ]
     )
 
+    slots = bin_indices(z_px.as_numpy_array(), xmin, xmax)
+    mean_i_sigi = flex.double(
+        bin_means(slots, len(xmin), i_sigi.as_numpy_array()).tolist()
+    )
+
+    potential_blank_sel = mean_i_sigi <= (fractional_loss * flex.max(mean_i_sigi))
+
     d = {
         "data": [
             {
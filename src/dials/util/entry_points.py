@@ -0,0 +1,69 @@
+"""
+A cached registry of the entry points (plugins) installed in the environment.
+
+Scanning the installed distributions for entry points is comparatively slow,
+and happens for several entry point groups every time a dials command starts.
+The entry points are therefore read once using importlib.metadata, and cached
+until the contents of any of the sys.path directories change (e.g. when a
+package is installed or removed), or the cache is explicitly invalidated.
+"""
+
+from __future__ import annotations
+
+import importlib.metadata
+import os
+import sys
+
+_cache = {"signature": None, "groups": {}}
+
+
+def _sys_path_signature() -> tuple:
+    """A cheap fingerprint of the locations that distributions are found in."""
+    signature = []
+    for path in sys.path:
+        try:
+            mtime = os.stat(path or os.curdir).st_mtime_ns
+        except OSError:
+            mtime = None
+        signature.append((path, mtime))
+    return tuple(signature)
+
+
+def invalidate_cache() -> None:
+    """Discard the cached entry points, so that they are reread on next use."""
+    _cache["signature"] = None
+    _cache["groups"] = {}
+
+
+def entry_points(
+    group: str, name: str | None = None
+) -> list[importlib.metadata.EntryPoint]:
+    """
+    Get the registered entry points for an entry point group.
+
+    Args:
+        group: The name of the entry point group, e.g. dxtbx.profile_model
+        name: If given, only return the entry points with this name
+
+    Returns:
+        A list of the matching entry points, in the order they were found.
+    """
+    signature = _sys_path_signature()
+    if signature != _cache["signature"]:
+        groups = {}
+        seen = set()
+        for dist in importlib.metadata.distributions():
+            # As importlib.metadata.entry_points, only use the first
+            # distribution found with a given name.
+            dist_name = dist.name.lower().replace("-", "_") if dist.name else None
+            if dist_name in seen:
+                continue
+            seen.add(dist_name)
+            for entry_point in dist.entry_points:
+                groups.setdefault(entry_point.group, []).append(entry_point)
+        _cache["groups"] = groups
+        _cache["signature"] = signature
+    found = _cache["groups"].get(group, [])
+    if name is not None:
+        return [entry_point for entry_point in found if entry_point.name == name]
+    return list(found)
@@ -12,6 +12,7 @@
 from cctbx import crystal as cctbxcrystal
 from cctbx import miller
 from cctbx.sgtbx import bravais_types
+from dxtbx import flumpy
 from iotbx.merging_statistics import dataset_statistics
 from libtbx import Auto
 from scitbx.array_family import flex
@@ -60,13 +61,15 @@ def write(self, experiments, reflections):
         else:
             filename = self.params.mmcif.hklout
 
-        # Add the block
-        self._cif["dials"] = self.make_cif_block(experiments, reflections)
+        # Add the block, leaving out the reflection data which are written after
+        self._cif["dials"], reflection_data = self._make_cif_block(
+            experiments, reflections
+        )
 
         if self.params.mmcif.pdb_version == "v5":
-            loop_format_strings = {"_diffrn_refln": self._v5_0_fmt}
+            fmt_str = self._v5_0_fmt
         else:
-            loop_format_strings = {"_pdbx_diffrn_unmerged_refln": self._v5_next_fmt}
+            fmt_str = self._v5_next_fmt
 
         # Print to file
         if self.params.mmcif.compress and not filename.endswith(
@@ -82,13 +85,24 @@ def write(self, experiments, reflections):
         else:
             open_fn = open
         with open_fn(filename, "wt") as fh:
-            self._cif.show(out=fh, loop_format_strings=loop_format_strings)
+            self._cif.show(out=fh)
+            _write_loop(fh, reflection_data, fmt_str, self.params.chunk_size)
 
         # Log
         logger.info("Wrote reflections to %s", filename)
 
     def make_cif_block(self, experiments, reflections):
         """Write the data to a cif block"""
+        cif_block, reflection_data = self._make_cif_block(experiments, reflections)
+        cif_block.add_loop(iotbx.cif.model.loop(data=reflection_data))
+        return cif_block
+
+    def _make_cif_block(self, experiments, reflections):
+        """
+        Write the metadata to a cif block, returning the block and the columns
+        of the reflection data loop (by data name), so that the reflection data
+        can be written without first formatting all of them as a cif loop.
+        """
         # Select reflections
         # if rotation, get reflections integrated by both integration methods
         # else if stills, only summation integrated reflections are available.
@@ -425,10 +439,7 @@ def make_cif_block(self, experiments, reflections):
                 det_x,
                 det_y,
             ] + [reflections[name] for name in variables_present]
-            cif_loop = iotbx.cif.model.loop(data=dict(zip(v5_0_header, loop_values)))
-            cif_block.add_loop(cif_loop)
-
-            return cif_block
+            return cif_block, dict(zip(v5_0_header, loop_values))
         # continue if v5_next
         cif_loop = iotbx.cif.model.loop(
             header=(
@@ -510,7 +521,31 @@ def make_cif_block(self, experiments, reflections):
             k,
             l,
         ] + [reflections[name] for name in variables_present]
-        cif_loop = iotbx.cif.model.loop(data=dict(zip(v5_next_header, loop_values)))
-        cif_block.add_loop(cif_loop)
+        return cif_block, dict(zip(v5_next_header, loop_values))
 
-        return cif_block
+
+def _write_loop(fh, data, fmt_str, chunk_size=None, indent="  "):
+    """
+    Write a cif loop of array columns, formatting chunk_size rows at a time.
+
+    The output is as for iotbx.cif.model.loop.show with a format string, but
+    without building the complete loop, nor its formatted text, in memory.
+
+    Args:
+        fh: The open file to write to
+        data: A dictionary of columns (flex arrays) by data name
+        fmt_str: The format string for a row of the loop
+        chunk_size: The number of rows to format at a time (default all)
+        indent: The indentation of the data names
+    """
+    fh.write("loop_\n")
+    for key in data:
+        fh.write(f"{indent}{key}\n")
+    columns = [flumpy.to_numpy(column) for column in data.values()]
+    n_rows = len(columns[0]) if columns else 0
+    chunk_size = chunk_size or max(n_rows, 1)
+    fmt_str = fmt_str + "\n"
+    for start in range(0, n_rows, chunk_size):
+        rows = zip(*(column[start : start + chunk_size].tolist() for column in columns))
+        fh.writelines(fmt_str % row for row in rows)
+    fh.write("\n")
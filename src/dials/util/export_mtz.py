@@ -10,7 +10,6 @@
 
 import gemmi
 import numpy as np
-import pandas as pd
 
 from cctbx import uctbx
 from dxtbx import flumpy
@@ -357,183 +356,140 @@ def add_batch_list(
     return
 
 
-def write_columns(mtz, reflection_table):
-    """Write the column definitions AND data to the current dataset."""
+def _mtz_columns(reflection_table):
+    """Determine the columns to write to the mtz file.
 
-    nref = len(reflection_table["miller_index"])
-    assert nref
-    xdet, ydet, _ = (
-        flex.double(x) for x in reflection_table["xyzobs.px.value"].parts()
-    )
+    Returns a list of (label, mtz column type, getter, transform) tuples, where
+    the getter returns an array (usually a view) of the source data from a
+    reflection table, and the optional transform is applied to each chunk of
+    that data. A getter of None denotes a column of a constant value, given by
+    the transform.
+    """
 
-    type_table = {
-        "H": "H",
-        "K": "H",
-        "L": "H",
-        "I": "J",
-        "SIGI": "Q",
-        "IPR": "J",
-        "SIGIPR": "Q",
-        "BG": "R",
-        "SIGBG": "R",
-        "XDET": "R",
-        "YDET": "R",
-        "BATCH": "B",
-        "BGPKRATIOS": "R",
-        "WIDTH": "R",
-        "MPART": "I",
-        "M_ISYM": "Y",
-        "FLAG": "I",
-        "LP": "R",
-        "FRACTIONCALC": "R",
-        "ROT": "R",
-        "QE": "R",
-    }
-
-    mtz_data = pd.DataFrame(
-        flumpy.to_numpy(reflection_table["miller_index"]).astype("float32"),
-        columns=["H", "K", "L"],
-    )
-    mtz_data.insert(3, "M/ISYM", np.zeros(nref, dtype="float32"))
+    def column(key, component=None):
+        if component is None:
+            return lambda table: flumpy.to_numpy(table[key])
+        return lambda table: flumpy.to_numpy(table[key])[:, component]
+
+    def variance(key):
+        def check_and_sqrt(v):
+            assert (v > 0).all()  # Trap negative variances
+            return np.sqrt(v)
+
+        return column(key), check_and_sqrt
 
     # H, K, L are in the base dataset, but we have to add M/ISYM
-    mtz.add_column("M/ISYM", type_table["M_ISYM"])
-    mtz.add_column("BATCH", type_table["BATCH"])
-    mtz_data.insert(
-        4, "BATCH", flumpy.to_numpy(reflection_table["batch"]).astype("float32")
-    )
+    columns = [
+        ("H", None, column("miller_index", 0), None),
+        ("K", None, column("miller_index", 1), None),
+        ("L", None, column("miller_index", 2), None),
+        ("M/ISYM", "Y", None, 0),
+        ("BATCH", "B", column("batch"), None),
+    ]
 
     # if intensity values used in scaling exist, then just export these as I, SIGI
     if "intensity.scale.value" in reflection_table:
-        I_scaling = reflection_table["intensity.scale.value"]
-        V_scaling = reflection_table["intensity.scale.variance"]
-        assert V_scaling.all_gt(0)  # Trap negative variances
-        mtz.add_column("I", type_table["I"])
-        mtz_data.insert(
-            len(mtz_data.columns), "I", flumpy.to_numpy(I_scaling).astype("float32")
-        )
-        mtz.add_column("SIGI", type_table["SIGI"])
-        mtz_data.insert(
-            len(mtz_data.columns),
-            "SIGI",
-            flumpy.to_numpy(flex.sqrt(V_scaling)).astype("float32"),
-        )
-        mtz.add_column("SCALEUSED", "R")
-        mtz_data.insert(
-            len(mtz_data.columns),
-            "SCALEUSED",
-            flumpy.to_numpy(reflection_table["inverse_scale_factor"]).astype("float32"),
-        )
-        mtz.add_column("SIGSCALEUSED", "R")
-        mtz_data.insert(
-            len(mtz_data.columns),
-            "SIGSCALEUSED",
-            flumpy.to_numpy(
-                flex.sqrt(reflection_table["inverse_scale_factor_variance"])
-            ).astype("float32"),
-        )
+        columns += [
+            ("I", "J", column("intensity.scale.value"), None),
+            ("SIGI", "Q", *variance("intensity.scale.variance")),
+            ("SCALEUSED", "R", column("inverse_scale_factor"), None),
+            (
+                "SIGSCALEUSED",
+                "R",
+                column("inverse_scale_factor_variance"),
+                np.sqrt,
+            ),
+        ]
     else:
         if "intensity.prf.value" in reflection_table:
             if "intensity.sum.value" in reflection_table:
                 col_names = ("IPR", "SIGIPR")
             else:
                 col_names = ("I", "SIGI")
-            I_profile = reflection_table["intensity.prf.value"]
-            V_profile = reflection_table["intensity.prf.variance"]
-            assert V_profile.all_gt(0)  # Trap negative variances
-            mtz.add_column(col_names[0], type_table["I"])
-            mtz_data.insert(
-                len(mtz_data.columns),
-                col_names[0],
-                flumpy.to_numpy(I_profile.as_float()).astype("float32"),
-            )
-            mtz.add_column(col_names[1], type_table["SIGI"])
-            mtz_data.insert(
-                len(mtz_data.columns),
-                col_names[1],
-                flumpy.to_numpy(flex.sqrt(V_profile)).astype("float32"),
-            )
+            columns += [
+                (col_names[0], "J", column("intensity.prf.value"), None),
+                (col_names[1], "Q", *variance("intensity.prf.variance")),
+            ]
 
         if "intensity.sum.value" in reflection_table:
-            I_sum = reflection_table["intensity.sum.value"]
-            V_sum = reflection_table["intensity.sum.variance"]
-            assert V_sum.all_gt(0)  # Trap negative variances
-            mtz.add_column("I", type_table["I"])
-            mtz_data.insert(
-                len(mtz_data.columns), "I", flumpy.to_numpy(I_sum).astype("float32")
-            )
-            mtz.add_column("SIGI", type_table["SIGI"])
-            mtz_data.insert(
-                len(mtz_data.columns),
-                "SIGI",
-                flumpy.to_numpy(flex.sqrt(V_sum)).astype("float32"),
-            )
+            columns += [
+                ("I", "J", column("intensity.sum.value"), None),
+                ("SIGI", "Q", *variance("intensity.sum.variance")),
+            ]
 
     if (
         "background.sum.value" in reflection_table
         and "background.sum.variance" in reflection_table
     ):
-        bg = reflection_table["background.sum.value"]
-        varbg = reflection_table["background.sum.variance"]
-        assert (varbg >= 0).count(False) == 0
-        sigbg = flex.sqrt(varbg)
-        mtz.add_column("BG", type_table["BG"])
-        mtz_data.insert(
-            len(mtz_data.columns), "BG", flumpy.to_numpy(bg).astype("float32")
-        )
-        mtz.add_column("SIGBG", type_table["SIGBG"])
-        mtz_data.insert(
-            len(mtz_data.columns), "SIGBG", flumpy.to_numpy(sigbg).astype("float32")
-        )
 
-    mtz.add_column("FRACTIONCALC", type_table["FRACTIONCALC"])
-    mtz_data.insert(
-        len(mtz_data.columns),
-        "FRACTIONCALC",
-        flumpy.to_numpy(reflection_table["fractioncalc"]).astype("float32"),
-    )
+        def check_and_sqrt(varbg):
+            assert (varbg >= 0).all()
+            return np.sqrt(varbg)
 
-    mtz.add_column("XDET", type_table["XDET"])
-    mtz_data.insert(
-        len(mtz_data.columns), "XDET", flumpy.to_numpy(xdet).astype("float32")
-    )
-    mtz.add_column("YDET", type_table["YDET"])
-    mtz_data.insert(
-        len(mtz_data.columns), "YDET", flumpy.to_numpy(ydet).astype("float32")
-    )
-    mtz.add_column("ROT", type_table["ROT"])
-    mtz_data.insert(
-        len(mtz_data.columns),
-        "ROT",
-        flumpy.to_numpy(reflection_table["ROT"]).astype("float32"),
-    )
+        columns += [
+            ("BG", "R", column("background.sum.value"), None),
+            ("SIGBG", "R", column("background.sum.variance"), check_and_sqrt),
+        ]
+
+    columns += [
+        ("FRACTIONCALC", "R", column("fractioncalc"), None),
+        ("XDET", "R", column("xyzobs.px.value", 0), None),
+        ("YDET", "R", column("xyzobs.px.value", 1), None),
+        ("ROT", "R", column("ROT"), None),
+    ]
     if "lp" in reflection_table:
-        mtz.add_column("LP", type_table["LP"])
-        mtz_data.insert(
-            len(mtz_data.columns),
-            "LP",
-            flumpy.to_numpy(reflection_table["lp"]).astype("float32"),
-        )
+        columns.append(("LP", "R", column("lp"), None))
     if "qe" in reflection_table:
-        mtz.add_column("QE", type_table["QE"])
-        mtz_data.insert(
-            len(mtz_data.columns),
-            "QE",
-            flumpy.to_numpy(reflection_table["qe"]).astype("float32"),
-        )
+        columns.append(("QE", "R", column("qe"), None))
     elif "dqe" in reflection_table:
-        mtz.add_column("QE", type_table["QE"])
-        mtz_data.insert(
-            len(mtz_data.columns),
-            "QE",
-            flumpy.to_numpy(reflection_table["dqe"]).astype("float32"),
-        )
+        columns.append(("QE", "R", column("dqe"), None))
     else:
-        mtz.add_column("QE", type_table["QE"])
-        mtz_data.insert(len(mtz_data.columns), "QE", np.ones(nref).astype("float32"))
+        columns.append(("QE", "R", None, 1))
+    return columns
+
+
+def write_columns(mtz, reflection_table, chunk_size=None):
+    """Write the column definitions AND data to the current dataset.
+
+    The data may be given as a single reflection table, or as a list of tables
+    (with the same columns) to be written consecutively. The mtz data array is
+    allocated once, and filled in chunks of at most chunk_size reflections, so
+    that only a chunk's worth of temporary arrays is needed at any time.
+    """
+
+    if not isinstance(reflection_table, (list, tuple)):
+        reflection_table = [reflection_table]
+    reflection_tables = [
+        table for table in reflection_table if len(table["miller_index"])
+    ]
+    nref = sum(len(table["miller_index"]) for table in reflection_tables)
+    assert nref
+    if chunk_size is None:
+        chunk_size = nref
+
+    columns = _mtz_columns(reflection_tables[0])
+    mtz_data = np.empty((nref, len(columns)), dtype="float32")
+    offset = 0
+    for table in reflection_tables:
+        n = len(table["miller_index"])
+        sources = [getter(table) if getter else None for _, _, getter, _ in columns]
+        for start in range(0, n, chunk_size):
+            end = min(start + chunk_size, n)
+            rows = slice(offset + start, offset + end)
+            for j, (source, (_, _, _, transform)) in enumerate(zip(sources, columns)):
+                if source is None:
+                    mtz_data[rows, j] = transform
+                elif transform is None:
+                    mtz_data[rows, j] = source[start:end]
+                else:
+                    mtz_data[rows, j] = transform(source[start:end])
+        offset += n
+
+    for label, column_type, _, _ in columns[3:]:
+        mtz.add_column(label, column_type)
 
     mtz.switch_to_original_hkl()
-    mtz.set_data(mtz_data.to_numpy())
+    mtz.set_data(mtz_data)
 
 
 def export_mtz(
@@ -551,9 +507,10 @@ def export_mtz(
     crystal_name=None,
     project_name=None,
     wavelength_tolerance=1e-4,
+    chunk_size=None,
 ):
     """Export data from reflection_table corresponding to experiment_list to an
-    MTZ file hklout."""
+    MTZ file hklout. The mtz data are filled in chunks of chunk_size reflections."""
 
     # First get the experiment identifier information out of the data
     expids_in_table = reflection_table.experiment_identifiers()
@@ -756,27 +713,24 @@ def export_mtz(
         ds.project_name = project_name
         ds.wavelength = wavelength.weighted_mean
 
-    # Combine all of the experiment data columns before writing
-    combined_data = {k: v.deep_copy() for k, v in experiment_list[0].data.items()}
-    for experiment in experiment_list[1:]:
-        for k, v in experiment.data.items():
-            combined_data[k].extend(v)
-    # ALL columns must be the same length
-    assert len({len(v) for v in combined_data.values()}) == 1, "Column length mismatch"
-    assert len(combined_data["id"]) == len(
-        reflection_table["id"]
-    ), "Lost rows in split/combine"
+    # Write the experiment data consecutively, rather than combining all of the
+    # data columns before writing
+    experiment_data = [experiment.data for experiment in experiment_list]
+    # ALL experiments must have the same columns, of the same length
+    assert len({frozenset(data) for data in experiment_data}) == 1, "Column mismatch"
+    for data in experiment_data:
+        assert len({len(v) for v in data.values()}) == 1, "Column length mismatch"
+    n_written = sum(len(data["id"]) for data in experiment_data)
+    assert n_written == len(reflection_table["id"]), "Lost rows in split/combine"
 
     # Write all the data and columns to the mtz file
-    write_columns(mtz, combined_data)
+    write_columns(mtz, experiment_data, chunk_size=chunk_size)
 
     # Switch to ASU indices and sort file in standard order
     mtz.switch_to_asu_hkl()
     mtz.sort(5)
 
-    logger.info(
-        "Saving %s integrated reflections to %s", len(combined_data["id"]), filename
-    )
+    logger.info("Saving %s integrated reflections to %s", n_written, filename)
     mtz.write_to_file(filename)
     log_summary(mtz)
 
@@ -4,9 +4,12 @@
 import logging
 import os
 
+import numpy as np
+
 import dxtbx.model  # noqa: F401
 import libtbx.phil  # noqa: F401
 from cctbx.miller import map_to_asu
+from dxtbx import flumpy
 from rstbx.cftbx.coordinate_frame_helpers import align_reference_frame
 from scitbx import matrix
 
@@ -84,16 +87,14 @@ def _export_experiment(
         scl,
     ) = FilteringReductionMethods.calculate_lp_qe_correction_and_filter(integrated_data)
 
-    # sort data before output
-    nref = len(integrated_data["miller_index"])
-    indices = flex.size_t_range(nref)
-
+    # sort data before output, on the asymmetric unit indices
     unique = copy.deepcopy(integrated_data["miller_index"])
 
     map_to_asu(experiment.crystal.get_space_group().type(), False, unique)
 
-    perm = sorted(indices, key=lambda k: unique[k])
-    integrated_data = integrated_data.select(flex.size_t(perm))
+    unique = flumpy.to_numpy(unique)
+    perm = np.lexsort((unique[:, 2], unique[:, 1], unique[:, 0]))
+    del unique
 
     if experiment.goniometer is None:
         print("Warning: No goniometer. Experimentally exporting with (1 0 0) axis")
@@ -112,32 +113,29 @@ def _export_experiment(
 
     nref = len(integrated_data["miller_index"])
 
-    miller_index = integrated_data["miller_index"]
+    miller_index = flumpy.to_numpy(integrated_data["miller_index"])
+    xyzcal = flumpy.to_numpy(integrated_data["xyzcal.px"])
+    scl = flumpy.to_numpy(scl)
 
     # profile correlation
     if "profile.correlation" in integrated_data:
-        prof_corr = 100.0 * integrated_data["profile.correlation"]
+        prof_corr = 100.0 * flumpy.to_numpy(integrated_data["profile.correlation"])
     else:
-        prof_corr = flex.double(nref, 100.0)
+        prof_corr = np.full(nref, 100.0)
 
     # partiality
     if "partiality" in integrated_data:
-        partiality = 100 * integrated_data["partiality"]
+        partiality = 100.0 * flumpy.to_numpy(integrated_data["partiality"])
     else:
-        prof_corr = flex.double(nref, 100.0)
+        partiality = np.full(nref, 100.0)
 
     if "intensity.sum.value" in integrated_data:
-        I = integrated_data["intensity.sum.value"]
-        V = integrated_data["intensity.sum.variance"]
-        assert V.all_gt(0)
-        V = var_model[0] * (V + var_model[1] * I * I)
-        sigI = flex.sqrt(V)
+        I = flumpy.to_numpy(integrated_data["intensity.sum.value"])
+        V = flumpy.to_numpy(integrated_data["intensity.sum.variance"])
     else:
-        I = integrated_data["intensity.prf.value"]
-        V = integrated_data["intensity.prf.variance"]
-        assert V.all_gt(0)
-        V = var_model[0] * (V + var_model[1] * I * I)
-        sigI = flex.sqrt(V)
+        I = flumpy.to_numpy(integrated_data["intensity.prf.value"])
+        V = flumpy.to_numpy(integrated_data["intensity.prf.variance"])
+    assert (V > 0).all()
 
     fout = open(filename, "w")
 
@@ -227,53 +225,81 @@ def _export_experiment(
         )
     )
 
-    # then write the data records
+    # then write the data records, a chunk at a time in the sorted order
 
     s0 = Rd * matrix.col(experiment.beam.get_s0())
+    chunk_size = params.chunk_size
+    record_fmt = "%d %d %d %f %f %f %f %f %f %.1f %.1f %f\n"
 
-    for j in range(nref):
-        x, y, z = integrated_data["xyzcal.px"][j]
+    for start in range(0, nref, chunk_size):
+        sel = perm[start : start + chunk_size]
+        hkl = miller_index[sel]
+        x, y, z = xyzcal[sel].T
         phi = phi_start + z * phi_range
-        h, k, l = miller_index[j]
-        X = (UB * (h, k, l)).rotate(axis, phi, deg=True)
-        s = s0 + X
-        g = s.cross(s0).normalize()
-
-        # find component of beam perpendicular to f, e
-        e = -(s + s0).normalize()
-        if h == k and k == l:
-            u = (h, -h, 0)
-        else:
-            u = (k - l, l - h, h - k)
-        q = (
-            (matrix.col(u).transpose() * UB.inverse())
-            .normalize()
-            .transpose()
-            .rotate(axis, phi, deg=True)
-        )
-
-        psi = q.angle(g, deg=True)
-        if q.dot(e) < 0:
-            psi *= -1
-
-        fout.write(
-            "%d %d %d %f %f %f %f %f %f %.1f %.1f %f\n"
-            % (
-                h,
-                k,
-                l,
-                I[j],
-                sigI[j],
-                x,
-                y,
-                z,
-                scl[j],
-                partiality[j],
-                prof_corr[j],
-                psi,
+        psi = _psi_angles(hkl, phi, UB, axis, s0)
+        i_obs = I[sel]
+        sig_i = np.sqrt(var_model[0] * (V[sel] + var_model[1] * i_obs * i_obs))
+
+        fout.writelines(
+            record_fmt % record
+            for record in zip(
+                *hkl.T.tolist(),
+                i_obs.tolist(),
+                sig_i.tolist(),
+                x.tolist(),
+                y.tolist(),
+                z.tolist(),
+                scl[sel].tolist(),
+                partiality[sel].tolist(),
+                prof_corr[sel].tolist(),
+                psi.tolist(),
             )
         )
 
     fout.write("!END_OF_DATA\n")
     fout.close()
     logger.info("Output %d reflections to %s", nref, filename)
+
+
+def _rotate(vectors, axis, angles):
+    """Rotate each of an array of vectors about an axis by the angles (in rad)."""
+    n = np.array(axis.normalize().elems)
+    c = np.cos(angles)[:, np.newaxis]
+    s = np.sin(angles)[:, np.newaxis]
+    return vectors * c + np.outer(vectors @ n, n) * (1.0 - c) + np.cross(n, vectors) * s
+
+
+def _psi_angles(hkl, phi, UB, axis, s0):
+    """Calculate the psi angle (in degrees) for each reflection.
+
+    Args:
+        hkl: An (n, 3) array of Miller indices
+        phi: The rotation angles (in degrees) of the reflections
+        UB: The UB matrix, in the output coordinate frame
+        axis: The rotation axis, in the output coordinate frame
+        s0: The beam vector, in the output coordinate frame
+    """
+    phi = np.radians(phi)
+    UB_arr = np.array(UB.elems).reshape(3, 3)
+    UB_inv = np.array(UB.inverse().elems).reshape(3, 3)
+    s0 = np.array(s0.elems)
+
+    X = _rotate(hkl @ UB_arr.T, axis, phi)
+    s = s0 + X
+    g = np.cross(s, s0)
+    g /= np.linalg.norm(g, axis=1)[:, np.newaxis]
+
+    # find component of beam perpendicular to f, e
+    e = s + s0
+    e /= -np.linalg.norm(e, axis=1)[:, np.newaxis]
+    h, k, l = hkl.T
+    u = np.column_stack((k - l, l - h, h - k))
+    equal = (h == k) & (k == l)
+    u[equal] = np.column_stack((h, -h, np.zeros_like(h)))[equal]
+    q = u @ UB_inv
+    q /= np.linalg.norm(q, axis=1)[:, np.newaxis]
+    q = _rotate(q, axis, phi)
+
+    psi = np.degrees(np.arccos(np.clip(np.einsum("ij,ij->i", q, g), -1.0, 1.0)))
+    psi[np.einsum("ij,ij->i", q, e) < 0] *= -1
+    return psi
@@ -0,0 +1,123 @@
+"""
+Histograms of reflection properties, and counts of reflections per image.
+
+Binning reflections by testing every reflection against each bin in turn
+takes a time proportional to the number of reflections times the number of
+bins, which is slow for sweeps of many thousands of images. These functions
+find the bin of every reflection with a single search of the bin edges, and
+accumulate the counts or sums of the bins with numpy.bincount.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def bin_indices(values, edges, high_edges=None):
+    """Find the bin of each of an array of values.
+
+    Args:
+        values: The values to bin.
+        edges: The n + 1 edges of n consecutive bins, where bin i holds the
+            values edges[i] <= value < edges[i + 1]. If high_edges is given,
+            the n low edges of the bins instead.
+        high_edges: The n high edges of the bins, where bin i holds the values
+            edges[i] <= value < high_edges[i], for bins that are not exactly
+            consecutive (for instance the slots of a flex.histogram, where the
+            high edge of a slot may differ from the low edge of the next by
+            rounding). The bins must be sorted and not overlap.
+
+    Returns:
+        An array of the bin of each value, or -1 for values not in any bin.
+    """
+    values = np.asarray(values)
+    edges = np.asarray(edges, dtype=np.float64)
+    indices = np.searchsorted(edges, values, side="right") - 1
+    if high_edges is None:
+        indices[indices >= edges.size - 1] = -1
+    else:
+        high_edges = np.asarray(high_edges, dtype=np.float64)
+        inside = indices >= 0
+        inside[inside] = values[inside] < high_edges[indices[inside]]
+        indices[~inside] = -1
+    return indices
+
+
+def bin_counts(indices, n_bins, weights=None):
+    """Count the values in each bin, or sum their weights.
+
+    Args:
+        indices: The bin of each value, as from bin_indices, where values
+            with a negative bin are ignored.
+        n_bins (int): The number of bins.
+        weights: An optional weight of each value.
+
+    Returns:
+        An array of the count (or sum of the weights) of each bin.
+    """
+    indices = np.asarray(indices)
+    inside = indices >= 0
+    if weights is not None:
+        weights = np.asarray(weights)[inside]
+    return np.bincount(indices[inside], weights=weights, minlength=n_bins)
+
+
+def bin_means(indices, n_bins, values, empty=0.0):
+    """The mean of the values in each bin, or the value empty for empty bins."""
+    counts = bin_counts(indices, n_bins)
+    sums = bin_counts(indices, n_bins, weights=values)
+    means = np.full(n_bins, empty, dtype=np.float64)
+    np.divide(sums, counts, out=means, where=counts > 0)
+    return means
+
+
+def rows_per_bin(indices, n_bins):
+    """Group values by their bin with a single sort.
+
+    Args:
+        indices: The bin of each value, as from bin_indices.
+        n_bins (int): The number of bins.
+
+    Returns:
+        A tuple of the positions of the values sorted by bin (keeping their
+        order within each bin), and the n_bins + 1 boundaries of the bins in
+        this order, so that the values in bin i are at the positions
+        order[boundaries[i] : boundaries[i + 1]].
+    """
+    indices = np.asarray(indices)
+    order = np.argsort(indices, kind="stable")
+    boundaries = np.searchsorted(indices[order], np.arange(n_bins + 1))
+    return order, boundaries
+
+
+def counts_per_image(z, n_images, groups=None, n_groups=None):
+    """Count the reflections on each image.
+
+    Image i holds the reflections with i <= z < i + 1, for the images
+    0 to n_images - 1.
+
+    Args:
+        z: The z positions (in images) of the reflections.
+        n_images (int): The number of images.
+        groups: An optional group (e.g. imageset id) of each reflection, to
+            count the reflections of each group separately. Reflections with a
+            negative group are ignored.
+        n_groups (int): The number of groups, by default the largest group + 1.
+
+    Returns:
+        An array of the count of each image, or if groups are given an array of
+        shape (n_groups, n_images) of the counts of each group.
+    """
+    z = np.asarray(z)
+    inside = (z >= 0) & (z < n_images)
+    images = np.floor(z[inside]).astype(np.int64)
+    if groups is None:
+        return np.bincount(images, minlength=n_images)
+    groups = np.asarray(groups)[inside].astype(np.int64)
+    if n_groups is None:
+        n_groups = int(groups.max(initial=-1)) + 1
+    keep = (groups >= 0) & (groups < n_groups)
+    counts = np.bincount(
+        groups[keep] * n_images + images[keep], minlength=n_groups * n_images
+    )
+    return counts.reshape(n_groups, n_images)
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
 import copy
+import glob
+import hashlib
+import json
 import logging
 import math
+import os
 import sys
+import tempfile
 import time
-from collections import namedtuple
+import zipfile
+from collections import OrderedDict, namedtuple
+
+import numpy as np
 
 import libtbx.phil
 from cctbx import crystal
+from dxtbx import flumpy
 from dxtbx.masking import (
     mask_untrusted_circle,
     mask_untrusted_polygon,
@@ -99,6 +108,23 @@
       .help = "The high resolution limit (otherwise use detector d_min)"
       .expert_level = 1
   }
+
+  cache {
+    directory = None
+      .type = path
+      .help = "A directory in which to store generated masks, so that they can"
+              "be reused by other processes and later runs with the same"
+              "detector and beam geometry and masking parameters. A directory"
+              "on a memory-backed filesystem (e.g. /dev/shm) shares the masks"
+              "between processes through memory."
+      .expert_level = 2
+    max_size = 1024
+      .type = float(value_min=0)
+      .help = "The maximum total size (in MB) of the masks stored in the cache"
+              "directory. The least recently used masks are removed to keep"
+              "within this size."
+      .expert_level = 2
+  }
 """,
     process_includes=True,
 )
@@ -106,52 +132,146 @@
 CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
 
 
-def lru_equality_cache(maxsize=10):
-    """LRU cache that compares keys based on equality... inefficiently.
+def _models_hash(*models):
+    """A hash of the content of dxtbx models (or other serialisable objects)."""
+    content = json.dumps(
+        [m.to_dict() if hasattr(m, "to_dict") else m for m in models],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
 
-    Used for dxtbx models that don't have unique id values so can't be
-    cached with a normal lru_cache.
 
-    Args:
-        maxsize (int): The maximum number of old results to remember
-    """
+def _mask_cache_key(detector, beam, params):
+    """A hash of the geometry and parameters that determine a mask."""
+    parameters = "".join(
+        o.as_str() for o in phil_scope.format(params).objects if o.name != "cache"
+    )
+    return _models_hash(detector, beam, parameters)
 
-    def _decorator(f):
-        class Scope:
-            pass
-
-        cache_data = Scope()
-        cache_data.cache = []
-        cache_data.hits = 0
-        cache_data.misses = 0
-
-        def _wrapper_function(*args, **kwargs):
-            for i, (key_args, key_kwargs, key_result) in enumerate(cache_data.cache):
-                if key_args == args and key_kwargs == kwargs:
-                    cache_data.cache.append(cache_data.cache.pop(i))
-                    cache_data.hits += 1
-                    return key_result
-            result = f(*args, **kwargs)
-            cache_data.misses += 1
-            cache_data.cache.append((args, kwargs, result))
-            if len(cache_data.cache) > maxsize:
-                cache_data.cache = cache_data.cache[1:]
-            return result
-
-        def _generate_cache_info():
-            return CacheInfo(
-                hits=cache_data.hits,
-                misses=cache_data.misses,
-                maxsize=maxsize,
-                currsize=len(cache_data.cache),
-            )
 
-        _wrapper_function.__wrapped__ = f
-        _wrapper_function.cache_info = _generate_cache_info
+class MaskCache:
+    """
+    A cache of generated masks, keyed on a hash of geometry and mask parameters.
+
+    The most recently used maxsize masks are kept in memory (none if maxsize is
+    zero), and masks can also be stored in a directory to be shared with other
+    processes and later runs. The files in the directory are written
+    atomically, so concurrent use by several processes is safe, and the least
+    recently used files are removed when the total size exceeds a limit. A
+    file that cannot be read is ignored, so that the masks are regenerated.
+    """
 
-        return _wrapper_function
+    def __init__(self, maxsize=1):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def cache_info(self):
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            maxsize=self.maxsize,
+            currsize=len(self._cache),
+        )
 
-    return _decorator
+    def clear(self):
+        """Clear the in-memory cache."""
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, directory=None):
+        """Return copies of the cached masks for a key, or None if not found."""
+        masks = self._cache.get(key)
+        if masks is not None:
+            self._cache.move_to_end(key)
+        elif directory:
+            masks = self._read(os.path.join(directory, f"{key}.npz"))
+            if masks is not None:
+                self._store_in_memory(key, masks)
+        if masks is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tuple(m.deep_copy() for m in masks)
+
+    def put(self, key, masks, directory=None, max_size=None):
+        """
+        Add masks to the cache.
+
+        Args:
+            key (str): The key for the masks
+            masks (tuple): A tuple of flex.bool masks, one per panel
+            directory (str): A directory in which to also store the masks
+            max_size (float): The maximum total size of the directory in MB
+        """
+        self._store_in_memory(key, tuple(m.deep_copy() for m in masks))
+        if directory:
+            try:
+                self._write(directory, key, masks)
+                if max_size is not None:
+                    self._evict(directory, int(max_size * 1024**2))
+            except OSError as e:
+                logger.debug(f"Unable to store mask in cache directory: {e}")
+
+    def _store_in_memory(self, key, masks):
+        if self.maxsize < 1:
+            return
+        self._cache[key] = masks
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with np.load(path) as data:
+                masks = tuple(
+                    flumpy.from_numpy(np.ascontiguousarray(data[f"panel_{i}"]))
+                    for i in range(len(data.files))
+                )
+            # Mark as recently used, for eviction from the directory
+            os.utime(path)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None
+        return masks
+
+    @staticmethod
+    def _write(directory, key, masks):
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f, **{f"panel_{i}": m.as_numpy_array() for i, m in enumerate(masks)}
+                )
+            os.replace(tmp_path, os.path.join(directory, f"{key}.npz"))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _evict(directory, max_bytes):
+        files = []
+        for path in glob.glob(os.path.join(directory, "*.npz")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(f[1] for f in files)
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+_mask_cache = MaskCache()
 
 
 def generate_ice_ring_resolution_ranges(beam, panel, params):
@@ -187,12 +307,21 @@ def generate_ice_ring_resolution_ranges(beam, panel, params):
             yield (d_min, d_max)
 
 
-@lru_equality_cache(maxsize=3)
-def _get_resolution_masker(beam, panel):
+_resolution_maskers = OrderedDict()
+
+
+def _get_resolution_masker(beam, panel, maxsize=3):
+    key = _models_hash(beam, panel)
+    if key in _resolution_maskers:
+        _resolution_maskers.move_to_end(key)
+        return _resolution_maskers[key]
     t0 = time.perf_counter()
     masker = ResolutionMaskGenerator(beam, panel)
     t1 = time.perf_counter()
     logger.debug(f"ResolutionMaskGenerator calculation took {t1 - t0:.4f} seconds")
+    _resolution_maskers[key] = masker
+    if len(_resolution_maskers) > maxsize:
+        _resolution_maskers.popitem(last=False)
     return masker
 
 
@@ -205,6 +334,10 @@ def generate_mask(
 ) -> tuple[flex.bool]:
     """Generate a mask based on the input parameters.
 
+    Generated masks are cached, keyed on the detector and beam geometry and the
+    masking parameters, and are optionally stored in params.cache.directory to
+    be reused by other processes.
+
     Args:
       imageset (ImageSet): The imageset for which to generate a mask
       params (libtbx.phil.scope_extract): The phil parameters for mask generation. This
@@ -221,6 +354,12 @@ def generate_mask(
                 f"d_min = {params.d_min} > d_max = {params.d_max}: no spots will be found"
             )
 
+    cache_key = _mask_cache_key(detector, beam, params)
+    cached_masks = _mask_cache.get(cache_key, params.cache.directory)
+    if cached_masks is not None:
+        logger.debug("Using cached mask")
+        return cached_masks
+
     # Create the mask for each panel
     masks = []
     for index, panel in enumerate(detector):
@@ -338,4 +477,6 @@ def generate_mask(
         masks.append(mask)
 
     # Return the mask
-    return tuple(masks)
+    masks = tuple(masks)
+    _mask_cache.put(cache_key, masks, params.cache.directory, params.cache.max_size)
+    return masks
@@ -1,12 +1,26 @@
 from __future__ import annotations
 
+import os
 import pickle
 import shutil
 import subprocess
 
+import numpy as np
 import pytest
 
-from dials.algorithms.background.gmodel import StaticBackgroundModel
+from dxtbx import flumpy
+
+from dials.algorithms.background.gmodel import (
+    Creator,
+    ExternalBackgroundModel,
+    StaticBackgroundModel,
+)
+from dials.algorithms.background.gmodel.algorithm import (
+    ModelCache,
+    load_model,
+    mapped_model_filename,
+    save_model,
+)
 from dials.array_family import flex
 
 
@@ -138,3 +152,56 @@ def test_robust(dials_data, model, tmp_path):
 
     scale4 = integrated4["background.scale"]
     assert (scale4 > 0).count(False) == 0
+
+
+def test_mapped_model(tmp_path):
+    rng = np.random.default_rng(0)
+    model = StaticBackgroundModel()
+    for shape in ((20, 30), (10, 5)):
+        model.add(flumpy.from_numpy(rng.random(shape)))
+    filename = str(tmp_path / "model.pickle")
+    save_model(model, filename)
+    assert os.path.isfile(mapped_model_filename(filename))
+    for panel in range(len(model)):
+        assert (tmp_path / f"model.pickle.{panel}.npy").is_file()
+
+    mapped = load_model(filename)
+    assert isinstance(mapped, ExternalBackgroundModel)
+    assert len(mapped) == len(model)
+    for panel in range(len(model)):
+        assert np.array_equal(
+            flumpy.to_numpy(mapped.data(panel)), flumpy.to_numpy(model.data(panel))
+        )
+        for bbox in ((0, 5, 0, 5, 0, 1), (-2, 3, 8, 12, 4, 7), (25, 35, 15, 25, 0, 2)):
+            assert np.array_equal(
+                flumpy.to_numpy(mapped.extract(panel, bbox)),
+                flumpy.to_numpy(model.extract(panel, bbox)),
+            )
+
+    # A mapped model is pickled by value, e.g. when sent to another process
+    unpickled = pickle.loads(pickle.dumps(mapped, pickle.HIGHEST_PROTOCOL))
+    assert isinstance(unpickled, ExternalBackgroundModel)
+    assert len(unpickled) == len(model)
+    for panel in range(len(model)):
+        assert np.array_equal(
+            flumpy.to_numpy(unpickled.data(panel)), flumpy.to_numpy(model.data(panel))
+        )
+        assert np.array_equal(
+            flumpy.to_numpy(unpickled.extract(panel, (0, 5, 0, 5, 0, 1))),
+            flumpy.to_numpy(model.extract(panel, (0, 5, 0, 5, 0, 1))),
+        )
+
+    # A mapped copy that is out of date with the model file is replaced
+    model = StaticBackgroundModel()
+    model.add(flex.double(flex.grid(4, 4), 2))
+    with open(filename, "wb") as fh:
+        pickle.dump(model, fh, pickle.HIGHEST_PROTOCOL)
+    mapped = load_model(filename)
+    assert len(mapped) == 1
+    assert flumpy.to_numpy(mapped.data(0)).tolist() == [[2.0] * 4] * 4
+
+    # The creators are built once for each model and set of options
+    cache = ModelCache()
+    creator = cache.get_creator(Creator, filename, False, 10)
+    assert cache.get_creator(Creator, filename, False, 10) is creator
+    assert cache.get_creator(Creator, filename, True, 10) is not creator
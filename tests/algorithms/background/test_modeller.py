@@ -312,3 +312,72 @@ def generate_background(self, size, N, A, B, C, D):
             progress.update(100.0 * i / N)
         progress.finished("Generated Background")
         return sboxes, masks
+
+
+def test_background_statistics_pickle():
+    import pickle
+
+    from dials.algorithms.background.modeller import (
+        BackgroundStatistics,
+        MultiPanelBackgroundStatistics,
+    )
+    from dials.array_family import flex
+
+    def statistics(value):
+        grid = flex.grid(3, 4)
+        return BackgroundStatistics(
+            flex.double(grid, value),
+            flex.double(grid, value**2),
+            flex.int(grid, 1),
+            flex.double(grid, value),
+            flex.double(grid, value),
+        )
+
+    stats = statistics(2.0)
+    stats += statistics(4.0)
+    copy = pickle.loads(pickle.dumps(stats))
+    for name in ("sum", "sum_sq", "num", "min", "max"):
+        assert list(getattr(copy, name)()) == list(getattr(stats, name)())
+    assert copy.sum().all() == (3, 4)
+    assert list(copy.mean(2)) == [3.0] * 12
+    assert list(copy.variance(2)) == [1.0] * 12
+
+    # The partial sums of several jobs can be sent back and merged
+    multi_panel = MultiPanelBackgroundStatistics()
+    multi_panel.append(statistics(1.0))
+    multi_panel.append(statistics(3.0))
+    copy = pickle.loads(pickle.dumps(multi_panel))
+    assert len(copy) == 2
+    copy += multi_panel
+    assert list(copy.get(1).sum()) == [6.0] * 12
+    assert list(copy.get(0).num()) == [2] * 12
+
+
+def test_finalize_model_median_filter_blocks():
+    import concurrent.futures
+
+    from dials.algorithms.background.modeller import FinalizeModel
+    from dials.command_line.benchmark_background_model import (
+        simulated_background,
+        simulated_experiments,
+    )
+
+    image_size = (200, 150)
+    finalizer = FinalizeModel(
+        simulated_experiments(image_size), kernel_size=5, niter=10
+    )
+    image, mask = simulated_background(image_size)
+    polar = finalizer.transform.to_polar(image, mask)
+    expected = finalizer.median_filter(polar.data(), polar.mask())
+    expected_model = finalizer.smooth(image, mask)
+
+    # Filtering in blocks of columns gives the same image
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as pool:
+        for n_blocks in (2, 3, 7):
+            filtered = finalizer.median_filter(
+                polar.data(), polar.mask(), pool=pool, n_blocks=n_blocks
+            )
+            assert filtered.all() == expected.all()
+            assert list(filtered) == list(expected)
+        model = finalizer.smooth(image, mask, pool=pool, n_blocks=3)
+    assert list(model) == list(expected_model)
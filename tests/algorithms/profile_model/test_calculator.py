@@ -1,9 +1,226 @@
 from __future__ import annotations
 
+import math
+
+import numpy as np
+import pytest
+
+from dxtbx import flumpy
+from dxtbx.model import Scan
+from dxtbx.model.experiment_list import ExperimentListFactory
+from scitbx import simplex
+
 from dials.algorithms.profile_model.gaussian_rs.calculator import (
+    ComputeEsdReflectingRange,
+    _estimate_frames_sigmas,
+    _estimate_sigma_m,
+    _fraction_and_derivative,
+    _frame_observations,
     _select_reflections_for_sigma_calc,
+    _tau_and_zeta,
 )
+from dials.algorithms.shoebox import MaskCode
 from dials.array_family import flex
+from dials.command_line import create_profile_model
+from dials.model.data import Shoebox
+
+
+@pytest.fixture
+def scan():
+    return Scan(image_range=(1, 20), oscillation=(0.0, 0.2))
+
+
+@pytest.fixture
+def reflections(scan):
+    rng = np.random.default_rng(0)
+    codes = [
+        MaskCode.Valid | MaskCode.Foreground,
+        MaskCode.Valid | MaskCode.Background,
+        MaskCode.Valid,
+    ]
+    shoeboxes = flex.shoebox()
+    phi = []
+    for _ in range(50):
+        x0, y0 = rng.integers(0, 100, 2).tolist()
+        z0 = int(rng.integers(0, 16))
+        z1 = z0 + int(rng.integers(1, 5))
+        bbox = (x0, x0 + int(rng.integers(3, 6)), y0, y0 + int(rng.integers(3, 6)))
+        shoebox = Shoebox(bbox + (z0, z1))
+        shoebox.allocate()
+        size = tuple(shoebox.size())
+        shoebox.data = flumpy.from_numpy(rng.poisson(5.0, size).astype(np.float32))
+        shoebox.mask = flumpy.from_numpy(rng.choice(codes, size).astype(np.int32))
+        shoeboxes.append(shoebox)
+        phi.append(scan.get_angle_from_array_index(rng.uniform(z0, z1), deg=False))
+    reflections = flex.reflection_table()
+    reflections["shoebox"] = shoeboxes
+    reflections["bbox"] = shoeboxes.bounding_boxes()
+    reflections["xyzcal.mm"] = flex.vec3_double(
+        flex.double(len(phi), 0), flex.double(len(phi), 0), flex.double(phi)
+    )
+    reflections["zeta"] = flumpy.from_numpy(rng.uniform(0.2, 1.0, len(phi)))
+    return reflections
+
+
+def test_frame_observations(scan, reflections):
+    row, tau, n_pixels, counts = _frame_observations(scan, reflections)
+
+    # Compare with a loop over the images of each shoebox
+    mask_code = MaskCode.Valid | MaskCode.Foreground
+    phi = reflections["xyzcal.mm"].parts()[2]
+    expected = []
+    for r, (shoebox, p) in enumerate(zip(reflections["shoebox"], phi)):
+        data = flumpy.to_numpy(shoebox.data)
+        mask = flumpy.to_numpy(shoebox.mask)
+        for z, f in enumerate(range(shoebox.bbox[4], shoebox.bbox[5])):
+            phi0 = scan.get_angle_from_array_index(f, deg=False)
+            phi1 = scan.get_angle_from_array_index(f + 1, deg=False)
+            foreground = mask[z] == mask_code
+            expected.append(
+                (
+                    r,
+                    (phi1 + phi0) / 2.0 - p,
+                    np.count_nonzero(foreground),
+                    np.sum(data[z][foreground], dtype=np.float64),
+                )
+            )
+    expected = np.array(expected).T
+    assert row.tolist() == expected[0].tolist()
+    assert tau == pytest.approx(expected[1])
+    assert n_pixels.tolist() == expected[2].tolist()
+    assert counts == pytest.approx(expected[3])
+
+
+def test_fraction_and_derivative():
+    rng = np.random.default_rng(0)
+    e = rng.normal(0, 0.005, 100)
+    e1, e2 = e + 0.002, e - 0.002
+    log_sigma = math.log(0.003)
+    h = 1e-6
+    _, dR = _fraction_and_derivative(e1, e2, math.exp(log_sigma))
+    R1, _ = _fraction_and_derivative(e1, e2, math.exp(log_sigma + h))
+    R0, _ = _fraction_and_derivative(e1, e2, math.exp(log_sigma - h))
+    assert dR == pytest.approx((R1 - R0) / (2 * h), abs=1e-6)
+
+
+def test_estimate_sigma_m():
+    rng = np.random.default_rng(0)
+    zeta = rng.uniform(0.2, 1.0, 1000)
+    tau = rng.normal(0, math.radians(0.3), zeta.size) / zeta
+    dphi2 = math.radians(0.1) / 2
+
+    # The estimate is the minimum of the target found by a grid search
+    sigma_m = _estimate_sigma_m(tau, zeta, dphi2)
+    e1 = (tau + dphi2) * zeta / math.sqrt(2.0)
+    e2 = (tau - dphi2) * zeta / math.sqrt(2.0)
+    grid = np.exp(np.linspace(math.log(1e-4), math.log(0.1), 2001))
+    target = [-np.sum(np.log(_fraction_and_derivative(e1, e2, s)[0])) for s in grid]
+    assert sigma_m == pytest.approx(grid[np.argmin(target)], rel=1e-2)
+
+
+def test_estimate_frames_sigmas():
+    rng = np.random.default_rng(0)
+    zeta = rng.uniform(0.2, 1.0, 1000)
+    tau = rng.normal(0, math.radians(0.3), zeta.size) / zeta
+    dphi2 = math.radians(0.1) / 2
+    variance = np.full(zeta.size, 1e-6)
+    # Observations so far from the reflecting range that the likelihood of
+    # each is zero, so that only the crude estimate can be made
+    far_tau = np.array([1e3, -1e3, 2e3])
+    (sigma_b, sigma_m, crude), (_, crude_sigma_m, far_crude) = _estimate_frames_sigmas(
+        [
+            (variance, tau, zeta, dphi2),
+            (variance[:3], far_tau, np.ones(3), dphi2),
+        ]
+    )
+    assert sigma_b == pytest.approx(1e-3)
+    assert sigma_m == pytest.approx(_estimate_sigma_m(tau, zeta, dphi2))
+    assert not crude
+    assert far_crude
+    assert crude_sigma_m == pytest.approx(np.std(far_tau, ddof=1))
+
+
+def test_extended_estimator(scan, reflections):
+    estimator = ComputeEsdReflectingRange.ExtendedEstimator(
+        None, None, None, None, scan, reflections
+    )
+
+    # The gradient of the target matches a finite difference
+    h = 1e-5
+    for log_sigma in (math.log(0.001), math.log(0.01)):
+        _, gradient = estimator.target([log_sigma])
+        f1, _ = estimator.target([log_sigma + h])
+        f0, _ = estimator.target([log_sigma - h])
+        assert gradient[0] == pytest.approx((f1 - f0) / (2 * h), rel=1e-4, abs=1e-4)
+
+    # The estimate is at the minimum of the target
+    grid = np.linspace(math.log(1e-4), math.log(0.1), 2001)
+    target = [estimator.target([x])[0] for x in grid]
+    assert estimator.sigma == pytest.approx(math.exp(grid[np.argmin(target)]), rel=1e-2)
+
+
+def _simplex_minimum(target, start, stop, tolerance):
+    """Minimise a target of [log(sigma)] as the estimators did with a simplex."""
+
+    class Evaluator:
+        def target(self, log_sigma):
+            return float(target([log_sigma[0]]))
+
+    optimizer = simplex.simplex_opt(
+        1,
+        matrix=[flex.double([start]), flex.double([stop])],
+        evaluator=Evaluator(),
+        tolerance=tolerance,
+    )
+    return math.exp(optimizer.get_solution()[0])
+
+
+def test_estimators_match_simplex(scan, reflections):
+    """The estimates agree with the simplex minimisation, from its starting
+    points, which the estimators used before."""
+    basic = ComputeEsdReflectingRange.Estimator(
+        None, None, None, None, scan, reflections
+    )
+    tau, zeta = _tau_and_zeta(scan, reflections)
+    dphi2 = scan.get_oscillation(deg=False)[1] / 2.0
+    e1 = (tau + dphi2) * zeta / math.sqrt(2.0)
+    e2 = (tau - dphi2) * zeta / math.sqrt(2.0)
+    expected = _simplex_minimum(
+        lambda x: -np.sum(np.log(_fraction_and_derivative(e1, e2, math.exp(x[0]))[0])),
+        math.radians(1),
+        math.radians(3),
+        1e-7,
+    )
+    assert basic.sigma == pytest.approx(expected, rel=1e-4)
+
+    extended = ComputeEsdReflectingRange.ExtendedEstimator(
+        None, None, None, None, scan, reflections
+    )
+    expected = _simplex_minimum(
+        lambda x: extended.target(x)[0],
+        math.log(math.radians(0.1)),
+        math.log(math.radians(1)),
+        1e-3,
+    )
+    assert extended.sigma == pytest.approx(expected, rel=1e-4)
+
+
+@pytest.mark.parametrize("algorithm,sigma_m", [("basic", 0.1873), ("extended", 0.1584)])
+def test_sigma_m_regression(algorithm, sigma_m, dials_data, run_in_tmp_path):
+    """The estimated sigma_m of a real dataset is unchanged."""
+    data_dir = dials_data("insulin_processed", pathlib=True)
+    create_profile_model.run(
+        [
+            str(data_dir / "indexed.expt"),
+            str(data_dir / "indexed.refl"),
+            f"sigma_m_algorithm={algorithm}",
+        ]
+    )
+    experiments = ExperimentListFactory.from_json_file(
+        "models_with_profiles.expt", check_format=False
+    )
+    assert experiments[0].profile.sigma_b(deg=True) == pytest.approx(0.0539, abs=1e-3)
+    assert experiments[0].profile.sigma_m(deg=True) == pytest.approx(sigma_m, abs=1e-3)
 
 
 def test_select_reflections_for_sigma_calc():
@@ -10,7 +10,14 @@
 from dxtbx import flumpy
 from scitbx import sparse
 
-from dials.algorithms.scaling.Ih_table import IhTable, IhTableBlock, map_indices_to_asu
+from dials.algorithms.scaling.Ih_table import (
+    IhTable,
+    IhTableBlock,
+    _block_nbytes,
+    _group_asu_indices,
+    get_sorted_asu_indices,
+    map_indices_to_asu,
+)
 from dials.array_family import flex
 
 
@@ -145,6 +152,27 @@ def generated_refl_for_splitting_2():
     return reflections
 
 
+@pytest.mark.parametrize("anomalous", [False, True])
+def test_group_asu_indices(anomalous):
+    """The groups are in the same order as the sorted asu indices."""
+    sg = space_group("P 4nw 2abw")
+    hkl = np.random.default_rng(0).integers(-8, 9, size=(2000, 3), dtype=np.int32)
+    asu_indices = map_indices_to_asu(
+        flex.miller_index([tuple(h) for h in hkl.tolist()]), sg, anomalous
+    )
+    sorted_indices, _ = get_sorted_asu_indices(asu_indices, sg, anomalous)
+    unique, n_before_group = _group_asu_indices(asu_indices)
+    assert [tuple(h) for h in unique.tolist()] == list(dict.fromkeys(sorted_indices))
+    for i, h in enumerate(unique.tolist()):
+        group = sorted_indices[int(n_before_group[i]) : int(n_before_group[i + 1])]
+        assert set(group) == {tuple(h)}
+    assert n_before_group[-1] == len(asu_indices)
+
+    unique, n_before_group = _group_asu_indices(flex.miller_index())
+    assert unique.shape == (0, 3)
+    assert list(n_before_group) == [0]
+
+
 def test_IhTableblock_onedataset(large_reflection_table, test_sg):
     """Test direct initialisation of Ih_table block"""
     asu_indices = map_indices_to_asu(large_reflection_table["miller_index"], test_sg)
@@ -452,6 +480,83 @@ def test_IhTable_split_into_blocks(
     ]
 
 
+def test_IhTable_memory_budget(large_reflection_table, small_reflection_table, test_sg):
+    """Test that Ih table blocks are paged out and back in to keep within budget."""
+    tables = [large_reflection_table, small_reflection_table]
+    reference = IhTable(reflection_tables=tables, space_group=test_sg, nblocks=2)
+    # A budget of one byte means only the most recently used block is resident.
+    Ih_table = IhTable(
+        reflection_tables=tables, space_group=test_sg, nblocks=2, memory_budget=1
+    )
+    pager = Ih_table.pager
+    blocks = Ih_table.blocked_data_list
+    assert [block._Ih_table is None for block in blocks] == [True, False]
+    assert pager.resident_bytes == _block_nbytes(blocks[1])
+
+    for block, expected in zip(blocks, reference.blocked_data_list):
+        assert list(block.asu_miller_index) == list(expected.asu_miller_index)
+        pd.testing.assert_frame_equal(block.Ih_table, expected.Ih_table)
+    assert [block._Ih_table is None for block in blocks] == [True, False]
+
+    # The paged in data are memory mapped rather than copied into memory.
+    n_page_ins = pager.n_page_ins
+    array = blocks[0].Ih_table["intensity"].to_numpy()
+    while array.base is not None and not isinstance(array, np.memmap):
+        array = array.base
+    assert isinstance(array, np.memmap)
+    assert pager.n_page_ins == n_page_ins + 1
+
+    # Changes to a block are preserved when it is paged out and back in.
+    new_intensities = np.arange(1.0, 8.0)
+    for table in (Ih_table, reference):
+        table.update_data_in_blocks(new_intensities, dataset_id=0)
+        table.calc_Ih()
+    for block, expected in zip(blocks, reference.blocked_data_list):
+        assert list(block.intensities) == list(expected.intensities)
+        assert list(block.Ih_values) == pytest.approx(list(expected.Ih_values))
+
+    # The resident size is measured again when a changed block is next used.
+    blocks[1].Ih_table["extra"] = np.zeros(blocks[1].size)
+    assert "extra" in blocks[1].Ih_table
+    assert pager.resident_bytes == _block_nbytes(blocks[1])
+
+    # A large budget keeps all blocks in memory.
+    Ih_table = IhTable(
+        reflection_tables=tables, space_group=test_sg, nblocks=2, memory_budget=10**9
+    )
+    assert Ih_table.pager.n_page_outs == 0
+    Ih_table.pager.cleanup()
+
+    with pytest.raises(ValueError):
+        IhTable(reflection_tables=tables, space_group=test_sg, memory_budget=0)
+
+
+def test_IhTable_memory_budget_free_set(
+    large_reflection_table, small_reflection_table, test_sg
+):
+    """Test that the blocks replaced when extracting a free set are released."""
+    tables = [large_reflection_table, small_reflection_table]
+    reference = IhTable(
+        reflection_tables=tables,
+        space_group=test_sg,
+        nblocks=2,
+        free_set_percentage=50.0,
+    )
+    Ih_table = IhTable(
+        reflection_tables=tables,
+        space_group=test_sg,
+        nblocks=2,
+        free_set_percentage=50.0,
+        memory_budget=1,
+    )
+    assert len(Ih_table.pager._resident) == 1
+    page_keys = {block._page_key for block in Ih_table.blocked_data_list}
+    assert set(Ih_table.pager._files) <= page_keys
+    for block, expected in zip(Ih_table.blocked_data_list, reference.blocked_data_list):
+        assert block._pager is Ih_table.pager
+        pd.testing.assert_frame_equal(block.Ih_table, expected.Ih_table)
+
+
 def test_IhTable_freework(large_reflection_table, small_reflection_table, test_sg):
     sel1 = flex.bool(7, True)
     sel1[6] = False
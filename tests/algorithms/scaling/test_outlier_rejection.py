@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import random
 from unittest.mock import Mock
 
 import pytest
@@ -331,6 +332,48 @@ def test_simple_outlier_rejection(generated_Ih_table):
     assert list(outliers[0]) == [4, 5, 6, 7, 8, 9]
 
 
+@pytest.mark.parametrize("memory_budget", [None, 1])
+@pytest.mark.parametrize("nblocks", [1, 2])
+@pytest.mark.parametrize(
+    "algorithm", [NormDevOutlierRejection, SimpleNormDevOutlierRejection]
+)
+def test_outlier_rejection_in_chunks(algorithm, nblocks, memory_budget):
+    """Test that splitting the groups across blocks and memory-limited chunks
+    gives the same outliers as processing a single block."""
+    random.seed(0)
+    tables = []
+    for _ in range(2):
+        rt = flex.reflection_table()
+        rt["miller_index"] = flex.miller_index(
+            [(0, 0, i) for i in range(1, 21) for _ in range(5)]
+        )
+        rt["intensity"] = flex.double(
+            [
+                random.gauss(100.0, 10.0) if random.random() > 0.05 else 1000.0
+                for _ in range(rt.size())
+            ]
+        )
+        rt["variance"] = flex.double(rt.size(), 100.0)
+        rt["inverse_scale_factor"] = flex.double(rt.size(), 1.0)
+        tables.append(rt)
+
+    outlier_rej = algorithm(IhTable(tables, space_group("P 1")), zmax=6.0)
+    outlier_rej.run()
+    expected = outlier_rej.final_outlier_arrays
+    assert sum(len(o) for o in expected)
+
+    outlier_rej = algorithm(
+        IhTable(tables, space_group("P 1"), nblocks=nblocks),
+        zmax=6.0,
+        memory_budget=memory_budget,
+    )
+    outlier_rej.run()
+    outliers = outlier_rej.final_outlier_arrays
+    assert len(outliers) == 2
+    for o, e in zip(outliers, expected):
+        assert sorted(o) == sorted(e)
+
+
 def test_reject_outliers(mock_exp_with_sg):
     """Test the reject outliers function"""
     refls = generate_outlier_table_2()
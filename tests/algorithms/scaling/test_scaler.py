@@ -18,6 +18,7 @@
     NullScaler,
     SingleScaler,
     TargetScaler,
+    _split_by_dataset,
     calc_sf_variances,
 )
 from dials.algorithms.scaling.scaler_factory import create_scaler
@@ -783,3 +784,11 @@ def test_multiscaler_update_for_minimisation():
     )
     assert block_list[1].derivatives == expected_derivatives_for_block_2
     assert block_list[0].derivatives == expected_derivatives_for_block_1
+
+
+def test_split_by_dataset():
+    """Test the splitting of values by dataset id in a single pass."""
+    values = np.array([10, 11, 12, 13, 14, 15], dtype=np.uint64)
+    dataset_ids = np.array([2, 0, 2, 0, 1, 2], dtype=np.uint64)
+    split = _split_by_dataset(values, dataset_ids, 4)
+    assert [list(s) for s in split] == [[11, 13], [14], [10, 12, 15], []]
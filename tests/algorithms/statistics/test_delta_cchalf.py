@@ -0,0 +1,116 @@
+"""Tests for the per-group CC½ statistics."""
+
+from __future__ import annotations
+
+import random
+from collections import defaultdict
+
+import pytest
+
+from cctbx import crystal, miller, sgtbx, uctbx
+
+from dials.algorithms.statistics.delta_cchalf import (
+    PerGroupCChalfStatistics,
+    ReflectionSum,
+    ResolutionBinner,
+    compute_cchalf_from_reflection_sums,
+)
+from dials.array_family import flex
+
+
+def generate_table(n_groups, unit_cell, space_group, d_min=2.0):
+    """Generate a table of noisy observations split into groups."""
+    random.seed(0)
+    indices = (
+        miller.build_set(
+            crystal.symmetry(unit_cell, space_group=space_group),
+            anomalous_flag=False,
+            d_min=d_min,
+        )
+        .expand_to_p1()
+        .indices()
+    )
+    true_intensities = {h: random.expovariate(1 / 100.0) for h in indices}
+    table = flex.reflection_table()
+    miller_index = flex.miller_index()
+    intensity = flex.double()
+    group = flex.int()
+    for g in range(n_groups):
+        for h in random.sample(list(indices), len(indices) // 4):
+            miller_index.append(h)
+            intensity.append(random.gauss(true_intensities[h], 10.0))
+            group.append(g)
+    table["miller_index"] = miller_index
+    table["intensity"] = intensity
+    table["variance"] = flex.double(intensity.size(), 100.0)
+    table["group"] = group
+    table["dataset"] = group
+    return table
+
+
+def reference_cchalf_excluding_each_group(statistics):
+    """A direct implementation of the leave-one-group-out CC½."""
+    table = statistics.reflection_table
+    binner = statistics.binner
+    sums = defaultdict(ReflectionSum)
+    group_sums = defaultdict(lambda: defaultdict(ReflectionSum))
+    for h, x, g in zip(table["miller_index"], table["intensity"], table["group"]):
+        for s in (sums[h], group_sums[g][h]):
+            s.sum_x += x
+            s.sum_x2 += x**2
+            s.n += 1
+    mean_cchalf = compute_cchalf_from_reflection_sums(sums, binner)
+    cchalf_i = {}
+    for g, g_sums in group_sums.items():
+        remaining = {
+            h: ReflectionSum(
+                s.sum_x - g_sums[h].sum_x if h in g_sums else s.sum_x,
+                s.sum_x2 - g_sums[h].sum_x2 if h in g_sums else s.sum_x2,
+                s.n - g_sums[h].n if h in g_sums else s.n,
+            )
+            for h, s in sums.items()
+        }
+        cchalf_i[g] = compute_cchalf_from_reflection_sums(remaining, binner)
+    return mean_cchalf, cchalf_i
+
+
+@pytest.mark.parametrize("nproc", [1, 3])
+def test_per_group_cchalf_statistics(nproc):
+    unit_cell = uctbx.unit_cell((40, 50, 60, 90, 90, 90))
+    space_group = sgtbx.space_group_info("P 2 2 2").group()
+    table = generate_table(20, unit_cell, space_group, d_min=3.0)
+
+    statistics = PerGroupCChalfStatistics(
+        table, unit_cell, space_group, n_bins=5, nproc=nproc
+    )
+    statistics.run()
+    assert statistics.num_datasets() == 20
+    assert statistics.num_reflections() == table.size()
+
+    mean_cchalf, cchalf_i = reference_cchalf_excluding_each_group(statistics)
+    assert statistics.mean_cchalf() == pytest.approx(mean_cchalf)
+    assert statistics.cchalf_i() == pytest.approx(cchalf_i)
+    assert statistics.delta_cchalf_i() == pytest.approx(
+        {g: mean_cchalf - v for g, v in cchalf_i.items()}
+    )
+
+
+def test_per_group_cchalf_statistics_many_groups():
+    unit_cell = uctbx.unit_cell((40, 50, 60, 90, 90, 90))
+    space_group = sgtbx.space_group_info("P 2 2 2").group()
+    table = generate_table(1000, unit_cell, space_group, d_min=6.0)
+
+    statistics = PerGroupCChalfStatistics(
+        table, unit_cell, space_group, n_bins=5, nproc=4
+    )
+    statistics.run()
+    assert statistics.num_datasets() == 1000
+    assert set(statistics.cchalf_i()) == set(range(1000))
+    assert 0 < statistics.mean_cchalf() <= 1
+
+
+def test_resolution_binner_indices():
+    unit_cell = uctbx.unit_cell((40, 50, 60, 90, 90, 90))
+    binner = ResolutionBinner(unit_cell, 2.0, 20.0, 10, output=False)
+    indices = flex.miller_index([(1, 0, 0), (5, 5, 5), (10, 10, 10), (19, 24, 29)])
+    assert list(binner.indices(indices)) == [binner.index(h) for h in indices]
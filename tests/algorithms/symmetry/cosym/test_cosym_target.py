@@ -52,3 +52,36 @@ def test_cosym_target(space_group):
         assert f < f0
         assert pytest.approx(list(g), abs=3e-3) == [0] * len(g)
         assert pytest.approx(g_fd, abs=3e-3) == [0] * len(g)
+
+
+@pytest.mark.parametrize("tile_elements", [None, 7])
+def test_pairwise_correlations(tile_elements, monkeypatch):
+    if tile_elements:
+        # Force several tiles of rows
+        monkeypatch.setattr(target, "_MAX_TILE_ELEMENTS", tile_elements)
+    rng = np.random.default_rng(0)
+    n_rows, n_columns = 6, 40
+    dense = rng.normal(size=(n_rows, n_columns))
+    dense[rng.random(size=dense.shape) < 0.5] = np.nan
+    dense[5] = np.nan
+    dense[5, :2] = 1.0
+    rows, columns = np.nonzero(np.isfinite(dense))
+    values = dense[rows, columns]
+    # A repeated (row, column) pair, where the last value should be used
+    rows = np.append(rows, rows[0])
+    columns = np.append(columns, columns[0])
+    values = np.append(values, values[0])
+    values[0] -= 1
+
+    rij, n_pairs = target._pairwise_correlations(
+        rows, columns, values, n_rows, min_pairs=3
+    )
+    for i in range(n_rows):
+        for j in range(n_rows):
+            sel = np.isfinite(dense[i]) & np.isfinite(dense[j])
+            assert n_pairs[i, j] == sel.sum()
+            if sel.sum() < 3:
+                assert np.isnan(rij[i, j])
+            else:
+                expected = np.corrcoef(dense[i, sel], dense[j, sel])[0, 1]
+                assert rij[i, j] == pytest.approx(expected)
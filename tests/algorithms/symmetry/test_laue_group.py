@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import logging
+
 import pytest
 
 from cctbx import crystal, miller, sgtbx
 
 from dials.algorithms.symmetry.cosym._generate_test_data import generate_intensities
 from dials.algorithms.symmetry.laue_group import LaueGroupAnalysis
+from dials.array_family import flex
 
 
 def generate_fake_intensities(crystal_symmetry):
@@ -74,3 +77,28 @@ def test_determine_space_group_best_monoclinic_beta():
     assert cs.change_basis(
         sgtbx.change_of_basis_op(d["subgroup_scores"][0]["cb_op"])
     ).is_similar_symmetry(result.best_solution.subgroup["best_subsym"])
+
+
+def test_determine_space_group_nproc(caplog):
+    """The symmetry elements of a cubic lattice scored in parallel give the same result."""
+    sgi = sgtbx.space_group_info(symbol="I23")
+    cs = sgi.any_compatible_crystal_symmetry(volume=10000).best_cell().minimum_cell()
+    intensities = generate_fake_intensities(cs)
+    caplog.set_level(logging.DEBUG, logger="dials.algorithms.symmetry.laue_group")
+    flex.set_random_seed(0)
+    serial = LaueGroupAnalysis([intensities], normalisation=None)
+    flex.set_random_seed(0)
+    parallel = LaueGroupAnalysis([intensities], normalisation=None, nproc=4)
+    assert len(parallel.sym_op_scores) == len(serial.sym_op_scores) > 4
+    assert parallel.as_dict() == serial.as_dict()
+    # The time taken to score the symmetry elements is logged for each
+    timings = [
+        record.getMessage()
+        for record in caplog.records
+        if record.getMessage().startswith("Scored ")
+    ]
+    n = len(serial.sym_op_scores)
+    assert [t.split(" in ")[0] for t in timings] == [
+        f"Scored {n} symmetry elements with nproc=1",
+        f"Scored {n} symmetry elements with nproc=4",
+    ]
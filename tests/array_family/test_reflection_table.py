@@ -1401,6 +1401,44 @@ def test_select_remove_on_experiment_identifiers(caplog):
     table.select_on_experiment_identifiers(["abcd", "mnop"])
 
 
+def test_experiment_id_index():
+    table = flex.reflection_table()
+    ids = [random.choice([-1, 0, 1, 2, 4]) for _ in range(1000)]
+    table["id"] = flex.int(ids)
+    table["x"] = flex.int_range(len(ids))
+
+    index = table.experiment_id_index()
+    assert list(index.id_values) == sorted(set(ids))
+    for id_value in (-1, 0, 1, 2, 3, 4):
+        assert list(index.rows(id_value)) == [
+            i for i, id_ in enumerate(ids) if id_ == id_value
+        ]
+    assert {k: list(v) for k, v in index.groups()} == {
+        k: list(index.rows(k)) for k in set(ids)
+    }
+    assert list(index.selection([0, 4])) == [id_ in (0, 4) for id_ in ids]
+
+    # A new index is built for the current id column
+    table["id"][0] = 3
+    assert list(table.experiment_id_index().rows(3)) == [0]
+
+    for i, identifier in enumerate(["a", "b", "c", "d", "e"]):
+        table.experiment_identifiers()[i] = identifier
+    ids = list(table["id"])
+    selected = table.select_on_experiment_identifiers(["b", "e"])
+    assert list(selected["x"]) == [i for i, id_ in enumerate(ids) if id_ in (1, 4)]
+    table.remove_on_experiment_identifiers(["a", "c", "d"])
+    assert list(table["x"]) == [i for i, id_ in enumerate(ids) if id_ in (-1, 1, 4)]
+    assert list(table.experiment_identifiers().values()) == ["b", "e"]
+
+    # Reset the ids to 0 .. n-1, leaving unassigned reflections unchanged
+    table.reset_ids()
+    assert list(table["id"]) == [
+        {1: 0, 4: 1}.get(id_, id_) for id_ in ids if id_ in (-1, 1, 4)
+    ]
+    assert list(table.experiment_identifiers().keys()) == [0, 1]
+
+
 def test_as_miller_array():
     table = flex.reflection_table()
     table["intensity.1.value"] = flex.double([1.0, 2.0, 3.0])
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import concurrent.futures
+import json
+
+import numpy as np
+
+from dxtbx import flumpy
+
+from dials.algorithms.background.modeller import FinalizeModel
+from dials.command_line import benchmark_background_model
+
+
+def test_simulated_background():
+    image_size = (1100, 600)
+    image, mask = benchmark_background_model.simulated_background(image_size, seed=1)
+    image, mask = flumpy.to_numpy(image), flumpy.to_numpy(mask)
+    assert image.shape == mask.shape == (600, 1100)
+    assert (image >= 0).all()
+    # The gaps between the modules are masked
+    assert not mask[:, 1030:1040].any() and not mask[514:551, :].any()
+    assert mask[:514, :1030].all() and mask[551:, 1040:].all()
+    again, _ = benchmark_background_model.simulated_background(image_size, seed=1)
+    assert np.array_equal(flumpy.to_numpy(again), image)
+
+    # The benchmarked model fills the gaps, and is the same with a pool
+    image, mask = benchmark_background_model.simulated_background(image_size)
+    finalizer = FinalizeModel(
+        benchmark_background_model.simulated_experiments(image_size),
+        kernel_size=5,
+        niter=5,
+    )
+    serial = flumpy.to_numpy(finalizer.smooth(image, mask))
+    assert serial.shape == (600, 1100)
+    assert np.isfinite(serial).all()
+    assert (serial[:, 1030:1040] > 0).all()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as pool:
+        pooled = finalizer.smooth(image, mask, pool=pool, n_blocks=2)
+    assert np.array_equal(flumpy.to_numpy(pooled), serial)
+
+
+def test_benchmark_background_model(run_in_tmp_path, capsys):
+    benchmark_background_model.run(
+        [
+            "nproc=1,2",
+            "image_size=300,200",
+            "kernel_size=5",
+            "niter=5",
+            "output.json=background_model.json",
+        ]
+    )
+    assert "identical" in capsys.readouterr().out
+    with open("background_model.json") as f:
+        results = json.load(f)
+    assert results["image_size"] == [300, 200]
+    assert [r["nproc"] for r in results["results"]] == [1, 2]
+    assert all(r["identical"] for r in results["results"])
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+
+import numpy as np
+
+from dxtbx import flumpy
+
+from dials.command_line import benchmark_batch_statistics
+from dials.report.analysis import batch_dependent_properties
+
+
+def test_generate_batch_data():
+    batches, intensities, scales = benchmark_batch_statistics.generate_batch_data(
+        20, 5, seed=1
+    )
+    assert batches.size() == intensities.size() == scales.size() == 100
+    # Every batch has the same number of reflections
+    counts = np.bincount(flumpy.to_numpy(batches.data()))
+    assert list(counts) == [0] + [5] * 20
+    assert (flumpy.to_numpy(intensities.sigmas()) > 0).all()
+    assert 0.5 <= min(scales.data()) and max(scales.data()) < 2.0
+
+    # The data are reproducible for a given seed
+    again = benchmark_batch_statistics.generate_batch_data(20, 5, seed=1)
+    assert list(again[0].data()) == list(batches.data())
+    assert list(again[1].data()) == list(intensities.data())
+    other = benchmark_batch_statistics.generate_batch_data(20, 5, seed=2)
+    assert list(other[1].data()) != list(intensities.data())
+
+    # The benchmarked calculation sees every batch
+    bins, rmerge, isigi, scalebins = batch_dependent_properties(
+        batches, intensities, scales
+    )
+    assert list(bins) == list(range(1, 21))
+    assert len(rmerge) == len(isigi) == len(scalebins) == 20
+    assert all(0.5 <= s < 2.0 for s in scalebins)
+
+
+def test_benchmark_batch_statistics(run_in_tmp_path, capsys):
+    benchmark_batch_statistics.run(
+        [
+            "n_batches=10,100",
+            "reflections_per_batch=5",
+            "repeats=1",
+            "output.json=batch_statistics.json",
+        ]
+    )
+    assert "reflections" in capsys.readouterr().out
+    with open("batch_statistics.json") as f:
+        results = json.load(f)["results"]
+    assert [(r["n_batches"], r["n_reflections"]) for r in results] == [
+        (10, 50),
+        (100, 500),
+    ]
+    assert all(r["time"] > 0 for r in results)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import json
+
+import numpy as np
+import pytest
+
+from dxtbx import flumpy
+
+from dials.algorithms.statistics.delta_cchalf import PerGroupCChalfStatistics
+from dials.command_line import benchmark_delta_cchalf
+
+
+def test_generate_group_data():
+    table = benchmark_delta_cchalf.generate_group_data(20, 50, seed=1)
+    assert table.size() == 1000
+    # Every group has the same number of reflections
+    counts = np.bincount(flumpy.to_numpy(table["group"]))
+    assert list(counts) == [50] * 20
+    assert list(table["dataset"]) == list(table["group"])
+
+    # The data are reproducible for a given seed
+    again = benchmark_delta_cchalf.generate_group_data(20, 50, seed=1)
+    assert list(again["intensity"]) == list(table["intensity"])
+    other = benchmark_delta_cchalf.generate_group_data(20, 50, seed=2)
+    assert list(other["intensity"]) != list(table["intensity"])
+
+
+def test_cchalf_excluding_each_group_per_group():
+    table = benchmark_delta_cchalf.generate_group_data(10, 200, d_min=4.0)
+    statistics = PerGroupCChalfStatistics(
+        table,
+        benchmark_delta_cchalf.unit_cell,
+        benchmark_delta_cchalf.space_group,
+        n_bins=5,
+    )
+    statistics.run()
+    cchalf_i = benchmark_delta_cchalf.cchalf_excluding_each_group_per_group(statistics)
+    assert cchalf_i == pytest.approx(statistics.cchalf_i())
+
+
+@pytest.mark.parametrize("per_group", [True, False])
+def test_benchmark_delta_cchalf(per_group, run_in_tmp_path, capsys):
+    benchmark_delta_cchalf.run(
+        [
+            "n_groups=5,10",
+            "reflections_per_group=100",
+            "d_min=4.0",
+            f"per_group={per_group}",
+            "repeats=1",
+            "output.json=delta_cchalf.json",
+        ]
+    )
+    assert ("speedup" in capsys.readouterr().out) is per_group
+    with open("delta_cchalf.json") as f:
+        results = json.load(f)["results"]
+    assert [(r["n_groups"], r["n_reflections"]) for r in results] == [
+        (5, 500),
+        (10, 1000),
+    ]
+    assert all(r["time"] > 0 for r in results)
+    if per_group:
+        assert all(r["per_group_time"] > 0 for r in results)
+        assert all(r["max_difference"] < 1e-8 for r in results)
+    else:
+        assert all("per_group_time" not in r for r in results)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import json
+
+from dials.command_line import benchmark_detect_blanks
+from dials.util import detect_blanks
+
+
+def test_generate_sweep():
+    reflections, scan = benchmark_detect_blanks.generate_sweep(200, 100, seed=1)
+    assert reflections.size() == 20000
+    assert scan.get_image_range() == (1, 200)
+    z = reflections["xyzobs.px.value"].parts()[2]
+    assert 0 <= min(z) and max(z) < 200
+    n_indexed = reflections.get_flags(reflections.flags.indexed).count(True)
+    assert 0.75 < n_indexed / reflections.size() < 0.85
+
+    # The data are reproducible for a given seed
+    again, _ = benchmark_detect_blanks.generate_sweep(200, 100, seed=1)
+    assert list(again["xyzobs.px.value"]) == list(reflections["xyzobs.px.value"])
+
+    # The spots are spread over all the images, so none are found to be blank,
+    # unless the spots are removed from some of them
+    for analysis in (
+        detect_blanks.blank_counts_analysis,
+        detect_blanks.blank_integrated_analysis,
+    ):
+        result = analysis(reflections, scan, phi_step=2, fractional_loss=0.1)
+        assert not any(result["data"][0]["blank"])
+    blanked = reflections.select((z < 100) | (z >= 140))
+    result = detect_blanks.blank_counts_analysis(
+        blanked, scan, phi_step=2, fractional_loss=0.1
+    )
+    assert result["data"][0]["blank"].count(True) == 2
+
+
+def test_benchmark_detect_blanks(run_in_tmp_path, capsys):
+    benchmark_detect_blanks.run(
+        [
+            "n_images=20,50",
+            "spots_per_image=10",
+            "repeats=1",
+            "output.json=detect_blanks.json",
+        ]
+    )
+    assert "reflections" in capsys.readouterr().out
+    with open("detect_blanks.json") as f:
+        results = json.load(f)["results"]
+    assert [(r["n_images"], r["n_reflections"]) for r in results] == [
+        (20, 200),
+        (50, 500),
+    ]
+    for r in results:
+        assert all(
+            r[name] > 0
+            for name in (
+                "blank_counts_analysis",
+                "blank_integrated_analysis",
+                "spot_count_per_image",
+                "spot_counts_per_image_plot",
+            )
+        )
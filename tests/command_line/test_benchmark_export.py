@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from iotbx import mtz
+
+from dials.command_line import benchmark_export
+from dials.util import Sorry
+
+
+def test_run_export(dials_data, tmp_path):
+    location = dials_data("centroid_test_data", pathlib=True)
+    args = (str(location / "experiments.json"), str(location / "integrated.pickle"))
+    outputs = {}
+    for chunk_size in (100, 100000):
+        directory = tmp_path / str(chunk_size)
+        directory.mkdir()
+        peak_memory, output_size = benchmark_export.run_export(
+            *args, "mtz", str(directory), ["intensity=sum", f"chunk_size={chunk_size}"]
+        )
+        if benchmark_export.resource:
+            assert peak_memory > 0
+        else:
+            assert peak_memory is None
+        assert output_size == pytest.approx(
+            (directory / "benchmark.mtz").stat().st_size / 1024**2
+        )
+        outputs[chunk_size] = mtz.object(str(directory / "benchmark.mtz"))
+
+    # The benchmarked exports write the same data, whatever the chunk size
+    small, large = outputs[100], outputs[100000]
+    assert small.n_reflections() == large.n_reflections() > 0
+    assert small.column_labels() == large.column_labels()
+    for label in small.column_labels():
+        assert list(small.get_column(label).extract_values()) == pytest.approx(
+            list(large.get_column(label).extract_values())
+        )
+
+    with pytest.raises(Sorry, match="dials.export failed"):
+        benchmark_export.run_export(
+            *args, "mtz", str(tmp_path), ["intensity=sum", "chunk_size=0"]
+        )
+
+
+def test_benchmark_export(dials_data, run_in_tmp_path, capsys):
+    location = dials_data("centroid_test_data", pathlib=True)
+    benchmark_export.run(
+        [
+            str(location / "experiments.json"),
+            str(location / "integrated.pickle"),
+            "formats=mtz,xds_ascii",
+            "intensity=sum",
+            "chunk_size=1000,100000",
+            "output.json=benchmark.json",
+        ]
+    )
+    assert "reflections/s" in capsys.readouterr().out
+    with open("benchmark.json") as f:
+        results = json.load(f)
+    assert [(r["format"], r["chunk_size"]) for r in results["results"]] == [
+        (export_format, chunk_size)
+        for export_format in ("mtz", "xds_ascii")
+        for chunk_size in (1000, 100000)
+    ]
+    for r in results["results"]:
+        assert r["reflections_per_second"] == pytest.approx(
+            results["n_reflections"] / r["time"]
+        )
+    # The output size does not depend on the chunk size
+    sizes = {}
+    for r in results["results"]:
+        sizes.setdefault(r["format"], set()).add(r["output_size"])
+    assert all(len(s) == 1 for s in sizes.values())
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import json
+import subprocess
+
+import pytest
+
+from dials.command_line import benchmark_import_time
+from dials.util import Sorry
+
+
+def test_command_modules():
+    modules = benchmark_import_time.command_modules()
+    assert modules["show"] == "dials.command_line.show"
+    assert "benchmark_import_time" in modules
+    assert benchmark_import_time.command_modules(["plugins", "show"]) == {
+        "plugins": "dials.command_line.plugins",
+        "show": "dials.command_line.show",
+    }
+    with pytest.raises(Sorry, match="Unknown commands: not_a_command"):
+        benchmark_import_time.command_modules(["show", "not_a_command"])
+
+
+def test_import_time():
+    # Importing a module includes the start-up time of the interpreter
+    baseline = benchmark_import_time.import_time(None, 1)
+    assert 0 < baseline < benchmark_import_time.import_time("dials.util", 1)
+    with pytest.raises(subprocess.CalledProcessError):
+        benchmark_import_time.import_time("dials.not_a_module", 1)
+
+
+def test_benchmark_import_time(run_in_tmp_path, capsys):
+    benchmark_import_time.run(
+        ["commands=plugins,show", "repeats=1", "output.json=import_time.json"]
+    )
+    assert "Python interpreter start-up time" in capsys.readouterr().out
+    with open("import_time.json") as f:
+        results = json.load(f)
+    assert {r["command"] for r in results["results"]} == {"plugins", "show"}
+    times = [r["total"] for r in results["results"]]
+    assert times == sorted(times, reverse=True)
+    for r in results["results"]:
+        assert r["import"] == pytest.approx(r["total"] - results["baseline"])
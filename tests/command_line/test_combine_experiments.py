@@ -20,6 +20,7 @@
     combine_experiments_no_reflections,
     phil_scope,
 )
+from dials.util.combine_experiments import _ImagesetIndex
 
 
 def test(dials_data, tmp_path):
@@ -463,3 +464,48 @@ def test_combine_imagesets(dials_data, tmp_path):
     expts2 = combine_experiments_no_reflections(params, list_of_elists)
     assert len(expts2) == 4
     assert expts2.identifiers() == expts.identifiers()
+
+
+def test_combine_reflection_files(dials_data):
+    """Test combining reflection tables read one at a time from their files"""
+    data = dials_data("l_cysteine_dials_output", pathlib=True)
+    list_of_elists = [
+        load.experiment_list(f, check_format=False)
+        for f in sorted(data.glob("*_integrated_experiments.json"))
+    ]
+    filenames = sorted(data.glob("*_integrated.pickle"))
+    params = phil_scope.extract()
+    expts, refls = combine_experiments(
+        params, list_of_elists, [flex.reflection_table.from_file(f) for f in filenames]
+    )
+    expts2, refls2 = combine_experiments(
+        params, list_of_elists, (str(f) for f in filenames)
+    )
+    assert expts2.identifiers() == expts.identifiers()
+    assert refls2.size() == refls.size()
+    for column in ("id", "imageset_id", "miller_index"):
+        assert list(refls2[column]) == list(refls[column])
+    assert dict(refls2.experiment_identifiers()) == dict(refls.experiment_identifiers())
+
+    # The reflections of each experiment are in their original order
+    table = flex.reflection_table.from_file(filenames[1])
+    assert list(refls.select(refls["id"] == 1)["miller_index"]) == list(
+        table.select(table["id"] == 0)["miller_index"]
+    )
+
+
+def test_imageset_index_single_images_from_one_file(dials_data):
+    """Single-image imagesets from one HDF5 file are each found by their key"""
+    nxs = dials_data("vmxi_thaumatin", pathlib=True) / "image_15799.nxs"
+    sequence = ExperimentListFactory.from_filenames([str(nxs)])[0].imageset
+    imagesets = [sequence[i : i + 1] for i in range(len(sequence))]
+    assert len(imagesets) > 1
+    assert len({imageset.get_path(0) for imageset in imagesets}) == 1
+
+    index = _ImagesetIndex()
+    positions = list(range(len(imagesets)))
+    assert [index.index(imageset) for imageset in imagesets] == positions
+    # Copies of the imagesets are found at the same positions
+    assert [index.index(sequence[i : i + 1]) for i in positions] == positions
+    # Each imageset has its own key, rather than all sharing the key of the file
+    assert len(index._imagesets) == len(imagesets)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import io
 import json
 import os
 import shutil
@@ -15,7 +16,9 @@
 from iotbx import mtz
 
 from dials.array_family import flex
+from dials.command_line import export
 from dials.command_line.slice_sequence import slice_experiments, slice_reflections
+from dials.util.export_mmcif import MMCIFOutputFile, _write_loop
 from dials.util.multi_dataset_handling import assign_unique_identifiers
 
 
@@ -406,6 +409,131 @@ def test_xds_ascii(dials_data, tmp_path):
             assert psi == pytest.approx(psi_values[hkl], abs=0.1)
 
 
+def _read_without_creation_date(filename):
+    """Read an exported file, except for the date in an mmcif file."""
+    return "".join(
+        line
+        for line in filename.read_text().splitlines(keepends=True)
+        if not line.startswith("_audit.creation_date")
+    )
+
+
+@pytest.mark.parametrize(
+    "export_format,hklout",
+    [
+        ("mtz", "mtz.hklout"),
+        ("mmcif", "mmcif.hklout"),
+        ("xds_ascii", "xds_ascii.hklout"),
+    ],
+)
+def test_export_in_chunks(export_format, hklout, dials_data, tmp_path):
+    """Exporting a chunk of reflections at a time gives an identical output."""
+    filenames = {}
+    for chunk_size in (7, 1000000):
+        filenames[chunk_size] = tmp_path / f"{chunk_size}.{export_format}"
+        result = subprocess.run(
+            [
+                shutil.which("dials.export"),
+                "intensity=sum",
+                f"format={export_format}",
+                f"chunk_size={chunk_size}",
+                f"{hklout}={filenames[chunk_size]}",
+                dials_data("centroid_test_data", pathlib=True) / "experiments.json",
+                dials_data("centroid_test_data", pathlib=True) / "integrated.pickle",
+            ],
+            cwd=tmp_path,
+            capture_output=True,
+        )
+        assert not result.returncode and not result.stderr
+
+    if export_format == "mtz":
+        chunked, unchunked = (
+            gemmi.read_mtz_file(str(filename)) for filename in filenames.values()
+        )
+        assert chunked.column_labels() == unchunked.column_labels()
+        assert (chunked.array == unchunked.array).all()
+    else:
+        assert _read_without_creation_date(filenames[7]) == _read_without_creation_date(
+            filenames[1000000]
+        )
+
+
+@pytest.mark.parametrize("pdb_version", ["v5", "v5_next"])
+def test_mmcif_loop_matches_iotbx(pdb_version, dials_data):
+    """The reflection loop is written exactly as iotbx would show it."""
+    params = export.phil_scope.extract()
+    params.intensity = ["sum"]
+    params.mmcif.pdb_version = pdb_version
+    data_dir = dials_data("centroid_test_data", pathlib=True)
+    experiments = load.experiment_list(
+        data_dir / "experiments.json", check_format=False
+    )
+    reflections = flex.reflection_table.from_file(data_dir / "integrated.pickle")
+    exporter = MMCIFOutputFile(params)
+
+    if pdb_version == "v5":
+        loop_name, fmt_str = "_diffrn_refln", exporter._v5_0_fmt
+    else:
+        loop_name, fmt_str = "_pdbx_diffrn_unmerged_refln", exporter._v5_next_fmt
+    expected = io.StringIO()
+    cif = iotbx.cif.model.cif()
+    cif["dials"] = exporter.make_cif_block(experiments, reflections)
+    cif.show(out=expected, loop_format_strings={loop_name: fmt_str})
+
+    written = io.StringIO()
+    cif = iotbx.cif.model.cif()
+    cif["dials"], reflection_data = exporter._make_cif_block(experiments, reflections)
+    cif.show(out=written)
+    _write_loop(written, reflection_data, fmt_str, chunk_size=7)
+    assert written.getvalue() == expected.getvalue()
+
+
+@pytest.mark.parametrize("nproc", [1, 3])
+def test_export_multiple_formats(nproc, dials_data, tmp_path):
+    """Exporting several formats at once gives the same output as one at a time."""
+    formats = {
+        "mtz": "integrated.mtz",
+        "mmcif": "integrated.cif",
+        "xds_ascii": "DIALS.HKL",
+        "json": "rlp.json",
+    }
+    inputs = [
+        dials_data("centroid_test_data", pathlib=True) / "experiments.json",
+        dials_data("centroid_test_data", pathlib=True) / "integrated.pickle",
+        "intensity=sum",
+    ]
+    (tmp_path / "separate").mkdir()
+    for export_format in formats:
+        result = subprocess.run(
+            [shutil.which("dials.export"), f"format={export_format}", *inputs],
+            cwd=tmp_path / "separate",
+            capture_output=True,
+        )
+        assert not result.returncode and not result.stderr
+    result = subprocess.run(
+        [
+            shutil.which("dials.export"),
+            "format=" + "+".join(formats),
+            f"nproc={nproc}",
+            *inputs,
+        ],
+        cwd=tmp_path,
+        capture_output=True,
+    )
+    assert not result.returncode and not result.stderr
+
+    separate, together = (
+        gemmi.read_mtz_file(str(path / "integrated.mtz"))
+        for path in (tmp_path / "separate", tmp_path)
+    )
+    assert separate.column_labels() == together.column_labels()
+    assert (separate.array == together.array).all()
+    for filename in ("integrated.cif", "DIALS.HKL", "rlp.json"):
+        assert _read_without_creation_date(
+            tmp_path / "separate" / filename
+        ) == _read_without_creation_date(tmp_path / filename)
+
+
 def test_sadabs(dials_data, tmp_path):
     # Call dials.export
     result = subprocess.run(
@@ -3,6 +3,15 @@
 import shutil
 import subprocess
 
+import h5py
+import numpy as np
+import pytest
+
+from dxtbx.model.experiment_list import ExperimentListFactory
+from dxtbx.serialize import load
+
+from dials.command_line.merge_cbf import raw_data_from_cbf, start_tag
+
 
 def test_merge_cbf(dials_data, tmp_path):
     data_dir = dials_data("centroid_test_data", pathlib=True)
@@ -28,3 +37,84 @@ def test_merge_cbf(dials_data, tmp_path):
     for f1, f2 in zip(g, g2):
         print("Testing", f1, f2)
         assert f1.read_bytes() == f2.read_bytes()
+
+
+def test_merge_cbf_parallel_and_hdf5(dials_data, tmp_path):
+    data_dir = dials_data("centroid_test_data", pathlib=True)
+    g = sorted(data_dir.glob("*.cbf"))
+
+    cmd = [shutil.which("dials.merge_cbf"), "merge_n_images=3"] + g
+    result = subprocess.run(cmd, cwd=tmp_path, capture_output=True)
+    assert not result.returncode and not result.stderr
+    result = subprocess.run(
+        cmd + ["nproc=2", "image_prefix=parallel_"], cwd=tmp_path, capture_output=True
+    )
+    assert not result.returncode and not result.stderr
+    serial = sorted(tmp_path.glob("sum_*.cbf"))
+    parallel = sorted(tmp_path.glob("parallel_*.cbf"))
+    assert len(parallel) == 3
+    for f1, f2 in zip(serial, parallel):
+        assert f1.read_bytes() == f2.read_bytes()
+
+    # Write the summed images to a single HDF5 file instead
+    result = subprocess.run(
+        cmd + ["output.format=hdf5", "hdf5_file=summed.h5"],
+        cwd=tmp_path,
+        capture_output=True,
+    )
+    assert not result.returncode and not result.stderr
+    with h5py.File(tmp_path / "summed.h5", "r") as f:
+        summed = f["data"][()]
+    assert summed.shape[0] == 3
+    imageset = ExperimentListFactory.from_filenames(serial).imagesets()[0]
+    for i in range(3):
+        assert np.array_equal(summed[i], imageset.get_raw_data(i)[0].as_numpy_array())
+
+
+def test_merge_cbf_nexus(dials_data, tmp_path):
+    """Images read from NeXus are summed and written with a miniCBF header"""
+    result = subprocess.run(
+        [
+            shutil.which("dials.import"),
+            dials_data("vmxi_thaumatin", pathlib=True) / "image_15799.nxs",
+            "image_range=1,6",
+        ],
+        cwd=tmp_path,
+        capture_output=True,
+    )
+    assert not result.returncode and not result.stderr
+    result = subprocess.run(
+        [shutil.which("dials.merge_cbf"), "imported.expt", "merge_n_images=3"],
+        cwd=tmp_path,
+        capture_output=True,
+    )
+    assert not result.returncode and not result.stderr
+    summed = sorted(tmp_path.glob("sum_*.cbf"))
+    assert len(summed) == 2
+
+    imageset = load.experiment_list(tmp_path / "imported.expt")[0].imageset
+    scan = imageset.get_scan()
+    width = scan.get_oscillation()[1]
+    for i_out, filename in enumerate(summed):
+        contents = filename.read_bytes()
+        header = {}
+        for record in contents[: contents.find(start_tag)].split(b"\n"):
+            fields = record.decode("latin-1").split()
+            if len(fields) > 2 and fields[0] == "#":
+                header[fields[1]] = fields[2]
+        # The oscillation width and exposure time are those of all the images
+        assert float(header["Angle_increment"]) == pytest.approx(3 * width, abs=1e-4)
+        exposure_time = scan.get_exposure_times()[3 * i_out]
+        assert float(header["Exposure_time"]) == pytest.approx(
+            3 * exposure_time, rel=1e-4
+        )
+
+        # Negative (masked) pixels are those of the first image of each sum
+        expected = imageset.get_raw_data(3 * i_out)[0].as_numpy_array().astype(int)
+        for i in range(3 * i_out + 1, 3 * i_out + 3):
+            image = imageset.get_raw_data(i)[0].as_numpy_array().astype(int)
+            expected += np.where(image < 0, 0, image)
+        data = raw_data_from_cbf(contents)[0].as_numpy_array()
+        assert data.shape == expected.shape
+        assert data.sum() == expected.sum()
+        assert np.array_equal(data, expected)
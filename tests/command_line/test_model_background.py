@@ -30,6 +30,8 @@ def test_model_background(dials_data, tmp_path):
     assert not result.stderr
     for filename in (
         "background.pickle",
+        "background.pickle.json",
+        "background.pickle.0.npy",
         "mean_0.png",
         "variance_0.png",
         "dispersion_0.png",
@@ -58,3 +58,30 @@ def test_report_scaled_data(dials_data, tmp_path):
     with report_json.open(encoding="utf-8") as fh:
         d = json.load(fh)
         assert not expected_keys - set(d.keys())
+
+
+def test_report_parallel_cached(dials_data, tmp_path):
+    """Test that the concurrent and cached analyses give the same report data."""
+    data_dir = dials_data("l_cysteine_dials_output", pathlib=True)
+    outputs = []
+    for i, options in enumerate(
+        ([], ["nproc=2", "cache.directory=cache"], ["cache.directory=cache"])
+    ):
+        result = subprocess.run(
+            [
+                shutil.which("dials.report"),
+                data_dir / "20_integrated_experiments.json",
+                data_dir / "20_integrated.pickle",
+                f"json=report_{i}.json",
+                *options,
+            ],
+            cwd=tmp_path,
+            capture_output=True,
+        )
+        assert not result.returncode and not result.stderr
+        outputs.append(result.stdout)
+        with (tmp_path / f"report_{i}.json").open(encoding="utf-8") as fh:
+            outputs.append(json.load(fh))
+    assert b"Using cached" not in outputs[2]
+    assert b"Using cached" in outputs[4]
+    assert outputs[1] == outputs[3] == outputs[5]
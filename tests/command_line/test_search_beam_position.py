@@ -14,6 +14,7 @@
 from cctbx import uctbx
 from dxtbx.serialize import load
 
+from dials.array_family import flex
 from dials.command_line import search_beam_position
 
 from ..algorithms.indexing.test_index import run_indexing
@@ -1836,3 +1837,56 @@ def get_random_gaussian_data():
     heights = [h1, h2, h3]  # Heights of the random Gaussians
 
     return xs, ys, widths, heights
+
+
+def test_origin_offset_scorer(dials_data):
+    """Check the vectorised scores against scoring each offset separately."""
+    insulin = dials_data("insulin_processed", pathlib=True)
+    experiments = load.experiment_list(insulin / "imported.expt", check_format=False)
+    reflections = flex.reflection_table.from_file(insulin / "strong.refl")
+    reflections["imageset_id"] = flex.int(len(reflections), 0)
+    reflections.centroid_px_to_mm(experiments)
+    reflections = reflections[:2000]
+    dps = search_beam_position.run_dps(experiments[0], reflections, max_cell=100)
+
+    scorer = search_beam_position._OriginOffsetScorer(
+        experiments[0], reflections, dps["solutions"], dps["amax"]
+    )
+    offsets = np.array([[0.0, 0.0, 0.0], [0.1, -0.2, 0.0], [-0.3, 0.05, 0.0]])
+    expected = [
+        search_beam_position._get_origin_offset_score(
+            scitbx.matrix.col(offset),
+            dps["solutions"],
+            dps["amax"],
+            reflections,
+            experiments[0],
+        )
+        for offset in offsets.tolist()
+    ]
+    assert scorer.scores(offsets) == pytest.approx(expected)
+
+
+def test_search_single_coarse_parallel(dials_data, run_in_tmp_path):
+    """Perform the search of test_search_single, coarse-to-fine and in parallel."""
+    insulin = dials_data("insulin_processed", pathlib=True)
+    refl_path = insulin / "strong.refl"
+    experiments_path = insulin / "imported.expt"
+
+    search_beam_position.run(
+        [
+            str(experiments_path),
+            str(refl_path),
+            "nproc=2",
+            "wide_search_coarse_factor=3",
+        ]
+    )
+    assert run_in_tmp_path.joinpath("optimised.expt").is_file()
+
+    experiments = load.experiment_list(experiments_path, check_format=False)
+    optimized_experiments = load.experiment_list("optimised.expt", check_format=False)
+    detector_1 = experiments.detectors()[0]
+    detector_2 = optimized_experiments.detectors()[0]
+    shift = scitbx.matrix.col(detector_1[0].get_origin()) - scitbx.matrix.col(
+        detector_2[0].get_origin()
+    )
+    assert shift.elems == pytest.approx((-0.165, -0.380, 0.0), abs=1e-1)
@@ -145,3 +145,45 @@ def test_split_by_wavelength(tmp_path):
     )
     assert result.returncode == 1
     assert result.stderr.startswith(b"Sorry")
+
+
+@pytest.mark.parametrize("nproc", [1, 2])
+@pytest.mark.parametrize("with_identifiers", [True, False])
+def test_split_single_experiments(tmp_path, nproc, with_identifiers):
+    """Test splitting into one file per experiment, with interleaved reflections"""
+    experiments = ExperimentList()
+    reflections = flex.reflection_table()
+    reflections["id"] = flex.int([2, 0, 1, 2, 0, 2])
+    reflections["intensity"] = flex.double([100.0, 200.0, 300.0, 400.0, 500.0, 600.0])
+    for i in range(3):
+        exp = generate_exp()
+        if with_identifiers:
+            exp.identifier = str(i)
+            reflections.experiment_identifiers()[i] = str(i)
+        experiments.append(exp)
+
+    experiments.as_json(tmp_path / "tmp.expt")
+    reflections.as_file(tmp_path / "tmp.refl")
+
+    result = subprocess.run(
+        [
+            shutil.which("dials.split_experiments"),
+            "tmp.expt",
+            "tmp.refl",
+            f"nproc={nproc}",
+        ],
+        cwd=tmp_path,
+        capture_output=True,
+    )
+    assert not result.returncode and not result.stderr
+
+    for i, intensities in enumerate([[200.0, 500.0], [300.0], [100.0, 400.0, 600.0]]):
+        expts = load.experiment_list(tmp_path / f"split_{i}.expt", check_format=False)
+        assert len(expts) == 1
+        refls = flex.reflection_table.from_file(tmp_path / f"split_{i}.refl")
+        assert list(refls["intensity"]) == intensities
+        assert set(refls["id"]) == {0}
+        assert set(refls["imageset_id"]) == {0}
+        if with_identifiers:
+            assert dict(refls.experiment_identifiers()) == {0: str(i)}
+        refls.assert_experiment_identifiers_are_consistent(expts)
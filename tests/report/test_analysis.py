@@ -13,6 +13,7 @@
     scaled_data_as_miller_array,
 )
 from dials.array_family import flex
+from dials.command_line.benchmark_batch_statistics import generate_batch_data
 from dials.report.analysis import (
     batch_dependent_properties,
     combined_table_to_batch_dependent_properties,
@@ -211,6 +212,30 @@ def test_batch_dependent_properties(batch_array, data_array):
         _ = batch_dependent_properties(batch_array[0:-1], Is)
 
 
+def test_batch_dependent_properties_many_batches():
+    """Compare the per-batch statistics with a direct calculation for each batch."""
+    batches, intensities, scales = generate_batch_data(500, 10)
+    bins, rmerge, isigi, scalesvsbatch = batch_dependent_properties(
+        batches, intensities, scales
+    )
+    assert bins == list(range(1, 501))
+
+    asu = intensities.map_to_asu()
+    merged = asu.merge_equivalents().array()
+    merged_i = dict(zip(merged.indices(), merged.data()))
+    for i, batch in enumerate(bins):
+        sel = batches.data() == batch
+        Ij = asu.data().select(sel)
+        merged_Ij = flex.double([merged_i[h] for h in asu.indices().select(sel)])
+        assert rmerge[i] == pytest.approx(
+            flex.sum(flex.abs(Ij - merged_Ij)) / flex.sum(Ij)
+        )
+        assert isigi[i] == pytest.approx(
+            flex.mean(Ij / intensities.sigmas().select(sel))
+        )
+        assert scalesvsbatch[i] == pytest.approx(flex.mean(scales.data().select(sel)))
+
+
 def test_table_1_summary(dials_data):
     location = dials_data("l_cysteine_4_sweeps_scaled", pathlib=True)
     expts = load.experiment_list(location / "scaled_20_25.expt", check_format=False)
@@ -6,8 +6,10 @@
 from cctbx import sgtbx
 from cctbx.array_family import flex
 from dxtbx.model import Experiment, ExperimentList, Scan
+from libtbx import phil
 
 import dials.pychef
+from dials.pychef.damage_series import DoseRanges
 
 
 def test_observations():
@@ -104,3 +106,60 @@ def test_interpret_images_to_doses_options():
         _, __ = dials.pychef.interpret_images_to_doses_options(
             experiments, dose_per_image=[1.0, 2.0]
         )
+
+
+def test_batches_to_dose():
+    batches = flex.int([5, 3, 3, 10, 7, 5, 12])
+    params = dials.pychef.phil_scope.extract().dose
+    assert list(dials.pychef.remove_batch_gaps(batches)) == [1, 0, 0, 3, 2, 1, 4]
+    assert list(dials.pychef.batches_to_dose(batches, params)) == [
+        1,
+        0,
+        0,
+        3,
+        2,
+        1,
+        4,
+    ]
+    params.remove_gaps = False
+    assert dials.pychef.batches_to_dose(batches, params) is batches
+
+    # Batches outside the given ranges have a dose of -1
+    params = dials.pychef.phil_scope.fetch(
+        source=phil.parse(
+            """
+dose.batch {
+  range = 3 7
+  dose_start = 10
+  dose_step = 2
+}
+dose.batch {
+  range = 10 11
+  dose_start = 100
+  dose_step = 0.5
+}
+"""
+        )
+    ).extract()
+    assert list(dials.pychef.batches_to_dose(batches, params.dose)) == [
+        14,
+        10,
+        10,
+        100,
+        18,
+        14,
+        -1,
+    ]
+
+
+def test_dose_ranges():
+    doses = flex.int([7, 0, 3, 12, 4, 1, 9, 15, 2])
+    dose_boundaries = [0, 2, 2, 5, 10, 13]
+    dose_ranges = DoseRanges(doses, dose_boundaries)
+    assert len(dose_ranges) == 5
+    for n in range(len(dose_ranges)):
+        lower, upper = dose_boundaries[n], dose_boundaries[n + 1]
+        expected = [i for i, d in enumerate(doses) if lower <= d < upper]
+        assert list(dose_ranges.selection(n)) == expected
+        expected = [i for i, d in enumerate(doses) if d < upper]
+        assert list(dose_ranges.accumulated_selection(n)) == expected
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import itertools
+import json
+
+import pytest
+
+import libtbx.phil
+
+from dials.util.benchmark import Column, best_time, make_phil_scope, report
+
+
+def test_make_phil_scope():
+    params = make_phil_scope("n = 1\n  .type = int", repeats=5).extract()
+    assert params.n == 1
+    assert params.repeats == 5
+    assert params.output.json is None
+    assert not hasattr(params, "seed")
+    assert make_phil_scope(seed=True).extract().seed == 0
+    with pytest.raises(RuntimeError, match="repeats"):
+        make_phil_scope().fetch(libtbx.phil.parse("repeats = 0")).extract()
+
+
+def test_best_time(monkeypatch):
+    # Calls taking 3, 1 and 2 seconds, returning the number of the call
+    clock = iter([0, 3, 3, 4, 4, 6])
+    monkeypatch.setattr("time.perf_counter", lambda: next(clock))
+    calls = itertools.count()
+    elapsed, result = best_time(lambda offset: next(calls) + offset, 3, offset=10)
+    assert elapsed == 1
+    assert result == 11
+    assert next(calls) == 3
+
+
+def test_report(tmp_path, capsys):
+    results = [{"n": 10, "time": 0.12345}, {"n": 100, "time": None}]
+    report(
+        results,
+        [
+            Column("n", "n"),
+            Column("time (s)", "time", lambda t: "failed" if t is None else f"{t:.2f}"),
+        ],
+        tmp_path / "results.json",
+        size=3,
+    )
+    table = capsys.readouterr().out
+    assert "time (s)" in table
+    assert "0.12" in table and "failed" in table
+    with open(tmp_path / "results.json") as f:
+        assert json.load(f) == {"size": 3, "results": results}
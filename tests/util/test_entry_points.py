@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from dials.util.entry_points import entry_points, invalidate_cache
+
+
+def test_entry_points():
+    names = [ep.name for ep in entry_points("dials.index.basis_vector_search")]
+    assert {"fft1d", "fft3d", "real_space_grid_search"} <= set(names)
+    (fft1d,) = entry_points("dials.index.basis_vector_search", "fft1d")
+    assert fft1d.load().__name__ == "FFT1D"
+    assert entry_points("dials.index.basis_vector_search", "not_a_plugin") == []
+    assert entry_points("dials.not_an_entry_point_group") == []
+
+
+def test_entry_points_cache_invalidation(tmp_path, monkeypatch):
+    dist_info = tmp_path / "dials_test_plugin-1.0.dist-info"
+    dist_info.mkdir()
+    (dist_info / "METADATA").write_text(
+        "Metadata-Version: 2.1\nName: dials_test_plugin\nVersion: 1.0\n"
+    )
+    (dist_info / "entry_points.txt").write_text(
+        "[dials.test_plugin]\nexample = json:dumps\n"
+    )
+    assert entry_points("dials.test_plugin") == []
+
+    # Changes to sys.path are picked up without explicit invalidation
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (example,) = entry_points("dials.test_plugin")
+    assert example.name == "example"
+    assert example.dist.version == "1.0"
+
+    (dist_info / "entry_points.txt").write_text("[dials.test_plugin]\n")
+    invalidate_cache()
+    assert entry_points("dials.test_plugin") == []
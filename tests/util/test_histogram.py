@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from dials.array_family import flex
+from dials.util.histogram import (
+    bin_counts,
+    bin_indices,
+    bin_means,
+    counts_per_image,
+    rows_per_bin,
+)
+
+
+@pytest.fixture
+def z():
+    rng = np.random.default_rng(0)
+    # Include values on the bin edges and outside the bins
+    return np.concatenate((rng.uniform(-2, 25, 1000), [0.0, 5.0, 20.0, np.nan]))
+
+
+def test_bin_indices(z):
+    edges = [0, 5, 10, 10, 20]
+    indices = bin_indices(z, edges)
+    for value, index in zip(z, indices):
+        expected = [
+            i for i in range(len(edges) - 1) if edges[i] <= value < edges[i + 1]
+        ]
+        assert [index] == expected or (index == -1 and not expected)
+
+    counts = bin_counts(indices, len(edges) - 1)
+    assert counts.tolist() == [
+        np.count_nonzero((z >= lo) & (z < hi)) for lo, hi in zip(edges, edges[1:])
+    ]
+    sums = bin_counts(indices, len(edges) - 1, weights=np.where(np.isnan(z), 0, z))
+    means = bin_means(indices, len(edges) - 1, np.where(np.isnan(z), 0, z))
+    assert means[2] == 0
+    assert means[[0, 1, 3]] == pytest.approx(sums[[0, 1, 3]] / counts[[0, 1, 3]])
+
+
+def test_bin_indices_flex_histogram_slots(z):
+    hist = flex.histogram(
+        flex.double(z[~np.isnan(z)].tolist()), data_min=0, data_max=20, n_slots=7
+    )
+    low = [s.low_cutoff for s in hist.slot_infos()]
+    high = [s.high_cutoff for s in hist.slot_infos()]
+    counts = bin_counts(bin_indices(z, low, high), len(low))
+    assert counts.tolist() == [
+        np.count_nonzero((z >= lo) & (z < hi)) for lo, hi in zip(low, high)
+    ]
+
+
+def test_rows_per_bin(z):
+    indices = bin_indices(z, np.arange(0, 21))
+    order, boundaries = rows_per_bin(indices, 20)
+    for i in range(20):
+        rows = order[boundaries[i] : boundaries[i + 1]]
+        assert rows.tolist() == np.flatnonzero(np.floor(z) == i).tolist()
+
+
+def test_counts_per_image(z):
+    counts = counts_per_image(z, 20)
+    assert counts.tolist() == [
+        np.count_nonzero((z >= i) & (z < i + 1)) for i in range(20)
+    ]
+
+    groups = np.arange(z.size) % 3 - 1
+    counts = counts_per_image(z, 20, groups)
+    assert counts.shape == (2, 20)
+    for j in range(2):
+        zsel = z[groups == j]
+        assert counts[j].tolist() == [
+            np.count_nonzero((zsel >= i) & (zsel < i + 1)) for i in range(20)
+        ]
+    assert counts_per_image(z, 20, groups, n_groups=4).shape == (4, 20)
@@ -5,6 +5,7 @@
 import shutil
 import subprocess
 from pathlib import Path
+from unittest import mock
 
 import pytest
 
@@ -122,69 +123,133 @@ def test_filter_shadowed_reflections(dials_regression: Path):
         assert shadowed.count(False) == 674
 
 
-def test_lru_equality_cache_basic():
-    callargs = []
-    result = [None]
-
-    def _callappend(*arg):
-        callargs.append(arg)
-        return result[-1]
-
-    fun = dials.util.masking.lru_equality_cache(maxsize=20)(_callappend)
-    hits, misses, maxsize, currsize = fun.cache_info()
-    assert hits == 0
-    assert misses == 0
-    assert maxsize == 20
-    assert currsize == 0
-
-    for i in range(100):
-        fun(i)
-        fun(i)
-    hits, misses, maxsize, currsize = fun.cache_info()
-    assert hits == 100
-    assert misses == 100
-    assert maxsize == 20
-    assert currsize == 20
-    assert len(callargs) == 100
-    assert len(set(callargs)) == 100
-    for i in range(80, 100):
-        fun(i)
-    assert fun.cache_info() == (120, 100, 20, 20)
-    assert len(callargs) == 100
-
-    # Change the return value
-    assert fun(1) is None
-    result.append("test_result")
-    assert fun(1) is None
-    assert fun.__wrapped__(1) == "test_result"
-    assert fun(2) == "test_result"
-
-
-def test_lru_equality_cache_id():
-    callargs = []
-
-    def _callappend(*arg):
-        callargs.append(arg)
-
-    fun = dials.util.masking.lru_equality_cache(maxsize=1)(_callappend)
-
-    class EqTester:
-        def __init__(self, a):
-            self.a = a
-
-        def __eq__(self, other):
-            return other.a == self.a
-
-        def __hash__(self):
-            return hash(id(self))
-
-    a, b = EqTester(-424242), EqTester(-424242)
-    assert a == b
-    assert hash(a) != hash(b)
-
-    fun(a)
-    fun(b)
-    assert fun.cache_info() == (1, 1, 1, 1)
+def test_filter_shadowed_reflections_multiple_experiments():
+    """Test the assignment of reflections to experiments, images and panels,
+    with a mock shadow covering x < 10 on panel 0 and y < 10 on panel 1 for
+    images 0-4, and nothing after."""
+
+    def project_extrema(detector, angle):
+        if angle < 5:
+            return [
+                flex.vec2_double([(-1, -1), (10, -1), (10, 100), (-1, 100)]),
+                flex.vec2_double([(-1, -1), (100, -1), (100, 10), (-1, 10)]),
+            ]
+        return [flex.vec2_double(), flex.vec2_double()]
+
+    masker = mock.Mock()
+    masker.project_extrema.side_effect = project_extrema
+    experiments = []
+    for _ in range(2):
+        expt = mock.Mock()
+        expt.imageset.masker.return_value = masker
+        expt.detector = [mock.Mock(), mock.Mock()]
+        expt.scan.get_array_range.return_value = (0, 10)
+        expt.scan.get_angle_from_array_index.side_effect = float
+        experiments.append(expt)
+    experiments[1].imageset.masker.return_value = None
+
+    reflections = flex.reflection_table()
+    reflections["id"] = flex.int([0, 0, 0, 0, 0, 1, 0, 0])
+    reflections["panel"] = flex.size_t([0, 0, 1, 1, 0, 0, 1, 0])
+    reflections["xyzcal.px"] = flex.vec3_double(
+        [
+            (5, 50, 0.5),
+            (50, 50, 1.5),
+            (50, 5, 2.5),
+            (5, 50, 2.5),
+            (5, 50, 7.5),
+            (5, 50, 0.5),
+            (5, 5, 4.9),
+            (5, 50, 10.5),
+        ]
+    )
+    expected = [True, False, True, False, False, False, True, False]
+    shadowed = filter_shadowed_reflections(experiments, reflections)
+    assert list(shadowed) == expected
+    # The shadow is only projected once per image containing reflections
+    assert masker.project_extrema.call_count == 5
+
+
+def test_filter_shadowed_reflections_shadows_per_experiment():
+    """The shadow of each experiment is projected with its own goniometer,
+    even when the experiments share the same scan angles."""
+    everything = flex.vec2_double([(-1, -1), (100, -1), (100, 100), (-1, 100)])
+    experiments = []
+    maskers = []
+    for shadow in (everything, flex.vec2_double()):
+        masker = mock.Mock()
+        masker.project_extrema.return_value = [shadow]
+        expt = mock.Mock()
+        expt.imageset.masker.return_value = masker
+        expt.detector = [mock.Mock()]
+        expt.scan.get_array_range.return_value = (0, 10)
+        expt.scan.get_angle_from_array_index.side_effect = float
+        experiments.append(expt)
+        maskers.append(masker)
+
+    reflections = flex.reflection_table()
+    reflections["id"] = flex.int([0, 1, 0, 1])
+    reflections["panel"] = flex.size_t(4, 0)
+    reflections["xyzcal.px"] = flex.vec3_double(
+        [(5, 5, 0.5), (5, 5, 0.5), (5, 5, 1.5), (5, 5, 1.5)]
+    )
+    shadowed = filter_shadowed_reflections(experiments, reflections)
+    assert list(shadowed) == [True, False, True, False]
+    for masker in maskers:
+        assert masker.project_extrema.call_count == 2
+
+
+def test_mask_cache(tmp_path):
+    cache = dials.util.masking.MaskCache(maxsize=2)
+    masks = (flex.bool(flex.grid(10, 20), True), flex.bool(flex.grid(5, 5), False))
+    masks[0][3, 4] = False
+    assert cache.get("a") is None
+    cache.put("a", masks, directory=str(tmp_path))
+    assert (tmp_path / "a.npz").is_file()
+
+    cached = cache.get("a")
+    assert cache.cache_info() == (1, 1, 2, 1)
+    assert [m.all() for m in cached] == [(10, 20), (5, 5)]
+    assert list(cached[0]) == list(masks[0])
+    # The cache returns copies of the masks
+    cached[0][0, 0] = False
+    assert cache.get("a")[0][0, 0]
+
+    # Another cache (e.g. in another process) can read the masks from disk
+    other = dials.util.masking.MaskCache()
+    assert other.get("a") is None
+    cached = other.get("a", directory=str(tmp_path))
+    assert [list(m) for m in cached] == [list(m) for m in masks]
+
+    # The least recently used files are removed to keep within the size limit
+    size_mb = (tmp_path / "a.npz").stat().st_size / 1024**2
+    for key in "bcd":
+        cache.put(key, masks, directory=str(tmp_path), max_size=2.5 * size_mb)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["c.npz", "d.npz"]
+    assert cache.cache_info().currsize == 2
+
+
+def test_mask_cache_not_in_memory(tmp_path):
+    cache = dials.util.masking.MaskCache(maxsize=0)
+    masks = (flex.bool(flex.grid(10, 20), True),)
+    cache.put("a", masks)
+    assert cache.get("a") is None
+    assert cache.cache_info().currsize == 0
+    # Masks are still shared through the cache directory
+    cache.put("a", masks, directory=str(tmp_path))
+    assert list(cache.get("a", directory=str(tmp_path))[0]) == list(masks[0])
+    assert cache.cache_info().currsize == 0
+
+
+@pytest.mark.parametrize("content", [b"", b"not a zip file", b"PK\x03\x04truncated"])
+def test_mask_cache_corrupt_file(tmp_path, content):
+    cache = dials.util.masking.MaskCache(maxsize=0)
+    (tmp_path / "a.npz").write_bytes(content)
+    assert cache.get("a", directory=str(tmp_path)) is None
+    # The regenerated masks replace the corrupt file
+    masks = (flex.bool(flex.grid(10, 20), True),)
+    cache.put("a", masks, directory=str(tmp_path))
+    assert list(cache.get("a", directory=str(tmp_path))[0]) == list(masks[0])
 
 
 def test_generate_mask(dials_data):
@@ -207,6 +272,12 @@ def test_generate_mask(dials_data):
         assert m.all() == im.all()
     assert mask[0].count(False) == 4060817
 
+    # A second call with the same geometry and parameters uses the cached mask
+    hits = dials.util.masking._mask_cache.cache_info().hits
+    mask = dials.util.masking.generate_mask(imageset, params)
+    assert dials.util.masking._mask_cache.cache_info().hits == hits + 1
+    assert mask[0].count(False) == 4060817
+
 
 @pytest.mark.parametrize(
     "disable_parallax_correction,expected", [(False, 1427394), (True, 1432002)]